@@ -6,26 +6,69 @@ Paquete principal para gestión de eventos con recursos limitados.
 __version__ = "1.0.0"
 __author__ = "Equipo de Desarrollo"
 
-# Re-exportaciones principales para facilitar el acceso
-from .dominio.recursos import Recurso, GestorRecursos
-from .dominio.eventos import Evento, GestorEventos
-from .dominio.restricciones import (
-    Restriccion, 
-    RestriccionCoRequisito, 
-    RestriccionExclusionMutua, 
-    RestriccionCapacidad
-)
-from .aplicacion.planificador import Planificador
-from .infraestructura.persistencia import Persistencia
-
-# Funciones de fábrica
-from .dominio.recursos import crear_recursos_predeterminados
-from .dominio.restricciones import crear_restricciones_predeterminadas
+import importlib
+from typing import TYPE_CHECKING
+
+# Re-exportaciones principales para facilitar el acceso.
+# Se resuelven al primer uso (PEP 562) para que importar el paquete no cargue
+# todos los módulos: nombre -> (módulo relativo, atributo)
+_REEXPORTACIONES = {
+    # Modelos y gestores
+    'Recurso': ('.dominio.recursos', 'Recurso'),
+    'GestorRecursos': ('.dominio.recursos', 'GestorRecursos'),
+    'Evento': ('.dominio.eventos', 'Evento'),
+    'GestorEventos': ('.dominio.eventos', 'GestorEventos'),
+    'SerieRecurrente': ('.dominio.series', 'SerieRecurrente'),
+
+    # Restricciones
+    'Restriccion': ('.dominio.restricciones', 'Restriccion'),
+    'RestriccionCoRequisito': ('.dominio.restricciones', 'RestriccionCoRequisito'),
+    'RestriccionExclusionMutua': ('.dominio.restricciones', 'RestriccionExclusionMutua'),
+    'RestriccionCapacidad': ('.dominio.restricciones', 'RestriccionCapacidad'),
+
+    # Lógica principal y persistencia
+    'Planificador': ('.aplicacion.planificador', 'Planificador'),
+    'Persistencia': ('.infraestructura.persistencia', 'Persistencia'),
+
+    # Funciones de fábrica
+    'crear_recursos_predeterminados': ('.dominio.recursos', 'crear_recursos_predeterminados'),
+    'crear_restricciones_predeterminadas': ('.dominio.restricciones', 'crear_restricciones_predeterminadas'),
+}
+
+if TYPE_CHECKING:
+    # Para los analizadores estáticos y el autocompletado
+    from .dominio.recursos import Recurso, GestorRecursos, crear_recursos_predeterminados
+    from .dominio.eventos import Evento, GestorEventos
+    from .dominio.series import SerieRecurrente
+    from .dominio.restricciones import (
+        Restriccion,
+        RestriccionCoRequisito,
+        RestriccionExclusionMutua,
+        RestriccionCapacidad,
+        crear_restricciones_predeterminadas
+    )
+    from .aplicacion.planificador import Planificador
+    from .infraestructura.persistencia import Persistencia
+
+
+def __getattr__(nombre: str):
+    if nombre not in _REEXPORTACIONES:
+        raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
+    modulo, atributo = _REEXPORTACIONES[nombre]
+    valor = getattr(importlib.import_module(modulo, __name__), atributo)
+    # Se guarda en el módulo para que los accesos siguientes no pasen por aquí
+    globals()[nombre] = valor
+    return valor
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_REEXPORTACIONES))
 
 __all__ = [
     # Modelos
     'Recurso',
     'Evento',
+    'SerieRecurrente',
     
     # Gestores
     'GestorRecursos',
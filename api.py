@@ -0,0 +1,493 @@
+"""
+Servidor HTTP/JSON sin interfaz gráfica para el Planificador
+Pensado para la automatización (p. ej. pipelines de entrenamiento que reservan tiempo de GPU)
+Solo usa la biblioteca estándar: asyncio para las conexiones y json para los mensajes
+
+Rutas:
+    GET    /salud                          Estado del servicio
+    GET    /metrics                        Métricas en formato de texto de Prometheus
+    GET    /recursos                       Lista de recursos
+    GET    /eventos?dias=N                 Eventos de los próximos N días
+    GET    /recursos/<id>/agenda?dias=N    Agenda de un recurso
+    POST   /eventos                        planificar_evento
+    DELETE /eventos/<id>                   eliminar_evento
+    POST   /conflictos                     verificar_conflictos
+    POST   /huecos                         buscar_hueco_disponible
+    POST   /lote                           Varias operaciones en una sola petición
+
+Las reservas y bajas pasan por aplicacion.asincrono.PlanificadorAsincrono: las que
+usan recursos distintos (también dentro de un mismo /lote) se comprueban a la vez y
+las consultas se resuelven en un hilo aparte, sin bloquear el bucle ni esperar a las
+escrituras
+
+Las listas se devuelven como NDJSON (una línea JSON por elemento, en bloques) si la
+petición incluye "?formato=ndjson" o la cabecera "Accept: application/x-ndjson". En
+GET /eventos cada bloque es una página del índice de eventos, que se envía en cuanto
+se obtiene
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional
+from urllib.parse import urlsplit, parse_qs
+
+# Configurar path para importaciones
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from aplicacion.asincrono import PlanificadorAsincrono
+from aplicacion.planificador import Planificador
+from core.metricas import METRICAS, EscritorPeriodico
+from dominio.eventos import Evento
+
+# Elementos que se agrupan en cada bloque de una respuesta NDJSON
+TAMANO_BLOQUE_NDJSON = 500
+
+# Tamaño máximo aceptado para el cuerpo de una petición (bytes)
+MAX_CUERPO = 16 * 1024 * 1024
+
+ESTADOS_HTTP = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    409: "Conflict",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+}
+
+
+class ErrorPeticion(Exception):
+    """Error atribuible a la petición del cliente"""
+    def __init__(self, mensaje: str, estado: int = 400):
+        super().__init__(mensaje)
+        self.estado = estado
+
+
+class TextoPlano(str):
+    """Resultado que se envía tal cual como text/plain en lugar de serializarse a JSON"""
+    tipo_contenido = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def evento_a_json(evento: Evento) -> Dict[str, Any]:
+    """Representación compacta de un evento (los recursos se identifican por id)"""
+    return {
+        'id': evento.id,
+        'nombre': evento.nombre,
+        'inicio': evento.inicio.isoformat(),
+        'fin': evento.fin.isoformat(),
+        'recursos': [r.id for r in evento.recursos],
+        'tipo': evento.tipo,
+        'descripcion': evento.descripcion,
+        'estado': evento.estado,
+        'prioridad': evento.prioridad,
+    }
+
+
+def _convertir(valor: Any) -> Any:
+    """Función 'default' de json.dumps para los tipos del dominio"""
+    if isinstance(valor, datetime):
+        return valor.isoformat()
+    if isinstance(valor, Evento):
+        return evento_a_json(valor)
+    if hasattr(valor, 'to_dict'):
+        return valor.to_dict()
+    return str(valor)
+
+
+def _a_json(datos: Any) -> bytes:
+    return json.dumps(datos, ensure_ascii=False, default=_convertir).encode('utf-8')
+
+
+def _fecha(parametros: Dict[str, Any], clave: str, obligatoria: bool = True) -> Optional[datetime]:
+    """Lee una fecha ISO 8601 de los parámetros"""
+    valor = parametros.get(clave)
+    if valor is None:
+        if obligatoria:
+            raise ErrorPeticion(f"Falta el parámetro '{clave}'")
+        return None
+    try:
+        return datetime.fromisoformat(valor)
+    except (TypeError, ValueError):
+        raise ErrorPeticion(f"'{clave}' debe ser una fecha ISO 8601")
+
+
+def _entero(parametros: Dict[str, Any], clave: str, predeterminado: Optional[int] = None) -> Optional[int]:
+    """Lee un entero de los parámetros (el predeterminado si falta o está vacío)"""
+    valor = parametros.get(clave)
+    if valor is None or valor == "":
+        return predeterminado
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        raise ErrorPeticion(f"'{clave}' debe ser un número entero")
+
+
+def _recursos(parametros: Dict[str, Any]) -> Dict[str, int]:
+    """Lee el diccionario {id_recurso: cantidad}"""
+    recursos = parametros.get('recursos')
+    if not isinstance(recursos, dict) or not recursos:
+        raise ErrorPeticion("'recursos' debe ser un objeto {id_recurso: cantidad} no vacío")
+    try:
+        return {str(id_recurso): int(cantidad) for id_recurso, cantidad in recursos.items()}
+    except (TypeError, ValueError):
+        raise ErrorPeticion("Las cantidades de 'recursos' deben ser enteras")
+
+
+async def _en_bloques(elementos: List[Any]) -> AsyncIterator[List[Any]]:
+    """Una lista ya construida, en bloques de TAMANO_BLOQUE_NDJSON elementos"""
+    for i in range(0, len(elementos), TAMANO_BLOQUE_NDJSON):
+        yield elementos[i:i + TAMANO_BLOQUE_NDJSON]
+
+
+class ServidorAPI:
+    """Servidor HTTP/1.1 con conexiones persistentes (keep-alive) sobre un Planificador"""
+
+    def __init__(self, planificador: Planificador, guardar: bool = True):
+        self.planificador = planificador
+        self.asincrono = PlanificadorAsincrono(planificador)
+        self.guardar = guardar
+        # Operaciones disponibles tanto por ruta como dentro de un lote
+        self.operaciones = {
+            'planificar_evento': self.op_planificar_evento,
+            'eliminar_evento': self.op_eliminar_evento,
+            'verificar_conflictos': self.op_verificar_conflictos,
+            'buscar_hueco_disponible': self.op_buscar_hueco_disponible,
+            'listar_eventos': self.op_listar_eventos,
+            'listar_recursos': self.op_listar_recursos,
+            'obtener_agenda_recurso': self.op_obtener_agenda_recurso,
+        }
+        # Operaciones que modifican el estado y requieren guardar
+        self.operaciones_escritura = {'planificar_evento', 'eliminar_evento'}
+
+    # Operaciones
+
+    async def op_planificar_evento(self, parametros: Dict[str, Any]) -> Dict[str, Any]:
+        if not parametros.get('nombre') or not parametros.get('tipo'):
+            raise ErrorPeticion("'nombre' y 'tipo' son obligatorios")
+        resultado = await self.asincrono.planificar_evento(
+            nombre=parametros['nombre'],
+            inicio=_fecha(parametros, 'inicio'),
+            fin=_fecha(parametros, 'fin'),
+            recursos_seleccionados=_recursos(parametros),
+            tipo=parametros['tipo'],
+            descripcion=parametros.get('descripcion', ''),
+            prioridad=_entero(parametros, 'prioridad', 1),
+            buscar_hueco_si_ocupado=bool(parametros.get('buscar_hueco', False))
+        )
+        return resultado
+
+    async def op_eliminar_evento(self, parametros: Dict[str, Any]) -> Dict[str, Any]:
+        id_evento = parametros.get('id')
+        if not id_evento:
+            raise ErrorPeticion("Falta el parámetro 'id'")
+        if not await self.asincrono.eliminar_evento(id_evento):
+            raise ErrorPeticion(f"Evento {id_evento} no encontrado", 404)
+        return {'success': True, 'message': 'Evento eliminado'}
+
+    async def op_verificar_conflictos(self, parametros: Dict[str, Any]) -> Dict[str, Any]:
+        recursos = []
+        for id_recurso, cantidad in _recursos(parametros).items():
+            recurso = self.planificador.gestor_recursos.obtener_recurso(id_recurso)
+            if not recurso:
+                raise ErrorPeticion(f"Recurso {id_recurso} no encontrado", 404)
+            recursos.extend([recurso] * cantidad)
+        try:
+            evento = Evento(
+                nombre=parametros.get('nombre', 'consulta_api'),
+                inicio=_fecha(parametros, 'inicio'),
+                fin=_fecha(parametros, 'fin'),
+                recursos=recursos,
+                tipo=parametros.get('tipo', 'entrenamiento')
+            )
+        except (TypeError, ValueError) as e:
+            raise ErrorPeticion(str(e))
+        sin_conflictos, errores = await self.asincrono.verificar_conflictos(evento)
+        return {'sin_conflictos': sin_conflictos, 'errores': errores}
+
+    async def op_buscar_hueco_disponible(self, parametros: Dict[str, Any]) -> List[Dict[str, Any]]:
+        try:
+            duracion_horas = float(parametros['duracion_horas'])
+        except (KeyError, TypeError, ValueError):
+            raise ErrorPeticion("'duracion_horas' es obligatorio y numérico")
+        return await self.asincrono.buscar_hueco_disponible(
+            recursos_con_cantidad=_recursos(parametros),
+            duracion_horas=duracion_horas,
+            inicio_busqueda=_fecha(parametros, 'inicio_busqueda', obligatoria=False),
+            dias=_entero(parametros, 'dias', 7),
+            max_resultados=_entero(parametros, 'max_resultados') or None,
+            tipo=parametros.get('tipo'),
+            recomendar=bool(parametros.get('recomendar', False))
+        )
+
+    async def op_listar_eventos(self, parametros: Dict[str, Any]) -> List[Evento]:
+        return await self.asincrono.listar_eventos(dias=_entero(parametros, 'dias', 1))
+
+    def paginas_eventos(self, parametros: Dict[str, Any]) -> AsyncIterator[List[Evento]]:
+        """Como op_listar_eventos, pero por páginas (para enviarlas según se obtienen)"""
+        return self.asincrono.paginas_eventos(dias=_entero(parametros, 'dias', 1), tamano=TAMANO_BLOQUE_NDJSON)
+
+    async def op_listar_recursos(self, parametros: Dict[str, Any]) -> List[Any]:
+        return await self.asincrono.listar_recursos()
+
+    async def op_obtener_agenda_recurso(self, parametros: Dict[str, Any]) -> List[Evento]:
+        id_recurso = parametros.get('recurso_id')
+        if not self.planificador.gestor_recursos.obtener_recurso(id_recurso):
+            raise ErrorPeticion(f"Recurso {id_recurso} no encontrado", 404)
+        return await self.asincrono.obtener_agenda_recurso(id_recurso, dias=_entero(parametros, 'dias', 7))
+
+    async def _ejecutar_operacion(self, peticion: Any) -> Dict[str, Any]:
+        nombre = peticion.get('operacion') if isinstance(peticion, dict) else None
+        operacion = self.operaciones.get(nombre)
+        if operacion is None:
+            return {'success': False, 'message': f"Operación desconocida: {nombre}"}
+        try:
+            resultado = await operacion(peticion.get('parametros') or {})
+        except ErrorPeticion as e:
+            return {'success': False, 'message': str(e)}
+        except Exception as e:
+            # Dentro de un lote, un fallo inesperado se informa en su operación y no
+            # interrumpe las demás (las ya aplicadas se guardan al final del lote)
+            return {'success': False, 'message': f"Error interno: {e}"}
+        return {'success': True, 'resultado': resultado} if isinstance(resultado, list) else resultado
+
+    async def ejecutar_lote(self, peticiones: Any) -> List[Dict[str, Any]]:
+        """
+        Ejecuta varias operaciones y guarda una sola vez al final. Las reservas seguidas
+        se lanzan a la vez (ver PlanificadorAsincrono.planificar_lote); el resto de
+        operaciones se ejecutan en orden
+        """
+        if not isinstance(peticiones, list):
+            raise ErrorPeticion("El cuerpo de /lote debe ser una lista de operaciones")
+
+        def nombre(peticion: Any) -> Optional[str]:
+            return peticion.get('operacion') if isinstance(peticion, dict) else None
+
+        resultados: List[Dict[str, Any]] = []
+        inicio = 0
+        while inicio < len(peticiones):
+            fin = inicio + 1
+            if nombre(peticiones[inicio]) == 'planificar_evento':
+                while fin < len(peticiones) and nombre(peticiones[fin]) == 'planificar_evento':
+                    fin += 1
+            resultados.extend(await asyncio.gather(
+                *(self._ejecutar_operacion(peticion) for peticion in peticiones[inicio:fin])))
+            inicio = fin
+
+        if any(nombre(peticion) in self.operaciones_escritura for peticion in peticiones):
+            self._guardar()
+        return resultados
+
+    def _guardar(self):
+        if self.guardar:
+            self.planificador.guardar_datos()
+
+    # Enrutado
+
+    async def despachar(self, metodo: str, ruta: str, consulta: Dict[str, str], cuerpo: Any,
+                        ndjson: bool = False) -> Any:
+        """
+        Traduce método y ruta a una operación. Devuelve el resultado a serializar
+        (con ndjson, las listas que se pueden recorrer por páginas como un iterador asíncrono de páginas)
+        """
+        partes = [p for p in ruta.split('/') if p]
+
+        if metodo == 'GET':
+            if partes == ['salud']:
+                return {'estado': 'ok', 'eventos': len(self.planificador.gestor_eventos),
+                        'recursos': len(self.planificador.gestor_recursos)}
+            if partes == ['metrics']:
+                return TextoPlano(METRICAS.exponer())
+            if partes == ['recursos']:
+                return await self.op_listar_recursos(consulta)
+            if partes == ['eventos']:
+                if ndjson:
+                    return self.paginas_eventos(consulta)
+                return await self.op_listar_eventos(consulta)
+            if len(partes) == 3 and partes[0] == 'recursos' and partes[2] == 'agenda':
+                return await self.op_obtener_agenda_recurso({**consulta, 'recurso_id': partes[1]})
+
+        elif metodo == 'POST':
+            if partes == ['lote']:
+                return await self.ejecutar_lote(cuerpo)
+            parametros = cuerpo if isinstance(cuerpo, dict) else {}
+            if partes == ['eventos']:
+                resultado = await self.op_planificar_evento(parametros)
+                if resultado.get('success'):
+                    self._guardar()
+                return resultado
+            if partes == ['conflictos']:
+                return await self.op_verificar_conflictos(parametros)
+            if partes == ['huecos']:
+                return await self.op_buscar_hueco_disponible(parametros)
+
+        elif metodo == 'DELETE':
+            if len(partes) == 2 and partes[0] == 'eventos':
+                resultado = await self.op_eliminar_evento({'id': partes[1]})
+                self._guardar()
+                return resultado
+
+        else:
+            raise ErrorPeticion(f"Método {metodo} no soportado", 405)
+
+        raise ErrorPeticion(f"Ruta no encontrada: {metodo} {ruta}", 404)
+
+    # Protocolo HTTP
+
+    async def atender(self, lector: asyncio.StreamReader, escritor: asyncio.StreamWriter):
+        """Atiende todas las peticiones de una conexión mientras siga abierta"""
+        try:
+            while True:
+                try:
+                    cabecera = await lector.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+
+                lineas = cabecera.decode('latin-1').split("\r\n")
+                try:
+                    metodo, destino, version = lineas[0].split(" ", 2)
+                except ValueError:
+                    await self._responder(escritor, 400, {'error': 'Línea de petición inválida'}, False)
+                    break
+
+                cabeceras = {}
+                for linea in lineas[1:]:
+                    if ":" in linea:
+                        clave, valor = linea.split(":", 1)
+                        cabeceras[clave.strip().lower()] = valor.strip()
+
+                conexion = cabeceras.get('connection', '').lower()
+                mantener = conexion != 'close' and (version == 'HTTP/1.1' or conexion == 'keep-alive')
+
+                try:
+                    longitud = int(cabeceras.get('content-length', 0) or 0)
+                except ValueError:
+                    longitud = -1
+                if longitud < 0:
+                    # Sin una longitud válida no se sabe dónde acaba el cuerpo: se cierra la conexión
+                    await self._responder(escritor, 400, {'error': 'Content-Length inválido'}, False)
+                    break
+                if longitud > MAX_CUERPO:
+                    await self._responder(escritor, 413, {'error': 'Cuerpo demasiado grande'}, False)
+                    break
+                cuerpo_bruto = await lector.readexactly(longitud) if longitud else b""
+
+                url = urlsplit(destino)
+                consulta = {k: v[-1] for k, v in parse_qs(url.query).items()}
+                ndjson = (consulta.pop('formato', '') == 'ndjson'
+                          or 'application/x-ndjson' in cabeceras.get('accept', ''))
+
+                try:
+                    cuerpo = json.loads(cuerpo_bruto) if cuerpo_bruto else None
+                    resultado = await self.despachar(metodo.upper(), url.path, consulta, cuerpo, ndjson)
+                    estado = 200
+                except json.JSONDecodeError:
+                    estado, resultado = 400, {'error': 'El cuerpo no es JSON válido'}
+                except ErrorPeticion as e:
+                    estado, resultado = e.estado, {'error': str(e)}
+                except Exception as e:
+                    estado, resultado = 500, {'error': f"Error interno: {e}"}
+
+                if ndjson and estado == 200 and isinstance(resultado, list):
+                    resultado = _en_bloques(resultado)
+                if hasattr(resultado, '__aiter__'):
+                    try:
+                        await self._responder_ndjson(escritor, resultado, mantener)
+                    except Exception:
+                        # La cabecera ya se envió: se corta la conexión sin el bloque final,
+                        # así el cliente sabe que la respuesta está incompleta
+                        break
+                else:
+                    await self._responder(escritor, estado, resultado, mantener)
+
+                if not mantener:
+                    break
+        finally:
+            escritor.close()
+
+    async def _responder(self, escritor: asyncio.StreamWriter, estado: int, datos: Any, mantener: bool):
+        if isinstance(datos, TextoPlano):
+            cuerpo, tipo = datos.encode('utf-8'), datos.tipo_contenido
+        else:
+            cuerpo, tipo = _a_json(datos), "application/json; charset=utf-8"
+        escritor.write(
+            f"HTTP/1.1 {estado} {ESTADOS_HTTP.get(estado, '')}\r\n"
+            f"Content-Type: {tipo}\r\n"
+            f"Content-Length: {len(cuerpo)}\r\n"
+            f"Connection: {'keep-alive' if mantener else 'close'}\r\n\r\n".encode('latin-1') + cuerpo
+        )
+        await escritor.drain()
+
+    async def _responder_ndjson(self, escritor: asyncio.StreamWriter, bloques: AsyncIterator[List[Any]],
+                                mantener: bool):
+        """Envía los bloques como NDJSON con codificación por bloques (chunked), cada uno en cuanto llega"""
+        escritor.write(
+            f"HTTP/1.1 200 OK\r\n"
+            f"Content-Type: application/x-ndjson; charset=utf-8\r\n"
+            f"Transfer-Encoding: chunked\r\n"
+            f"Connection: {'keep-alive' if mantener else 'close'}\r\n\r\n".encode('latin-1')
+        )
+        async for elementos in bloques:
+            if not elementos:
+                # Un bloque vacío marcaría el final de la respuesta
+                continue
+            bloque = b"".join(_a_json(e) + b"\n" for e in elementos)
+            escritor.write(f"{len(bloque):X}\r\n".encode('ascii') + bloque + b"\r\n")
+            # Ceder el control entre bloques para no bloquear otras conexiones
+            await escritor.drain()
+        escritor.write(b"0\r\n\r\n")
+        await escritor.drain()
+
+
+async def servir(planificador: Planificador, host: str = "127.0.0.1", puerto: int = 8000,
+                 guardar: bool = True):
+    """Arranca el servidor y atiende conexiones indefinidamente"""
+    servidor_api = ServidorAPI(planificador, guardar=guardar)
+    servidor = await asyncio.start_server(servidor_api.atender, host, puerto)
+    print(f"API del planificador escuchando en http://{host}:{puerto}")
+    async with servidor:
+        await servidor.serve_forever()
+
+
+def crear_planificador(datos_dir: str = "datos", guardar: bool = True) -> Planificador:
+    """
+    Crea el planificador cargando los datos persistidos (igual que la interfaz web).
+    Sin guardar, los cambios tampoco se anotan en el diario de recuperación
+    """
+    planificador = Planificador(datos_dir)
+    planificador.cargar_datos(diario=guardar)
+    for advertencia in planificador.advertencias_carga:
+        print(f" {advertencia}")
+    return planificador
+
+
+def ejecutar(host: str = "127.0.0.1", puerto: int = 8000, datos_dir: str = "datos", guardar: bool = True,
+             archivo_metricas: Optional[str] = None, intervalo_metricas: float = 15.0):
+    """
+    Punto de entrada bloqueante del servidor
+    Con archivo_metricas, las métricas se vuelcan además a ese archivo periódicamente
+    """
+    escritor = None
+    if archivo_metricas:
+        escritor = EscritorPeriodico(METRICAS, archivo_metricas, intervalo_metricas).iniciar()
+    try:
+        asyncio.run(servir(crear_planificador(datos_dir, guardar), host, puerto, guardar))
+    finally:
+        if escritor is not None:
+            escritor.detener()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="API HTTP/JSON del Planificador Inteligente de Eventos")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=8000)
+    parser.add_argument("--datos", default="datos", help="Directorio de datos")
+    parser.add_argument("--sin-guardar", action="store_true", help="No persistir los cambios")
+    parser.add_argument("--metricas-archivo", help="Volcar también las métricas a este archivo (.prom)")
+    parser.add_argument("--metricas-intervalo", type=float, default=15.0,
+                        help="Segundos entre volcados del archivo de métricas")
+    argumentos = parser.parse_args()
+    ejecutar(argumentos.host, argumentos.puerto, argumentos.datos, not argumentos.sin_guardar,
+             argumentos.metricas_archivo, argumentos.metricas_intervalo)
@@ -0,0 +1,171 @@
+"""
+Herramientas de línea de comandos del planificador
+
+    python -m aplicacion importar solicitudes.csv [--auto] [--simular]
+    python -m aplicacion contabilidad [--desde 2025-01-01] [--periodo trimestre] [--agrupar recurso]
+    python -m aplicacion simular --escenario dos_a100:cluster_gpu_a100=2 [--corridas 500] [--historico]
+
+Cada fila procesada, de informe o de escenario se escribe en la salida estándar como una línea JSON
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+
+# Configurar path para importaciones (raíz del proyecto)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aplicacion.planificador import Planificador
+from aplicacion.importador import leer_solicitudes, importar_solicitudes
+from aplicacion.contabilidad import AGRUPACIONES, PERIODOS, Tarifas, inicio_mes, mes_siguiente
+from aplicacion.simulador import escenario_desde_texto, simular
+
+
+def comando_importar(argumentos) -> int:
+    """Importa un archivo CSV/JSONL de solicitudes de reserva"""
+    planificador = Planificador(argumentos.datos)
+    resultados = sys.stdout
+    aceptadas = rechazadas = 0
+    # Todo lo que imprima el planificador (carga, diario, guardado...) va a stderr para no
+    # mezclarse con los resultados
+    with contextlib.redirect_stdout(sys.stderr):
+        # Una simulación no se guarda: sus cambios tampoco van al diario
+        planificador.cargar_datos(diario=not argumentos.simular)
+
+        filas = leer_solicitudes(argumentos.archivo, argumentos.formato)
+        for resultado in importar_solicitudes(planificador, filas, argumentos.auto):
+            if resultado["success"]:
+                aceptadas += 1
+            else:
+                rechazadas += 1
+            resultados.write(json.dumps(resultado, ensure_ascii=False) + "\n")
+            resultados.flush()
+
+        if aceptadas and not argumentos.simular:
+            if not planificador.guardar_datos():
+                print("Error al guardar los eventos importados", file=sys.stderr)
+                return 1
+            for advertencia in planificador.advertencias_guardado:
+                print(f"Advertencia: {advertencia}", file=sys.stderr)
+
+    print(f"Importación terminada: {aceptadas} aceptadas, {rechazadas} rechazadas"
+          f"{' (simulación, sin guardar)' if argumentos.simular else ''}", file=sys.stderr)
+    return 0
+
+
+def _precio_recurso(texto: str) -> tuple:
+    """'recurso=euros' -> (recurso, euros)"""
+    recurso_id, _, precio = texto.partition("=")
+    try:
+        return recurso_id, float(precio)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Precio inválido '{texto}': se esperaba recurso=euros")
+
+
+def comando_contabilidad(argumentos) -> int:
+    """Informe de horas, kWh y costes de las reservas guardadas"""
+    planificador = Planificador(argumentos.datos)
+    with contextlib.redirect_stdout(sys.stderr):
+        planificador.cargar_datos(diario=False)
+
+    # Por defecto, los doce meses anteriores al actual y el actual
+    hasta = argumentos.hasta or mes_siguiente(inicio_mes(datetime.now()))
+    desde = argumentos.desde or datetime(hasta.year - 1, hasta.month, 1)
+    tarifas = Tarifas(precio_kwh=argumentos.precio_kwh)
+    tarifas.precio_hora.update(argumentos.precio_hora)
+
+    filas = planificador.contabilidad.informe(desde, hasta, argumentos.periodo, argumentos.agrupar, tarifas)
+    for fila in filas:
+        sys.stdout.write(json.dumps(fila, ensure_ascii=False) + "\n")
+    print(f"Informe del {desde:%Y-%m-%d} al {hasta:%Y-%m-%d}: {len(filas)} filas, "
+          f"{sum(f['coste_total'] for f in filas):.2f} € en total", file=sys.stderr)
+    return 0
+
+
+def comando_simular(argumentos) -> int:
+    """Simulación Monte Carlo del catálogo actual y de los escenarios indicados"""
+    planificador = Planificador(argumentos.datos)
+    with contextlib.redirect_stdout(sys.stderr):
+        planificador.cargar_datos(diario=False)
+
+    try:
+        escenarios = [escenario_desde_texto(texto, planificador.gestor_recursos)
+                      for texto in argumentos.escenario]
+        resultados = simular(
+            planificador, escenarios,
+            corridas=argumentos.corridas,
+            dias=argumentos.dias,
+            llegadas_por_dia=argumentos.llegadas_dia,
+            historico=argumentos.historico,
+            incluir_agenda=argumentos.con_agenda,
+            paciencia=timedelta(hours=argumentos.paciencia),
+            semilla=argumentos.semilla,
+            max_procesos=argumentos.procesos
+        )
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    for nombre, metricas in resultados.items():
+        for advertencia in metricas["advertencias"]:
+            print(f"Advertencia ({nombre}): {advertencia}", file=sys.stderr)
+        sys.stdout.write(json.dumps({"escenario": nombre, **metricas}, ensure_ascii=False) + "\n")
+    print(f"Simulación terminada: {len(resultados)} escenarios, {argumentos.corridas} corridas "
+          f"de {argumentos.dias} días cada uno", file=sys.stderr)
+    return 0
+
+
+def crear_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m aplicacion",
+                                     description="Herramientas del Planificador Inteligente de Eventos")
+    subcomandos = parser.add_subparsers(dest="comando", required=True)
+
+    importar = subcomandos.add_parser("importar", aliases=["import"],
+                                      help="Importar solicitudes de reserva desde CSV o JSONL")
+    importar.add_argument("archivo", help="Archivo .csv o .jsonl con una solicitud por fila")
+    importar.add_argument("--formato", choices=["csv", "jsonl"], help="Por defecto se deduce de la extensión")
+    importar.add_argument("--auto", action="store_true",
+                          help="Ubicar automáticamente las solicitudes que no caben en su horario")
+    importar.add_argument("--simular", action="store_true", help="Validar sin guardar los cambios")
+    importar.add_argument("--datos", default="datos", help="Directorio de datos")
+    importar.set_defaults(funcion=comando_importar)
+
+    contabilidad = subcomandos.add_parser("contabilidad",
+                                          help="Horas, kWh y costes de las reservas por recurso, tipo y periodo")
+    contabilidad.add_argument("--desde", type=datetime.fromisoformat, help="Por defecto, hace un año")
+    contabilidad.add_argument("--hasta", type=datetime.fromisoformat, help="Por defecto, final del mes actual")
+    contabilidad.add_argument("--periodo", choices=PERIODOS, default="mes")
+    contabilidad.add_argument("--agrupar", nargs="*", choices=AGRUPACIONES, default=list(AGRUPACIONES),
+                              help="Criterios además del periodo (ninguno: solo por periodo)")
+    contabilidad.add_argument("--precio-kwh", type=float, default=Tarifas().precio_kwh, help="Euros por kWh")
+    contabilidad.add_argument("--precio-hora", type=_precio_recurso, nargs="*", default=[],
+                              metavar="RECURSO=EUROS", help="Euros por hora y unidad de un recurso")
+    contabilidad.add_argument("--datos", default="datos", help="Directorio de datos")
+    contabilidad.set_defaults(funcion=comando_contabilidad)
+
+    simulacion = subcomandos.add_parser("simular",
+                                        help="Simulación Monte Carlo de la capacidad con catálogos modificados")
+    simulacion.add_argument("--escenario", action="append", default=[], metavar="NOMBRE:RECURSO=N,...",
+                            help="Capacidades a probar (N o +N unidades), potencia=KW y cuota.RECURSO=H; "
+                                 "se compara siempre con el catálogo actual")
+    simulacion.add_argument("--corridas", type=int, default=200, help="Corridas por escenario")
+    simulacion.add_argument("--dias", type=int, default=28, help="Días simulados en cada corrida")
+    simulacion.add_argument("--llegadas-dia", type=float, default=12.0, help="Solicitudes por día (flujo sintético)")
+    simulacion.add_argument("--historico", action="store_true",
+                            help="Remuestrear por días las reservas guardadas en lugar del flujo sintético")
+    simulacion.add_argument("--con-agenda", action="store_true", help="Partir de las reservas ya hechas")
+    simulacion.add_argument("--paciencia", type=float, default=48.0,
+                            help="Horas que una solicitud acepta retrasarse si no cabe en su horario")
+    simulacion.add_argument("--semilla", type=int, default=0)
+    simulacion.add_argument("--procesos", type=int, help="Procesos trabajadores (por defecto, uno por núcleo)")
+    simulacion.add_argument("--datos", default="datos", help="Directorio de datos")
+    simulacion.set_defaults(funcion=comando_simular)
+
+    return parser
+
+
+if __name__ == "__main__":
+    argumentos = crear_parser().parse_args()
+    sys.exit(argumentos.funcion(argumentos))
@@ -0,0 +1,126 @@
+"""
+Búsqueda en paralelo de configuraciones alternativas de recursos
+Cuando una reserva no cabe, se prueban a la vez varias combinaciones de recursos
+(p. ej. V100 en lugar de A100, u otro espacio). Cada alternativa se busca en un
+proceso distinto sobre una instantánea de la agenda que se envía una sola vez a
+cada proceso, así que el tiempo total depende de los núcleos y no del número de
+alternativas
+"""
+from __future__ import annotations
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from aplicacion.planificador import Planificador
+from infraestructura.persistencia import Persistencia
+
+# Con menos alternativas no compensa arrancar procesos: se buscan en el propio proceso
+MIN_ALTERNATIVAS_PARALELO = 2
+
+# Planificador de solo lectura reconstruido en cada proceso trabajador
+_planificador_trabajador: Optional[Planificador] = None
+
+
+def _iniciar_trabajador(instantanea: Dict[str, Any], datos_dir: str):
+    """Reconstruye la agenda en el proceso trabajador (una vez por proceso, sin volver a validar)"""
+    global _planificador_trabajador
+    gestor_eventos, gestor_recursos, restricciones, _ = Persistencia.desde_diccionario(instantanea, confiable=True)
+    planificador = Planificador(datos_dir)
+    planificador.gestor_eventos = gestor_eventos
+    planificador.gestor_recursos = gestor_recursos
+    planificador.restricciones = restricciones
+    _planificador_trabajador = planificador
+
+
+def _buscar(planificador: Planificador, recursos_con_cantidad: Dict[str, int], duracion_horas: float,
+            inicio_busqueda: datetime, fin_busqueda: datetime, tipo: Optional[str]) -> Dict[str, Any]:
+    """Primer hueco en el que cabe una alternativa"""
+    huecos = planificador.buscar_hueco_disponible(
+        recursos_con_cantidad = recursos_con_cantidad,
+        duracion_horas = duracion_horas,
+        inicio_busqueda = inicio_busqueda,
+        fin_busqueda = fin_busqueda,
+        max_resultados = 1,
+        tipo = tipo
+    )
+    if not huecos:
+        return {'success': False, 'message': "No hay hueco disponible en el rango buscado", 'hueco': None}
+    return {
+        'success': True,
+        'message': f"Disponible a partir del {huecos[0]['inicio'].strftime('%d/%m/%Y %H:%M')}",
+        'hueco': huecos[0]
+    }
+
+
+def _buscar_en_trabajador(argumentos: tuple) -> Dict[str, Any]:
+    return _buscar(_planificador_trabajador, *argumentos)
+
+
+def buscar_alternativas(
+    planificador: Planificador,
+    alternativas: List[Dict[str, int]],
+    duracion_horas: float,
+    inicio_busqueda: Optional[datetime] = None,
+    dias: int = 7,
+    tipo: Optional[str] = None,
+    max_procesos: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """
+    Busca el primer hueco disponible para cada conjunto alternativo de recursos
+    Args:
+        alternativas: lista de {recurso_id: cantidad}, una por configuración a probar
+        tipo: tipo de la reserva (para las cuotas limitadas a un tipo de evento; con None
+            no se tienen en cuenta)
+        max_procesos: procesos trabajadores (por defecto, uno por núcleo)
+    Returns:
+        Un dict por alternativa, en el mismo orden:
+        {'alternativa', 'recursos', 'success', 'message', 'hueco'} donde 'hueco' es el
+        primero encontrado ({'inicio', 'fin', 'duracion_horas'}) o None
+    """
+    if inicio_busqueda is None:
+        inicio_busqueda = datetime.now()
+    fin_busqueda = inicio_busqueda + timedelta(days=dias)
+
+    resultados: List[Optional[Dict[str, Any]]] = [None] * len(alternativas)
+    pendientes = []
+    for posicion, recursos_con_cantidad in enumerate(alternativas):
+        desconocidos = [recurso_id for recurso_id in recursos_con_cantidad
+                        if planificador.gestor_recursos.obtener_recurso(recurso_id) is None]
+        if not recursos_con_cantidad or desconocidos:
+            resultados[posicion] = {
+                'success': False,
+                'message': (f"Recursos desconocidos: {', '.join(desconocidos)}" if desconocidos
+                            else "La alternativa no incluye recursos"),
+                'hueco': None
+            }
+        else:
+            pendientes.append(posicion)
+
+    argumentos = [(alternativas[posicion], duracion_horas, inicio_busqueda, fin_busqueda, tipo)
+                  for posicion in pendientes]
+    procesos = min(max_procesos or os.cpu_count() or 1, len(pendientes))
+
+    if procesos < MIN_ALTERNATIVAS_PARALELO:
+        # La búsqueda no modifica la agenda: se puede hacer sobre el planificador real
+        encontrados = [_buscar(planificador, *argumento) for argumento in argumentos]
+    else:
+        instantanea = Persistencia.a_diccionario(
+            planificador.gestor_eventos, planificador.gestor_recursos, planificador.restricciones,
+            planificador.revision)
+        with ProcessPoolExecutor(max_workers=procesos, initializer=_iniciar_trabajador,
+                                 initargs=(instantanea, planificador.datos_dir)) as ejecutor:
+            encontrados = list(ejecutor.map(_buscar_en_trabajador, argumentos))
+
+    for posicion, resultado in zip(pendientes, encontrados):
+        resultados[posicion] = resultado
+    return [{'alternativa': posicion, 'recursos': dict(alternativas[posicion]), **resultado}
+            for posicion, resultado in enumerate(resultados)]
+
+
+def mejor_alternativa(resultados: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """La alternativa con el hueco más temprano (None si ninguna tiene hueco)"""
+    con_hueco = [resultado for resultado in resultados if resultado['success']]
+    if not con_hueco:
+        return None
+    return min(con_hueco, key=lambda resultado: (resultado['hueco']['inicio'], resultado['alternativa']))
@@ -0,0 +1,190 @@
+"""
+Fachada asíncrona (asyncio) del Planificador para la API y los procesos por lotes
+Las escrituras toman un cerrojo por recurso, siempre en orden de id para que dos
+reservas no puedan esperarse mutuamente; así, las reservas con recursos distintos
+avanzan a la vez y las que comparten alguno se deciden de una en una
+
+Las comprobaciones de una reserva (restricciones y conflictos) solo leen la agenda
+y se hacen en un hilo aparte; el alta se hace después en el hilo del bucle de
+eventos. Las consultas (agenda, eventos, huecos...) también se hacen en un hilo
+aparte y no toman cerrojos: no bloquean el bucle ni esperan a una escritura. Lo único
+que modifica una consulta (retirar las retenciones caducadas antes de buscar huecos)
+se hace en el hilo del bucle y con los cerrojos, como una escritura
+"""
+from __future__ import annotations
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional
+
+from aplicacion.planificador import Planificador
+from dominio.eventos import Evento
+from dominio.recursos import Recurso
+from dominio.restricciones import restricciones_de_agenda
+from core.metricas import registrar_reserva
+
+
+class PlanificadorAsincrono:
+    """Envoltorio asíncrono de un Planificador (todas las llamadas desde el mismo bucle de eventos)"""
+
+    def __init__(self, planificador: Planificador):
+        self.planificador = planificador
+        self._cerrojos: Dict[str, asyncio.Lock] = {}
+
+    def _con_relacionados(self, recursos_ids: Iterable[str]) -> set:
+        """
+        Los recursos más los que comparten con alguno una restricción que depende de la
+        agenda (potencia simultánea, exclusión temporal): esas reservas también deben
+        decidirse de una en una
+        """
+        recursos = set(recursos_ids)
+        planificador = self.planificador
+        for restriccion in restricciones_de_agenda(planificador.restricciones):
+            implicados = restriccion.recursos_implicados(planificador.gestor_recursos)
+            if recursos.intersection(implicados):
+                recursos.update(implicados)
+        return recursos
+
+    @asynccontextmanager
+    async def reservando(self, recursos_ids: Iterable[str]) -> AsyncIterator[None]:
+        """Adquiere los cerrojos de los recursos (y sus relacionados) en orden de id y los libera al salir"""
+        adquiridos = []
+        try:
+            for recurso_id in sorted(self._con_relacionados(recursos_ids)):
+                cerrojo = self._cerrojos.setdefault(recurso_id, asyncio.Lock())
+                await cerrojo.acquire()
+                adquiridos.append(cerrojo)
+            yield
+        finally:
+            for cerrojo in reversed(adquiridos):
+                cerrojo.release()
+
+    def _recursos_de(self, evento_id: str) -> List[str]:
+        evento = self.planificador.gestor_eventos.obtener_evento(evento_id)
+        return [recurso.id for recurso in evento.recursos] if evento else []
+
+    # --- Escrituras ---
+
+    async def planificar_evento(
+        self,
+        nombre: str,
+        inicio: datetime,
+        fin: datetime,
+        recursos_seleccionados: Dict[str, int],
+        tipo: str,
+        descripcion: str = "",
+        prioridad: int = 1,
+        buscar_hueco_si_ocupado: bool = False
+    ) -> Dict[str, Any]:
+        """Igual que Planificador.planificar_evento, sin bloquear el bucle durante las comprobaciones"""
+        resultado = {"success": False, "message": "", "evento": None, "detalles": {}}
+        motivos = ["error"]
+        try:
+            async with self.reservando(recursos_seleccionados):
+                # Como en Planificador.planificar_evento: las retenciones caducadas se retiran
+                # antes de comprobar (en el hilo del bucle, como cualquier escritura)
+                self.planificador.purgar_retenciones()
+                comprobacion = await asyncio.to_thread(
+                    self.planificador.comprobar_evento,
+                    nombre, inicio, fin, recursos_seleccionados, tipo, descripcion, prioridad)
+                evento = comprobacion["evento"]
+                motivos = comprobacion["motivos"]
+                cuotas = self.planificador.estado_cuotas(evento) if evento is not None else []
+                if not comprobacion["success"]:
+                    if comprobacion["conflictos"] and buscar_hueco_si_ocupado:
+                        # Caso poco frecuente: la búsqueda también agrega el evento, así que
+                        # se hace en el hilo del bucle con los cerrojos tomados
+                        resultado = self.planificador.buscar_hueco_automático(
+                            nombre, inicio, fin, evento.recursos, tipo, descripcion, prioridad)
+                    else:
+                        resultado["message"] = comprobacion["message"]
+                        if cuotas:
+                            resultado["detalles"]["cuotas"] = cuotas
+                    return resultado
+                # Nadie más ha podido reservar estos recursos desde la comprobación
+                resultado = self.planificador.agregar_evento_comprobado(evento)
+                if not resultado["success"]:
+                    motivos = ["error"]
+                elif cuotas:
+                    resultado["detalles"]["cuotas"] = cuotas
+        except Exception as e:
+            motivos = ["error"]
+            resultado = {"success": False, "message": f"Error: {str(e)}", "evento": None, "detalles": {}}
+        finally:
+            registrar_reserva(resultado.get("success", False), motivos)
+        return resultado
+
+    async def planificar_lote(self, solicitudes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Planifica varias reservas a la vez (argumentos de planificar_evento, una por
+        solicitud). Las que comparten recursos se deciden de una en una, pero no
+        necesariamente en el orden de la lista: una reserva que espera el cerrojo de un
+        recurso aún no tiene los siguientes, y otra posterior puede tomarlos antes
+        """
+        return list(await asyncio.gather(*(self.planificar_evento(**solicitud) for solicitud in solicitudes)))
+
+    async def eliminar_evento(self, evento_id: str) -> bool:
+        async with self.reservando(self._recursos_de(evento_id)):
+            return self.planificador.eliminar_evento(evento_id)
+
+    async def cancelar_evento(self, evento_id: str) -> bool:
+        async with self.reservando(self._recursos_de(evento_id)):
+            return self.planificador.cancelar_evento(evento_id)
+
+    async def reactivar_evento(self, evento_id: str) -> Dict[str, Any]:
+        async with self.reservando(self._recursos_de(evento_id)):
+            return self.planificador.reactivar_evento(evento_id)
+
+    async def mover_evento(self, evento_id: str, nuevo_inicio: datetime) -> Dict[str, Any]:
+        async with self.reservando(self._recursos_de(evento_id)):
+            return self.planificador.mover_evento(evento_id, nuevo_inicio)
+
+    # --- Consultas (sin cerrojos) ---
+
+    async def _purgar_retenciones(self, recursos_ids: Iterable[str]):
+        """
+        Retira las retenciones caducadas como lo hace una escritura (con los cerrojos
+        tomados). Solo espera a los cerrojos si hay alguna caducada
+        """
+        if self.planificador.retenciones.proxima() <= datetime.now():
+            async with self.reservando(recursos_ids):
+                self.planificador.purgar_retenciones()
+
+    async def listar_recursos(self) -> List[Recurso]:
+        return await asyncio.to_thread(self.planificador.listar_recursos)
+
+    async def listar_eventos(self, dias: int = 1) -> List[Evento]:
+        return await asyncio.to_thread(self.planificador.listar_eventos, dias)
+
+    async def paginas_eventos(self, dias: int = 1, tamano: int = 500) -> AsyncIterator[List[Evento]]:
+        """Planificador.paginas_eventos, obteniendo cada página en un hilo aparte"""
+        paginas = self.planificador.paginas_eventos(dias, tamano)
+        while True:
+            pagina = await asyncio.to_thread(next, paginas, None)
+            if pagina is None:
+                return
+            yield pagina
+
+    async def obtener_agenda_recurso(self, recurso_id: str, dias: int = 7) -> List[Evento]:
+        return await asyncio.to_thread(self.planificador.obtener_agenda_recurso, recurso_id, dias)
+
+    async def verificar_conflictos(self, evento: Evento) -> tuple:
+        return await asyncio.to_thread(self.planificador.verificar_conflictos, evento)
+
+    async def buscar_hueco_disponible(self, recursos_con_cantidad: Dict[str, int], duracion_horas: float,
+                                      inicio_busqueda: Optional[datetime] = None,
+                                      dias: int = 7, max_resultados: Optional[int] = None,
+                                      tipo: Optional[str] = None,
+                                      recomendar: bool = False) -> List[Dict[str, Any]]:
+        await self._purgar_retenciones(recursos_con_cantidad)
+        return await asyncio.to_thread(
+            self.planificador.buscar_hueco_disponible,
+            recursos_con_cantidad = recursos_con_cantidad,
+            duracion_horas = duracion_horas,
+            inicio_busqueda = inicio_busqueda,
+            dias = dias,
+            max_resultados = max_resultados,
+            tipo = tipo,
+            recomendar = recomendar,
+            purgar = False
+        )
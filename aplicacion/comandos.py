@@ -0,0 +1,462 @@
+"""
+Comandos reversibles sobre el almacén de eventos e historial para deshacer/rehacer
+Cada mutación del planificador es un Comando que sabe aplicarse y revertirse sobre un
+GestorEventos. Los comandos guardan referencias a los eventos y series que cambian (no
+copias del estado), así que deshacer o rehacer cuesta lo que ocupa el cambio. Los
+índices del gestor se mantienen porque los comandos solo usan sus altas, bajas y
+actualizaciones, y los oyentes del historial reciben el mismo flujo de comandos (p. ej. el diario en disco)
+"""
+from __future__ import annotations
+from abc import ABC, abstractmethod
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, List, Optional, Union
+
+from dominio.eventos import Evento, GestorEventos
+from dominio.recursos import GestorRecursos
+from dominio.series import SerieRecurrente
+
+# Comandos que se pueden deshacer como máximo
+MAX_HISTORIAL = 100
+
+# Claves de metadata que cambian al cancelar o reactivar un evento
+_CLAVES_CANCELACION = ("cancelado", "fecha_cancelacion")
+
+Ocupacion = Union[Evento, SerieRecurrente]
+
+
+class Comando(ABC):
+    """Mutación reversible. 'aplicar' y 'revertir' devuelven False si no se pudo realizar"""
+    tipo = ""
+
+    @abstractmethod
+    def aplicar(self, gestor: GestorEventos) -> bool:
+        pass
+
+    @abstractmethod
+    def revertir(self, gestor: GestorEventos) -> bool:
+        pass
+
+    @abstractmethod
+    def describir(self) -> str:
+        """Texto para el historial de deshacer/rehacer"""
+        pass
+
+    def ocupados(self, revertido: bool = False) -> List[Ocupacion]:
+        """Eventos o series que pasan a ocupar recursos al aplicar (o al revertir) el comando"""
+        return []
+
+    @abstractmethod
+    def to_dict(self) -> Dict[str, Any]:
+        """Datos del comando para el diario (ver from_dict)"""
+        pass
+
+    @staticmethod
+    def from_dict(data: Dict[str, Any], gestor_recursos: GestorRecursos) -> 'Comando':
+        """Reconstruye un comando del diario enlazando los recursos con 'gestor_recursos'"""
+        return _TIPOS[data["tipo"]].desde_datos(data, gestor_recursos)
+
+
+def _evento_desde(data: Dict[str, Any], gestor_recursos: GestorRecursos) -> Evento:
+    evento = Evento.from_dict(data)
+    evento.recursos = [gestor_recursos.obtener_recurso(r.id) or r for r in evento.recursos]
+    return evento
+
+
+def _serie_desde(data: Dict[str, Any], gestor_recursos: GestorRecursos) -> SerieRecurrente:
+    serie = SerieRecurrente.from_dict(data)
+    serie.recursos = [gestor_recursos.obtener_recurso(r.id) or r for r in serie.recursos]
+    return serie
+
+
+class AgregarEvento(Comando):
+    tipo = "agregar_evento"
+
+    def __init__(self, evento: Evento):
+        self.evento = evento
+
+    def aplicar(self, gestor):
+        return gestor.agregar_evento(self.evento)
+
+    def revertir(self, gestor):
+        return gestor.eliminar_evento(self.evento.id)
+
+    def describir(self):
+        return f"Planificar '{self.evento.nombre}'"
+
+    def ocupados(self, revertido=False):
+        return [] if revertido else [self.evento]
+
+    def to_dict(self):
+        return {"tipo": self.tipo, "evento": self.evento.to_dict()}
+
+    @classmethod
+    def desde_datos(cls, data, gestor_recursos):
+        return cls(_evento_desde(data["evento"], gestor_recursos))
+
+
+class EliminarEvento(AgregarEvento):
+    tipo = "eliminar_evento"
+
+    def aplicar(self, gestor):
+        return super().revertir(gestor)
+
+    def revertir(self, gestor):
+        return super().aplicar(gestor)
+
+    def describir(self):
+        return f"Eliminar '{self.evento.nombre}'"
+
+    def ocupados(self, revertido=False):
+        return super().ocupados(not revertido)
+
+
+class ModificarEvento(Comando):
+    """Sustituye un evento por otra versión con el mismo id (otra fecha, otros recursos...)"""
+    tipo = "modificar_evento"
+
+    def __init__(self, anterior: Evento, nuevo: Evento):
+        self.anterior = anterior
+        self.nuevo = nuevo
+
+    def _sustituir(self, gestor, quitar: Evento, poner: Evento) -> bool:
+        if not gestor.eliminar_evento(quitar.id):
+            return False
+        return gestor.agregar_evento(poner)
+
+    def aplicar(self, gestor):
+        return self._sustituir(gestor, self.anterior, self.nuevo)
+
+    def revertir(self, gestor):
+        return self._sustituir(gestor, self.nuevo, self.anterior)
+
+    def describir(self):
+        if self.anterior.inicio != self.nuevo.inicio:
+            return f"Mover '{self.nuevo.nombre}' al {self.nuevo.inicio.strftime('%d/%m/%Y %H:%M')}"
+        return f"Modificar '{self.nuevo.nombre}'"
+
+    def ocupados(self, revertido=False):
+        return [self.anterior if revertido else self.nuevo]
+
+    def to_dict(self):
+        return {"tipo": self.tipo, "anterior": self.anterior.to_dict(), "nuevo": self.nuevo.to_dict()}
+
+    @classmethod
+    def desde_datos(cls, data, gestor_recursos):
+        return cls(_evento_desde(data["anterior"], gestor_recursos), _evento_desde(data["nuevo"], gestor_recursos))
+
+
+class CancelarEvento(Comando):
+    """Marca un evento como cancelado guardando los valores previos para poder reactivarlo"""
+    tipo = "cancelar_evento"
+    cancelado = True
+
+    def __init__(self, evento_id: str, fecha: Optional[str] = None):
+        self.evento_id = evento_id
+        self.fecha = fecha or datetime.now().isoformat()
+        self.evento: Optional[Evento] = None
+        self.previos: Dict[str, Any] = {}
+
+    def _valores(self) -> Dict[str, Any]:
+        return {"cancelado": True, "fecha_cancelacion": self.fecha}
+
+    def _marcar(self, evento: Evento):
+        metadata = evento.metadata
+        self.previos = {clave: metadata[clave] for clave in _CLAVES_CANCELACION if clave in metadata}
+        for clave in _CLAVES_CANCELACION:
+            metadata.pop(clave, None)
+        metadata.update(self._valores())
+
+    def _restaurar(self, evento: Evento):
+        for clave in _CLAVES_CANCELACION:
+            evento.metadata.pop(clave, None)
+        evento.metadata.update(self.previos)
+
+    def aplicar(self, gestor):
+        evento = gestor.obtener_evento(self.evento_id)
+        if evento is None or (evento.metadata.get("cancelado") is True) == self.cancelado:
+            return False
+        # actualizar_evento avisa del cambio de ocupación; en una bifurcación se
+        # modifica una copia propia
+        self.evento = gestor.actualizar_evento(self.evento_id, self._marcar)
+        return True
+
+    def revertir(self, gestor):
+        self.evento = gestor.actualizar_evento(self.evento_id, self._restaurar)
+        return self.evento is not None
+
+    def describir(self):
+        nombre = self.evento.nombre if self.evento else self.evento_id
+        return f"Cancelar '{nombre}'"
+
+    def ocupados(self, revertido=False):
+        return [self.evento] if revertido and self.evento else []
+
+    def to_dict(self):
+        return {"tipo": self.tipo, "evento_id": self.evento_id, "fecha": self.fecha, "previos": self.previos}
+
+    @classmethod
+    def desde_datos(cls, data, gestor_recursos):
+        comando = cls(data["evento_id"], data.get("fecha"))
+        comando.previos = data.get("previos", {})
+        return comando
+
+
+class ReactivarEvento(CancelarEvento):
+    tipo = "reactivar_evento"
+    cancelado = False
+
+    def _valores(self):
+        return {"cancelado": False}
+
+    def describir(self):
+        nombre = self.evento.nombre if self.evento else self.evento_id
+        return f"Reactivar '{nombre}'"
+
+    def ocupados(self, revertido=False):
+        return [self.evento] if not revertido and self.evento else []
+
+
+class AgregarSerie(Comando):
+    tipo = "agregar_serie"
+
+    def __init__(self, serie: SerieRecurrente):
+        self.serie = serie
+
+    def aplicar(self, gestor):
+        return gestor.agregar_serie(self.serie)
+
+    def revertir(self, gestor):
+        return gestor.eliminar_serie(self.serie.id)
+
+    def describir(self):
+        return f"Planificar la serie '{self.serie.nombre}'"
+
+    def ocupados(self, revertido=False):
+        return [] if revertido else [self.serie]
+
+    def to_dict(self):
+        return {"tipo": self.tipo, "serie": self.serie.to_dict()}
+
+    @classmethod
+    def desde_datos(cls, data, gestor_recursos):
+        return cls(_serie_desde(data["serie"], gestor_recursos))
+
+
+class EliminarSerie(AgregarSerie):
+    tipo = "eliminar_serie"
+
+    def aplicar(self, gestor):
+        return super().revertir(gestor)
+
+    def revertir(self, gestor):
+        return super().aplicar(gestor)
+
+    def describir(self):
+        return f"Eliminar la serie '{self.serie.nombre}'"
+
+    def ocupados(self, revertido=False):
+        return super().ocupados(not revertido)
+
+
+class ModificarSerie(Comando):
+    tipo = "modificar_serie"
+
+    def __init__(self, anterior: SerieRecurrente, nueva: SerieRecurrente):
+        self.anterior = anterior
+        self.nueva = nueva
+
+    def _sustituir(self, gestor, quitar: SerieRecurrente, poner: SerieRecurrente) -> bool:
+        if not gestor.eliminar_serie(quitar.id):
+            return False
+        return gestor.agregar_serie(poner)
+
+    def aplicar(self, gestor):
+        return self._sustituir(gestor, self.anterior, self.nueva)
+
+    def revertir(self, gestor):
+        return self._sustituir(gestor, self.nueva, self.anterior)
+
+    def describir(self):
+        return f"Modificar la serie '{self.nueva.nombre}'"
+
+    def ocupados(self, revertido=False):
+        return [self.anterior if revertido else self.nueva]
+
+    def to_dict(self):
+        return {"tipo": self.tipo, "anterior": self.anterior.to_dict(), "nueva": self.nueva.to_dict()}
+
+    @classmethod
+    def desde_datos(cls, data, gestor_recursos):
+        return cls(_serie_desde(data["anterior"], gestor_recursos), _serie_desde(data["nueva"], gestor_recursos))
+
+
+class AnularOcurrencia(Comando):
+    tipo = "anular_ocurrencia"
+
+    def __init__(self, serie_id: str, inicio: datetime):
+        self.serie_id = serie_id
+        self.inicio = inicio
+        self.serie: Optional[SerieRecurrente] = None
+
+    def aplicar(self, gestor):
+        serie = gestor.obtener_serie(self.serie_id)
+        if serie is None or self.inicio not in serie.fechas(self.inicio, self.inicio):
+            return False
+        self.serie = gestor.actualizar_serie(self.serie_id, lambda serie: serie.agregar_excepcion(self.inicio))
+        return True
+
+    def revertir(self, gestor):
+        serie = gestor.obtener_serie(self.serie_id)
+        if serie is None or self.inicio not in serie.excepciones:
+            return False
+        self.serie = gestor.actualizar_serie(self.serie_id, lambda serie: serie.excepciones.discard(self.inicio))
+        return True
+
+    def describir(self):
+        nombre = self.serie.nombre if self.serie else self.serie_id
+        return f"Anular la ocurrencia del {self.inicio.strftime('%d/%m/%Y %H:%M')} de '{nombre}'"
+
+    def ocupados(self, revertido=False):
+        # Al revertir vuelve a existir una sola ocurrencia
+        return [self.serie._crear_ocurrencia(self.inicio)] if revertido and self.serie else []
+
+    def to_dict(self):
+        return {"tipo": self.tipo, "serie_id": self.serie_id, "inicio": self.inicio.isoformat()}
+
+    @classmethod
+    def desde_datos(cls, data, gestor_recursos):
+        return cls(data["serie_id"], datetime.fromisoformat(data["inicio"]))
+
+
+class Lote(Comando):
+    """Varios comandos que se deshacen y rehacen juntos (p. ej. una fusión)"""
+    tipo = "lote"
+
+    def __init__(self, comandos: List[Comando], descripcion: str):
+        self.comandos = comandos
+        self.descripcion = descripcion
+
+    def aplicar(self, gestor):
+        aplicados = []
+        for comando in self.comandos:
+            if not comando.aplicar(gestor):
+                # Todo o nada: se revierten los ya aplicados
+                for hecho in reversed(aplicados):
+                    hecho.revertir(gestor)
+                return False
+            aplicados.append(comando)
+        return True
+
+    def revertir(self, gestor):
+        revertidos = []
+        for comando in reversed(self.comandos):
+            if not comando.revertir(gestor):
+                for hecho in reversed(revertidos):
+                    hecho.aplicar(gestor)
+                return False
+            revertidos.append(comando)
+        return True
+
+    def describir(self):
+        return self.descripcion
+
+    def ocupados(self, revertido=False):
+        return [ocupado for comando in self.comandos for ocupado in comando.ocupados(revertido)]
+
+    def to_dict(self):
+        return {"tipo": self.tipo, "descripcion": self.descripcion,
+                "comandos": [comando.to_dict() for comando in self.comandos]}
+
+    @classmethod
+    def desde_datos(cls, data, gestor_recursos):
+        return cls([Comando.from_dict(c, gestor_recursos) for c in data["comandos"]], data.get("descripcion", ""))
+
+
+_TIPOS = {clase.tipo: clase for clase in (
+    AgregarEvento, EliminarEvento, ModificarEvento, CancelarEvento, ReactivarEvento,
+    AgregarSerie, EliminarSerie, ModificarSerie, AnularOcurrencia, Lote
+)}
+
+
+class Historial:
+    """
+    Pilas de deshacer/rehacer acotadas. Los oyentes reciben (comando, revertido) cada vez
+    que un comando se aplica o se revierte
+    """
+
+    def __init__(self, limite: int = MAX_HISTORIAL):
+        self._hechos: Deque[Comando] = deque(maxlen=limite)
+        self._deshechos: List[Comando] = []
+        self.oyentes: List[Callable[[Comando, bool], None]] = []
+
+    def registrar(self, comando: Comando):
+        """Anota un comando ya aplicado; rehacer deja de tener sentido"""
+        self._hechos.append(comando)
+        self._deshechos.clear()
+        self._notificar(comando, False)
+
+    def ejecutar(self, comando: Comando, gestor: GestorEventos) -> bool:
+        if not comando.aplicar(gestor):
+            return False
+        self.registrar(comando)
+        return True
+
+    def deshacer(self, gestor: GestorEventos,
+                 validar: Optional[Callable[[Comando, bool], bool]] = None) -> Optional[Comando]:
+        """
+        Revierte el último comando. Si 'validar(comando, revertido)' lo rechaza (p. ej. porque
+        el evento recuperado ya no cabe) se vuelve a aplicar y no se notifica nada
+        Returns: el comando deshecho o None si no había nada que deshacer o no se pudo
+        """
+        if not self._hechos:
+            return None
+        comando = self._hechos[-1]
+        if not comando.revertir(gestor):
+            return None
+        if validar is not None and not validar(comando, True):
+            comando.aplicar(gestor)
+            return None
+        self._deshechos.append(self._hechos.pop())
+        self._notificar(comando, True)
+        return comando
+
+    def rehacer(self, gestor: GestorEventos,
+                validar: Optional[Callable[[Comando, bool], bool]] = None) -> Optional[Comando]:
+        """Vuelve a aplicar el último comando deshecho (ver deshacer)"""
+        if not self._deshechos:
+            return None
+        comando = self._deshechos[-1]
+        if not comando.aplicar(gestor):
+            return None
+        if validar is not None and not validar(comando, False):
+            comando.revertir(gestor)
+            return None
+        self._hechos.append(self._deshechos.pop())
+        self._notificar(comando, False)
+        return comando
+
+    def _notificar(self, comando: Comando, revertido: bool):
+        for oyente in self.oyentes:
+            oyente(comando, revertido)
+
+    @property
+    def puede_deshacer(self) -> bool:
+        return bool(self._hechos)
+
+    @property
+    def puede_rehacer(self) -> bool:
+        return bool(self._deshechos)
+
+    def siguiente_deshacer(self) -> Optional[str]:
+        return self._hechos[-1].describir() if self._hechos else None
+
+    def siguiente_rehacer(self) -> Optional[str]:
+        return self._deshechos[-1].describir() if self._deshechos else None
+
+    def limpiar(self):
+        self._hechos.clear()
+        self._deshechos.clear()
+
+    def __len__(self):
+        return len(self._hechos)
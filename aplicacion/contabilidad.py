@@ -0,0 +1,313 @@
+"""
+Contabilidad de energía y costes del historial de reservas
+Las horas reservadas se acumulan por recurso y tipo de evento en particiones de un
+mes. Cada partición se calcula una vez recorriendo el índice ordenado del gestor por
+bloques de eventos (con la aritmética de cada bloque vectorizada) y se guarda; los
+avisos del gestor descartan solo las particiones que toca cada cambio. Los kWh y los
+euros se obtienen al pedir el informe a partir de las horas guardadas, así que cambiar
+las tarifas o el consumo de un recurso no obliga a recalcular nada: repetir el informe
+de un año solo recalcula los meses que cambiaron
+"""
+from __future__ import annotations
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from core.perezoso import importar_perezoso
+from dominio.eventos import DURACION_MAXIMA_EVENTO, Evento, GestorEventos, Ocupacion
+from dominio.potencia import consumo_vatios
+from dominio.recursos import GestorRecursos, Recurso
+from dominio.series import SerieRecurrente
+
+if TYPE_CHECKING:
+    import numpy
+# numpy solo se carga al calcular el primer informe (no retrasa el arranque)
+np = importar_perezoso("numpy")
+
+# Eventos leídos del índice en cada bloque
+TAMANO_BLOQUE = 5000
+
+PERIODOS = ("mes", "trimestre", "anio", "total")
+AGRUPACIONES = ("recurso", "tipo")
+
+# (id del recurso, tipo de evento): columna de los subtotales
+Clave = Tuple[str, str]
+
+
+@dataclass
+class Tarifas:
+    """
+    Precios para el informe
+    Args:
+        precio_kwh: euros por kWh consumido
+        precio_hora: euros por hora y unidad de cada recurso (por id)
+        precio_hora_tipo: euros por hora y unidad de los recursos de un tipo
+            ('computacional', 'humano', 'espacio') que no tienen precio propio
+    """
+    precio_kwh: float = 0.20
+    precio_hora: Dict[str, float] = field(default_factory=lambda: {"servidor_externo": 32.0})
+    precio_hora_tipo: Dict[str, float] = field(default_factory=dict)
+
+    def precio(self, recurso: Optional[Recurso], recurso_id: str) -> float:
+        if recurso_id in self.precio_hora:
+            return self.precio_hora[recurso_id]
+        return self.precio_hora_tipo.get(recurso.tipo, 0.0) if recurso is not None else 0.0
+
+
+@dataclass
+class Subtotal:
+    """
+    Horas-unidad y reservas de cada recurso de una partición, por columna (las columnas
+    nuevas quedan fuera), y reservas por tipo de evento (una reserva con varios recursos
+    cuenta una vez en su tipo y una vez en cada recurso)
+    """
+    horas: 'numpy.ndarray'
+    reservas: 'numpy.ndarray'
+    eventos: Dict[str, int] = field(default_factory=dict)
+
+
+def inicio_mes(momento: datetime) -> datetime:
+    return datetime(momento.year, momento.month, 1)
+
+
+def mes_siguiente(mes: datetime) -> datetime:
+    return datetime(mes.year + mes.month // 12, mes.month % 12 + 1, 1)
+
+
+def etiqueta_periodo(mes: datetime, periodo: str) -> str:
+    if periodo == "mes":
+        return f"{mes.year}-{mes.month:02d}"
+    if periodo == "trimestre":
+        return f"{mes.year}-T{(mes.month - 1) // 3 + 1}"
+    if periodo == "anio":
+        return str(mes.year)
+    return "total"
+
+
+def _ajustar(valores: 'numpy.ndarray', columnas: int) -> 'numpy.ndarray':
+    """Rellena con ceros las columnas creadas después de calcular el subtotal"""
+    if len(valores) == columnas:
+        return valores
+    return np.concatenate([valores, np.zeros(columnas - len(valores))])
+
+
+class Contabilidad:
+    """Horas, kWh y costes de la agenda de un gestor, con subtotales mensuales mantenidos con sus avisos"""
+
+    def __init__(self, gestor_eventos: GestorEventos, gestor_recursos: GestorRecursos):
+        self.gestor_eventos = gestor_eventos
+        self.gestor_recursos = gestor_recursos
+        self._cerrojo = threading.Lock()
+        self._columnas: Dict[Clave, int] = {}
+        self._claves: List[Clave] = []
+        # Recurso visto en los eventos de cada id (por si ya no está en el catálogo)
+        self._recursos: Dict[str, Recurso] = {}
+        # Inicio del mes -> subtotal
+        self._particiones: Dict[datetime, Subtotal] = {}
+        self._firma = self._firma_bases()
+        gestor_eventos.oyentes.append(self._al_cambiar)
+
+    def desconectar(self):
+        """Deja de recibir los avisos del gestor de eventos"""
+        if self._al_cambiar in self.gestor_eventos.oyentes:
+            self.gestor_eventos.oyentes.remove(self._al_cambiar)
+
+    def vaciar(self):
+        with self._cerrojo:
+            self._particiones.clear()
+
+    # --- Mantenimiento ---
+
+    def _firma_bases(self) -> tuple:
+        firma = []
+        base = getattr(self.gestor_eventos, "base", None)
+        while base is not None:
+            firma.append(base.version)
+            base = getattr(base, "base", None)
+        return tuple(firma)
+
+    def _al_cambiar(self, ocupacion: Optional[Ocupacion], signo: int):
+        with self._cerrojo:
+            if ocupacion is None:
+                self._particiones.clear()
+            elif isinstance(ocupacion, SerieRecurrente):
+                # Puede no tener fin: todos los meses desde su inicio
+                primero = inicio_mes(ocupacion.inicio)
+                for mes in [mes for mes in self._particiones if mes >= primero]:
+                    del self._particiones[mes]
+            else:
+                mes = inicio_mes(ocupacion.inicio)
+                while mes < ocupacion.fin:
+                    self._particiones.pop(mes, None)
+                    mes = mes_siguiente(mes)
+
+    def _columna(self, recurso: Recurso, tipo: str) -> int:
+        clave = (recurso.id, tipo)
+        columna = self._columnas.get(clave)
+        if columna is None:
+            columna = self._columnas[clave] = len(self._claves)
+            self._claves.append(clave)
+            self._recursos.setdefault(recurso.id, recurso)
+        return columna
+
+    # --- Cálculo de particiones ---
+
+    def _eventos(self, desde: datetime, hasta: datetime) -> Iterator[List[Evento]]:
+        """Bloques de eventos (y ocurrencias de series) en curso en algún momento de [desde, hasta)"""
+        cursor = None
+        while True:
+            bloque, cursor = self.gestor_eventos.paginar(
+                limite=TAMANO_BLOQUE, cursor=cursor, desde=desde - DURACION_MAXIMA_EVENTO,
+                hasta=hasta, descendente=False)
+            yield [e for e in bloque if e.fin > desde and e.inicio < hasta]
+            if cursor is None:
+                break
+        ocurrencias = [o for o in self.gestor_eventos.ocurrencias_series(desde, hasta)
+                       if o.fin > desde and o.inicio < hasta]
+        for posicion in range(0, len(ocurrencias), TAMANO_BLOQUE):
+            yield ocurrencias[posicion:posicion + TAMANO_BLOQUE]
+
+    def _calcular(self, desde: datetime, hasta: datetime) -> Subtotal:
+        """
+        Subtotal de [desde, hasta). Los eventos cancelados y las retenciones provisionales
+        no cuentan; los que se salen del rango cuentan solo la parte que cae dentro, y una
+        reserva se cuenta en la partición en que empieza
+        """
+        horas = np.zeros(len(self._claves))
+        reservas = np.zeros(len(self._claves))
+        eventos: Dict[str, int] = {}
+        limite = (hasta - desde).total_seconds()
+        for bloque in self._eventos(desde, hasta):
+            inicios, fines, columnas, unidades = [], [], [], []
+            for evento in bloque:
+                if evento.metadata.get("cancelado") is True or evento.metadata.get("retencion"):
+                    continue
+                demanda: Dict[int, int] = {}
+                for recurso in evento.recursos:
+                    columna = self._columna(recurso, evento.tipo)
+                    demanda[columna] = demanda.get(columna, 0) + 1
+                comienzo = (evento.inicio - desde).total_seconds()
+                if comienzo >= 0 and demanda:
+                    eventos[evento.tipo] = eventos.get(evento.tipo, 0) + 1
+                final = (evento.fin - desde).total_seconds()
+                for columna, cantidad in demanda.items():
+                    inicios.append(comienzo)
+                    fines.append(final)
+                    columnas.append(columna)
+                    unidades.append(cantidad)
+            if not columnas:
+                continue
+            inicios_np = np.array(inicios)
+            duracion = np.clip(np.minimum(np.array(fines), limite) - np.maximum(inicios_np, 0.0), 0.0, None)
+            columnas_np = np.array(columnas)
+            total = len(self._claves)
+            horas = _ajustar(horas, total) + np.bincount(
+                columnas_np, weights=duracion * np.array(unidades) / 3600, minlength=total)
+            reservas = _ajustar(reservas, total) + np.bincount(
+                columnas_np, weights=(inicios_np >= 0).astype(float), minlength=total)
+        return Subtotal(horas=horas, reservas=reservas, eventos=eventos)
+
+    def _subtotales(self, desde: datetime, hasta: datetime) -> Iterator[Tuple[datetime, Subtotal]]:
+        """(mes, subtotal) de cada mes de [desde, hasta); solo se guardan los meses completos"""
+        with self._cerrojo:
+            firma = self._firma_bases()
+            if firma != self._firma:
+                self._particiones.clear()
+                self._firma = firma
+            mes = inicio_mes(desde)
+            while mes < hasta:
+                siguiente = mes_siguiente(mes)
+                completo = desde <= mes and siguiente <= hasta
+                subtotal = self._particiones.get(mes) if completo else None
+                if subtotal is None:
+                    subtotal = self._calcular(max(mes, desde), min(siguiente, hasta))
+                    if completo:
+                        self._particiones[mes] = subtotal
+                yield mes, subtotal
+                mes = siguiente
+
+    # --- Informes ---
+
+    def informe(
+        self,
+        desde: datetime,
+        hasta: datetime,
+        periodo: str = "mes",
+        agrupar: Iterable[str] = AGRUPACIONES,
+        tarifas: Optional[Tarifas] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Horas, kWh y costes de las reservas en curso en [desde, hasta)
+        Args:
+            periodo: 'mes', 'trimestre', 'anio' o 'total'
+            agrupar: además del periodo, 'recurso' y/o 'tipo' (de evento)
+            tarifas: precios (por defecto Tarifas())
+        Returns: una fila por grupo, ordenadas por periodo y coste total descendente
+        """
+        if periodo not in PERIODOS:
+            raise ValueError(f"Periodo inválido. Debe ser uno de: {','.join(PERIODOS)}")
+        agrupar = tuple(agrupar)
+        for criterio in agrupar:
+            if criterio not in AGRUPACIONES:
+                raise ValueError(f"Agrupación inválida. Debe ser una de: {','.join(AGRUPACIONES)}")
+        tarifas = tarifas or Tarifas()
+
+        acumulado: Dict[str, Subtotal] = {}
+        for mes, subtotal in list(self._subtotales(desde, hasta)):
+            etiqueta = etiqueta_periodo(mes, periodo)
+            previo = acumulado.get(etiqueta)
+            if previo is not None:
+                columnas = max(len(previo.horas), len(subtotal.horas))
+                subtotal = Subtotal(
+                    horas=_ajustar(previo.horas, columnas) + _ajustar(subtotal.horas, columnas),
+                    reservas=_ajustar(previo.reservas, columnas) + _ajustar(subtotal.reservas, columnas),
+                    eventos={tipo: previo.eventos.get(tipo, 0) + subtotal.eventos.get(tipo, 0)
+                             for tipo in {*previo.eventos, *subtotal.eventos}})
+            acumulado[etiqueta] = subtotal
+
+        # kW y €/h de cada columna, y grupo al que va
+        claves = list(self._claves)
+        recursos = [self.gestor_recursos.obtener_recurso(recurso_id) or self._recursos.get(recurso_id)
+                    for recurso_id, _ in claves]
+        kilovatios = np.array([consumo_vatios(r) / 1000 if r is not None else 0.0 for r in recursos])
+        precios = np.array([tarifas.precio(r, recurso_id) for r, (recurso_id, _) in zip(recursos, claves)])
+        grupos: Dict[tuple, int] = {}
+        indices = np.array([grupos.setdefault(tuple(recurso_id if c == "recurso" else tipo for c in agrupar),
+                                              len(grupos)) for recurso_id, tipo in claves], dtype=int)
+
+        filas = []
+        for etiqueta, subtotal in acumulado.items():
+            horas = _ajustar(subtotal.horas, len(claves))
+            kwh = horas * kilovatios
+            columnas = {
+                "horas": horas,
+                "kwh": kwh,
+                "coste_energia": kwh * tarifas.precio_kwh,
+                "coste_uso": horas * precios,
+                "reservas": _ajustar(subtotal.reservas, len(claves)),
+            }
+            sumas = {nombre: np.bincount(indices, weights=valores, minlength=len(grupos))
+                     for nombre, valores in columnas.items()} if len(claves) else {}
+            filas_periodo = []
+            for grupo, indice in grupos.items():
+                if not sumas["horas"][indice]:
+                    continue
+                fila: Dict[str, Any] = {"periodo": etiqueta, **dict(zip(agrupar, grupo))}
+                fila.update({
+                    "horas": round(float(sumas["horas"][indice]), 2),
+                    "kwh": round(float(sumas["kwh"][indice]), 2),
+                    "coste_energia": round(float(sumas["coste_energia"][indice]), 2),
+                    "coste_uso": round(float(sumas["coste_uso"][indice]), 2),
+                    "coste_total": round(float(sumas["coste_energia"][indice] + sumas["coste_uso"][indice]), 2),
+                    "reservas": int(sumas["reservas"][indice]) if "recurso" in agrupar else sum(
+                        cantidad for tipo, cantidad in subtotal.eventos.items()
+                        if "tipo" not in agrupar or grupo == (tipo,)),
+                })
+                filas_periodo.append(fila)
+            filas.extend(sorted(filas_periodo, key=lambda f: -f["coste_total"]))
+        return filas
+
+    def __len__(self):
+        """Particiones guardadas"""
+        return len(self._particiones)
@@ -0,0 +1,195 @@
+"""
+Demanda histórica de los recursos por hora de la semana
+Para cada recurso se acumulan las unidades-hora reservadas en cada una de las 168
+horas de la semana (lunes 00:00 = hora 0) y las semanas con reservas, de modo que la
+ocupación media de un recurso un martes a las 10 es una división. Se construye la
+primera vez que se consulta y después se mantiene con los avisos del gestor de eventos,
+sin volver a recorrerlo. La búsqueda de huecos la usa para recomendar las ventanas
+menos disputadas en lugar de las más tempranas
+"""
+from __future__ import annotations
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from dominio.eventos import Evento, GestorEventos, Ocupacion
+from dominio.recursos import GestorRecursos
+from dominio.series import SerieRecurrente
+
+HORAS_SEMANA = 168
+HORA = timedelta(hours=1)
+SEMANA = timedelta(weeks=1)
+
+# Lunes a las 00:00 desde el que se cuentan las horas y las semanas
+LUNES = datetime(2000, 1, 3)
+
+# Semanas desde el inicio de una serie con las que se calcula su patrón semanal medio
+SEMANAS_MUESTRA_SERIE = 4
+
+
+def hora_semana(momento: datetime) -> float:
+    """Horas (con fracción) desde el lunes a las 00:00 de la semana de 'momento'"""
+    return ((momento - LUNES) / HORA) % HORAS_SEMANA
+
+
+def _repartir(inicio: datetime, fin: datetime) -> Iterator[Tuple[int, float]]:
+    """(hora de la semana, fracción de esa hora ocupada) de cada hora que toca [inicio, fin)"""
+    momento = inicio
+    while momento < fin:
+        siguiente = min(fin, momento.replace(minute=0, second=0, microsecond=0) + HORA)
+        yield (momento - LUNES) // HORA % HORAS_SEMANA, (siguiente - momento) / HORA
+        momento = siguiente
+
+
+class PerfilSemanal:
+    """
+    Contención de un conjunto de recursos por hora de la semana, con sumas prefijas para
+    calcular la media de cualquier ventana en O(1)
+    """
+
+    def __init__(self, contencion: List[float]):
+        self.contencion = contencion
+        self._prefijas = [0.0]
+        for valor in contencion:
+            self._prefijas.append(self._prefijas[-1] + valor)
+
+    def _acumulada(self, horas: float) -> float:
+        """Integral de la contención desde el lunes a las 00:00 hasta 'horas' (< HORAS_SEMANA)"""
+        hora = min(int(horas), HORAS_SEMANA - 1)
+        return self._prefijas[hora] + (horas - hora) * self.contencion[hora]
+
+    def media(self, inicio: datetime, fin: datetime) -> float:
+        """Contención media de la ventana [inicio, fin)"""
+        duracion = (fin - inicio) / HORA
+        if duracion <= 0:
+            return 0.0
+        semanas, resto = divmod(duracion, HORAS_SEMANA)
+        desde = hora_semana(inicio)
+        hasta = desde + resto
+        total = semanas * self._prefijas[-1]
+        if hasta <= HORAS_SEMANA:
+            total += self._acumulada(hasta) - self._acumulada(desde)
+        else:
+            total += self._prefijas[-1] - self._acumulada(desde) + self._acumulada(hasta - HORAS_SEMANA)
+        return total / duracion
+
+
+class DemandaSemanal:
+    """Unidades-hora reservadas por recurso y hora de la semana en un gestor, mantenidas con sus avisos"""
+
+    def __init__(self, gestor_eventos: GestorEventos):
+        self.gestor_eventos = gestor_eventos
+        self._cerrojo = threading.Lock()
+        self._construida = False
+        # recurso_id -> unidades-hora de los eventos en cada hora de la semana
+        self._horas: Dict[str, List[float]] = {}
+        # recurso_id -> unidades-hora por semana de las series (patrón medio de cada una)
+        self._series: Dict[str, List[float]] = {}
+        # Número de semana desde LUNES -> eventos que empiezan en ella
+        self._semanas: Dict[int, int] = {}
+        self._firma = self._firma_bases()
+        gestor_eventos.oyentes.append(self._al_cambiar)
+
+    def desconectar(self):
+        """Deja de recibir los avisos del gestor de eventos"""
+        if self._al_cambiar in self.gestor_eventos.oyentes:
+            self.gestor_eventos.oyentes.remove(self._al_cambiar)
+
+    # --- Mantenimiento ---
+
+    def _firma_bases(self) -> tuple:
+        firma = []
+        base = getattr(self.gestor_eventos, "base", None)
+        while base is not None:
+            firma.append(base.version)
+            base = getattr(base, "base", None)
+        return tuple(firma)
+
+    @staticmethod
+    def _cuenta(ocupacion: Ocupacion) -> bool:
+        """Los eventos cancelados y las retenciones provisionales no son demanda"""
+        return ocupacion.metadata.get("cancelado") is not True and not ocupacion.metadata.get("retencion")
+
+    @staticmethod
+    def _sumar_en(tabla: Dict[str, List[float]], recursos, inicio: datetime, fin: datetime, factor: float):
+        horas = list(_repartir(inicio, fin))
+        for recurso in recursos:
+            fila = tabla.get(recurso.id)
+            if fila is None:
+                fila = tabla[recurso.id] = [0.0] * HORAS_SEMANA
+            for hora, fraccion in horas:
+                fila[hora] += factor * fraccion
+
+    def _sumar_evento(self, evento: Evento, signo: int):
+        if not self._cuenta(evento):
+            return
+        self._sumar_en(self._horas, evento.recursos, evento.inicio, evento.fin, signo)
+        semana = (evento.inicio - LUNES) // SEMANA
+        cantidad = self._semanas.get(semana, 0) + signo
+        if cantidad > 0:
+            self._semanas[semana] = cantidad
+        else:
+            self._semanas.pop(semana, None)
+
+    def _sumar_serie(self, serie: SerieRecurrente, signo: int):
+        if not self._cuenta(serie):
+            return
+        for ocurrencia in serie.ocurrencias(serie.inicio, serie.inicio + SEMANAS_MUESTRA_SERIE * SEMANA):
+            self._sumar_en(self._series, ocurrencia.recursos, ocurrencia.inicio, ocurrencia.fin,
+                           signo / SEMANAS_MUESTRA_SERIE)
+
+    def _al_cambiar(self, ocupacion: Optional[Ocupacion], signo: int):
+        with self._cerrojo:
+            if ocupacion is None:
+                self._construida = False
+            elif not self._construida:
+                return
+            elif isinstance(ocupacion, SerieRecurrente):
+                self._sumar_serie(ocupacion, signo)
+            else:
+                self._sumar_evento(ocupacion, signo)
+
+    def _construir(self):
+        self._horas, self._series, self._semanas = {}, {}, {}
+        for evento in list(self.gestor_eventos.eventos.values()):
+            self._sumar_evento(evento, 1)
+        for serie in list(self.gestor_eventos.series.values()):
+            self._sumar_serie(serie, 1)
+        self._firma = self._firma_bases()
+        self._construida = True
+
+    def _al_dia(self):
+        if not self._construida or self._firma != self._firma_bases():
+            self._construir()
+
+    # --- Consultas ---
+
+    def ocupacion_media(self, recurso_id: str) -> List[float]:
+        """Unidades ocupadas de media en cada hora de la semana (eventos y series)"""
+        with self._cerrojo:
+            self._al_dia()
+            semanas = max(1, len(self._semanas))
+            horas = self._horas.get(recurso_id, [0.0] * HORAS_SEMANA)
+            series = self._series.get(recurso_id, [0.0] * HORAS_SEMANA)
+            return [max(0.0, valor / semanas + serie) for valor, serie in zip(horas, series)]
+
+    def perfil(self, demanda: Dict[str, int], gestor_recursos: GestorRecursos) -> PerfilSemanal:
+        """
+        Contención de una demanda {recurso_id: unidades} por hora de la semana: fracción
+        media de la capacidad de cada recurso que ya está reservada a esa hora, ponderada
+        por las unidades que se piden de cada uno
+        """
+        contencion = [0.0] * HORAS_SEMANA
+        total = sum(demanda.values()) or 1
+        for recurso_id, unidades in demanda.items():
+            recurso = gestor_recursos.obtener_recurso(recurso_id)
+            capacidad = max(1, recurso.capacidad if recurso is not None else 1)
+            for hora, valor in enumerate(self.ocupacion_media(recurso_id)):
+                contencion[hora] += unidades * valor / capacidad / total
+        return PerfilSemanal(contencion)
+
+    def __len__(self):
+        """Semanas con reservas"""
+        with self._cerrojo:
+            self._al_dia()
+            return len(self._semanas)
@@ -0,0 +1,321 @@
+"""
+Planificador fragmentado por grupos de recursos relacionados
+Los recursos solo interactúan a través de los eventos que comparten y de las
+restricciones que los nombran, así que el grafo recurso-restricción se divide en
+componentes conexas y cada fragmento (uno o varios componentes) vive en su propio
+proceso con su propia agenda. Cada reserva se envía a los fragmentos que toca: si
+es uno solo, se comprueba y se guarda allí sin esperar a los demás; si son varios,
+se confirma en dos fases (preparar en todos y confirmar, o abortar si alguno falla)
+
+Las restricciones que solo miran la combinación de recursos de la reserva (tipos,
+co-requisitos, exclusiones) se comprueban en el coordinador sobre la reserva
+completa; cada fragmento comprueba la ocupación de sus propios recursos y las
+restricciones temporales (todos los recursos que implican están en su fragmento)
+"""
+from __future__ import annotations
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from aplicacion.comandos import AgregarEvento, Lote
+from aplicacion.planificador import Planificador
+from dominio.eventos import Evento
+from dominio.recursos import GestorRecursos
+from dominio.restricciones import Restriccion, restricciones_violadas
+from infraestructura.persistencia import Persistencia
+from core.metricas import registrar_reserva
+
+# Con menos fragmentos no compensa arrancar procesos: el único fragmento vive en el coordinador
+MIN_FRAGMENTOS_PARALELO = 2
+
+
+def componentes_conexas(gestor_recursos: GestorRecursos, restricciones: List[Restriccion]) -> List[List[str]]:
+    """
+    Grupos de recursos relacionados por alguna restricción (unión-búsqueda sobre los
+    recursos_implicados de cada una). Cada recurso sin restricciones forma su propio grupo
+    """
+    padres = {recurso_id: recurso_id for recurso_id in gestor_recursos.recursos}
+
+    def raiz(recurso_id: str) -> str:
+        while padres[recurso_id] != recurso_id:
+            padres[recurso_id] = padres[padres[recurso_id]]
+            recurso_id = padres[recurso_id]
+        return recurso_id
+
+    for restriccion in restricciones:
+        implicados = [recurso_id for recurso_id in restriccion.recursos_implicados(gestor_recursos)
+                      if recurso_id in padres]
+        for recurso_id in implicados[1:]:
+            padres[raiz(recurso_id)] = raiz(implicados[0])
+
+    grupos: Dict[str, List[str]] = {}
+    for recurso_id in padres:
+        grupos.setdefault(raiz(recurso_id), []).append(recurso_id)
+    return list(grupos.values())
+
+
+def _con_recursos(datos: Dict[str, Any], recursos_ids: set) -> Optional[Dict[str, Any]]:
+    """Copia de un evento o serie serializados con solo los recursos indicados (None si no toca ninguno)"""
+    recursos = [recurso for recurso in datos.get('recursos', []) if recurso['id'] in recursos_ids]
+    return {**datos, 'recursos': recursos} if recursos else None
+
+
+class _Fragmento:
+    """Agenda de un fragmento: solo sus recursos y la parte de cada evento que los usa"""
+
+    def __init__(self, instantanea: Dict[str, Any], datos_dir: str):
+        gestor_eventos, gestor_recursos, restricciones, _ = Persistencia.desde_diccionario(instantanea, confiable=True)
+        self.planificador = Planificador(datos_dir)
+        self.planificador.gestor_eventos = gestor_eventos
+        self.planificador.gestor_recursos = gestor_recursos
+        self.planificador.restricciones = restricciones
+        # Reservas entre fragmentos preparadas y a la espera de confirmar o abortar
+        self._preparados: Dict[str, Evento] = {}
+
+    def _evento_local(self, reserva: Dict[str, Any]) -> Evento:
+        """Parte de la reserva que usa recursos de este fragmento (ya validada en el coordinador)"""
+        recursos = self.planificador.gestor_recursos.recursos
+        return Evento.sin_validar(
+            reserva['id'], reserva['nombre'], reserva['inicio'], reserva['fin'],
+            [recursos[recurso_id] for recurso_id in reserva['recursos'] if recurso_id in recursos],
+            reserva['tipo'], reserva['descripcion'], reserva['prioridad'], {})
+
+    def _comprobar(self, evento: Evento) -> Dict[str, Any]:
+        violadas = restricciones_violadas(evento.recursos, evento, self.planificador.restricciones)
+        if violadas:
+            return {'success': False, 'motivos': [type(r).__name__ for r in violadas],
+                    'message': f'Violación de restricciones: {", ".join(r.mensaje_error() for r in violadas)}'}
+        sin_conflictos, errores = self.planificador.verificar_conflictos(evento)
+        if not sin_conflictos:
+            return {'success': False, 'motivos': ["capacidad"], 'message': f"{errores}"}
+        return {'success': True, 'motivos': [], 'message': ""}
+
+    def reservar(self, reserva: Dict[str, Any]) -> Dict[str, Any]:
+        """Reserva que solo toca este fragmento: se comprueba y se guarda de una vez"""
+        evento = self._evento_local(reserva)
+        resultado = self._comprobar(evento)
+        if resultado['success']:
+            self.planificador.gestor_eventos.agregar_evento(evento)
+        return resultado
+
+    def preparar(self, reserva: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Primera fase: si la parte local cabe, queda ocupando los recursos (las reservas
+        posteriores ya la ven) hasta que llegue confirmar o abortar
+        """
+        evento = self._evento_local(reserva)
+        resultado = self._comprobar(evento)
+        if resultado['success']:
+            self.planificador.gestor_eventos.agregar_evento(evento)
+            self._preparados[evento.id] = evento
+        return resultado
+
+    def confirmar(self, evento_id: str) -> bool:
+        """Segunda fase: la parte preparada pasa a ser definitiva"""
+        return self._preparados.pop(evento_id, None) is not None
+
+    def abortar(self, evento_id: str) -> bool:
+        """Segunda fase cuando otro fragmento rechazó la reserva: se libera la parte local"""
+        if self._preparados.pop(evento_id, None) is None:
+            return False
+        return self.planificador.gestor_eventos.eliminar_evento(evento_id)
+
+    def eventos(self) -> List[str]:
+        """Ids de los eventos con alguna parte en el fragmento"""
+        return list(self.planificador.gestor_eventos.eventos)
+
+
+# Fragmento que atiende el proceso trabajador (uno por proceso)
+_fragmento_trabajador: Optional[_Fragmento] = None
+
+
+def _iniciar_trabajador(instantanea: Dict[str, Any], datos_dir: str):
+    global _fragmento_trabajador
+    _fragmento_trabajador = _Fragmento(instantanea, datos_dir)
+
+
+def _llamar_en_trabajador(metodo: str, *argumentos):
+    return getattr(_fragmento_trabajador, metodo)(*argumentos)
+
+
+class PlanificadorFragmentado:
+    """
+    Coordinador de reservas repartidas entre fragmentos. Se crea a partir de un
+    Planificador y, mientras está abierto, las reservas deben pasar por él; las
+    confirmadas se vuelcan al planificador original con volcar() (o al cerrar)
+    """
+
+    def __init__(self, planificador: Planificador, max_fragmentos: Optional[int] = None):
+        self.planificador = planificador
+        self.componentes = componentes_conexas(planificador.gestor_recursos, planificador.restricciones)
+        total = max(1, min(max_fragmentos or os.cpu_count() or 1, len(self.componentes)))
+
+        # Reparto de componentes entre fragmentos equilibrando los eventos que ya tienen
+        # (primero los componentes con más carga, cada uno al fragmento menos cargado)
+        carga_recurso: Dict[str, int] = {}
+        for evento in planificador.gestor_eventos.eventos.values():
+            for recurso_id in {recurso.id for recurso in evento.recursos}:
+                carga_recurso[recurso_id] = carga_recurso.get(recurso_id, 0) + 1
+        cargas = [0] * total
+        self.fragmento_de: Dict[str, int] = {}
+        for componente in sorted(self.componentes, key=lambda c: -sum(carga_recurso.get(r, 0) + 1 for r in c)):
+            indice = cargas.index(min(cargas))
+            cargas[indice] += sum(carga_recurso.get(r, 0) + 1 for r in componente)
+            for recurso_id in componente:
+                self.fragmento_de[recurso_id] = indice
+        self.total_fragmentos = total
+
+        # Reservas confirmadas pendientes de volcar al planificador original
+        self._confirmados: List[Evento] = []
+
+        instantaneas = self._instantaneas()
+        self._local: Optional[_Fragmento] = None
+        self._ejecutores: List[ProcessPoolExecutor] = []
+        if total < MIN_FRAGMENTOS_PARALELO:
+            self._local = _Fragmento(instantaneas[0], planificador.datos_dir)
+        else:
+            # Un proceso por fragmento: sus operaciones se atienden en orden de llegada
+            self._ejecutores = [
+                ProcessPoolExecutor(max_workers=1, initializer=_iniciar_trabajador,
+                                    initargs=(instantanea, planificador.datos_dir))
+                for instantanea in instantaneas
+            ]
+
+    def _instantaneas(self) -> List[Dict[str, Any]]:
+        """Estado inicial de cada fragmento: sus recursos, restricciones y partes de eventos y series"""
+        planificador = self.planificador
+        eventos = [evento.to_dict() for evento in planificador.gestor_eventos.eventos.values()
+                   if evento.estado != 'cancelado']
+        series = planificador.gestor_eventos.series_to_list()
+        instantaneas = []
+        for indice in range(self.total_fragmentos):
+            propios = {recurso_id for recurso_id, fragmento in self.fragmento_de.items() if fragmento == indice}
+            instantaneas.append({
+                "recursos": [recurso.to_dict() for recurso in planificador.gestor_recursos.recursos.values()
+                             if recurso.id in propios],
+                "eventos": [parte for parte in (_con_recursos(datos, propios) for datos in eventos) if parte],
+                "series": [parte for parte in (_con_recursos(datos, propios) for datos in series) if parte],
+                "restricciones": Persistencia.serializar_restricciones([
+                    restriccion for restriccion in planificador.restricciones
+                    if propios.intersection(restriccion.recursos_implicados(planificador.gestor_recursos))
+                ])
+            })
+        return instantaneas
+
+    def _enviar(self, indice: int, metodo: str, *argumentos) -> Future:
+        if self._local is not None:
+            futuro = Future()
+            futuro.set_result(getattr(self._local, metodo)(*argumentos))
+            return futuro
+        return self._ejecutores[indice].submit(_llamar_en_trabajador, metodo, *argumentos)
+
+    def _confirmar_entre_fragmentos(self, reserva: Dict[str, Any], fragmentos: List[int]) -> Dict[str, Any]:
+        """Confirmación en dos fases de una reserva que toca varios fragmentos"""
+        votos = [(indice, self._enviar(indice, "preparar", reserva)) for indice in fragmentos]
+        votos = [(indice, futuro.result()) for indice, futuro in votos]
+        rechazos = [voto for _, voto in votos if not voto['success']]
+        fase = "confirmar" if not rechazos else "abortar"
+        for futuro in [self._enviar(indice, fase, reserva['id']) for indice, voto in votos if voto['success']]:
+            futuro.result()
+        if rechazos:
+            return {'success': False, 'message': rechazos[0]['message'],
+                    'motivos': [motivo for voto in rechazos for motivo in voto['motivos']]}
+        return {'success': True, 'message': "", 'motivos': []}
+
+    def planificar_lote(self, solicitudes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Planifica varias reservas. Las de fragmentos distintos se comprueban a la vez;
+        dentro de un mismo fragmento se atienden en el orden de la lista
+        Args:
+            solicitudes: argumentos de planificar_evento, uno por reserva
+                ({'nombre', 'inicio', 'fin', 'recursos_seleccionados', 'tipo', ...})
+        Returns:
+            Un resultado por solicitud, en el mismo orden y con el formato de
+            Planificador.planificar_evento
+        """
+        resultados: List[Dict[str, Any]] = []
+        pendientes = []
+        for solicitud in solicitudes:
+            resultado = {"success": False, "message": "", "evento": None, "detalles": {}}
+            resultados.append(resultado)
+            # Lo que no depende de la agenda se comprueba aquí, sobre la reserva completa
+            try:
+                comprobacion = self.planificador.comprobar_evento(**solicitud, verificar_ocupacion=False)
+            except Exception as e:
+                comprobacion = {"success": False, "message": f"Error: {str(e)}", "motivos": ["error"]}
+            if not comprobacion["success"]:
+                resultado["message"] = comprobacion["message"]
+                registrar_reserva(False, comprobacion["motivos"])
+                continue
+            evento = comprobacion["evento"]
+
+            reserva = {'id': evento.id, 'nombre': evento.nombre, 'inicio': evento.inicio, 'fin': evento.fin,
+                       'recursos': [recurso.id for recurso in evento.recursos], 'tipo': evento.tipo,
+                       'descripcion': evento.descripcion, 'prioridad': evento.prioridad}
+            fragmentos = sorted({self.fragmento_de[recurso.id] for recurso in evento.recursos})
+            if len(fragmentos) == 1:
+                # No se espera la respuesta: la siguiente reserva puede ir a otro fragmento
+                futuro = self._enviar(fragmentos[0], "reservar", reserva)
+            else:
+                futuro = Future()
+                futuro.set_result(self._confirmar_entre_fragmentos(reserva, fragmentos))
+            pendientes.append((resultado, evento, fragmentos, futuro))
+
+        for resultado, evento, fragmentos, futuro in pendientes:
+            try:
+                respuesta = futuro.result()
+            except Exception as e:
+                respuesta = {'success': False, 'message': f"Error: {str(e)}", 'motivos': ["error"]}
+            if respuesta['success']:
+                self._confirmados.append(evento)
+                resultado["success"] = True
+                resultado["message"] = "Evento agregado exitosamente"
+                resultado["evento"] = evento
+                resultado["detalles"] = {
+                    'id': evento.id,
+                    'duracion_horas': evento.duracion_horas,
+                    'recursos_asignados': [r.nombre for r in evento.recursos],
+                    'fragmentos': fragmentos
+                }
+            else:
+                resultado["message"] = respuesta['message']
+            registrar_reserva(respuesta['success'], respuesta['motivos'])
+        return resultados
+
+    def planificar_evento(self, nombre: str, inicio: datetime, fin: datetime, recursos_seleccionados: Dict[str, int],
+                          tipo: str, descripcion: str = "", prioridad: int = 1) -> Dict[str, Any]:
+        """Planifica una reserva (mismo resultado que Planificador.planificar_evento)"""
+        return self.planificar_lote([{
+            'nombre': nombre, 'inicio': inicio, 'fin': fin, 'recursos_seleccionados': recursos_seleccionados,
+            'tipo': tipo, 'descripcion': descripcion, 'prioridad': prioridad
+        }])[0]
+
+    def volcar(self) -> int:
+        """
+        Añade al planificador original las reservas confirmadas desde el último volcado
+        (como un solo cambio del historial). Returns: número de reservas volcadas
+        """
+        confirmados, self._confirmados = self._confirmados, []
+        if not confirmados:
+            return 0
+        if not self.planificador._ejecutar(Lote([AgregarEvento(evento) for evento in confirmados],
+                                                f"Reservas fragmentadas ({len(confirmados)})")):
+            self._confirmados = confirmados + self._confirmados
+            print(" Error al volcar las reservas fragmentadas en el planificador")
+            return 0
+        return len(confirmados)
+
+    def cerrar(self) -> int:
+        """Vuelca las reservas pendientes y detiene los procesos de los fragmentos"""
+        volcadas = self.volcar()
+        for ejecutor in self._ejecutores:
+            ejecutor.shutdown()
+        self._ejecutores = []
+        return volcadas
+
+    def __enter__(self) -> 'PlanificadorFragmentado':
+        return self
+
+    def __exit__(self, *excepcion):
+        self.cerrar()
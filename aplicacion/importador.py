@@ -0,0 +1,215 @@
+"""
+Importación masiva de solicitudes de reserva desde archivos CSV o JSONL
+Los archivos se leen fila a fila, de modo que nunca se cargan completos en memoria
+"""
+from __future__ import annotations
+import csv
+import json
+import math
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from aplicacion.planificador import Planificador
+
+# Separadores aceptados en la columna "recursos" de un CSV: "cluster_gpu_a100:1;investigador_vision:1"
+SEPARADOR_RECURSOS = ";"
+SEPARADOR_CANTIDAD = ":"
+
+
+class ErrorFila(ValueError):
+    """La fila no tiene el formato esperado"""
+    pass
+
+
+def leer_solicitudes(archivo: str, formato: Optional[str] = None) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Recorre las solicitudes de un archivo CSV o JSONL de forma perezosa
+    Returns:
+        Iterador de (número de fila, diccionario con los campos de la fila)
+    """
+    if formato is None:
+        formato = "jsonl" if os.path.splitext(archivo)[1].lower() in (".jsonl", ".ndjson") else "csv"
+
+    with open(archivo, 'r', encoding='utf-8', newline='') as f:
+        if formato == "csv":
+            # La fila 1 es la cabecera
+            for numero, fila in enumerate(csv.DictReader(f), start=2):
+                yield numero, fila
+        else:
+            for numero, linea in enumerate(f, start=1):
+                linea = linea.strip()
+                if not linea:
+                    continue
+                try:
+                    fila = json.loads(linea)
+                except json.JSONDecodeError as e:
+                    yield numero, {"_error": f"JSON inválido: {e.msg}"}
+                    continue
+                if not isinstance(fila, dict):
+                    fila = {"_error": "Cada línea debe ser un objeto JSON"}
+                yield numero, fila
+
+
+def _texto(fila: Dict[str, Any], clave: str) -> str:
+    valor = fila.get(clave)
+    return str(valor).strip() if valor is not None else ""
+
+
+def _fecha(fila: Dict[str, Any], clave: str) -> Optional[datetime]:
+    valor = _texto(fila, clave)
+    if not valor:
+        return None
+    try:
+        return datetime.fromisoformat(valor)
+    except ValueError:
+        raise ErrorFila(f"'{clave}' no es una fecha ISO 8601 válida: {valor}")
+
+
+def _recursos(fila: Dict[str, Any]) -> Dict[str, int]:
+    """Acepta {"id": cantidad} (JSONL) o "id:cantidad;id:cantidad" (CSV)"""
+    valor = fila.get("recursos")
+    if isinstance(valor, dict):
+        elementos = valor.items()
+    else:
+        elementos = []
+        for parte in _texto(fila, "recursos").split(SEPARADOR_RECURSOS):
+            if not parte.strip():
+                continue
+            id_recurso, _, cantidad = parte.partition(SEPARADOR_CANTIDAD)
+            elementos.append((id_recurso.strip(), cantidad.strip() or 1))
+
+    try:
+        recursos = {str(id_recurso): int(cantidad) for id_recurso, cantidad in elementos}
+    except (TypeError, ValueError):
+        # TypeError: cantidad nula u otro valor JSON no numérico
+        raise ErrorFila("Las cantidades de 'recursos' deben ser enteras")
+    if any(cantidad <= 0 for cantidad in recursos.values()):
+        raise ErrorFila("Las cantidades de 'recursos' deben ser mayores a 0")
+    if not recursos:
+        raise ErrorFila("La fila no indica recursos")
+    return recursos
+
+
+def interpretar_fila(fila: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Convierte una fila en los parámetros de una solicitud
+    Columnas: nombre, tipo, recursos, prioridad, descripcion y además
+        - inicio y (fin o duracion_horas) para un horario fijo, o
+        - ventana_inicio, ventana_fin y duracion_horas para ubicar dentro de una ventana
+    """
+    if not isinstance(fila, dict):
+        raise ErrorFila("La fila debe ser un objeto con los campos de la solicitud")
+    if "_error" in fila:
+        raise ErrorFila(fila["_error"])
+
+    nombre = _texto(fila, "nombre")
+    tipo = _texto(fila, "tipo")
+    if not nombre or not tipo:
+        raise ErrorFila("'nombre' y 'tipo' son obligatorios")
+
+    duracion = None
+    if _texto(fila, "duracion_horas"):
+        try:
+            horas = float(_texto(fila, "duracion_horas"))
+            # inf y nan se leen como float; las cantidades enormes desbordan timedelta
+            if not math.isfinite(horas):
+                raise ValueError(horas)
+            duracion = timedelta(hours=horas)
+        except (ValueError, OverflowError):
+            raise ErrorFila("'duracion_horas' debe ser un número finito de horas")
+
+    inicio = _fecha(fila, "inicio")
+    fin = _fecha(fila, "fin")
+    ventana_inicio = _fecha(fila, "ventana_inicio")
+    ventana_fin = _fecha(fila, "ventana_fin")
+
+    if inicio is None:
+        if ventana_inicio is None or duracion is None:
+            raise ErrorFila("Se necesita 'inicio' o bien 'ventana_inicio' y 'duracion_horas'")
+        inicio = ventana_inicio
+    if fin is None:
+        if duracion is None:
+            raise ErrorFila("Se necesita 'fin' o 'duracion_horas'")
+        try:
+            fin = inicio + duracion
+        except OverflowError:
+            raise ErrorFila("'duracion_horas' lleva el fin más allá de la última fecha representable")
+
+    try:
+        prioridad = int(_texto(fila, "prioridad") or 1)
+    except ValueError:
+        raise ErrorFila("'prioridad' debe ser un entero")
+
+    return {
+        "nombre": nombre,
+        "tipo": tipo,
+        "descripcion": _texto(fila, "descripcion"),
+        "prioridad": prioridad,
+        "recursos": _recursos(fila),
+        "inicio": inicio,
+        "fin": fin,
+        "ventana_fin": ventana_fin,
+    }
+
+
+def importar_solicitudes(
+    planificador: Planificador,
+    filas: Iterator[Tuple[int, Dict[str, Any]]],
+    ubicar_automaticamente: bool = False
+) -> Iterator[Dict[str, Any]]:
+    """
+    Valida y planifica cada fila en una sola pasada, devolviendo el resultado fila a fila
+    Con ubicar_automaticamente, una fila que no cabe en su horario se mueve al primer hueco
+    libre de su ventana (o de los 7 días siguientes si no tiene ventana)
+    """
+    for numero, fila in filas:
+        salida = {"fila": numero, "success": False, "message": "", "id": None, "inicio": None, "fin": None}
+        try:
+            solicitud = interpretar_fila(fila)
+        except ErrorFila as e:
+            salida["message"] = str(e)
+            yield salida
+            continue
+
+        inicio, fin = solicitud["inicio"], solicitud["fin"]
+        ventana_fin = solicitud["ventana_fin"]
+        buscar_en_ventana = ubicar_automaticamente and ventana_fin is not None
+
+        if buscar_en_ventana:
+            # Primer hueco de la ventana en el que caben los recursos
+            huecos = planificador.buscar_hueco_disponible(
+                recursos_con_cantidad=solicitud["recursos"],
+                duracion_horas=(fin - inicio).total_seconds() / 3600,
+                inicio_busqueda=inicio,
+                fin_busqueda=ventana_fin,
+                max_resultados=1,
+                tipo=solicitud["tipo"]
+            )
+            if not huecos:
+                salida["message"] = "No hay hueco disponible dentro de la ventana"
+                yield salida
+                continue
+            inicio, fin = huecos[0]['inicio'], huecos[0]['fin']
+
+        resultado = planificador.planificar_evento(
+            nombre=solicitud["nombre"],
+            inicio=inicio,
+            fin=fin,
+            recursos_seleccionados=solicitud["recursos"],
+            tipo=solicitud["tipo"],
+            descripcion=solicitud["descripcion"],
+            prioridad=solicitud["prioridad"],
+            buscar_hueco_si_ocupado=ubicar_automaticamente and not buscar_en_ventana
+        )
+
+        salida["success"] = resultado.get("success", False)
+        salida["message"] = resultado.get("message", "")
+        if salida["success"]:
+            detalles = resultado.get("detalles", {})
+            evento = planificador.gestor_eventos.obtener_evento(detalles.get("id"))
+            salida["id"] = detalles.get("id")
+            if evento:
+                salida["inicio"] = evento.inicio.isoformat()
+                salida["fin"] = evento.fin.isoformat()
+        yield salida
@@ -0,0 +1,230 @@
+"""
+Agregación en el servidor de la vista Gantt (recurso × tiempo) de todo el centro
+En lugar de enviar al navegador una barra por evento, las reservas se ajustan a
+columnas del nivel de zoom, se reparten en carriles por recurso y las contiguas
+de un mismo carril se fusionan en un único bloque. El número de figuras queda
+acotado por recursos × carriles × columnas, sea cual sea el número de eventos
+"""
+from __future__ import annotations
+import heapq
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from dominio.eventos import GestorEventos
+from dominio.recursos import Recurso
+
+# Niveles de zoom disponibles, de más fino a más grueso
+NIVELES_ZOOM: Dict[str, timedelta] = {
+    "15 minutos": timedelta(minutes=15),
+    "1 hora": timedelta(hours=1),
+    "4 horas": timedelta(hours=4),
+    "1 día": timedelta(days=1),
+    "1 semana": timedelta(weeks=1),
+}
+
+# Columnas máximas del rango visible al elegir el zoom automáticamente
+MAX_COLUMNAS = 800
+
+# Bloques máximos enviados al navegador (con cualquier zoom)
+MAX_BLOQUES = 8000
+
+# Carriles máximos por recurso; el resto de solapamientos se apila en el último
+MAX_CARRILES = 8
+
+
+@dataclass
+class BloqueGantt:
+    """Reservas contiguas de un mismo carril de un recurso, ya fusionadas"""
+    recurso_id: str
+    carril: int
+    inicio: datetime
+    fin: datetime
+    eventos: int
+    nombre: str  # nombre del evento si el bloque contiene uno solo
+
+
+@dataclass
+class LineaTiempo:
+    """Resultado de la agregación, listo para dibujarse"""
+    inicio: datetime
+    fin: datetime
+    resolucion: timedelta
+    recursos: List[Recurso]
+    carriles: Dict[str, int]
+    bloques: List[BloqueGantt]
+    total_eventos: int
+
+
+def elegir_resolucion(inicio: datetime, fin: datetime, max_columnas: int = MAX_COLUMNAS) -> timedelta:
+    """Nivel de zoom más fino con el que el rango cabe en 'max_columnas' columnas"""
+    for resolucion in NIVELES_ZOOM.values():
+        if (fin - inicio) / resolucion <= max_columnas:
+            return resolucion
+    return list(NIVELES_ZOOM.values())[-1]
+
+
+def _niveles(inicio: datetime, fin: datetime, resolucion: Optional[timedelta]) -> Iterator[timedelta]:
+    """
+    Anchos de columna a probar, de más fino a más grueso: el zoom pedido (o el automático),
+    los niveles más gruesos y después el último nivel duplicado hasta que el rango
+    entero cabe en una columna
+    """
+    if resolucion is None:
+        resolucion = elegir_resolucion(inicio, fin)
+    yield resolucion
+    yield from (nivel for nivel in NIVELES_ZOOM.values() if nivel > resolucion)
+    nivel = max(resolucion, list(NIVELES_ZOOM.values())[-1])
+    while nivel < fin - inicio:
+        nivel *= 2
+        yield nivel
+
+
+def _asignar_carriles(intervalos: List[tuple], max_carriles: int) -> List[List[tuple]]:
+    """
+    Reparte intervalos (columna_inicio, columna_fin, nombre) en carriles sin solapamientos
+    Barrido ordenado por inicio con un montículo de (fin, carril) de los carriles ocupados
+    """
+    intervalos.sort()
+    carriles: List[List[tuple]] = []
+    ocupados: List[tuple] = []   # (columna en que queda libre, carril)
+    libres: List[int] = []        # carriles liberados, reutilizando siempre el más bajo
+    # Fin vigente de cada carril ocupado: al alargarse el último carril su entrada
+    # anterior en el montículo queda obsoleta y se descarta al salir
+    fin_carril: Dict[int, int] = {}
+
+    for intervalo in intervalos:
+        comienzo = intervalo[0]
+        while ocupados and ocupados[0][0] <= comienzo:
+            final, carril = heapq.heappop(ocupados)
+            if fin_carril.get(carril) == final:
+                del fin_carril[carril]
+                heapq.heappush(libres, carril)
+
+        if libres:
+            carril = heapq.heappop(libres)
+        elif len(carriles) < max_carriles:
+            carril = len(carriles)
+            carriles.append([])
+        else:
+            # Más solapamientos que carriles: se apilan en el último carril, que queda
+            # ocupado hasta el final de todo lo apilado
+            carril = max_carriles - 1
+            carriles[carril].append(intervalo)
+            if intervalo[1] > fin_carril[carril]:
+                fin_carril[carril] = intervalo[1]
+                heapq.heappush(ocupados, (intervalo[1], carril))
+            continue
+
+        carriles[carril].append(intervalo)
+        fin_carril[carril] = intervalo[1]
+        heapq.heappush(ocupados, (intervalo[1], carril))
+
+    return carriles
+
+
+def _fusionar(intervalos: List[tuple]) -> List[tuple]:
+    """Fusiona intervalos ordenados que se tocan o solapan -> (inicio, fin, eventos, nombre)"""
+    intervalos.sort()
+    fusionados: List[list] = []
+    for comienzo, final, nombre in intervalos:
+        if fusionados and comienzo <= fusionados[-1][1]:
+            ultimo = fusionados[-1]
+            ultimo[1] = max(ultimo[1], final)
+            ultimo[2] += 1
+            ultimo[3] = ""
+        else:
+            fusionados.append([comienzo, final, 1, nombre])
+    return [tuple(f) for f in fusionados]
+
+
+def _bloques(crudos: Dict[str, List[tuple]], recursos: List[Recurso], inicio: datetime,
+             resolucion: timedelta, ultimo_segundo: float, max_carriles: int) -> tuple:
+    """Ajusta los intervalos crudos (segundos desde 'inicio') a columnas, reparte y fusiona"""
+    paso = resolucion.total_seconds()
+    ultima_columna = int(-(-ultimo_segundo // paso))
+    bloques: List[BloqueGantt] = []
+    carriles_por_recurso: Dict[str, int] = {}
+
+    for recurso in recursos:
+        # Columnas enteras [columna_inicio, columna_fin), redondeando hacia fuera
+        intervalos = [(int(comienzo // paso), min(ultima_columna, int(-(-final // paso))), nombre)
+                      for comienzo, final, nombre in crudos[recurso.id]]
+        carriles = _asignar_carriles(intervalos, max_carriles)
+        carriles_por_recurso[recurso.id] = max(1, len(carriles))
+        for numero, intervalos_carril in enumerate(carriles):
+            for columna_inicio, columna_fin, eventos, nombre in _fusionar(intervalos_carril):
+                bloques.append(BloqueGantt(
+                    recurso_id=recurso.id,
+                    carril=numero,
+                    inicio=inicio + columna_inicio * resolucion,
+                    fin=inicio + columna_fin * resolucion,
+                    eventos=eventos,
+                    nombre=nombre
+                ))
+    return bloques, carriles_por_recurso
+
+
+def agregar_linea_tiempo(
+    gestor_eventos: GestorEventos,
+    recursos: Iterable[Recurso],
+    inicio: datetime,
+    fin: datetime,
+    resolucion: Optional[timedelta] = None,
+    max_carriles: int = MAX_CARRILES,
+    max_bloques: int = MAX_BLOQUES,
+    incluir_cancelados: bool = False
+) -> LineaTiempo:
+    """
+    Agrega las reservas de los recursos indicados entre 'inicio' y 'fin'
+    Args:
+        resolucion: ancho de columna. Por defecto se usa el nivel de zoom más fino que
+            da como mucho MAX_COLUMNAS columnas. Si con él salen más de 'max_bloques'
+            bloques (también con un zoom explícito) se pasa a columnas más anchas y, si
+            ni con una sola columna basta, a un único carril por recurso
+        max_carriles: filas máximas por recurso (se usan tantas como solapamientos haya)
+        incluir_cancelados: mostrar también los eventos cancelados y las retenciones
+            caducadas que aún no se han purgado
+    """
+    if max_carriles < 1:
+        raise ValueError("max_carriles debe ser al menos 1")
+    recursos = list(recursos)
+    ultimo_segundo = (fin - inicio).total_seconds()
+
+    # Reservas recortadas al rango, en segundos desde 'inicio'. Un evento que pide
+    # varias unidades de un recurso aparece una vez por unidad
+    crudos: Dict[str, List[tuple]] = {r.id: [] for r in recursos}
+    total = 0
+    for evento in gestor_eventos.obtener_por_rango_fecha(inicio, fin):
+        if not incluir_cancelados and evento.estado in ("cancelado", "caducado"):
+            continue
+        comienzo = (max(evento.inicio, inicio) - inicio).total_seconds()
+        final = (min(evento.fin, fin) - inicio).total_seconds()
+        if comienzo >= final:
+            continue
+        contado = False
+        for recurso in evento.recursos:
+            intervalos = crudos.get(recurso.id)
+            if intervalos is not None:
+                intervalos.append((comienzo, final, evento.nombre))
+                contado = True
+        total += contado
+
+    # Del zoom pedido hacia columnas más anchas hasta no superar 'max_bloques'
+    for nivel in _niveles(inicio, fin, resolucion):
+        bloques, carriles = _bloques(crudos, recursos, inicio, nivel, ultimo_segundo, max_carriles)
+        if len(bloques) <= max_bloques:
+            break
+    else:
+        # Ni con una columna: un carril por recurso, como mucho un bloque por recurso
+        bloques, carriles = _bloques(crudos, recursos, inicio, nivel, ultimo_segundo, 1)
+
+    return LineaTiempo(
+        inicio=inicio,
+        fin=fin,
+        resolucion=nivel,
+        recursos=recursos,
+        carriles=carriles,
+        bloques=bloques,
+        total_eventos=total
+    )
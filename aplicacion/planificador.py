@@ -2,20 +2,55 @@
 Planificador principal
 """
 from __future__ import annotations
+import copy
+import heapq
 import json 
 import os
+from bisect import bisect_left
+from dataclasses import replace
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple, Any
+from typing import Dict, Iterator, List, Optional, Tuple, Any
 
 # Importaciones absolutas desde el paquete
 from dominio.recursos import Recurso, GestorRecursos, crear_recursos_predeterminados
-from dominio.eventos import Evento, GestorEventos
-from dominio.restricciones import Restriccion, crear_restricciones_predeterminadas, validar_restricciones
-from infraestructura.persistencia import Persistencia
+from dominio.eventos import Evento, GestorEventos, DURACION_MAXIMA_EVENTO
+from dominio.series import SerieRecurrente
+from dominio.bifurcacion import GestorEventosBifurcado, Diferencias, copiar_evento, copiar_serie
+from dominio.disponibilidad import MapaDisponibilidad, VentanaOcupacion
+from dominio.retenciones import Retenciones
+from dominio.restricciones import (
+    Restriccion, crear_restricciones_predeterminadas, validar_restricciones, restricciones_violadas,
+    RestriccionCuota, restricciones_de_agenda, obtener_restricciones_por_tipo
+)
+from infraestructura.persistencia import Persistencia, ConflictoRevision
+from infraestructura.diario import Diario
+from aplicacion.contabilidad import Contabilidad
+from aplicacion.demanda import DemandaSemanal
+from aplicacion.comandos import (
+    Comando, Historial, Lote, AgregarEvento, EliminarEvento, ModificarEvento, CancelarEvento,
+    ReactivarEvento, AgregarSerie, EliminarSerie, ModificarSerie, AnularOcurrencia
+)
+from core.diagnostico import instrumentar, contar
+from core.identificadores import generar_id
+from core.metricas import registrar_reserva, ITERACIONES_HUECOS
 
 class Planificador:
     """Clase principal que integra todo el proceso de planificación"""
     
+    # Veces que se reintenta un guardado cuando otro proceso escribió antes
+    MAX_REINTENTOS_GUARDADO = 5
+    
+    # Ocurrencias de una serie sin fin que se comprueban al planificarla. Las posteriores
+    # se comprueban igualmente cuando se planifica un evento que coincide con ellas
+    HORIZONTE_SERIES = timedelta(days=365)
+    
+    # Tiempo que dura una retención provisional si no se indica otro
+    DURACION_RETENCION = timedelta(minutes=10)
+    
+    # Candidatos que se verifican como mucho al recomendar huecos, y huecos recomendados por defecto
+    PRESUPUESTO_RECOMENDACION = 200
+    HUECOS_RECOMENDADOS = 5
+    
     def __init__(self, datos_dir :str = "datos"):
         # Si a la función no se le especifica los datos_dir, automáticamente genera el parámetro "datos" por defecto
         """Inicializa el planificador con gestor de recursos, gestor de eventos y restricciones """
@@ -28,6 +63,32 @@ class Planificador:
         self.gestor_eventos = GestorEventos()
         self.restricciones = crear_restricciones_predeterminadas()
         self.advertencias_carga = []
+        self.advertencias_guardado = []
+        
+        # Control de concurrencia optimista: revisión del archivo sobre la que se trabaja
+        # y huella de cada evento tal como estaba en esa revisión
+        self.revision = 0
+        self._archivo_revision = None
+        self._huellas_base: Dict[str, tuple] = {}
+        self._huellas_series_base: Dict[str, str] = {}
+        
+        # Planificador del que se bifurcó este (None en el planificador real)
+        self.origen: Optional[Planificador] = None
+        
+        # Todas las mutaciones pasan por el historial (deshacer/rehacer); el diario
+        # recibe el mismo flujo de comandos para no perder cambios entre guardados
+        self.historial = Historial()
+        self.historial.oyentes.append(self._anotar_en_diario)
+        self._diario: Optional[Diario] = None
+        
+        # Ocupación por franjas de los recursos (se crea al consultarla, ver 'disponibilidad')
+        self._disponibilidad: Optional[MapaDisponibilidad] = None
+        # Caducidades de las retenciones provisionales (ver 'retenciones')
+        self._retenciones: Optional[Retenciones] = None
+        # Subtotales mensuales de horas para los informes de costes (ver 'contabilidad')
+        self._contabilidad: Optional[Contabilidad] = None
+        # Demanda histórica por hora de la semana para recomendar huecos (ver 'demanda')
+        self._demanda: Optional[DemandaSemanal] = None
         
     def cargar_recursos_iniciales(self, limpiar_existentes: bool = True):
         """Carga los recursos iniciales del sistema (predeterminados)"""
@@ -41,6 +102,109 @@ class Planificador:
         print(f" Cargados {len(self.gestor_recursos)} recursos predeterminados")
             
 
+    @staticmethod
+    def error_fechas(inicio: datetime, fin: datetime) -> str:
+        """Motivo por el que las fechas de una reserva no son válidas ('' si lo son)"""
+        ahora = datetime.now()
+        fecha_minima = datetime(2020, 1, 1)
+        año_actual = datetime.now().year
+
+        if inicio >= fin:
+            return 'La fecha de inicio debe ser anterior a la de fin'
+
+        if fin - inicio > timedelta(days =7):
+            return 'Los eventos no pueden durar más de 7 días'
+
+        if inicio < ahora - timedelta(minutes=5):
+            return 'La fecha de inicio no puede ser en el pasado(a menos que sea 5 minutos antes de la fecha actual)'
+
+        if inicio < fecha_minima:
+            return f'La fecha debe ser posterior al {fecha_minima.year}'
+
+        if inicio.year < 2000 or inicio.year > año_actual + 10:
+            return f'El año ({inicio.year}) no es válido. Debe estar entre 2000 y {año_actual + 10}'
+
+        if fin.year < 2000 or fin.year > año_actual + 10:
+            return f'El año ({fin.year}) no es válido. Debe estar entre 2000 y {año_actual + 10}'
+
+        return ""
+    
+    def comprobar_evento(
+        self,
+        nombre: str,
+        inicio: datetime,
+        fin: datetime,
+        recursos_seleccionados: Dict[str, int],
+        tipo: str,
+        descripcion: str = "",
+        prioridad: int = 1,
+        verificar_ocupacion: bool = True
+    ) -> Dict[str, Any]:
+        """
+        Todas las comprobaciones de planificar_evento sin modificar la agenda
+        Args:
+            verificar_ocupacion: comprobar también los conflictos con los eventos existentes
+        Returns:
+            {'success', 'message', 'evento' (el evento listo para agregar, o None si no se
+            pudo crear), 'motivos' (del rechazo, para las métricas), 'conflictos'}
+        """
+        comprobacion = {"success": False, "message": "", "evento": None, "motivos": ["validacion"], "conflictos": []}
+
+        # Validar parámetros básicos
+        error_fechas = self.error_fechas(inicio, fin)
+        if error_fechas:
+            comprobacion["message"] = error_fechas
+            return comprobacion
+
+        # Obtener recursos
+        recursos = []
+        for recurso_id, cantidad in recursos_seleccionados.items():
+            recurso = self.gestor_recursos.obtener_recurso(recurso_id)
+            if not recurso:
+                comprobacion["motivos"] = ["recurso_desconocido"]
+                comprobacion["message"] = f"Recurso {recurso_id} no encontrado"
+                return comprobacion
+
+            if cantidad > recurso.capacidad:
+                comprobacion["motivos"] = ["capacidad"]
+                comprobacion["message"] = "La cantidad solicitada supera la capacidad"
+                return comprobacion
+
+            # Agregar el recurso la cantidad de veces especificada
+            for i in range(cantidad):
+                recursos.append(recurso)
+
+        evento = comprobacion["evento"] = Evento(
+            nombre = nombre,
+            inicio = inicio,
+            fin = fin,
+            recursos = recursos,
+            tipo = tipo,
+            descripcion = descripcion,
+            prioridad = prioridad,
+        )
+
+        # Validar restricciones
+        violadas = restricciones_violadas(recursos, evento, self.restricciones)
+        if violadas:
+            comprobacion["motivos"] = [type(r).__name__ for r in violadas]
+            comprobacion["message"] = f'Violación de restricciones: {", ".join(r.mensaje_error() for r in violadas)}'
+            return comprobacion
+
+        # Verificar Conflictos de Recursos (Capacidad/Pools)
+        if verificar_ocupacion:
+            sin_conflictos, errores = self.verificar_conflictos(evento)
+            if not sin_conflictos:
+                comprobacion["motivos"] = ["capacidad"]
+                comprobacion["conflictos"] = errores
+                comprobacion["message"] = f"{errores}"
+                return comprobacion
+
+        comprobacion["success"] = True
+        comprobacion["motivos"] = []
+        return comprobacion
+
+    @instrumentar()
     def planificar_evento(
         self,
         nombre: str,
@@ -62,116 +226,104 @@ class Planificador:
             "evento": None,
             "detalles": {}
         }
+        # Motivos del rechazo para las métricas; por defecto, parámetros no válidos
+        motivos = ["validacion"]
             
         try:
-            # Validar parámetros básicos
-            ahora = datetime.now()
-            fecha_minima = datetime(2020, 1, 1)
-            año_actual = datetime.now().year
-            
-            if inicio >= fin:
-                resultado['message'] = 'La fecha de inicio debe ser anterior a la de fin'
-                return resultado
-            
-            if fin - inicio > timedelta(days =7):
-                resultado["message"] = 'Los eventos no pueden durar más de 7 días'
-                return resultado
-            
-            if inicio < ahora - timedelta(minutes=5):
-                resultado['message'] = 'La fecha de inicio no puede ser en el pasado(a menos que sea 5 minutos antes de la fecha actual)'
-                return resultado
-            
-            if inicio < fecha_minima:
-                resultado['message'] = f'La fecha debe ser posterior al {fecha_minima.year}'
-                return resultado
-            
-            
-            if inicio.year < 2000 or inicio.year > año_actual + 10:
-                resultado['message'] = f'El año ({inicio.year}) no es válido. Debe estar entre 2000 y {año_actual + 10}'
-                return resultado
-            
-            if fin.year < 2000 or fin.year > año_actual + 10:
-                resultado['message'] = f'El año ({fin.year}) no es válido. Debe estar entre 2000 y {año_actual + 10}'
-                return resultado
-
-            
-            # Obtener recursos
-            recursos = []
-            for recurso_id, cantidad in recursos_seleccionados.items():
-                recurso = self.gestor_recursos.obtener_recurso(recurso_id)
-                if not recurso:
-                    resultado["message"] = f"Recurso {recurso_id} no encontrado"
-                    return resultado
-                
-                if cantidad > recurso.capacidad: 
-                    resultado["message"] = "La cantidad solicitada supera la capacidad" 
-                    return resultado
-                
-                # Agregar el recurso la cantidad de veces especificada
-                for i in range(cantidad):
-                    recursos.append(recurso)
-                    
-            # Crear evento temporal para validaciones 
-            evento_temp =Evento(
-                nombre = nombre,
-                inicio = inicio, 
-                fin = fin,
-                recursos = recursos,
-                tipo = tipo,
-                descripcion = descripcion,
-                prioridad = prioridad,
-            )
-            
-            # Validar restricciones
-            es_valido, errores = validar_restricciones(recursos, evento_temp, self.restricciones)
-            if not es_valido:
-                resultado["message"] = f'Violación de restricciones: {", ".join(errores)}'
-                return resultado
-            
-            # Verificar disponibilidad
-            errores = []
-
-            # Verificar Conflictos de Recursos (Capacidad/Pools)
-            sin_conflictos, errores_conflictos = self.verificar_conflictos(evento_temp)
-            if not sin_conflictos:
-                errores.extend(errores_conflictos)
-                if buscar_hueco_si_ocupado:
+            self.purgar_retenciones()
+            comprobacion = self.comprobar_evento(
+                nombre, inicio, fin, recursos_seleccionados, tipo, descripcion, prioridad)
+            evento = comprobacion["evento"]
+            # Uso de las cuotas con la reserva incluida (aunque se rechace)
+            cuotas = self.estado_cuotas(evento) if evento is not None else []
+            if not comprobacion["success"]:
+                motivos = comprobacion["motivos"]
+                if comprobacion["conflictos"] and buscar_hueco_si_ocupado:
                     # Buscar hueco automáticamente
-                    return self.buscar_hueco_automático(
-                        nombre, inicio, fin, recursos, tipo, descripcion, prioridad
+                    resultado = self.buscar_hueco_automático(
+                        nombre, inicio, fin, evento.recursos, tipo, descripcion, prioridad
                         )
                 else:
-                    resultado["message"] = f"{errores}"
-                    return resultado  
-            
-            # Crear y agregar evento
-            evento = Evento(
-                nombre = nombre,
-                inicio = inicio,
-                fin = fin,
-                recursos = recursos,
-                tipo = tipo,
-                descripcion = descripcion, 
-                prioridad = prioridad
-            ) 
+                    resultado["message"] = comprobacion["message"]
+                    if cuotas:
+                        resultado["detalles"]["cuotas"] = cuotas
+                return resultado
             
-            if self.gestor_eventos.agregar_evento(evento):
-                resultado["success"] = True
-                resultado["message"] = "Evento agregado exitosamente"
-                resultado["evento"] = evento
-                resultado["detalles"] = {
-                    'id': evento.id,
-                    'duracion_horas': evento.duracion_horas,
-                    'recursos_asignados': [r.nombre for r in recursos]
-                }
-            else: 
-                resultado["message"] = "Error al agregar el evento"        
+            resultado = self.agregar_evento_comprobado(evento)
+            if not resultado["success"]:
+                motivos = ["error"]
+            elif cuotas:
+                resultado["detalles"]["cuotas"] = cuotas
                 
         except Exception as e:
+            motivos = ["error"]
             resultado["message"] = f"Error: {str(e)}"
+        finally:
+            registrar_reserva(resultado.get("success", False), motivos)
         
         return resultado 
     
+    def agregar_evento_comprobado(self, evento: Evento) -> Dict[str, Any]:
+        """Agrega un evento que ya pasó comprobar_evento (mismo resultado que planificar_evento)"""
+        if not self._ejecutar(AgregarEvento(evento)):
+            return {"success": False, "message": "Error al agregar el evento", "evento": None, "detalles": {}}
+        return {
+            "success": True,
+            "message": "Evento agregado exitosamente",
+            "evento": evento,
+            "detalles": {
+                'id': evento.id,
+                'duracion_horas': evento.duracion_horas,
+                'recursos_asignados': [r.nombre for r in evento.recursos]
+            }
+        }
+
+    def estado_cuotas(self, evento: Evento) -> List[Dict[str, Any]]:
+        """
+        Horas usadas y restantes de cada cuota que afecta al evento, contándolo
+        (ver RestriccionCuota.estado). Vacía si no le afecta ninguna
+        """
+        return [r.estado(self.gestor_eventos, evento)
+                for r in obtener_restricciones_por_tipo(self.restricciones, RestriccionCuota) if r.aplica_a(evento)]
+
+    @property
+    def disponibilidad(self) -> MapaDisponibilidad:
+        """
+        Mapa de ocupación por franjas de los gestores actuales. Se vuelve a crear si se
+        sustituye alguno de ellos (carga de datos, restauración de un backup...)
+        """
+        mapa = self._disponibilidad
+        if mapa is None or mapa.gestor_eventos is not self.gestor_eventos or mapa.gestor_recursos is not self.gestor_recursos:
+            if mapa is not None and mapa.gestor_eventos is self.gestor_eventos:
+                mapa.desconectar()
+            mapa = self._disponibilidad = MapaDisponibilidad(self.gestor_eventos, self.gestor_recursos)
+        return mapa
+
+    @property
+    def contabilidad(self) -> Contabilidad:
+        """
+        Contabilidad de energía y costes de los gestores actuales. Se vuelve a crear si se
+        sustituye alguno de ellos, como el mapa de disponibilidad
+        """
+        contabilidad = self._contabilidad
+        if (contabilidad is None or contabilidad.gestor_eventos is not self.gestor_eventos
+                or contabilidad.gestor_recursos is not self.gestor_recursos):
+            if contabilidad is not None and contabilidad.gestor_eventos is self.gestor_eventos:
+                contabilidad.desconectar()
+            contabilidad = self._contabilidad = Contabilidad(self.gestor_eventos, self.gestor_recursos)
+        return contabilidad
+
+    @property
+    def demanda(self) -> DemandaSemanal:
+        """Demanda histórica por hora de la semana del gestor actual (se vuelve a crear si se sustituye)"""
+        demanda = self._demanda
+        if demanda is None or demanda.gestor_eventos is not self.gestor_eventos:
+            if demanda is not None:
+                demanda.desconectar()
+            demanda = self._demanda = DemandaSemanal(self.gestor_eventos)
+        return demanda
+
+    @instrumentar()
     def verificar_conflictos(self, nuevo_evento: Evento) -> Tuple[bool, List[str]]:
         errores = []
         
@@ -179,6 +331,12 @@ class Planificador:
         demanda_nuevo = {}
         for r in nuevo_evento.recursos:
             demanda_nuevo[r.id] = demanda_nuevo.get(r.id, 0) + 1
+        
+        # Eventos y ocurrencias de series que se solapan con el nuevo (consulta por rango
+        # sobre el índice ordenado, sin recorrer todos los eventos)
+        solapados = [ev for ev in self.gestor_eventos.eventos_solapados(nuevo_evento)
+                     if ev.estado not in ('cancelado', 'caducado')]
+        contar("conflictos.eventos_examinados", len(solapados))
             
         # Verificar cada recurso solicitado
         for id_recurso, cantidad_solicitada in demanda_nuevo.items():
@@ -187,14 +345,8 @@ class Planificador:
                 errores.append(f"Recurso {id_recurso} no existe.")
                 continue
 
-            # Obtener solo los eventos que usan este recurso y se solapan con el nuevo
-            eventos_interes = [
-                ev for ev in self.gestor_eventos.eventos.values()
-                if ev.id != nuevo_evento.id 
-                and ev.estado != 'cancelado'
-                and ev.se_solapa_con(nuevo_evento)
-                and any(r.id == id_recurso for r in ev.recursos)
-            ]
+            # Obtener solo los eventos que usan este recurso
+            eventos_interes = [ev for ev in solapados if any(r.id == id_recurso for r in ev.recursos)]
 
             # Creamos una lista de puntos de tiempo importantes (inicio y fin de cada evento)
             # para ver cuántos están activos simultáneamente.
@@ -234,8 +386,14 @@ class Planificador:
                     f"Se requieren {max_uso_detectado} simultáneos, capacidad máxima {recurso.capacidad}."
                 )
 
+        # Restricciones que dependen de la agenda (potencia simultánea, exclusiones entre
+        # eventos): cada una consulta su propio índice, sin recorrer los eventos solapados
+        errores.extend(r.mensaje_error() for r in restricciones_de_agenda(self.restricciones)
+                       if not r.es_valida_en(nuevo_evento.recursos, nuevo_evento, self.gestor_eventos))
+
         return len(errores) == 0, errores
     
+    @instrumentar()
     def buscar_hueco_automático(
         self,
         nombre: str,
@@ -254,10 +412,21 @@ class Planificador:
         
         # Buscar en los próximos 7 días
         limite_busqueda = tiempo_actual + timedelta(days=7)
+        demanda = {}
+        for recurso in recursos:
+            demanda[recurso.id] = demanda.get(recurso.id, 0) + 1
+        ocupado = self.disponibilidad.ventana_ocupada(demanda, tiempo_actual, limite_busqueda + duracion)
+        iteraciones = 0
         while tiempo_actual < limite_busqueda:
             # Intenta para cada 10 minutos 
             tiempo_intento = tiempo_actual
             tiempo_fin_intento = tiempo_actual + duracion
+            
+            # Descartar sin verificar los intentos que el mapa de disponibilidad ya sabe ocupados
+            if ocupado.ocupado(tiempo_intento, tiempo_fin_intento):
+                tiempo_actual += timedelta(minutes=10)
+                continue
+            iteraciones += 1
         
             # Crear evento de prueba
             evento_prueba = Evento(
@@ -288,7 +457,8 @@ class Planificador:
                         prioridad = prioridad
                     )
                     
-                    if self.gestor_eventos.agregar_evento(evento):
+                    if self._ejecutar(AgregarEvento(evento)):
+                        self._registrar_busqueda(iteraciones)
                         return {
                             'success': True,
                             'message': f"Evento planificado automáticamente en el hueco encontrado",
@@ -303,29 +473,50 @@ class Planificador:
             # Avanzar 10 minutos
             tiempo_actual += timedelta(minutes=10)
             
+        self._registrar_busqueda(iteraciones)
         return {
             'success': False,
             'message': f"No se encontró hueco disponible en los próximos 7 días"
         }
         
+    @instrumentar()
     def buscar_hueco_disponible(
         self, 
         recursos_con_cantidad: Dict[str, int], 
         duracion_horas: float, 
         inicio_busqueda: Optional[datetime] = None, 
-        dias: int = 7
+        dias: int = 7,
+        fin_busqueda: Optional[datetime] = None,
+        max_resultados: Optional[int] = None,
+        tipo: Optional[str] = None,
+        recomendar: bool = False,
+        purgar: bool = True
         )->List[Dict[str, Any]]:
         """
         Busca huecos disponibles para un conjunto de recursos.
+        Args:
+            fin_busqueda: límite exacto de la búsqueda (si se indica, sustituye a 'dias')
+            max_resultados: detiene la búsqueda al encontrar esta cantidad de huecos
+            tipo: tipo del evento que se quiere ubicar (para las cuotas limitadas a un tipo de
+                evento). Con None no se tienen en cuenta esas cuotas, solo las de cualquier tipo
+            recomendar: en lugar de los huecos más tempranos, los de menor contención histórica
+                de los recursos (ver _recomendar_huecos); por defecto HUECOS_RECOMENDADOS
+            purgar: retirar antes las retenciones caducadas. Con False la búsqueda solo lee
+                (quien llama ya las retiró, p. ej. PlanificadorAsincrono con los cerrojos tomados)
         Returns:
             Lista de dicts con {'inicio': datetime, 'fin': datetime, 'duracion_horas': float}
+            y, si le afecta alguna cuota, 'cuotas' (ver estado_cuotas). Al recomendar, además
+            'contencion', y ordenados de menor a mayor contención
         """
         # Validar entrada
         if inicio_busqueda is None:
             inicio_busqueda = datetime.now()
+        # El mapa de disponibilidad cuenta las retenciones hasta que se retiran
+        if purgar:
+            self.purgar_retenciones()
         
         # Calcular límite 
-        limite_final = inicio_busqueda + timedelta(days=dias)
+        limite_final = fin_busqueda if fin_busqueda is not None else inicio_busqueda + timedelta(days=dias)
         
         # Aplanar recursos (igual que en planificador_evento)
         recursos = []
@@ -344,44 +535,369 @@ class Planificador:
         duracion = timedelta(hours=duracion_horas)
         huecos = []
         tiempo_actual = inicio_busqueda
+        iteraciones = 0
+        demanda = {recurso_id: cantidad for recurso_id, cantidad in recursos_con_cantidad.items()
+                   if self.gestor_recursos.obtener_recurso(recurso_id)}
+        ocupado = self.disponibilidad.ventana_ocupada(demanda, inicio_busqueda, limite_final)
+        
+        if recomendar:
+            return self._recomendar_huecos(recursos, demanda, duracion_horas, inicio_busqueda, limite_final,
+                                           ocupado, max_resultados or self.HUECOS_RECOMENDADOS, tipo)
         
         # Búsqueda inteligente: mientras quepa un hueco completo
         while tiempo_actual + duracion <= limite_final:
             tiempo_fin = tiempo_actual + duracion
             
-            # Crear evento de prueba
-            evento_prueba = Evento(
-                nombre="prueba_hueco",
-                inicio=tiempo_actual,
-                fin=tiempo_fin,
-                recursos=recursos,
-                tipo="entrenamiento"
-            )
-            
-            # Verificar conflictos
-            sin_conflictos, errores = self.verificar_conflictos(evento_prueba)
+            # Los intentos que el mapa de disponibilidad ya sabe ocupados no se verifican
+            if ocupado.ocupado(tiempo_actual, tiempo_fin):
+                tiempo_actual += timedelta(minutes=10)
+                continue
+            iteraciones += 1
             
-            if sin_conflictos:
-                # Validar restricciones
-                es_valido, mensajes_error = validar_restricciones(
-                    recursos, evento_prueba, self.restricciones
-                )
-                
-                if es_valido:
-                    # Agregar hueco disponible
-                    huecos.append({
-                        'inicio': tiempo_actual,
-                        'fin': tiempo_fin,
-                        'duracion_horas': duracion_horas
-                    })
-                    # Saltar al final el hueco para evitar redundancias
-                    tiempo_actual = tiempo_fin
+            hueco = self._probar_hueco(recursos, tiempo_actual, tiempo_fin, duracion_horas, tipo)
+            if hueco is not None:
+                huecos.append(hueco)
+                if max_resultados is not None and len(huecos) >= max_resultados:
+                    break
+                # Saltar al final el hueco para evitar redundancias
+                tiempo_actual = tiempo_fin
+            else:
+                # Con una cuota superada, los inicios anteriores a su retraso mínimo también
+                # la superan: se saltan (en pasos enteros de 10 minutos)
+                retraso = self._retraso_cuotas(recursos, tiempo_actual, tiempo_fin, tipo)
+                tiempo_actual += (retraso // timedelta(minutes=10)) * timedelta(minutes=10)
                     
             # Si hay conflicto o no es válido, avanzar 10 minutos
             tiempo_actual += timedelta(minutes=10)
         
+        self._registrar_busqueda(iteraciones)
+        return huecos
+
+    @staticmethod
+    def _evento_prueba(recursos: List[Recurso], inicio: datetime, fin: datetime, tipo: Optional[str]) -> Evento:
+        """
+        Evento de prueba de la búsqueda de huecos. Sin tipo (None) no se valida: ninguna
+        cuota limitada a un tipo de evento lo cuenta
+        """
+        if tipo is None:
+            return Evento.sin_validar(generar_id("evento"), "prueba_hueco", inicio, fin, recursos,
+                                      None, "", 1, {})
+        return Evento(nombre="prueba_hueco", inicio=inicio, fin=fin, recursos=recursos, tipo=tipo)
+
+    def _probar_hueco(self, recursos: List[Recurso], inicio: datetime, fin: datetime,
+                      duracion_horas: float, tipo: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Hueco [inicio, fin) si una reserva de esos recursos no tiene conflictos ni incumple restricciones"""
+        evento_prueba = self._evento_prueba(recursos, inicio, fin, tipo)
+        
+        # Verificar conflictos y validar restricciones
+        sin_conflictos, _ = self.verificar_conflictos(evento_prueba)
+        if not sin_conflictos:
+            return None
+        es_valido, _ = validar_restricciones(recursos, evento_prueba, self.restricciones)
+        if not es_valido:
+            return None
+        
+        hueco = {
+            'inicio': inicio,
+            'fin': fin,
+            'duracion_horas': duracion_horas
+        }
+        cuotas = self.estado_cuotas(evento_prueba)
+        if cuotas:
+            hueco['cuotas'] = cuotas
+        return hueco
+
+    def _retraso_cuotas(self, recursos: List[Recurso], inicio: datetime, fin: datetime,
+                        tipo: Optional[str]) -> timedelta:
+        """Cuánto hay que retrasar como mínimo una reserva para que pueda cumplir todas las cuotas"""
+        evento = self._evento_prueba(recursos, inicio, fin, tipo)
+        return max((r.retraso_minimo(self.gestor_eventos, evento)
+                    for r in obtener_restricciones_por_tipo(self.restricciones, RestriccionCuota)),
+                   default=timedelta(0))
+
+    def _recomendar_huecos(self, recursos: List[Recurso], demanda: Dict[str, int], duracion_horas: float,
+                           inicio_busqueda: datetime, limite_final: datetime, ocupado: VentanaOcupacion,
+                           max_resultados: int, tipo: Optional[str]) -> List[Dict[str, Any]]:
+        """
+        Huecos que no se solapan entre sí con la menor contención histórica de los recursos
+        (ocupación media de su capacidad a esas horas de la semana, ver DemandaSemanal).
+        Todos los inicios posibles cada 10 minutos se puntúan en O(1) y se verifican de
+        mejor a peor hasta reunir 'max_resultados' o agotar PRESUPUESTO_RECOMENDACION
+        """
+        duracion = timedelta(hours=duracion_horas)
+        perfil = self.demanda.perfil(demanda, self.gestor_recursos)
+        candidatos = []
+        tiempo_actual = inicio_busqueda
+        while tiempo_actual + duracion <= limite_final:
+            tiempo_fin = tiempo_actual + duracion
+            # Los que el mapa de disponibilidad ya sabe ocupados ni se puntúan
+            if not ocupado.ocupado(tiempo_actual, tiempo_fin):
+                candidatos.append((perfil.media(tiempo_actual, tiempo_fin), tiempo_actual))
+            tiempo_actual += timedelta(minutes=10)
+        # A igual contención, antes el más temprano
+        candidatos.sort()
+        
+        huecos = []
+        iteraciones = 0
+        for contencion, inicio in candidatos:
+            if len(huecos) >= max_resultados or iteraciones >= self.PRESUPUESTO_RECOMENDACION:
+                break
+            fin = inicio + duracion
+            if any(inicio < hueco['fin'] and hueco['inicio'] < fin for hueco in huecos):
+                continue
+            iteraciones += 1
+            hueco = self._probar_hueco(recursos, inicio, fin, duracion_horas, tipo)
+            if hueco is not None:
+                hueco['contencion'] = round(contencion, 3)
+                huecos.append(hueco)
+        
+        self._registrar_busqueda(iteraciones)
         return huecos
+
+    @staticmethod
+    def _registrar_busqueda(iteraciones: int):
+        """Anota los candidatos probados por una búsqueda de huecos (diagnóstico y métricas)"""
+        contar("huecos.candidatos_probados", iteraciones)
+        ITERACIONES_HUECOS.observar(iteraciones)
+        
+    @instrumentar()
+    def planificar_serie(
+        self,
+        nombre: str,
+        inicio: datetime,
+        fin: datetime,
+        recursos_seleccionados: Dict[str, int],
+        tipo: str,
+        frecuencia: str = "semanal",
+        intervalo: int = 1,
+        dias_semana: Optional[List[int]] = None,
+        repetir_hasta: Optional[datetime] = None,
+        repeticiones: Optional[int] = None,
+        descripcion: str = "",
+        prioridad: int = 1,
+        omitir_conflictos: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Planifica una serie recurrente como un único registro
+        'inicio' y 'fin' delimitan la primera ocurrencia. Se comprueban las ocurrencias
+        hasta el final de la serie o, si no tiene fin, durante HORIZONTE_SERIES
+        Args:
+            omitir_conflictos: en lugar de rechazar la serie, anula las ocurrencias en conflicto
+        Return: Resultado de la operación (con 'conflictos': inicios de las ocurrencias en conflicto)
+        """
+        resultado = {
+            "success": False,
+            "message": "",
+            "serie": None,
+            "conflictos": []
+        }
+        
+        try:
+            if inicio < datetime.now() - timedelta(minutes=5):
+                resultado['message'] = 'La fecha de inicio no puede ser en el pasado(a menos que sea 5 minutos antes de la fecha actual)'
+                return resultado
+            
+            # Obtener recursos (igual que en planificar_evento)
+            recursos = []
+            for recurso_id, cantidad in recursos_seleccionados.items():
+                recurso = self.gestor_recursos.obtener_recurso(recurso_id)
+                if not recurso:
+                    resultado["message"] = f"Recurso {recurso_id} no encontrado"
+                    return resultado
+                if cantidad > recurso.capacidad:
+                    resultado["message"] = "La cantidad solicitada supera la capacidad"
+                    return resultado
+                recursos.extend([recurso] * cantidad)
+            
+            serie = SerieRecurrente(
+                nombre = nombre,
+                inicio = inicio,
+                duracion = fin - inicio,
+                recursos = recursos,
+                tipo = tipo,
+                frecuencia = frecuencia,
+                intervalo = intervalo,
+                dias_semana = dias_semana or [],
+                repetir_hasta = repetir_hasta,
+                repeticiones = repeticiones,
+                descripcion = descripcion,
+                prioridad = prioridad
+            )
+            
+            # Las restricciones dependen de los recursos y del tipo, iguales en todas las ocurrencias
+            violadas = restricciones_violadas(recursos, serie._crear_ocurrencia(inicio), self.restricciones)
+            if violadas:
+                resultado["message"] = f'Violación de restricciones: {", ".join(r.mensaje_error() for r in violadas)}'
+                return resultado
+            
+            conflictos = self._conflictos_serie(serie)
+            resultado["conflictos"] = [inicio_ocurrencia for inicio_ocurrencia, _ in conflictos]
+            if conflictos and not omitir_conflictos:
+                inicio_conflicto, errores = conflictos[0]
+                resultado["message"] = (
+                    f"{len(conflictos)} ocurrencias en conflicto; la primera el "
+                    f"{inicio_conflicto.strftime('%d/%m/%Y %H:%M')}: {errores}"
+                )
+                return resultado
+            
+            for inicio_ocurrencia, _ in conflictos:
+                serie.excepciones.add(inicio_ocurrencia)
+            
+            if self._ejecutar(AgregarSerie(serie)):
+                resultado["success"] = True
+                resultado["serie"] = serie
+                resultado["message"] = "Serie agregada exitosamente"
+                if conflictos:
+                    resultado["message"] += f" ({len(conflictos)} ocurrencias en conflicto anuladas)"
+            else:
+                resultado["message"] = "Error al agregar la serie"
         
+        except Exception as e:
+            resultado["message"] = f"Error: {str(e)}"
+        
+        return resultado
+    
+    def _conflictos_serie(self, serie: SerieRecurrente) -> List[Tuple[datetime, List[str]]]:
+        """Ocurrencias de la serie (dentro del horizonte de comprobación) que no caben"""
+        limite = serie.inicio + self.HORIZONTE_SERIES if serie.es_infinita else None
+        conflictos = []
+        for ocurrencia in serie.ocurrencias(serie.inicio, limite):
+            sin_conflictos, errores = self.verificar_conflictos(ocurrencia)
+            if not sin_conflictos:
+                conflictos.append((ocurrencia.inicio, errores))
+        return conflictos
+    
+    @instrumentar()
+    def anular_ocurrencia(self, serie_id: str, inicio: datetime) -> bool:
+        """Anula una sola ocurrencia de una serie (la serie sigue vigente)"""
+        return self._ejecutar(AnularOcurrencia(serie_id, inicio))
+    
+    @instrumentar()
+    def eliminar_serie(self, serie_id: str) -> bool:
+        """Elimina una serie recurrente con todas sus ocurrencias"""
+        serie = self.gestor_eventos.obtener_serie(serie_id)
+        return serie is not None and self._ejecutar(EliminarSerie(serie))
+    
+    # --- Retenciones provisionales ---
+    
+    @property
+    def retenciones(self) -> Retenciones:
+        """Caducidades de las retenciones del gestor actual (se reconstruyen si se sustituye)"""
+        if self._retenciones is None or self._retenciones.gestor_eventos is not self.gestor_eventos:
+            self._retenciones = Retenciones(self.gestor_eventos)
+        return self._retenciones
+    
+    def purgar_retenciones(self) -> int:
+        """Retira las retenciones caducadas. Returns: cuántas se retiraron"""
+        retenciones = self.retenciones
+        if retenciones.proxima() > datetime.now():
+            return 0
+        return len(retenciones.purgar(datetime.now()))
+    
+    def retener(
+        self,
+        recursos_seleccionados: Dict[str, int],
+        inicio: datetime,
+        fin: datetime,
+        tipo: str,
+        nombre: str = "Reserva provisional",
+        duracion: Optional[timedelta] = None
+    ) -> Dict[str, Any]:
+        """
+        Ocupa los recursos durante [inicio, fin) mientras se completa la reserva. La
+        retención pasa todas las comprobaciones de planificar_evento y cuenta como
+        ocupación hasta que se confirma, se libera o caduca (DURACION_RETENCION por defecto).
+        No queda en el historial de deshacer
+        Returns: {'success', 'message', 'retencion' (el evento provisional), 'expira'}
+        """
+        resultado = {"success": False, "message": "", "retencion": None, "expira": None}
+        try:
+            self.purgar_retenciones()
+            comprobacion = self.comprobar_evento(nombre, inicio, fin, recursos_seleccionados, tipo)
+            if not comprobacion["success"]:
+                resultado["message"] = comprobacion["message"]
+                return resultado
+            
+            evento = comprobacion["evento"]
+            expira = datetime.now() + (duracion or self.DURACION_RETENCION)
+            evento.metadata["retencion"] = expira.isoformat()
+            self.gestor_eventos.agregar_evento(evento)
+            self.retenciones.agregar(evento)
+            resultado.update(success=True, message=f"Recursos retenidos hasta las {expira.strftime('%H:%M')}",
+                             retencion=evento, expira=expira)
+        except Exception as e:
+            resultado["message"] = f"Error: {str(e)}"
+        return resultado
+    
+    def confirmar_retencion(
+        self,
+        retencion_id: str,
+        nombre: str,
+        tipo: str,
+        descripcion: str = "",
+        prioridad: int = 1
+    ) -> Dict[str, Any]:
+        """
+        Convierte una retención vigente en un evento definitivo con el mismo id. Los
+        recursos y el horario ya se comprobaron al retener y desde entonces nadie más
+        ha podido ocuparlos, así que no se vuelven a validar los conflictos. Las
+        restricciones sí pueden depender del tipo (p. ej. las cuotas de un tipo de
+        evento): si cambia respecto a la retención se vuelven a comprobar, también
+        junto a la agenda
+        Return: Resultado de la operación (como planificar_evento)
+        """
+        resultado = {"success": False, "message": "", "evento": None, "detalles": {}}
+        motivos = ["validacion"]
+        try:
+            self.purgar_retenciones()
+            retencion = self.gestor_eventos.obtener_evento(retencion_id)
+            if retencion is None or retencion.estado != 'retenido':
+                motivos = ["retencion_caducada"]
+                resultado["message"] = "La retención no existe o ya ha caducado"
+                return resultado
+            
+            evento = Evento(
+                id = retencion.id,
+                nombre = nombre,
+                inicio = retencion.inicio,
+                fin = retencion.fin,
+                recursos = list(retencion.recursos),
+                tipo = tipo,
+                descripcion = descripcion,
+                prioridad = prioridad
+            )
+            self.gestor_eventos.eliminar_evento(retencion_id)
+            if tipo != retencion.tipo:
+                violadas = restricciones_violadas(evento.recursos, evento, self.restricciones, self.gestor_eventos)
+                if violadas:
+                    motivos = [type(r).__name__ for r in violadas]
+                    resultado["message"] = f'Violación de restricciones: {", ".join(r.mensaje_error() for r in violadas)}'
+                    self.gestor_eventos.agregar_evento(retencion)
+                    return resultado
+            resultado = self.agregar_evento_comprobado(evento)
+            if not resultado["success"]:
+                motivos = ["error"]
+                self.gestor_eventos.agregar_evento(retencion)
+        except Exception as e:
+            motivos = ["error"]
+            resultado["message"] = f"Error: {str(e)}"
+        finally:
+            registrar_reserva(resultado.get("success", False), motivos)
+        return resultado
+    
+    def liberar_retencion(self, retencion_id: str) -> bool:
+        """Deja libres los recursos de una retención sin esperar a que caduque"""
+        retencion = self.gestor_eventos.obtener_evento(retencion_id)
+        if retencion is None or retencion.retencion is None:
+            return False
+        return self.gestor_eventos.eliminar_evento(retencion_id)
+    
+    @instrumentar()
+    def listar_series(self) -> List[SerieRecurrente]:
+        """Series recurrentes ordenadas por inicio"""
+        return sorted(self.gestor_eventos.series.values(), key=lambda s: s.inicio)
+    
+    @instrumentar()
     def listar_eventos(self, dias: int = 1) ->List[Evento]:
         """Organiza los próximos eventos"""
         
@@ -394,10 +910,40 @@ class Planificador:
         
         return eventos
     
+    def paginas_eventos(self, dias: int = 1, tamano: int = 500) -> Iterator[List[Evento]]:
+        """
+        Los mismos eventos que listar_eventos y en el mismo orden, por páginas de unos
+        'tamano' eventos recorridas en el índice ordenado, sin construir la lista entera
+        """
+        ahora = datetime.now()
+        fin_rango = ahora + timedelta(days=dias)
+        
+        por_inicio = lambda e: e.inicio
+        # Las ocurrencias de las series se intercalan en la página que les corresponde
+        ocurrencias = sorted(self.gestor_eventos.ocurrencias_series(ahora, fin_rango), key=por_inicio)
+        cursor = None
+        while True:
+            pagina, cursor = self.gestor_eventos.paginar(
+                limite=tamano, cursor=cursor, desde=ahora - DURACION_MAXIMA_EVENTO, hasta=fin_rango,
+                filtro=lambda e: e.fin >= ahora, descendente=False)
+            if cursor is None:
+                pagina = list(heapq.merge(pagina, ocurrencias, key=por_inicio))
+            else:
+                # Las que empiezan a la vez que el último de la página van después (como en el sort estable)
+                corte = bisect_left(ocurrencias, pagina[-1].inicio, key=por_inicio)
+                pagina = list(heapq.merge(pagina, ocurrencias[:corte], key=por_inicio))
+                ocurrencias = ocurrencias[corte:]
+            if pagina:
+                yield pagina
+            if cursor is None:
+                return
+    
+    @instrumentar()
     def listar_recursos(self) ->List[Recurso]:
         """Lista todos los recursos disponibles"""
         return list(self.gestor_recursos.recursos.values())
     
+    @instrumentar()
     def obtener_agenda_recurso(self, recurso_id: str, dias: int = 7) -> List[Evento]:
         """
         Devuelve todos los eventos planificados en los siguientes días, 
@@ -417,28 +963,251 @@ class Planificador:
         eventos_filtrados = [e for e in eventos_recurso 
                              if ahora <= e.inicio <= fin_rango]
         
+        # Ocurrencias de las series que usan el recurso, solo las del rango
+        eventos_filtrados.extend(e for e in self.gestor_eventos.ocurrencias_series(ahora, fin_rango, recurso.id)
+                                 if e.inicio >= ahora)
+        
         # Ordenar los eventos filtrados por fecha
         eventos_filtrados.sort(key=lambda e: e.inicio)
         
         return eventos_filtrados
     
+    @instrumentar()
     def eliminar_evento(self, evento_id) ->bool:
         """Elimina el evento por ID"""
-        return self.gestor_eventos.eliminar_evento(evento_id)
+        evento = self.gestor_eventos.obtener_evento(evento_id)
+        return evento is not None and self._ejecutar(EliminarEvento(evento))
+    
+    @instrumentar()
+    def mover_evento(self, evento_id: str, nuevo_inicio: datetime) -> Dict[str, Any]:
+        """
+        Cambia la fecha de un evento manteniendo su duración y sus recursos
+        Si el nuevo horario entra en conflicto el evento se queda donde estaba
+        """
+        resultado = {"success": False, "message": "", "evento": None}
+        evento = self.gestor_eventos.obtener_evento(evento_id)
+        if evento is None:
+            resultado["message"] = f"Evento {evento_id} no encontrado"
+            return resultado
+        
+        try:
+            movido = replace(evento, inicio=nuevo_inicio, fin=nuevo_inicio + evento.duracion,
+                             metadata=dict(evento.metadata))
+        except ValueError as e:
+            resultado["message"] = f"Error: {str(e)}"
+            return resultado
+        
+        # verificar_conflictos ignora el evento con el mismo id (la versión sin mover)
+        sin_conflictos, errores = self.verificar_conflictos(movido)
+        es_valido, mensajes_error = validar_restricciones(movido.recursos, movido, self.restricciones)
+        if not (sin_conflictos and es_valido):
+            resultado["message"] = f"{errores + mensajes_error}"
+            return resultado
+        
+        self._ejecutar(ModificarEvento(evento, movido))
+        resultado.update(success=True, message="Evento movido exitosamente", evento=movido)
+        return resultado
+    
+    @instrumentar()
+    def cancelar_evento(self, evento_id: str) -> bool:
+        """Cancela un evento (se puede deshacer o reactivar después)"""
+        return self._ejecutar(CancelarEvento(evento_id))
+    
+    @instrumentar()
+    def reactivar_evento(self, evento_id: str) -> Dict[str, Any]:
+        """Reactiva un evento cancelado si sus recursos siguen libres"""
+        resultado = {"success": False, "message": ""}
+        evento = self.gestor_eventos.obtener_evento(evento_id)
+        if evento is None or evento.estado != 'cancelado':
+            resultado["message"] = "Solo se pueden reactivar eventos cancelados"
+            return resultado
+        
+        sin_conflictos, errores = self.verificar_conflictos(evento)
+        es_valido, errores_rest = validar_restricciones(evento.recursos, evento, self.restricciones)
+        if not (sin_conflictos and es_valido):
+            resultado["message"] = f"No se puede reactivar debido a conflictos: {', '.join(errores + errores_rest)}"
+            return resultado
+        
+        resultado["success"] = self._ejecutar(ReactivarEvento(evento_id))
+        resultado["message"] = "Evento reactivado" if resultado["success"] else "Error al reactivar el evento"
+        return resultado
+    
+    # --- Historial de cambios ---
+    
+    def _ejecutar(self, comando: Comando) -> bool:
+        """Aplica una mutación y la anota en el historial (y, a través de él, en el diario)"""
+        return self.historial.ejecutar(comando, self.gestor_eventos)
+    
+    def _errores_ocupacion(self, ocupados: List[Any]) -> List[str]:
+        """Conflictos de los eventos o series que vuelven a ocupar recursos"""
+        errores = []
+        for ocupado in ocupados:
+            if ocupado.estado == 'cancelado':
+                continue
+            if isinstance(ocupado, SerieRecurrente):
+                for _, errores_serie in self._conflictos_serie(ocupado)[:1]:
+                    errores.extend(errores_serie)
+            else:
+                errores.extend(self.verificar_conflictos(ocupado)[1])
+        return errores
+    
+    def _deshacer_o_rehacer(self, deshacer: bool) -> Dict[str, Any]:
+        errores: List[str] = []
+        
+        def validar(comando: Comando, revertido: bool) -> bool:
+            # Lo que se recupera puede chocar con reservas hechas después
+            errores.extend(self._errores_ocupacion(comando.ocupados(revertido)))
+            return not errores
+        
+        if deshacer:
+            descripcion = self.historial.siguiente_deshacer()
+            comando = self.historial.deshacer(self.gestor_eventos, validar)
+        else:
+            descripcion = self.historial.siguiente_rehacer()
+            comando = self.historial.rehacer(self.gestor_eventos, validar)
+        
+        if descripcion is None:
+            return {"success": False, "message": f"No hay nada que {'deshacer' if deshacer else 'rehacer'}"}
+        if comando is None:
+            motivo = f": {', '.join(errores)}" if errores else ""
+            return {"success": False, "message": f"No se pudo {'deshacer' if deshacer else 'rehacer'} "
+                                                 f"«{descripcion}»{motivo}"}
+        return {"success": True, "message": f"{'Deshecho' if deshacer else 'Rehecho'}: {descripcion}"}
+    
+    @instrumentar()
+    def deshacer(self) -> Dict[str, Any]:
+        """Deshace la última mutación (si lo recuperado no choca con reservas posteriores)"""
+        return self._deshacer_o_rehacer(True)
+    
+    @instrumentar()
+    def rehacer(self) -> Dict[str, Any]:
+        """Vuelve a aplicar la última mutación deshecha"""
+        return self._deshacer_o_rehacer(False)
+    
+    def _anotar_en_diario(self, comando: Comando, revertido: bool):
+        if self._diario is None:
+            return
+        try:
+            self._diario.registrar(self.revision, {
+                "operacion": "revertir" if revertido else "aplicar",
+                "comando": comando.to_dict()
+            })
+        except OSError as e:
+            print(f"Error al escribir en el diario: {e}")
+    
+    def _reproducir_diario(self, ruta_archivo: str) -> int:
+        """
+        Aplica los cambios anotados después del último guardado completo por sesiones que
+        terminaron sin guardar. Sin diario propio se aplican sin hacerlos suyos
+        """
+        diario = self._diario if self._diario is not None else Diario(ruta_archivo)
+        aplicadas = 0
+        for entrada in diario.recuperar(self.revision, adoptar=self._diario is not None):
+            try:
+                comando = Comando.from_dict(entrada["comando"], self.gestor_recursos)
+            except (KeyError, TypeError, ValueError) as e:
+                print(f" Entrada del diario no válida: {e}")
+                continue
+            if entrada.get("operacion") == "revertir":
+                aplicadas += comando.revertir(self.gestor_eventos)
+            else:
+                aplicadas += comando.aplicar(self.gestor_eventos)
+        return aplicadas
+    
+    # --- Bifurcaciones ("¿qué pasaría si...?") ---
+    
+    def bifurcar(self) -> 'Planificador':
+        """
+        Planificador independiente para probar cambios sin tocar los datos reales. Es O(1):
+        los eventos se comparten con este planificador y solo se copian al modificarse.
+        Los recursos y las restricciones también se comparten y no deben modificarse en la
+        bifurcación. Una bifurcación no se guarda en disco; sus cambios se traen con fusionar()
+        """
+        bifurcacion = copy.copy(self)
+        bifurcacion.gestor_eventos = GestorEventosBifurcado(self.gestor_eventos)
+        bifurcacion.restricciones = list(self.restricciones)
+        bifurcacion.advertencias_carga = []
+        bifurcacion.advertencias_guardado = []
+        bifurcacion._archivo_revision = None
+        bifurcacion.origen = self
+        # Historial propio y sin diario: los cambios de la bifurcación no llegan a disco
+        bifurcacion.historial = Historial()
+        bifurcacion._diario = None
+        bifurcacion._disponibilidad = None
+        bifurcacion._contabilidad = None
+        bifurcacion._demanda = None
+        return bifurcacion
+    
+    def diferencias(self) -> Diferencias:
+        """Cambios de esta bifurcación respecto al planificador del que se bifurcó"""
+        if self.origen is None:
+            return Diferencias()
+        return self.gestor_eventos.diferencias()
+    
+    @instrumentar()
+    def fusionar(self, bifurcacion: 'Planificador') -> Dict[str, Any]:
+        """
+        Aplica aquí los cambios de una bifurcación de este planificador. Los eventos y series
+        añadidos o modificados se vuelven a validar, por si este planificador cambió después
+        de bifurcar; los que ahora entran en conflicto se descartan y se informa en 'rechazados'
+        """
+        resultado = {"success": False, "message": "", "aplicados": 0, "rechazados": []}
+        if bifurcacion.origen is not self:
+            resultado["message"] = "Solo se pueden fusionar bifurcaciones de este planificador"
+            return resultado
+        
+        diferencias = bifurcacion.diferencias()
+        # Se fusionan copias: la bifurcación puede seguir usándose sin afectar a este planificador
+        cambiados = [copiar_evento(e) for e in (
+            *diferencias.eventos_agregados, *(nuevo for _, nuevo in diferencias.eventos_modificados)
+        )]
+        series_cambiadas = [copiar_serie(s) for s in (
+            *diferencias.series_agregadas, *(nueva for _, nueva in diferencias.series_modificadas)
+        )]
+        
+        comandos, rechazados = self._aplicar_cambios(
+            [e.id for e in diferencias.eventos_eliminados], cambiados,
+            [s.id for s in diferencias.series_eliminadas], series_cambiadas,
+            "no se fusionó porque entra en conflicto con el estado actual"
+        )
+        if comandos:
+            # La fusión entera se deshace de una vez
+            self.historial.registrar(Lote(comandos, "Fusionar bifurcación"))
+        total = (len(cambiados) + len(series_cambiadas)
+                 + len(diferencias.eventos_eliminados) + len(diferencias.series_eliminadas))
+        resultado.update(
+            success = not rechazados,
+            aplicados = total - len(rechazados),
+            rechazados = rechazados,
+            message = f"{total - len(rechazados)} cambios fusionados"
+                      + (f", {len(rechazados)} descartados por conflictos" if rechazados else "")
+        )
+        return resultado
     
     def __str__(self):
         """Representación del planificador"""
         return (f"Planificador(recursos: {len(self.gestor_recursos)}," 
-               f"eventos: {len(self.gestor_eventos)})") 
+               f"eventos: {len(self.gestor_eventos)}, series: {len(self.gestor_eventos.series)})") 
         
-    def cargar_datos(self, archivo: str = "datos.json") ->bool:
+    @instrumentar()
+    def cargar_datos(self, archivo: str = "datos.json", diario: bool = True) ->bool:
         """
         Carga los datos usando la clase Persistencia
+        Args:
+            diario: anotar los cambios en el diario de recuperación. False cuando no se van
+                a guardar (simulaciones, API sin guardado), para que no se recuperen después
         Returns:
             True si tuvo éxito al cargar
         """
         ruta_archivo = os.path.join(self.datos_dir, archivo)
         
+        # La revisión se lee antes que los datos: si otro proceso guarda entretanto,
+        # el siguiente guardado detectará el conflicto y se integrarán los cambios
+        self._archivo_revision = ruta_archivo
+        self.revision = Persistencia.leer_revision(ruta_archivo)
+        self._diario = Diario(ruta_archivo) if diario else None
+        self.historial.limpiar()
+        
         # Intentar cargar con Persistencia
         if os.path.exists(ruta_archivo):
         
@@ -454,7 +1223,13 @@ class Planificador:
                     restricciones = crear_restricciones_predeterminadas()
                 
                 self.restricciones = restricciones
+                self._registrar_base()
                 print(f" Datos cargados desde {archivo} - {len(restricciones)} restricciones")
+                
+                # Cambios posteriores al último guardado completo (quedan como cambios locales)
+                recuperados = self._reproducir_diario(ruta_archivo)
+                if recuperados:
+                    print(f" Recuperados {recuperados} cambios del diario")
                 return True
                 
             except Exception as e:
@@ -497,26 +1272,177 @@ class Planificador:
                 print(f"Error al cargar formato antiguo: {e}")
         
         # Si no existe ningún archivo, cargar recursos predeterminados
+        self._huellas_base = {}
         self.cargar_recursos_iniciales()
         print(" Cargados recursos predeterminados (sin datos previos)")
         return False
         
+    @instrumentar()
     def guardar_datos(self, archivo: str = "datos.json") -> bool:
         """
-        Guardar los datos usando la clase Persistencia
+        Guardar los datos usando la clase Persistencia.
+        Si otro proceso guardó el mismo archivo después de cargarlo, se integran los
+        cambios locales sobre el estado más reciente antes de volver a intentarlo
         """
+        if self.origen is not None:
+            print("Una bifurcación no se guarda: sus cambios se aplican con fusionar()")
+            return False
+        
+        # Las retenciones caducadas no se guardan
+        self.purgar_retenciones()
         ruta_archivo = os.path.join(self.datos_dir, archivo)
         
         try:
-            # Usar Persistencia para guardar
-            Persistencia.guardar_sistema(
-                self.gestor_eventos,
-                self.gestor_recursos,
-                self.restricciones,
-                ruta_archivo
-            )
-            return True
+            # Solo se comprueba la revisión del archivo del que proceden los datos;
+            # guardar en otro archivo equivale a exportar y lo sobrescribe
+            if ruta_archivo != self._archivo_revision:
+                Persistencia.guardar_sistema(
+                    self.gestor_eventos,
+                    self.gestor_recursos,
+                    self.restricciones,
+                    ruta_archivo
+                )
+                return True
+            
+            for _ in range(self.MAX_REINTENTOS_GUARDADO):
+                try:
+                    # Usar Persistencia para guardar
+                    self.revision = Persistencia.guardar_sistema(
+                        self.gestor_eventos,
+                        self.gestor_recursos,
+                        self.restricciones,
+                        ruta_archivo,
+                        revision_esperada = self.revision
+                    )
+                    self._registrar_base()
+                    # El guardado completo incluye todo lo que esta sesión anotó en el diario
+                    if self._diario is not None:
+                        self._diario.vaciar()
+                    return True
+                except ConflictoRevision:
+                    self._rebasar(ruta_archivo)
+            
+            print(f"Error al guardar datos: el archivo cambió {self.MAX_REINTENTOS_GUARDADO} veces seguidas")
+            return False
         except Exception as e:
             print(f"Error al guardar datos con Persistencia: {e}")
             return False
+    
+    @staticmethod
+    def _huella(evento: Evento) -> tuple:
+        """Resume los campos de un evento que se comparan para detectar cambios locales"""
+        return (
+            evento.nombre, evento.inicio, evento.fin,
+            tuple(r.id for r in evento.recursos),
+            evento.tipo, evento.descripcion, evento.prioridad,
+            evento.metadata.get("cancelado") is True,
+            evento.metadata.get("retencion")
+        )
+    
+    @staticmethod
+    def _huella_serie(serie: SerieRecurrente) -> str:
+        """La regla completa de la serie: cualquier cambio (incluidas las excepciones) cuenta"""
+        return json.dumps(serie.to_dict(), sort_keys=True, default=str)
+    
+    def _registrar_base(self):
+        """Toma el estado actual como la revisión de referencia para detectar cambios"""
+        self._huellas_base = {e.id: self._huella(e) for e in self.gestor_eventos}
+        self._huellas_series_base = {s.id: self._huella_serie(s) for s in self.gestor_eventos.series.values()}
+    
+    def _rebasar(self, ruta_archivo: str):
+        """
+        Carga el estado guardado por otro proceso y aplica encima los cambios locales.
+        Solo se vuelven a validar los eventos añadidos o modificados localmente; los que
+        ahora entran en conflicto se descartan y se informa en advertencias_guardado
+        """
+        revision, gestor_eventos, gestor_recursos, restricciones, _ = Persistencia.cargar_con_revision(ruta_archivo)
+        
+        # Cambios locales respecto a la revisión de referencia
+        locales = {e.id: e for e in self.gestor_eventos}
+        eliminados = [id_evento for id_evento in self._huellas_base if id_evento not in locales]
+        cambiados = [e for id_evento, e in locales.items()
+                     if self._huellas_base.get(id_evento) != self._huella(e)]
+        series_locales = dict(self.gestor_eventos.series)
+        series_eliminadas = [id_serie for id_serie in self._huellas_series_base if id_serie not in series_locales]
+        series_cambiadas = [s for id_serie, s in series_locales.items()
+                            if self._huellas_series_base.get(id_serie) != self._huella_serie(s)]
+        
+        # El estado recién cargado pasa a ser la nueva referencia
+        self.gestor_eventos = gestor_eventos
+        self.gestor_recursos = gestor_recursos
+        if restricciones:
+            self.restricciones = restricciones
+        self.revision = revision
+        self._registrar_base()
+        
+        _, avisos = self._aplicar_cambios(
+            eliminados, cambiados, series_eliminadas, series_cambiadas,
+            "no se guardó porque otro usuario reservó los mismos recursos"
+        )
+        self.advertencias_guardado.extend(avisos)
+    
+    def _aplicar_cambios(
+        self,
+        eliminados: List[str],
+        cambiados: List[Evento],
+        series_eliminadas: List[str],
+        series_cambiadas: List[SerieRecurrente],
+        motivo_rechazo: str
+    ) -> Tuple[List[Comando], List[str]]:
+        """
+        Aplica sobre el estado actual cambios hechos en otra copia (guardado concurrente o
+        bifurcación). Los eventos y series añadidos o modificados se vuelven a validar; los
+        que ahora entran en conflicto se descartan
+        Returns: (comandos aplicados, avisos de los cambios descartados)
+        """
+        comandos: List[Comando] = []
+        avisos = []
+        
+        def aplicar(comando: Comando):
+            if comando.aplicar(self.gestor_eventos):
+                comandos.append(comando)
+        
+        for id_evento in eliminados:
+            evento = self.gestor_eventos.obtener_evento(id_evento)
+            if evento is not None:
+                aplicar(EliminarEvento(evento))
+        for id_serie in series_eliminadas:
+            serie = self.gestor_eventos.obtener_serie(id_serie)
+            if serie is not None:
+                aplicar(EliminarSerie(serie))
+        
+        for serie in series_cambiadas:
+            serie.recursos = [self.gestor_recursos.obtener_recurso(r.id) or r for r in serie.recursos]
+            previa = self.gestor_eventos.obtener_serie(serie.id)
+            
+            if serie.estado != 'cancelado':
+                # Las ocurrencias de la versión previa no deben contar como conflicto
+                if previa:
+                    self.gestor_eventos.eliminar_serie(serie.id)
+                conflictos = self._conflictos_serie(serie)
+                if previa:
+                    self.gestor_eventos.agregar_serie(previa)
+                if conflictos:
+                    avisos.append(
+                        f"La serie '{serie.nombre}' {motivo_rechazo} "
+                        f"el {conflictos[0][0].strftime('%d/%m/%Y %H:%M')}: {', '.join(conflictos[0][1])}"
+                    )
+                    continue
+            
+            aplicar(ModificarSerie(previa, serie) if previa else AgregarSerie(serie))
+        
+        for evento in cambiados:
+            # Enlazar con las instancias de recursos del estado actual
+            evento.recursos = [self.gestor_recursos.obtener_recurso(r.id) or r for r in evento.recursos]
+            previo = self.gestor_eventos.obtener_evento(evento.id)
+            
+            if evento.estado != 'cancelado':
+                # verificar_conflictos ignora la versión previa (mismo id)
+                sin_conflictos, errores = self.verificar_conflictos(evento)
+                if not sin_conflictos:
+                    avisos.append(f"El evento '{evento.nombre}' {motivo_rechazo}: {', '.join(errores)}")
+                    continue
+            
+            aplicar(ModificarEvento(previo, evento) if previo else AgregarEvento(evento))
         
+        return comandos, avisos
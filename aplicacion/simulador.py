@@ -0,0 +1,430 @@
+"""
+Simulador Monte Carlo de capacidad
+Responde a preguntas como "¿compensa un segundo cluster A100?" o "¿y otro ingeniero de
+MLOps?": se generan flujos de llegada de solicitudes (sintéticos, o remuestreando por
+días el historial de reservas) y se reproducen con las reglas reales del Planificador
+(conflictos, restricciones, cuotas y búsqueda de hueco dentro de la paciencia de cada
+solicitud) sobre copias modificadas del catálogo de recursos y de los límites de
+potencia y cuotas. Cada corrida usa su propia semilla; las corridas se reparten entre procesos y de cada escenario se dan
+percentiles de la tasa de aceptación, la espera y la utilización de cada recurso
+"""
+from __future__ import annotations
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from aplicacion.planificador import Planificador
+from core.perezoso import importar_perezoso
+from dominio.eventos import GestorEventos
+from dominio.potencia import consumo_vatios
+from dominio.recursos import Recurso, GestorRecursos
+from dominio.restricciones import Restriccion, RestriccionPotencia, RestriccionCuota
+from infraestructura.persistencia import Persistencia
+
+np = importar_perezoso("numpy")
+
+# Con menos corridas no compensa arrancar procesos: se simulan en el propio proceso
+MIN_CORRIDAS_PARALELO = 2
+
+# Percentiles que se dan de cada métrica
+PERCENTILES = (5, 50, 95)
+
+# Horario en que se piden las reservas sintéticas (hora de inicio deseada)
+HORA_PRIMERA = 8
+HORA_ULTIMA = 18
+
+# Tipos de solicitud de los flujos sintéticos: (peso, tipo, recursos, horas mínimas, horas máximas).
+# Cumplen las restricciones predeterminadas (co-requisitos, exclusiones y capacidades)
+MEZCLA_PREDETERMINADA: List[Tuple[float, str, Dict[str, int], float, float]] = [
+    (3, "entrenamiento", {"cluster_gpu_a100": 1, "investigador_vision": 1}, 4, 10),
+    (2, "entrenamiento", {"cluster_gpu_v100": 1, "investigador_nlp": 1}, 4, 8),
+    (3, "procesamiento", {"servidor_cpu": 1, "cientifico_datos": 1}, 2, 6),
+    (2, "investigación", {"lab_datos_sensibles": 1, "cientifico_datos": 1}, 2, 4),
+    (2, "inferencia", {"servidor_externo": 1, "ingeniero_mlops": 1}, 1, 4),
+    (1, "inferencia", {"sala_servidores": 1, "ingeniero_mlops": 1, "estacion_trabajo": 1}, 1, 3),
+    (3, "reunión", {"sala_reuniones": 1, "investigador_vision": 1, "investigador_nlp": 1}, 1, 2),
+    (1, "seminario", {"lab_prototipado": 1, "robot_aprendizaje": 1, "ingeniero_mlops": 1}, 2, 4),
+]
+
+
+@dataclass
+class Solicitud:
+    """
+    Solicitud de reserva de un flujo de llegada. Los momentos son desplazamientos desde
+    el origen de la simulación, así el mismo flujo sirve para cualquier fecha
+    Args:
+        llegada: cuándo se pide (las solicitudes se procesan en este orden)
+        inicio: inicio deseado
+        paciencia: retraso máximo aceptable respecto al inicio deseado
+    """
+    llegada: timedelta
+    inicio: timedelta
+    duracion: timedelta
+    recursos: Dict[str, int]
+    tipo: str
+    paciencia: timedelta = timedelta(hours=48)
+
+
+@dataclass
+class Escenario:
+    """
+    Variante del catálogo de recursos y de los límites que lo acotan
+    Args:
+        capacidades: nueva capacidad de recursos existentes ({'cluster_gpu_a100': 2})
+        recursos_nuevos: recursos que se añaden al catálogo
+        limite_kw: nuevo límite de las restricciones de potencia (None: se mantiene)
+        cuotas: nuevas horas máximas de las cuotas de cada recurso ({'cluster_gpu_a100': 80})
+    """
+    nombre: str
+    capacidades: Dict[str, int] = field(default_factory=dict)
+    recursos_nuevos: List[Recurso] = field(default_factory=list)
+    limite_kw: Optional[float] = None
+    cuotas: Dict[str, float] = field(default_factory=dict)
+
+    def aplicar(self, gestor_recursos: GestorRecursos) -> GestorRecursos:
+        """Copia del catálogo con los cambios del escenario (el original no se modifica)"""
+        catalogo = GestorRecursos()
+        for recurso in (*gestor_recursos.recursos.values(), *self.recursos_nuevos):
+            copia = Recurso.from_dict(recurso.to_dict())
+            if copia.id in self.capacidades:
+                copia.capacidad = self.capacidades[copia.id]
+            catalogo.agregar_recurso(copia)
+        return catalogo
+
+    def aplicar_restricciones(self, restricciones: List[Restriccion]) -> List[Restriccion]:
+        """Restricciones con los límites del escenario (las originales no se modifican)"""
+        resultado = []
+        for restriccion in restricciones:
+            if isinstance(restriccion, RestriccionPotencia) and self.limite_kw is not None:
+                restriccion = RestriccionPotencia(self.limite_kw)
+            elif isinstance(restriccion, RestriccionCuota) and restriccion.recurso in self.cuotas:
+                restriccion = RestriccionCuota(restriccion.recurso, self.cuotas[restriccion.recurso],
+                                               restriccion.ventana_dias, restriccion.tipo_evento)
+            resultado.append(restriccion)
+        return resultado
+
+    def advertencias(self, gestor_recursos: GestorRecursos, restricciones: List[Restriccion]) -> List[str]:
+        """
+        Recursos ampliados cuyo uso sigue acotado por una restricción que el escenario no
+        cambia: la capacidad añadida no se notará (o no del todo) en los resultados
+        """
+        catalogo = self.aplicar(gestor_recursos)
+        restricciones = self.aplicar_restricciones(restricciones)
+        avisos = []
+        for recurso_id in (*self.capacidades, *(r.id for r in self.recursos_nuevos)):
+            recurso = catalogo.obtener_recurso(recurso_id)
+            for restriccion in restricciones:
+                if isinstance(restriccion, RestriccionPotencia):
+                    vatios = consumo_vatios(recurso) * recurso.capacidad
+                    if vatios > restriccion.limite_vatios:
+                        avisos.append(
+                            f"{recurso.capacidad} unidades de {recurso.id} consumen {vatios / 1000:g} kW, por encima "
+                            f"del límite de potencia de {restriccion.limite_kw:g} kW: no podrán usarse todas a la vez")
+                elif (isinstance(restriccion, RestriccionCuota) and restriccion.recurso == recurso.id
+                      and recurso.id not in self.cuotas):
+                    tipo = f" en '{restriccion.tipo_evento}'" if restriccion.tipo_evento else ""
+                    avisos.append(
+                        f"La cuota de {restriccion.horas_maximas:g} h de {recurso.id}{tipo} cada "
+                        f"{restriccion.ventana_dias:g} días no cambia con la capacidad")
+        return avisos
+
+
+def escenario_desde_texto(texto: str, gestor_recursos: GestorRecursos) -> Escenario:
+    """
+    Escenario escrito como 'nombre:cambio,cambio...' (p. ej. 'dos_a100:cluster_gpu_a100=2'
+    u 'otro_mlops:ingeniero_mlops=+1'); sin nombre, se usa el propio texto. Cada cambio es
+        - recurso=N o recurso=+N: capacidad nueva o unidades añadidas
+        - potencia=KW: límite de potencia simultánea
+        - cuota.recurso=H: horas máximas de las cuotas del recurso
+    """
+    nombre, separador, cambios = texto.partition(":")
+    if not separador:
+        nombre, cambios = texto, texto
+    escenario = Escenario(nombre.strip())
+    for cambio in filter(None, (c.strip() for c in cambios.split(","))):
+        clave, _, valor = cambio.partition("=")
+        clave = clave.strip()
+        if clave == "potencia" or clave.startswith("cuota."):
+            try:
+                limite = float(valor)
+            except ValueError:
+                raise ValueError(f"Límite inválido en el escenario '{texto}': {cambio}")
+            if limite <= 0:
+                raise ValueError(f"El límite de '{clave}' debe ser mayor a 0 en el escenario '{texto}'")
+            if clave == "potencia":
+                escenario.limite_kw = limite
+            else:
+                recurso_id = clave.partition(".")[2]
+                if gestor_recursos.obtener_recurso(recurso_id) is None:
+                    raise ValueError(f"Recurso desconocido en el escenario '{texto}': {recurso_id}")
+                escenario.cuotas[recurso_id] = limite
+            continue
+
+        recurso = gestor_recursos.obtener_recurso(clave)
+        if recurso is None:
+            raise ValueError(f"Recurso desconocido en el escenario '{texto}': {clave}")
+        try:
+            cantidad = int(valor)
+        except ValueError:
+            raise ValueError(f"Capacidad inválida en el escenario '{texto}': {cambio}")
+        capacidad = recurso.capacidad + cantidad if valor.strip().startswith(("+", "-")) else cantidad
+        if capacidad < 1:
+            raise ValueError(f"La capacidad de {recurso.id} debe ser al menos 1 en el escenario '{texto}'")
+        escenario.capacidades[recurso.id] = capacidad
+    if not escenario.capacidades and escenario.limite_kw is None and not escenario.cuotas:
+        raise ValueError(f"El escenario '{texto}' no cambia ningún recurso ni límite")
+    return escenario
+
+
+# --- Flujos de llegada ---
+
+def llegadas_sinteticas(rng: random.Random, dias: int, llegadas_por_dia: float,
+                        mezcla=MEZCLA_PREDETERMINADA, antelacion_maxima_dias: int = 3,
+                        paciencia: timedelta = timedelta(hours=48)) -> List[Solicitud]:
+    """
+    Llegadas de Poisson durante 'dias' días. Cada solicitud es de un tipo de la mezcla
+    (según su peso) y pide empezar entre 0 y 'antelacion_maxima_dias' días después, en
+    punto o a la media hora del horario HORA_PRIMERA-HORA_ULTIMA
+    """
+    pesos = [peso for peso, *_ in mezcla]
+    solicitudes = []
+    momento = 0.0
+    horizonte = dias * 24.0
+    while True:
+        momento += rng.expovariate(llegadas_por_dia / 24.0)
+        if momento >= horizonte:
+            break
+        _, tipo, recursos, minimo, maximo = rng.choices(mezcla, weights=pesos)[0]
+        llegada = timedelta(hours=momento)
+        dia = int(momento // 24) + rng.randint(0, antelacion_maxima_dias)
+        media_hora = rng.randint(HORA_PRIMERA * 2, HORA_ULTIMA * 2)
+        inicio = max(llegada, timedelta(days=dia, minutes=30 * media_hora))
+        solicitudes.append(Solicitud(
+            llegada=llegada,
+            inicio=inicio,
+            duracion=timedelta(minutes=30 * round(rng.uniform(minimo, maximo) * 2)),
+            recursos=dict(recursos),
+            tipo=tipo,
+            paciencia=paciencia
+        ))
+    return solicitudes
+
+
+def solicitudes_historicas(gestor_eventos: GestorEventos, antelacion: timedelta = timedelta(days=1),
+                           paciencia: timedelta = timedelta(hours=48)) -> Dict[int, List[Solicitud]]:
+    """
+    Reservas del historial (sin canceladas ni retenciones) como solicitudes, agrupadas por
+    día: {día desde el primero del historial: solicitudes con momentos relativos a ese día}.
+    Los días sin reservas entre el primero y el último aparecen vacíos. Se supone que cada
+    reserva se pidió 'antelacion' antes de su inicio
+    """
+    eventos = [e for e in gestor_eventos.eventos.values()
+               if e.metadata.get("cancelado") is not True and not e.metadata.get("retencion")]
+    if not eventos:
+        return {}
+    primero = min(e.inicio for e in eventos).replace(hour=0, minute=0, second=0, microsecond=0)
+    dias: Dict[int, List[Solicitud]] = {n: [] for n in range((max(e.inicio for e in eventos) - primero).days + 1)}
+    for evento in eventos:
+        dia = (evento.inicio - primero).days
+        inicio = evento.inicio - (primero + timedelta(days=dia))
+        recursos: Dict[str, int] = {}
+        for recurso in evento.recursos:
+            recursos[recurso.id] = recursos.get(recurso.id, 0) + 1
+        dias[dia].append(Solicitud(
+            llegada=inicio - antelacion,
+            inicio=inicio,
+            duracion=evento.duracion,
+            recursos=recursos,
+            tipo=evento.tipo,
+            paciencia=paciencia
+        ))
+    return dias
+
+
+def remuestrear_dias(rng: random.Random, historial: Dict[int, List[Solicitud]], dias: int) -> List[Solicitud]:
+    """Flujo de 'dias' días en el que cada día copia las solicitudes de un día del historial al azar"""
+    disponibles = list(historial)
+    solicitudes = []
+    for dia in range(dias):
+        desplazamiento = timedelta(days=dia)
+        for solicitud in historial[rng.choice(disponibles)]:
+            solicitudes.append(Solicitud(
+                llegada=max(timedelta(0), solicitud.llegada + desplazamiento),
+                inicio=solicitud.inicio + desplazamiento,
+                duracion=solicitud.duracion,
+                recursos=dict(solicitud.recursos),
+                tipo=solicitud.tipo,
+                paciencia=solicitud.paciencia
+            ))
+    return solicitudes
+
+
+# --- Corridas ---
+
+def reproducir(planificador: Planificador, solicitudes: List[Solicitud], origen: datetime) -> Dict[str, Any]:
+    """
+    Procesa las solicitudes en orden de llegada como lo haría un usuario: se intenta el
+    inicio deseado y, si no cabe, el primer hueco dentro de la paciencia de la solicitud
+    Returns: {'solicitudes', 'aceptadas', 'esperas' (horas de cada aceptada)}
+    """
+    aceptadas = 0
+    esperas: List[float] = []
+    for solicitud in sorted(solicitudes, key=lambda s: s.llegada):
+        inicio = origen + solicitud.inicio
+        fin = inicio + solicitud.duracion
+        duracion_horas = solicitud.duracion.total_seconds() / 3600
+        resultado = planificador.planificar_evento(
+            nombre=f"simulada_{solicitud.tipo}", inicio=inicio, fin=fin,
+            recursos_seleccionados=solicitud.recursos, tipo=solicitud.tipo)
+        if not resultado["success"] and solicitud.paciencia > timedelta(0):
+            huecos = planificador.buscar_hueco_disponible(
+                recursos_con_cantidad=solicitud.recursos,
+                duracion_horas=duracion_horas,
+                inicio_busqueda=inicio,
+                fin_busqueda=fin + solicitud.paciencia,
+                max_resultados=1,
+                tipo=solicitud.tipo
+            )
+            if huecos:
+                resultado = planificador.planificar_evento(
+                    nombre=f"simulada_{solicitud.tipo}", inicio=huecos[0]['inicio'], fin=huecos[0]['fin'],
+                    recursos_seleccionados=solicitud.recursos, tipo=solicitud.tipo)
+        if resultado["success"]:
+            aceptadas += 1
+            esperas.append((resultado["evento"].inicio - inicio).total_seconds() / 3600)
+    return {"solicitudes": len(solicitudes), "aceptadas": aceptadas, "esperas": esperas}
+
+
+def _corrida(instantanea: Dict[str, Any], datos_dir: str, opciones: Dict[str, Any],
+             historial: Dict[int, List[Solicitud]], semilla: int) -> Dict[str, Any]:
+    """Una corrida: agenda inicial de la instantánea, flujo generado con 'semilla' y métricas"""
+    gestor_eventos, gestor_recursos, restricciones, _ = Persistencia.desde_diccionario(instantanea, confiable=True)
+    planificador = Planificador(datos_dir)
+    planificador.gestor_eventos = gestor_eventos
+    planificador.gestor_recursos = gestor_recursos
+    planificador.restricciones = restricciones
+
+    rng = random.Random(semilla)
+    if historial:
+        solicitudes = remuestrear_dias(rng, historial, opciones["dias"])
+    else:
+        solicitudes = llegadas_sinteticas(rng, opciones["dias"], opciones["llegadas_por_dia"],
+                                          paciencia=opciones["paciencia"])
+    origen = opciones["origen"]
+    reproduccion = reproducir(planificador, solicitudes, origen)
+
+    # Utilización: horas reservadas de cada recurso sobre las que tenía disponibles en el horizonte
+    horizonte_horas = opciones["dias"] * 24
+    horas = {fila["recurso"]: fila["horas"] for fila in planificador.contabilidad.informe(
+        origen, origen + timedelta(days=opciones["dias"]), "total", ["recurso"])}
+    utilizacion = {recurso.id: horas.get(recurso.id, 0.0) / (max(1, recurso.capacidad) * horizonte_horas)
+                   for recurso in gestor_recursos}
+    esperas = reproduccion["esperas"]
+    return {
+        "tasa_aceptacion": reproduccion["aceptadas"] / reproduccion["solicitudes"] if reproduccion["solicitudes"] else 1.0,
+        "espera_media_horas": sum(esperas) / len(esperas) if esperas else 0.0,
+        "espera_maxima_horas": max(esperas, default=0.0),
+        "solicitudes": reproduccion["solicitudes"],
+        "utilizacion": utilizacion,
+    }
+
+
+# Datos de las corridas en cada proceso trabajador (se envían una vez por proceso)
+_datos_trabajador: Optional[tuple] = None
+
+
+def _iniciar_trabajador(instantaneas: Dict[str, Dict[str, Any]], datos_dir: str, opciones: Dict[str, Any],
+                        historial: Dict[int, List[Solicitud]]):
+    global _datos_trabajador
+    _datos_trabajador = (instantaneas, datos_dir, opciones, historial)
+
+
+def _corrida_en_trabajador(tarea: Tuple[str, int]) -> Dict[str, Any]:
+    instantaneas, datos_dir, opciones, historial = _datos_trabajador
+    escenario, semilla = tarea
+    return _corrida(instantaneas[escenario], datos_dir, opciones, historial, semilla)
+
+
+def _percentiles(valores: List[float]) -> Dict[str, float]:
+    return {f"p{p}": round(float(v), 4) for p, v in zip(PERCENTILES, np.percentile(valores, PERCENTILES))}
+
+
+def agregar(corridas: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Percentiles de las métricas de las corridas de un escenario"""
+    recursos = corridas[0]["utilizacion"].keys() if corridas else []
+    return {
+        "corridas": len(corridas),
+        "solicitudes_media": round(sum(c["solicitudes"] for c in corridas) / len(corridas), 1) if corridas else 0,
+        "tasa_aceptacion": _percentiles([c["tasa_aceptacion"] for c in corridas]) if corridas else {},
+        "espera_media_horas": _percentiles([c["espera_media_horas"] for c in corridas]) if corridas else {},
+        "espera_maxima_horas": _percentiles([c["espera_maxima_horas"] for c in corridas]) if corridas else {},
+        "utilizacion": {recurso_id: _percentiles([c["utilizacion"][recurso_id] for c in corridas])
+                        for recurso_id in recursos},
+    }
+
+
+def simular(
+    planificador: Planificador,
+    escenarios: List[Escenario],
+    corridas: int = 200,
+    dias: int = 28,
+    llegadas_por_dia: float = 12.0,
+    historico: bool = False,
+    incluir_agenda: bool = False,
+    paciencia: timedelta = timedelta(hours=48),
+    origen: Optional[datetime] = None,
+    semilla: int = 0,
+    max_procesos: Optional[int] = None
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Simula los escenarios (además del catálogo actual, 'actual') con el mismo conjunto de
+    semillas, de modo que todos ven los mismos flujos de llegada
+    Args:
+        planificador: catálogo, restricciones y (con historico o incluir_agenda) eventos de partida
+        corridas: corridas por escenario
+        dias: horizonte de cada corrida
+        llegadas_por_dia: tasa de los flujos sintéticos
+        historico: remuestrear por días el historial del planificador en lugar de generar llegadas
+        incluir_agenda: partir de las reservas ya hechas (si no, de una agenda vacía)
+        origen: comienzo de la simulación (por defecto, mañana a las 00:00)
+        max_procesos: procesos trabajadores (por defecto, uno por núcleo)
+    Returns: {nombre del escenario: métricas agregadas (ver agregar) y 'advertencias'
+        (ver Escenario.advertencias)}
+    """
+    if origen is None:
+        origen = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+    historial = solicitudes_historicas(planificador.gestor_eventos, paciencia=paciencia) if historico else {}
+    if historico and not historial:
+        raise ValueError("No hay reservas en el historial para remuestrear")
+
+    agenda = planificador.gestor_eventos if incluir_agenda else GestorEventos()
+    escenarios = [Escenario("actual"), *escenarios]
+    instantaneas = {
+        escenario.nombre: Persistencia.a_diccionario(
+            agenda, escenario.aplicar(planificador.gestor_recursos),
+            escenario.aplicar_restricciones(planificador.restricciones))
+        for escenario in escenarios
+    }
+    opciones = {"dias": dias, "llegadas_por_dia": llegadas_por_dia, "paciencia": paciencia, "origen": origen}
+    tareas = [(nombre, semilla + corrida) for nombre in instantaneas for corrida in range(corridas)]
+    procesos = min(max_procesos or os.cpu_count() or 1, len(tareas))
+
+    if procesos < MIN_CORRIDAS_PARALELO:
+        resultados = [_corrida(instantaneas[nombre], planificador.datos_dir, opciones, historial, semilla_corrida)
+                      for nombre, semilla_corrida in tareas]
+    else:
+        with ProcessPoolExecutor(max_workers=procesos, initializer=_iniciar_trabajador,
+                                 initargs=(instantaneas, planificador.datos_dir, opciones, historial)) as ejecutor:
+            resultados = list(ejecutor.map(_corrida_en_trabajador, tareas,
+                                           chunksize=max(1, len(tareas) // (procesos * 4))))
+
+    por_escenario: Dict[str, List[Dict[str, Any]]] = {nombre: [] for nombre in instantaneas}
+    for (nombre, _), resultado in zip(tareas, resultados):
+        por_escenario[nombre].append(resultado)
+    return {escenario.nombre: {**agregar(por_escenario[escenario.nombre]),
+                               "advertencias": escenario.advertencias(planificador.gestor_recursos,
+                                                                      planificador.restricciones)}
+            for escenario in escenarios}
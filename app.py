@@ -6,21 +6,26 @@ import streamlit as st
 import sys
 import os
 from datetime import datetime, timedelta
-import json
-import pandas as pd
-import plotly.graph_objects as go
-import plotly.express as px
+import time
 
 # Configurar path para importaciones
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
+# pandas y plotly solo se cargan cuando una página los usa por primera vez
+from core.perezoso import importar_perezoso
+pd = importar_perezoso("pandas")
+go = importar_perezoso("plotly.graph_objects")
+px = importar_perezoso("plotly.express")
+
 # Importar el planificador
 from aplicacion.planificador import Planificador
+from aplicacion.linea_tiempo import agregar_linea_tiempo, NIVELES_ZOOM
 
-from dominio.restricciones import validar_restricciones
-from dominio.recursos import Recurso, GestorRecursos, crear_recursos_predeterminados
-from dominio.eventos import GestorEventos
+from dominio.recursos import GestorRecursos, crear_recursos_predeterminados
+from dominio.eventos import GestorEventos, DURACION_MAXIMA_EVENTO
+from dominio.series import FRECUENCIAS, DIAS_SEMANA
 from infraestructura.persistencia import Persistencia
+from core.diagnostico import DIAGNOSTICO
 
 
 # Configuración de la página y estilos
@@ -320,7 +325,9 @@ def badge_for_estado(estado):
         'planificado': 'badge-info',
         'en_curso': 'badge-success',
         'completado': 'badge-warning',
-        'cancelado': 'badge-danger'
+        'cancelado': 'badge-danger',
+        'retenido': 'badge-warning',
+        'caducado': 'badge-danger'
     }
     clase = colores.get(estado, 'badge-info')
     return f'<span class="badge {clase}">{estado.upper()}</span>'
@@ -393,14 +400,88 @@ def display_recurso_card(recurso):
     """, unsafe_allow_html=True)
 
 
+# Colores de los bloques del Gantt según cuántos eventos agrupan
+COLORES_GANTT = [
+    (1, 1, "1 evento", "#00D4FF"),
+    (2, 5, "2-5 eventos", "#FFB74D"),
+    (6, None, "Más de 5 eventos", "#FF5252"),
+]
+
+# Origen de las fechas numéricas de plotly (ms desde 1970, mostradas sin zona horaria)
+EPOCA = datetime(1970, 1, 1)
+
+def crear_figura_gantt(linea):
+    """Dibuja una LineaTiempo ya agregada con trazas WebGL (una por rango de densidad)"""
+    # Fila base de cada recurso: sus carriles ocupan filas consecutivas
+    filas = {}
+    posiciones, etiquetas = [], []
+    fila = 0
+    for recurso in linea.recursos:
+        filas[recurso.id] = fila
+        carriles = linea.carriles[recurso.id]
+        posiciones.append(fila + (carriles - 1) / 2)
+        etiquetas.append(recurso.nombre)
+        fila += carriles + 1  # una fila vacía de separación entre recursos
+    total_filas = max(fila, 1)
+
+    fig = go.Figure()
+    ancho_linea = max(2, min(14, 500 // total_filas))
+    for minimo, maximo, nombre, color in COLORES_GANTT:
+        x, y, textos = [], [], []
+        for bloque in linea.bloques:
+            if bloque.eventos < minimo or (maximo is not None and bloque.eventos > maximo):
+                continue
+            posicion = filas[bloque.recurso_id] + bloque.carril
+            texto = (bloque.nombre if bloque.eventos == 1 else f"{bloque.eventos} eventos") + \
+                f"<br>{bloque.inicio:%d/%m %H:%M} - {bloque.fin:%d/%m %H:%M}"
+            # Cada bloque es un segmento horizontal; None separa los segmentos.
+            # Las fechas van como milisegundos (más compacto y rápido de serializar)
+            x.extend(((bloque.inicio - EPOCA).total_seconds() * 1000,
+                      (bloque.fin - EPOCA).total_seconds() * 1000, None))
+            y.extend((posicion, posicion, None))
+            textos.extend((texto, texto, None))
+        if x:
+            fig.add_trace(go.Scattergl(
+                x=x, y=y, mode="lines", name=nombre, connectgaps=False,
+                line=dict(color=color, width=ancho_linea),
+                hovertext=textos, hoverinfo="text"
+            ))
+
+    fig.update_layout(
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        font_color='white',
+        height=min(1600, max(350, total_filas * 12 + 120)),
+        xaxis=dict(range=[(linea.inicio - EPOCA).total_seconds() * 1000,
+                          (linea.fin - EPOCA).total_seconds() * 1000], type="date"),
+        yaxis=dict(tickvals=posiciones, ticktext=etiquetas, autorange="reversed",
+                   showgrid=False, zeroline=False),
+        legend=dict(orientation="h", y=1.05),
+        margin=dict(l=10, r=10, t=40, b=10)
+    )
+    return fig
+
+
 # PÁGINA PRINCIPAL
 
+def _deshacer_o_rehacer(planificador, deshacer):
+    resultado = planificador.deshacer() if deshacer else planificador.rehacer()
+    if resultado["success"]:
+        planificador.guardar_datos()
+    st.session_state.aviso_historial = (resultado["success"], resultado["message"])
+
+
 def main():
     """Función principal de la aplicación"""
     
     # Inicializar planificador
     planificador = initialize_planificador()
-    
+
+    # Cambios descartados al guardar porque otra sesión reservó antes los mismos recursos
+    for advertencia in planificador.advertencias_guardado:
+        st.warning(f"⚠️ {advertencia}")
+    planificador.advertencias_guardado.clear()
+
 
     # Sidebar
     
@@ -514,6 +595,12 @@ def main():
         "buscar_huecos": {"icon": "🔍", "label": "Buscar Huecos", "badge": ""},
         "datos": {"icon": "💾", "label": "Gestión de Datos", "badge": ""}
     }
+
+    # Página oculta de diagnóstico: solo aparece abriendo la app con ?diagnostico=1
+    if st.experimental_get_query_params().get("diagnostico", ["0"])[0] == "1":
+        pages["diagnostico"] = {"icon": "🩺", "label": "Diagnóstico", "badge": ""}
+    elif st.session_state.current_page == "diagnostico":
+        st.session_state.current_page = "dashboard"
     
     # Crear botones de navegación
     for page_id, page_info in pages.items():
@@ -647,6 +734,23 @@ def main():
             except Exception as e:
                 st.toast(f"❌ Error: {str(e)[:50]}...", icon="❌")
     
+    # Deshacer / rehacer la última modificación
+    historial = planificador.historial
+    undo_cols = st.sidebar.columns(2)
+    with undo_cols[0]:
+        st.button("↩️", help=f"Deshacer: {historial.siguiente_deshacer() or 'nada que deshacer'}",
+                  key="undo_action", use_container_width=True, type="secondary",
+                  disabled=not historial.puede_deshacer, on_click=_deshacer_o_rehacer,
+                  args=(planificador, True))
+    with undo_cols[1]:
+        st.button("↪️", help=f"Rehacer: {historial.siguiente_rehacer() or 'nada que rehacer'}",
+                  key="redo_action", use_container_width=True, type="secondary",
+                  disabled=not historial.puede_rehacer, on_click=_deshacer_o_rehacer,
+                  args=(planificador, False))
+    if "aviso_historial" in st.session_state:
+        exito, mensaje = st.session_state.pop("aviso_historial")
+        st.toast(f"{'✅' if exito else '❌'} {mensaje}", icon="✅" if exito else "❌")
+    
     # Estilo para botones de acciones
     st.sidebar.markdown("""
     <style>
@@ -678,19 +782,29 @@ def main():
    
     # Contenido principal según página
     
-    # Mostrar la página correspondiente
-    if st.session_state.current_page == "dashboard":
-        show_dashboard(planificador)
-    elif st.session_state.current_page == "eventos":
-        show_eventos(planificador)
-    elif st.session_state.current_page == "recursos":
-        show_recursos(planificador)
-    elif st.session_state.current_page == "nuevo_evento":
-        show_nuevo_evento(planificador)
-    elif st.session_state.current_page == "buscar_huecos":
-        show_buscar_huecos(planificador)
-    elif st.session_state.current_page == "datos":
-        show_datos(planificador)
+    # Mostrar la página correspondiente, midiendo cuánto tarda en generarse
+    pagina = st.session_state.current_page
+    DIAGNOSTICO.reanudar_perfil()
+    inicio_render = time.perf_counter()
+    try:
+        if pagina == "dashboard":
+            show_dashboard(planificador)
+        elif pagina == "eventos":
+            show_eventos(planificador)
+        elif pagina == "recursos":
+            show_recursos(planificador)
+        elif pagina == "nuevo_evento":
+            show_nuevo_evento(planificador)
+        elif pagina == "buscar_huecos":
+            show_buscar_huecos(planificador)
+        elif pagina == "datos":
+            show_datos(planificador)
+        elif pagina == "diagnostico":
+            show_diagnostico(planificador)
+    finally:
+        DIAGNOSTICO.pausar_perfil()
+        if pagina != "diagnostico":
+            DIAGNOSTICO.registrar_llamada(f"app.{pagina}", time.perf_counter() - inicio_render)
 
 
 # Secciones de la aplicación
@@ -803,52 +917,82 @@ def show_eventos(planificador):
             ["Todos", "entrenamiento", "procesamiento", "investigación", "reunión", "seminario", "inferencia"]
         )
     
-     
-    # lista base de todos los eventos primero
-    todos_eventos = list(planificador.gestor_eventos.eventos.values())
+    
+    col_pag1, col_pag2 = st.columns([1, 3])
+    with col_pag1:
+        tamano_pagina = st.selectbox("Eventos por página", [10, 20, 50, 100], index=1, key="eventos_por_pagina")
+    
+    # Cada vista se traduce a un rango sobre el índice ordenado por inicio y, si hace
+    # falta, a una condición que solo se evalúa sobre los eventos recorridos
+    gestor = planificador.gestor_eventos
     ahora = datetime.now()
+    desde = hasta = filtro = None
     
-    # Aplicar filtro de vista predefinida
     if vista_predefinida == "Todos los eventos":
-        eventos = todos_eventos
+        pass
     
     elif vista_predefinida == "próximos":
         # Eventos que inician en el futuro (dentro del rango de días)
-        fecha_limite = ahora + timedelta(days=dias)
-        eventos = [e for e in todos_eventos if ahora <= e.inicio <= fecha_limite]
+        desde, hasta = ahora, ahora + timedelta(days=dias)
     
     elif vista_predefinida == "completados":
         # Eventos completados en el rango de días hacia atrás
         fecha_limite = ahora - timedelta(days=dias)
-        eventos = [e for e in todos_eventos if e.estado == 'completado' and e.fin >= fecha_limite]
+        desde, hasta = fecha_limite - DURACION_MAXIMA_EVENTO, ahora
+        filtro = lambda e: e.estado == 'completado' and e.fin >= fecha_limite
     
     elif vista_predefinida == "en curso":
         # Eventos que están en curso ahora mismo
-        eventos = [e for e in todos_eventos if e.estado == 'en_curso']
+        desde, hasta = ahora - DURACION_MAXIMA_EVENTO, ahora
+        filtro = lambda e: e.estado == 'en_curso'
     
     elif vista_predefinida == "cancelados":
         # Eventos cancelados (sin límite temporal por defecto)
-        eventos = [e for e in todos_eventos if e.estado == 'cancelado']
+        filtro = lambda e: e.estado == 'cancelado'
     
     elif vista_predefinida == "Histórico (más de 7 días)":
         # Eventos que terminaron hace más de 7 días
         limite = ahora - timedelta(days=7)
-        eventos = [e for e in todos_eventos if e.fin < limite]
-    
-    else:
-        # Caso por defecto (no debería ocurrir)
-        eventos = []
-        
-    # Aplicar filtro de tipo
-    if tipo_filtro != "Todos":
-        eventos = [e for e in eventos if e.tipo == tipo_filtro]
-    
-    # Ordenar por fecha de inicio (más reciente primero)
-    eventos.sort(key=lambda e: e.inicio, reverse=True)
+        hasta = limite
+        filtro = lambda e: e.fin < limite
+    
+    tipo = None if tipo_filtro == "Todos" else tipo_filtro
+    
+    # Cursores de las páginas visitadas (el de la primera es None); se reinician al cambiar los filtros
+    consulta = (vista_predefinida, dias, tipo_filtro, tamano_pagina)
+    if st.session_state.get("eventos_consulta") != consulta:
+        st.session_state.eventos_consulta = consulta
+        st.session_state.eventos_cursores = [None]
+    cursores = st.session_state.eventos_cursores
+    
+    # Solo se materializa la página visible
+    eventos, siguiente = gestor.paginar(
+        limite=tamano_pagina,
+        cursor=cursores[-1],
+        desde=desde,
+        hasta=hasta,
+        tipo=tipo,
+        filtro=filtro
+    )
+    numero_pagina = len(cursores)
     
     # Mostrar eventos
     if eventos:
-        st.success(f"✅ Encontrados {len(eventos)} eventos")
+        if filtro is None:
+            # Sin condición adicional el total sale del índice sin recorrerlo
+            total = gestor.contar_por_inicio(desde, hasta, tipo)
+            st.success(f"✅ Encontrados {total} eventos · página {numero_pagina} de {-(-total // tamano_pagina)}")
+        else:
+            st.success(f"✅ Página {numero_pagina} · {len(eventos)} eventos")
+        
+        # Los callbacks se ejecutan antes del siguiente render, así la página cambia con un solo clic
+        col_nav1, col_nav2, col_nav3 = st.columns([1, 1, 4])
+        with col_nav1:
+            st.button("⬅️ Anterior", disabled=numero_pagina == 1, use_container_width=True,
+                      on_click=cursores.pop)
+        with col_nav2:
+            st.button("Siguiente ➡️", disabled=siguiente is None, use_container_width=True,
+                      on_click=cursores.append, args=(siguiente,))
         
         for evento in eventos:
             # Crear un contenedor para cada evento
@@ -893,7 +1037,7 @@ def show_eventos(planificador):
                     with col_btn2:
                         if st.button("❌", key=f"cancel_{evento.id}", help="Cancelar evento"):
                             if evento.estado != 'cancelado':
-                                evento.cancelar()
+                                planificador.cancelar_evento(evento.id)
                                 st.success("✅ Evento cancelado")
                                 planificador.guardar_datos()
                                 st.rerun()
@@ -903,23 +1047,14 @@ def show_eventos(planificador):
                     with col_btn3:
                         if st.button("🔄", key=f"refresh_{evento.id}", help="Reactivar evento"):
                             if evento.estado == 'cancelado':
-                                # 1 Verificar conflictos temporales
-                                sin_conflictos, errores = planificador.verificar_conflictos(evento)
-                                # 2 Validar restricciones
-                                es_valido, errores_rest = validar_restricciones(
-                                    evento.recursos,
-                                    evento,
-                                    planificador.restricciones
-                                ) 
-                                
-                                if sin_conflictos and es_valido:
-                                    evento.metadata["cancelado"] = False
+                                # Verifica conflictos y restricciones antes de reactivar
+                                resultado = planificador.reactivar_evento(evento.id)
+                                if resultado["success"]:
                                     st.success("✅ Evento reactivado")
                                     planificador.guardar_datos()
                                     st.rerun()
                                 else:
-                                    todos_errores = errores + errores_rest
-                                    st.error(f"❌ No se puede reactivar debido a conflictos: {', '.join(todos_errores)}")
+                                    st.error(f"❌ {resultado['message']}")
                             else:
                                 st.info("⚠️ Solo se pueden reactivar eventos cancelados")
                     
@@ -941,6 +1076,34 @@ def show_eventos(planificador):
                 st.markdown("---")
     else:
         st.warning("No hay eventos que coincidan con los filtros.")
+    
+    mostrar_series(planificador)
+
+
+def _eliminar_serie(planificador, serie_id):
+    if planificador.eliminar_serie(serie_id):
+        planificador.guardar_datos()
+
+
+def mostrar_series(planificador):
+    """Series recurrentes: una fila por serie, con sus próximas ocurrencias"""
+    series = planificador.listar_series()
+    if not series:
+        return
+    
+    st.subheader(f"🔁 Series recurrentes ({len(series)})")
+    ahora = datetime.now()
+    for serie in series:
+        with st.expander(str(serie)):
+            recursos = ", ".join(sorted({r.nombre for r in serie.recursos}))
+            st.markdown(f"**Recursos:** {recursos}  \n**Tipo:** {serie.tipo}  \n"
+                        f"**Primera ocurrencia:** {serie.inicio.strftime('%d/%m/%Y %H:%M')}")
+            proximas = [o.strftime('%d/%m/%Y %H:%M') for _, o in zip(range(5), serie.fechas(ahora))]
+            st.markdown(f"**Próximas ocurrencias:** {', '.join(proximas) or 'ninguna'}")
+            if serie.excepciones:
+                st.caption(f"{len(serie.excepciones)} ocurrencias anuladas")
+            st.button("🗑️ Eliminar serie", key=f"eliminar_serie_{serie.id}",
+                      on_click=_eliminar_serie, args=(planificador, serie.id))
 
 def show_recursos(planificador):
     """Gestión de recursos"""
@@ -959,7 +1122,7 @@ def show_recursos(planificador):
         recursos = [r for r in recursos if r.tipo == tipo_filtro]
     
     # Mostrar en pestañas
-    tab1, tab2 = st.tabs(["📋 Lista de Recursos", "📊 Agenda por Recurso"])
+    tab1, tab2, tab3 = st.tabs(["📋 Lista de Recursos", "📊 Agenda por Recurso", "🗓️ Vista Gantt del Centro"])
     
     with tab1:
         if recursos:
@@ -1044,6 +1207,37 @@ def show_recursos(planificador):
                 else:
                     st.success(f"✅ No hay eventos programados para {recurso.nombre} en los próximos {dias} días.")
 
+    with tab3:
+        st.subheader("🗓️ Vista Gantt del Centro")
+
+        if recursos:
+            col_g1, col_g2, col_g3 = st.columns(3)
+            with col_g1:
+                fecha_gantt = st.date_input("Desde", value=datetime.now().date(), key="gantt_desde")
+            with col_g2:
+                dias_gantt = st.slider("Días a mostrar", 1, 90, 30, key="gantt_dias")
+            with col_g3:
+                zoom = st.selectbox("Resolución", ["Automática"] + list(NIVELES_ZOOM), key="gantt_zoom")
+
+            inicio_gantt = datetime.combine(fecha_gantt, datetime.min.time())
+            linea = agregar_linea_tiempo(
+                planificador.gestor_eventos,
+                recursos,
+                inicio_gantt,
+                inicio_gantt + timedelta(days=dias_gantt),
+                resolucion=None if zoom == "Automática" else NIVELES_ZOOM[zoom]
+            )
+
+            if linea.bloques:
+                # Con demasiados bloques la resolución pasa a una más gruesa, quizá fuera de la lista
+                nombre_zoom = next((n for n, r in NIVELES_ZOOM.items() if r == linea.resolucion),
+                                   f"{linea.resolucion.days} días")
+                st.caption(f"{linea.total_eventos} eventos agrupados en {len(linea.bloques)} bloques "
+                           f"(columnas de {nombre_zoom})")
+                st.plotly_chart(crear_figura_gantt(linea), use_container_width=True)
+            else:
+                st.success("✅ No hay eventos en el periodo seleccionado.")
+
 def show_nuevo_evento(planificador):
     """Formulario para nuevo evento"""
     st.title("➕ Planificar Nuevo Evento")
@@ -1207,8 +1401,64 @@ def show_nuevo_evento(planificador):
         with cols_avanzadas[0].container():  # Primera columna
             buscar_hueco = st.checkbox("🔍 Buscar hueco automáticamente si ocupado", True)
         
-        # Botón de envío
-        submitted = st.form_submit_button("🚀 Planificar Evento", use_container_width=True)
+        with cols_avanzadas[1].container():  # Segunda columna: repetición
+            repetir = st.checkbox("🔁 Repetir (serie recurrente)", False, key="serie_repetir")
+            col_frec, col_intervalo = st.columns(2)
+            with col_frec:
+                frecuencia = st.selectbox("Frecuencia", FRECUENCIAS, index=1, key="serie_frecuencia")
+            with col_intervalo:
+                intervalo = st.number_input("Cada", 1, 52, 1, 1, key="serie_intervalo")
+            dias_semana = st.multiselect("Días (solo semanal)", DIAS_SEMANA, key="serie_dias")
+            fin_serie = st.radio("Termina", ["Nunca", "En una fecha", "Tras N repeticiones"],
+                                 horizontal=True, key="serie_fin")
+            col_hasta, col_veces = st.columns(2)
+            with col_hasta:
+                repetir_hasta = st.date_input("Hasta", now.date() + timedelta(days=90), key="serie_hasta")
+            with col_veces:
+                repeticiones = st.number_input("Repeticiones", 1, 1000, 10, 1, key="serie_repeticiones")
+            omitir_conflictos = st.checkbox("Anular las ocurrencias en conflicto", False, key="serie_omitir")
+        
+        # Botones de envío: retener los recursos mientras se completa el resto, o planificar
+        col_retener, col_enviar = st.columns([1, 2])
+        with col_retener:
+            retener = st.form_submit_button(
+                f"🔒 Retener recursos ({int(planificador.DURACION_RETENCION.total_seconds() // 60)} min)",
+                use_container_width=True)
+        with col_enviar:
+            submitted = st.form_submit_button("🚀 Planificar Evento", use_container_width=True)
+    
+    if retener:
+        if not recursos_seleccionados or inicio >= fin:
+            st.error("❌ Para retener hay que elegir recursos y un horario válido")
+        else:
+            # Una sola retención por formulario: la anterior se libera
+            retencion_previa = st.session_state.get('retencion_nuevo_evento')
+            if retencion_previa:
+                planificador.liberar_retencion(retencion_previa['id'])
+                st.session_state.retencion_nuevo_evento = None
+            resultado_retencion = planificador.retener(
+                recursos_seleccionados, inicio, fin, tipo, nombre=nombre or "Reserva provisional")
+            if resultado_retencion["success"]:
+                st.session_state.retencion_nuevo_evento = {
+                    'id': resultado_retencion['retencion'].id,
+                    'recursos': dict(recursos_seleccionados),
+                    'tipo': tipo,
+                    'inicio': inicio,
+                    'fin': fin,
+                    'expira': resultado_retencion['expira']
+                }
+                # Se guarda para que los demás usuarios vean los recursos ocupados
+                planificador.guardar_datos()
+            else:
+                st.error(f"❌ {resultado_retencion['message']}")
+    
+    retencion_activa = st.session_state.get('retencion_nuevo_evento')
+    if retencion_activa and not submitted:
+        if retencion_activa['expira'] > datetime.now():
+            st.info(f"🔒 Recursos retenidos hasta las {retencion_activa['expira'].strftime('%H:%M')}. "
+                    "Al planificar con los mismos recursos y horario se confirma sin volver a validar")
+        else:
+            st.warning("⌛ La retención ha caducado: al planificar se volverá a comprobar la disponibilidad")
     
     # Procesar el formulario después de enviarlo
     if submitted:
@@ -1228,6 +1478,44 @@ def show_nuevo_evento(planificador):
             st.session_state.evento_planificado = False
             return
         
+        # La retención solo sirve para esta misma reserva (del mismo tipo: las cuotas dependen de él)
+        retencion = st.session_state.get('retencion_nuevo_evento')
+        st.session_state.retencion_nuevo_evento = None
+        misma_reserva = retencion is not None and not repetir and (
+            (retencion['recursos'], retencion.get('tipo'), retencion['inicio'], retencion['fin'])
+            == (recursos_seleccionados, tipo, inicio, fin))
+        if retencion is not None and not misma_reserva:
+            planificador.liberar_retencion(retencion['id'])
+        
+        if repetir:
+            # Una serie se guarda como un único registro; sus ocurrencias se calculan al consultar
+            with st.spinner("⏳ Planificando serie..."):
+                resultado = planificador.planificar_serie(
+                    nombre=nombre,
+                    inicio=inicio,
+                    fin=fin,
+                    recursos_seleccionados=recursos_seleccionados,
+                    tipo=tipo,
+                    frecuencia=frecuencia,
+                    intervalo=int(intervalo),
+                    dias_semana=[DIAS_SEMANA.index(d) for d in dias_semana],
+                    repetir_hasta=(datetime.combine(repetir_hasta, datetime.max.time())
+                                   if fin_serie == "En una fecha" else None),
+                    repeticiones=int(repeticiones) if fin_serie == "Tras N repeticiones" else None,
+                    descripcion=descripcion,
+                    prioridad=prioridad,
+                    omitir_conflictos=omitir_conflictos
+                )
+            if resultado["success"]:
+                serie = resultado["serie"]
+                st.success(f"✅ {resultado['message']}: {serie.describir_regla()}")
+                proximas = [o.strftime('%d/%m/%Y %H:%M') for _, o in zip(range(5), serie.fechas(datetime.now()))]
+                st.markdown(f"**Próximas ocurrencias:** {', '.join(proximas) or 'ninguna'}")
+                planificador.guardar_datos()
+            else:
+                st.error(f"❌ {resultado['message']}")
+            return
+        
         # Mostrar resumen
         st.markdown("### 📋 Resumen del Evento")
         col_sum1, col_sum2 = st.columns(2)
@@ -1271,16 +1559,25 @@ def show_nuevo_evento(planificador):
         # Planificar evento con manejo de errores
         with st.spinner("⏳ Planificando evento..."):
             try:
-                resultado = planificador.planificar_evento(
-                    nombre=nombre,
-                    inicio=inicio,
-                    fin=fin,
-                    recursos_seleccionados=recursos_seleccionados,
-                    tipo=tipo,
-                    descripcion=descripcion,
-                    prioridad=prioridad,
-                    buscar_hueco_si_ocupado=buscar_hueco
-                )
+                resultado = None
+                if misma_reserva:
+                    # Confirmar la retención: los recursos ya estaban comprobados y ocupados
+                    resultado = planificador.confirmar_retencion(
+                        retencion['id'], nombre, tipo, descripcion, prioridad)
+                    if not resultado["success"]:
+                        planificador.liberar_retencion(retencion['id'])
+                        resultado = None
+                if resultado is None:
+                    resultado = planificador.planificar_evento(
+                        nombre=nombre,
+                        inicio=inicio,
+                        fin=fin,
+                        recursos_seleccionados=recursos_seleccionados,
+                        tipo=tipo,
+                        descripcion=descripcion,
+                        prioridad=prioridad,
+                        buscar_hueco_si_ocupado=buscar_hueco
+                    )
             except ValueError as e:
                 st.error(f"❌ Error de validación: {str(e)}")
                 st.session_state.evento_planificado = False
@@ -1322,6 +1619,7 @@ def show_nuevo_evento(planificador):
                     planificador.guardar_datos()
                     
                     # Botones adicionales si se creó un evento
+            mostrar_cuotas(resultado.get('detalles', {}).get('cuotas'))
             if st.session_state.get('evento_planificado'):
                 st.markdown("<div class='separator'></div>", unsafe_allow_html=True)
                 col_btn2, = st.columns(1)
@@ -1333,9 +1631,22 @@ def show_nuevo_evento(planificador):
         else:
             error_message = resultado.get('message', 'Error desconocido')
             st.error(f"❌ {error_message}")
+            mostrar_cuotas(resultado.get('detalles', {}).get('cuotas'))
             st.session_state.evento_planificado = False
             
             
+def mostrar_cuotas(cuotas):
+    """Uso de las cuotas por ventana móvil que afectan a una reserva (con la reserva incluida)"""
+    for cuota in cuotas or []:
+        tipo = f" ({cuota['tipo_evento']})" if cuota['tipo_evento'] else ""
+        texto = (f"⏳ Cuota de **{cuota['recurso']}**{tipo}: {cuota['horas_usadas']:g} de "
+                 f"{cuota['horas_maximas']:g} h en {cuota['ventana_dias']:g} días")
+        if cuota['horas_restantes'] < 0:
+            st.warning(f"{texto} (excedida en {-cuota['horas_restantes']:g} h)")
+        else:
+            st.info(f"{texto} (quedan {cuota['horas_restantes']:g} h)")
+            
+            
 def show_buscar_huecos(planificador):
     """Búsqueda de huecos disponibles"""
     st.title("🔍 Buscar Huecos Disponibles")
@@ -1418,6 +1729,18 @@ def show_buscar_huecos(planificador):
             # Actualizar el estado de sesión con la nueva selección
             st.session_state.hora_inicio_busqueda = hora_inicio_min
         
+        tipo_busqueda = st.selectbox(
+            "🎯 Tipo de evento",
+            ["Cualquiera", "entrenamiento", "procesamiento", "investigación", "reunión", "seminario", "inferencia"],
+            help="Las cuotas limitadas a un tipo de evento solo se tienen en cuenta si se indica el tipo"
+        )
+        
+        recomendar = st.checkbox(
+            "⚖️ Recomendar los huecos menos disputados",
+            help="Ordena los huecos por la ocupación media histórica de los recursos a esas horas "
+                 "de la semana en lugar de mostrar los más tempranos"
+        )
+        
         # Botón de búsqueda
         submitted = st.form_submit_button("🔎 Buscar Huecos", use_container_width=True)
     
@@ -1441,11 +1764,19 @@ def show_buscar_huecos(planificador):
                     recursos_con_cantidad=recursos_con_cantidad,
                     duracion_horas=duracion_horas,
                     inicio_busqueda=inicio_busqueda,
-                    dias=dias_busqueda
+                    dias=dias_busqueda,
+                    tipo=None if tipo_busqueda == "Cualquiera" else tipo_busqueda,
+                    recomendar=recomendar
                 )
             except Exception as e:
                 st.error(f"❌ Error al buscar huecos: {str(e)}")
                 huecos = []
+            
+            # Disponibilidad conjunta por hora (mapa de ocupación por franjas, sin verificar cada hora)
+            st.session_state.mapa_calor_huecos = (
+                inicio_busqueda.date(),
+                planificador.disponibilidad.mapa_calor(recursos_con_cantidad, inicio_busqueda.date(), dias_busqueda)
+            )
         
         st.session_state.huecos_encontrados = huecos
     
@@ -1459,8 +1790,11 @@ def show_buscar_huecos(planificador):
             
             fig_data = []
             for hueco in huecos[:10]:  # Mostrar solo 10 en el gráfico
+                etiqueta = f"Hueco {hueco['inicio'].strftime('%H:%M')}"
+                if 'contencion' in hueco:
+                    etiqueta = f"Hueco {hueco['inicio'].strftime('%a %d/%m %H:%M')} · contención {hueco['contencion']:.0%}"
                 fig_data.append({
-                    "Recursos": f"Hueco {hueco['inicio'].strftime('%H:%M')}",
+                    "Recursos": etiqueta,
                     "Inicio": hueco['inicio'],
                     "Fin": hueco['fin']
                 })
@@ -1501,6 +1835,26 @@ def show_buscar_huecos(planificador):
             st.markdown("- Menos recursos seleccionados")
             st.markdown("- Duración más corta")
             st.markdown("- Ampliar el rango de búsqueda")
+        
+        if st.session_state.get("mapa_calor_huecos"):
+            primer_dia, filas = st.session_state.mapa_calor_huecos
+            st.subheader("🗓️ Disponibilidad conjunta por hora")
+            st.caption("Porcentaje de cada hora en el que todos los recursos seleccionados tienen capacidad libre "
+                       "(solo capacidad; las demás restricciones se validan al planificar)")
+            fig_calor = px.imshow(
+                [[round(valor * 100) for valor in fila] for fila in filas],
+                x=[f"{hora:02d}:00" for hora in range(24)],
+                y=[(primer_dia + timedelta(days=n)).strftime('%a %d/%m') for n in range(len(filas))],
+                color_continuous_scale="Teal", zmin=0, zmax=100, aspect="auto",
+                labels={"color": "% libre"}
+            )
+            fig_calor.update_layout(
+                paper_bgcolor='rgba(0,0,0,0)',
+                plot_bgcolor='rgba(0,0,0,0)',
+                font_color='white',
+                height=max(250, 28 * len(filas))
+            )
+            st.plotly_chart(fig_calor, use_container_width=True)
             
 def show_datos(planificador):
     """Gestión de datos y persistencia"""
@@ -1613,6 +1967,8 @@ def show_datos(planificador):
                         planificador.gestor_eventos = gestor_eventos
                         planificador.gestor_recursos = gestor_recursos
                         planificador.restricciones = restricciones
+                        # Lo anterior a la restauración ya no se puede deshacer
+                        planificador.historial.limpiar()
                         planificador.advertencias_carga = advertencias
                         
                         for advertencia in advertencias:
@@ -1665,6 +2021,80 @@ def show_datos(planificador):
                         
 
 
+def show_diagnostico(planificador):
+    """Estadísticas de rendimiento y captura de perfiles (página oculta)"""
+    st.title("🩺 Diagnóstico de Rendimiento")
+
+    col_estado1, col_estado2, col_estado3 = st.columns(3)
+    with col_estado1:
+        DIAGNOSTICO.activo = st.toggle("Instrumentación activa", value=DIAGNOSTICO.activo)
+    with col_estado2:
+        st.metric("Eventos en memoria", len(planificador.gestor_eventos))
+    with col_estado3:
+        if st.button("🔄 Reiniciar estadísticas", use_container_width=True):
+            DIAGNOSTICO.reiniciar()
+            st.rerun()
+
+    # Tiempos por función y por página
+    st.subheader("⏱️ Tiempos por función")
+    filas = DIAGNOSTICO.estadisticas()
+    if filas:
+        df_tiempos = pd.DataFrame(filas)
+        st.dataframe(df_tiempos, use_container_width=True, hide_index=True, column_config={
+            "funcion": "Función",
+            "llamadas": "Llamadas",
+            "total_ms": st.column_config.NumberColumn("Total (ms)", format="%.2f"),
+            "media_ms": st.column_config.NumberColumn("Media (ms)", format="%.3f"),
+            "max_ms": st.column_config.NumberColumn("Máximo (ms)", format="%.3f"),
+        })
+    else:
+        st.info("ℹ️ Todavía no hay llamadas registradas")
+
+    # Contadores de trabajo interno
+    st.subheader("🔢 Contadores")
+    if DIAGNOSTICO.contadores:
+        df_contadores = pd.DataFrame(
+            sorted(DIAGNOSTICO.contadores.items()), columns=["Contador", "Valor"]
+        )
+        st.dataframe(df_contadores, use_container_width=True, hide_index=True)
+    else:
+        st.info("ℹ️ Sin contadores registrados")
+
+    st.markdown("<div class='separator'></div>", unsafe_allow_html=True)
+
+    # Captura detallada: el perfil se acumula mientras se navega por las demás páginas
+    st.subheader("🔬 Captura detallada")
+    if not DIAGNOSTICO.capturando:
+        col_cap1, col_cap2 = st.columns(2)
+        with col_cap1:
+            con_perfil = st.checkbox("Perfil de CPU (cProfile)", value=True)
+        with col_cap2:
+            con_memoria = st.checkbox("Memoria (tracemalloc)", value=False,
+                                      help="Ralentiza notablemente la aplicación mientras está activa")
+        if st.button("▶️ Iniciar captura", use_container_width=True):
+            DIAGNOSTICO.iniciar_captura(perfil=con_perfil, memoria=con_memoria)
+            st.rerun()
+    else:
+        st.warning("⚠️ Captura en curso: navega por la aplicación y vuelve aquí para detenerla")
+        if st.button("⏹️ Detener captura", use_container_width=True, type="primary"):
+            st.session_state.resultado_captura = DIAGNOSTICO.detener_captura()
+            st.rerun()
+
+    resultado = st.session_state.get("resultado_captura")
+    if resultado:
+        marca = datetime.now().strftime("%Y%m%d_%H%M%S")
+        if resultado["perfil"]:
+            with st.expander("📄 Perfil de CPU", expanded=True):
+                st.code(resultado["perfil"], language="text")
+            st.download_button("⬇️ Descargar perfil (.prof)", resultado["perfil_binario"],
+                               file_name=f"perfil_{marca}.prof", mime="application/octet-stream")
+        if resultado["memoria"]:
+            with st.expander("🧠 Reservas de memoria", expanded=True):
+                st.code(resultado["memoria"], language="text")
+            st.download_button("⬇️ Descargar informe de memoria", resultado["memoria"],
+                               file_name=f"memoria_{marca}.txt", mime="text/plain")
+
+
 # EJECUCIÓN DE LA APLICACIÓN
 
 if __name__ == "__main__":
@@ -0,0 +1,3 @@
+"""
+Benchmarks reproducibles del planificador
+"""
\ No newline at end of file
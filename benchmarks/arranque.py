@@ -0,0 +1,172 @@
+"""
+Benchmark de arranque de la aplicación
+
+    python -m benchmarks.arranque --repeticiones 5 --salida arranque.json
+    python -m benchmarks.arranque --comparar arranque_base.json
+
+Cada medición se hace en un intérprete nuevo (arranque en frío) y sobre una copia
+temporal del directorio de datos, para no modificar los datos reales:
+    - importar_paquete: importar el paquete raíz del proyecto
+    - importar_streamlit: importar streamlit (coste fijo que la aplicación no controla)
+    - primer_render: ejecutar app.py por primera vez con streamlit ya importado
+    - servidor_listo: desde 'python main.py' hasta que el servidor responde
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import platform
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import datetime
+from typing import Any, Callable, Dict, List
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Segundos máximos de espera para que el servidor de Streamlit responda
+ESPERA_MAXIMA_SERVIDOR = 60.0
+
+# Programas que se ejecutan en un intérprete limpio e imprimen los segundos medidos
+_IMPORTAR_PAQUETE = f"""
+import importlib.util, sys, time
+t0 = time.perf_counter()
+especificacion = importlib.util.spec_from_file_location(
+    "planificador_raiz", {os.path.join(RAIZ, "__init__.py")!r}, submodule_search_locations=[{RAIZ!r}])
+modulo = importlib.util.module_from_spec(especificacion)
+sys.modules["planificador_raiz"] = modulo
+especificacion.loader.exec_module(modulo)
+print(time.perf_counter() - t0)
+"""
+
+_IMPORTAR_STREAMLIT = """
+import time
+t0 = time.perf_counter()
+import streamlit
+print(time.perf_counter() - t0)
+"""
+
+_PRIMER_RENDER = f"""
+import time
+from streamlit.testing.v1 import AppTest
+prueba = AppTest.from_file({os.path.join(RAIZ, "app.py")!r}, default_timeout=120)
+t0 = time.perf_counter()
+prueba.run()
+transcurrido = time.perf_counter() - t0
+if prueba.exception:
+    raise SystemExit(str(prueba.exception))
+print(transcurrido)
+"""
+
+
+def _ejecutar_programa(programa: str, directorio: str) -> float:
+    salida = subprocess.run([sys.executable, "-c", programa], cwd=directorio,
+                            capture_output=True, text=True, check=True)
+    # La última línea es el tiempo; las anteriores son mensajes del planificador
+    return float(salida.stdout.strip().splitlines()[-1])
+
+
+def _puerto_libre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def medir_servidor_listo(directorio: str) -> float:
+    """Lanza main.py y espera a que /_stcore/health responda"""
+    puerto = _puerto_libre()
+    t0 = time.perf_counter()
+    proceso = subprocess.Popen([sys.executable, os.path.join(RAIZ, "main.py"), "--puerto", str(puerto),
+                                "--sin-navegador"], cwd=directorio,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - t0 < ESPERA_MAXIMA_SERVIDOR:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{puerto}/_stcore/health", timeout=1) as r:
+                    if r.status == 200:
+                        return time.perf_counter() - t0
+            except OSError:
+                time.sleep(0.05)
+        raise TimeoutError("El servidor de Streamlit no respondió a tiempo")
+    finally:
+        proceso.terminate()
+        proceso.wait()
+
+
+# nombre: función que recibe el directorio de trabajo y devuelve los segundos medidos
+MEDICIONES: Dict[str, Callable[[str], float]] = {
+    "importar_paquete": lambda d: _ejecutar_programa(_IMPORTAR_PAQUETE, d),
+    "importar_streamlit": lambda d: _ejecutar_programa(_IMPORTAR_STREAMLIT, d),
+    "primer_render": lambda d: _ejecutar_programa(_PRIMER_RENDER, d),
+    "servidor_listo": medir_servidor_listo,
+}
+
+
+def ejecutar(mediciones: List[str], repeticiones: int) -> Dict[str, Any]:
+    resultados = []
+    with tempfile.TemporaryDirectory(prefix="benchmark_arranque_") as directorio:
+        if os.path.isdir(os.path.join(RAIZ, "datos")):
+            shutil.copytree(os.path.join(RAIZ, "datos"), os.path.join(directorio, "datos"))
+
+        for nombre in mediciones:
+            tiempos = sorted(MEDICIONES[nombre](directorio) for _ in range(repeticiones))
+            resultados.append({
+                "medicion": nombre,
+                "repeticiones": repeticiones,
+                "mediana_ms": statistics.median(tiempos) * 1000,
+                "min_ms": tiempos[0] * 1000,
+                "max_ms": tiempos[-1] * 1000,
+            })
+            print(f"  {nombre:<20} mediana={resultados[-1]['mediana_ms']:9.1f} ms  "
+                  f"min={resultados[-1]['min_ms']:9.1f} ms", file=sys.stderr)
+
+    return {
+        "metadata": {
+            "fecha": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+        },
+        "resultados": resultados,
+    }
+
+
+def comparar(base: Dict[str, Any], nuevo: Dict[str, Any]):
+    """Imprime la variación de la mediana entre dos ejecuciones"""
+    indice = {r["medicion"]: r for r in base.get("resultados", [])}
+    print(f"{'medición':<20} {'base (ms)':>11} {'nuevo (ms)':>11} {'cambio':>8}")
+    for r in nuevo["resultados"]:
+        anterior = indice.get(r["medicion"])
+        if not anterior:
+            continue
+        cambio = (r["mediana_ms"] / anterior["mediana_ms"] - 1) * 100 if anterior["mediana_ms"] else 0.0
+        print(f"{r['medicion']:<20} {anterior['mediana_ms']:>11.1f} {r['mediana_ms']:>11.1f} {cambio:>+7.1f}%")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de arranque del Planificador Inteligente de Eventos")
+    parser.add_argument("--mediciones", default=",".join(MEDICIONES),
+                        help="Mediciones a realizar separadas por comas")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--salida", default="resultados_benchmark_arranque.json")
+    parser.add_argument("--comparar", help="Resultados anteriores con los que comparar")
+    argumentos = parser.parse_args()
+
+    mediciones = [m.strip() for m in argumentos.mediciones.split(",") if m.strip()]
+    desconocidas = [m for m in mediciones if m not in MEDICIONES]
+    if desconocidas:
+        parser.error(f"Mediciones desconocidas: {', '.join(desconocidas)}")
+
+    informe = ejecutar(mediciones, argumentos.repeticiones)
+
+    with open(argumentos.salida, 'w', encoding='utf-8') as f:
+        json.dump(informe, f, indent=2, ensure_ascii=False)
+    print(f"Resultados guardados en {argumentos.salida}", file=sys.stderr)
+
+    if argumentos.comparar:
+        with open(argumentos.comparar, 'r', encoding='utf-8') as f:
+            comparar(json.load(f), informe)
@@ -0,0 +1,250 @@
+"""
+Ejecutor de benchmarks del planificador
+
+    python -m benchmarks.ejecutar --tamanos 1000,10000,100000,1000000 --salida resultados.json
+    python -m benchmarks.ejecutar --comparar base.json --salida nuevo.json
+
+Para cada tamaño de centro y cada operación mide la latencia (percentiles), el
+rendimiento (operaciones por segundo) y la memoria pico, y guarda todo en JSON
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List
+
+# Configurar path para importaciones (raíz del proyecto)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aplicacion.linea_tiempo import agregar_linea_tiempo
+from benchmarks.generador import generar_centro, horizonte
+from dominio.eventos import Evento
+from dominio.restricciones import validar_restricciones
+from infraestructura.persistencia import Persistencia
+
+TAMANOS_PREDETERMINADOS = [1_000, 10_000]
+
+
+class Contexto:
+    """Estado compartido por las operaciones de un mismo tamaño de centro"""
+
+    def __init__(self, planificador, semilla: int, directorio: str):
+        self.planificador = planificador
+        self.rng = random.Random(semilla)
+        self.directorio = directorio
+        self.recursos = list(planificador.gestor_recursos)
+        self.inicio, self.fin = horizonte(planificador.gestor_eventos)
+        self.archivo = os.path.join(directorio, "datos.json")
+        # Muestra fija de eventos serializados para medir Evento.from_dict
+        eventos = list(planificador.gestor_eventos.eventos.values())
+        self.diccionarios = [e.to_dict() for e in self.rng.sample(eventos, min(1000, len(eventos)))]
+
+    def momento_aleatorio(self) -> datetime:
+        segundos = int((self.fin - self.inicio).total_seconds())
+        return self.inicio + timedelta(seconds=self.rng.randrange(max(segundos, 1)))
+
+    def evento_aleatorio(self) -> Evento:
+        comienzo = self.momento_aleatorio()
+        return Evento(
+            nombre="consulta",
+            inicio=comienzo,
+            fin=comienzo + timedelta(minutes=self.rng.randrange(30, 480)),
+            recursos=self.rng.sample(self.recursos, self.rng.randint(1, 3)),
+            tipo="entrenamiento"
+        )
+
+    def recursos_aleatorios(self) -> Dict[str, int]:
+        return {r.id: 1 for r in self.rng.sample(self.recursos, self.rng.randint(1, 2))}
+
+
+# Operaciones medidas. Cada una recibe el contexto y hace una única llamada medida;
+# la preparación de argumentos se hace en 'preparar' para no contaminar la medición
+
+def _preparar_evento(ctx: Contexto):
+    return (ctx.evento_aleatorio(),)
+
+
+def _medir_verificar_conflictos(ctx: Contexto, evento):
+    ctx.planificador.verificar_conflictos(evento)
+
+
+def _preparar_hueco(ctx: Contexto):
+    return (ctx.recursos_aleatorios(), ctx.momento_aleatorio())
+
+
+def _medir_buscar_hueco(ctx: Contexto, recursos, inicio):
+    ctx.planificador.buscar_hueco_disponible(recursos, 2.0, inicio_busqueda=inicio, dias=1, max_resultados=5)
+
+
+def _medir_validar_restricciones(ctx: Contexto, evento):
+    validar_restricciones(evento.recursos, evento, ctx.planificador.restricciones)
+
+
+def _preparar_nada(ctx: Contexto):
+    return ()
+
+
+def _medir_guardar_sistema(ctx: Contexto):
+    p = ctx.planificador
+    Persistencia.guardar_sistema(p.gestor_eventos, p.gestor_recursos, p.restricciones, ctx.archivo)
+
+
+def _medir_cargar_sistema(ctx: Contexto):
+    Persistencia.cargar_sistema(ctx.archivo)
+
+
+def _preparar_diccionario(ctx: Contexto):
+    datos = dict(ctx.rng.choice(ctx.diccionarios))
+    datos["recursos"] = [ctx.planificador.gestor_recursos.obtener_recurso(r["id"]) for r in datos["recursos"]]
+    return (datos,)
+
+
+def _medir_from_dict(ctx: Contexto, datos):
+    Evento.from_dict(datos)
+
+
+def _preparar_mes(ctx: Contexto):
+    return (ctx.momento_aleatorio(),)
+
+
+def _medir_linea_tiempo(ctx: Contexto, inicio):
+    # Vista Gantt de todo el centro durante un mes (zoom automático)
+    agregar_linea_tiempo(ctx.planificador.gestor_eventos, ctx.recursos, inicio, inicio + timedelta(days=30))
+
+
+# nombre: (preparar, medir, muestras máximas)
+OPERACIONES: Dict[str, tuple] = {
+    "verificar_conflictos": (_preparar_evento, _medir_verificar_conflictos, 200),
+    "buscar_hueco_disponible": (_preparar_hueco, _medir_buscar_hueco, 20),
+    "validar_restricciones": (_preparar_evento, _medir_validar_restricciones, 2000),
+    "guardar_sistema": (_preparar_nada, _medir_guardar_sistema, 5),
+    "cargar_sistema": (_preparar_nada, _medir_cargar_sistema, 5),
+    "evento_from_dict": (_preparar_diccionario, _medir_from_dict, 5000),
+    "linea_tiempo": (_preparar_mes, _medir_linea_tiempo, 20),
+}
+
+
+def percentil(valores_ordenados: List[float], p: float) -> float:
+    """Percentil por el método del rango más cercano"""
+    if not valores_ordenados:
+        return 0.0
+    indice = min(len(valores_ordenados) - 1, max(0, int(round(p / 100 * len(valores_ordenados))) - 1))
+    return valores_ordenados[indice]
+
+
+def medir_operacion(ctx: Contexto, preparar: Callable, medir: Callable,
+                    muestras: int, presupuesto_segundos: float) -> Dict[str, Any]:
+    """Mide una operación hasta agotar las muestras o el presupuesto de tiempo"""
+    latencias = []
+    total = 0.0
+    while len(latencias) < muestras and (total < presupuesto_segundos or not latencias):
+        argumentos = preparar(ctx)
+        t0 = time.perf_counter()
+        medir(ctx, *argumentos)
+        transcurrido = time.perf_counter() - t0
+        latencias.append(transcurrido)
+        total += transcurrido
+
+    # La memoria se mide aparte porque tracemalloc ralentiza la ejecución
+    argumentos = preparar(ctx)
+    tracemalloc.start()
+    medir(ctx, *argumentos)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencias.sort()
+    return {
+        "muestras": len(latencias),
+        "p50_ms": percentil(latencias, 50) * 1000,
+        "p90_ms": percentil(latencias, 90) * 1000,
+        "p99_ms": percentil(latencias, 99) * 1000,
+        "media_ms": total / len(latencias) * 1000,
+        "max_ms": latencias[-1] * 1000,
+        "operaciones_por_segundo": len(latencias) / total if total > 0 else None,
+        "memoria_pico_kb": pico / 1024,
+    }
+
+
+def ejecutar(tamanos: List[int], operaciones: List[str], semilla: int, densidad: float,
+             presupuesto_segundos: float) -> Dict[str, Any]:
+    resultados = []
+    with tempfile.TemporaryDirectory(prefix="benchmark_planificador_") as directorio:
+        for tamano in tamanos:
+            t0 = time.perf_counter()
+            planificador = generar_centro(tamano, densidad=densidad, semilla=semilla,
+                                          datos_dir=os.path.join(directorio, "datos"))
+            print(f"Centro de {tamano} eventos generado en {time.perf_counter() - t0:.2f}s", file=sys.stderr)
+            ctx = Contexto(planificador, semilla, directorio)
+
+            # cargar_sistema necesita un archivo guardado previamente
+            _medir_guardar_sistema(ctx)
+
+            for nombre in operaciones:
+                preparar, medir, muestras = OPERACIONES[nombre]
+                metricas = medir_operacion(ctx, preparar, medir, muestras, presupuesto_segundos)
+                resultados.append({"tamano": tamano, "operacion": nombre, **metricas})
+                print(f"  {nombre:<26} p50={metricas['p50_ms']:10.3f} ms  "
+                      f"p99={metricas['p99_ms']:10.3f} ms  ({metricas['muestras']} muestras)", file=sys.stderr)
+
+    return {
+        "metadata": {
+            "fecha": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "semilla": semilla,
+            "densidad": densidad,
+            "presupuesto_segundos": presupuesto_segundos,
+        },
+        "resultados": resultados,
+    }
+
+
+def comparar(base: Dict[str, Any], nuevo: Dict[str, Any]):
+    """Imprime la variación de p50 y p99 entre dos ejecuciones"""
+    indice = {(r["tamano"], r["operacion"]): r for r in base.get("resultados", [])}
+    print(f"{'operación':<26} {'tamaño':>9} {'p50 base':>11} {'p50 nuevo':>11} {'cambio':>8}")
+    for r in nuevo["resultados"]:
+        anterior = indice.get((r["tamano"], r["operacion"]))
+        if not anterior:
+            continue
+        cambio = (r["p50_ms"] / anterior["p50_ms"] - 1) * 100 if anterior["p50_ms"] else 0.0
+        print(f"{r['operacion']:<26} {r['tamano']:>9} {anterior['p50_ms']:>11.3f} {r['p50_ms']:>11.3f} {cambio:>+7.1f}%")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks del Planificador Inteligente de Eventos")
+    parser.add_argument("--tamanos", default=",".join(str(t) for t in TAMANOS_PREDETERMINADOS),
+                        help="Cantidades de eventos separadas por comas (p. ej. 1000,10000,100000,1000000)")
+    parser.add_argument("--operaciones", default=",".join(OPERACIONES),
+                        help="Operaciones a medir separadas por comas")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--densidad", type=float, default=0.5,
+                        help="Eventos simultáneos promedio por recurso")
+    parser.add_argument("--presupuesto", type=float, default=5.0,
+                        help="Segundos máximos de medición por operación y tamaño")
+    parser.add_argument("--salida", default="resultados_benchmark.json")
+    parser.add_argument("--comparar", help="Resultados anteriores con los que comparar")
+    argumentos = parser.parse_args()
+
+    operaciones = [o.strip() for o in argumentos.operaciones.split(",") if o.strip()]
+    desconocidas = [o for o in operaciones if o not in OPERACIONES]
+    if desconocidas:
+        parser.error(f"Operaciones desconocidas: {', '.join(desconocidas)}")
+
+    informe = ejecutar([int(t) for t in argumentos.tamanos.split(",")], operaciones,
+                       argumentos.semilla, argumentos.densidad, argumentos.presupuesto)
+
+    with open(argumentos.salida, 'w', encoding='utf-8') as f:
+        json.dump(informe, f, indent=2, ensure_ascii=False)
+    print(f"Resultados guardados en {argumentos.salida}", file=sys.stderr)
+
+    if argumentos.comparar:
+        with open(argumentos.comparar, 'r', encoding='utf-8') as f:
+            comparar(json.load(f), informe)
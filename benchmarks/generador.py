@@ -0,0 +1,132 @@
+"""
+Generador de cargas sintéticas reproducibles para los benchmarks
+Construye centros realistas (recursos por tipo, eventos con densidad de solapamiento
+controlada y un conjunto de restricciones) a partir de una semilla
+"""
+from __future__ import annotations
+import os
+import random
+import shutil
+import sys
+import tempfile
+import weakref
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+# Configurar path para importaciones (raíz del proyecto)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aplicacion.planificador import Planificador
+from dominio.recursos import Recurso, GestorRecursos
+from dominio.eventos import Evento, GestorEventos
+from dominio.restricciones import (
+    Restriccion, RestriccionCoRequisito, RestriccionExclusionMutua, RestriccionCapacidad
+)
+
+# Fecha fija para que dos ejecuciones con la misma semilla generen exactamente lo mismo
+FECHA_BASE = datetime(2030, 1, 7, 8, 0)
+
+TIPOS_EVENTO = ["entrenamiento", "procesamiento", "investigación", "reunión", "seminario", "inferencia"]
+
+RECURSOS_POR_TIPO = {"computacional": 8, "humano": 8, "espacio": 4}
+
+# Duración de los eventos generados (horas)
+DURACION_MINIMA = 0.5
+DURACION_MAXIMA = 8.0
+
+
+def generar_recursos(recursos_por_tipo: Dict[str, int], rng: random.Random) -> GestorRecursos:
+    """Crea N recursos de cada tipo con capacidades y atributos verosímiles"""
+    gestor = GestorRecursos()
+    for tipo, cantidad in recursos_por_tipo.items():
+        for i in range(cantidad):
+            atributos = {}
+            if tipo == "computacional":
+                atributos["consumo_energia"] = f"{rng.uniform(0.5, 7.0):.1f}kW"
+            capacidad = rng.choice([1, 1, 1, 2, 3, 4])
+            gestor.agregar_recurso(Recurso(f"{tipo}_{i:03d}", f"{tipo.capitalize()} {i}", tipo, capacidad, atributos))
+    return gestor
+
+
+def generar_restricciones(gestor_recursos: GestorRecursos, rng: random.Random,
+                          cantidad: int = 6) -> List[Restriccion]:
+    """Co-requisitos y exclusiones entre recursos al azar, más un límite de capacidad por tipo"""
+    ids = sorted(gestor_recursos.recursos)
+    restricciones: List[Restriccion] = []
+    for i in range(cantidad):
+        a, b = rng.sample(ids, 2)
+        if i % 2 == 0:
+            restricciones.append(RestriccionCoRequisito(a, b))
+        else:
+            restricciones.append(RestriccionExclusionMutua(a, b))
+    for tipo in sorted({r.tipo for r in gestor_recursos}):
+        restricciones.append(RestriccionCapacidad(capacidad_maxima=4, tipo_recurso=tipo))
+    return restricciones
+
+
+def generar_eventos(gestor_recursos: GestorRecursos, n_eventos: int, densidad: float,
+                    rng: random.Random, inicio: datetime = FECHA_BASE) -> GestorEventos:
+    """
+    Genera eventos repartidos uniformemente en un horizonte calculado para que cada
+    recurso tenga, en promedio, 'densidad' eventos activos a la vez
+    """
+    recursos = list(gestor_recursos)
+    duracion_media = (DURACION_MINIMA + DURACION_MAXIMA) / 2
+    recursos_por_evento = 2
+    horizonte_horas = max(
+        24.0, n_eventos * recursos_por_evento * duracion_media / (len(recursos) * max(densidad, 1e-6))
+    )
+
+    gestor = GestorEventos()
+    for i in range(n_eventos):
+        comienzo = inicio + timedelta(minutes=rng.randrange(int(horizonte_horas * 60)))
+        duracion = timedelta(minutes=rng.randrange(int(DURACION_MINIMA * 60), int(DURACION_MAXIMA * 60)))
+        seleccion = rng.sample(recursos, rng.randint(1, 3))
+        gestor.agregar_evento(Evento(
+            id=f"evento_{i:08d}",
+            nombre=f"Evento sintético {i}",
+            inicio=comienzo,
+            fin=comienzo + duracion,
+            recursos=seleccion,
+            tipo=rng.choice(TIPOS_EVENTO),
+            prioridad=rng.randint(1, 5),
+        ))
+    return gestor
+
+
+def horizonte(gestor_eventos: GestorEventos) -> tuple:
+    """Devuelve (inicio, fin) del periodo cubierto por los eventos generados"""
+    inicio = min((e.inicio for e in gestor_eventos), default=FECHA_BASE)
+    fin = max((e.fin for e in gestor_eventos), default=FECHA_BASE + timedelta(days=1))
+    return inicio, fin
+
+
+def generar_centro(
+    n_eventos: int,
+    recursos_por_tipo: Optional[Dict[str, int]] = None,
+    densidad: float = 0.5,
+    semilla: int = 42,
+    datos_dir: Optional[str] = None
+) -> Planificador:
+    """
+    Construye un Planificador sintético completo
+    Args:
+        n_eventos: cantidad de eventos a generar
+        recursos_por_tipo: {tipo: cantidad de recursos}
+        densidad: eventos simultáneos promedio por recurso (controla el solapamiento)
+        semilla: semilla del generador pseudoaleatorio
+        datos_dir: directorio de datos del planificador. Por defecto uno temporal nuevo,
+            para no crear nada en el directorio de trabajo, que se borra al liberarse el
+            planificador (o al salir del intérprete)
+    """
+    temporal = datos_dir is None
+    if temporal:
+        datos_dir = tempfile.mkdtemp(prefix="datos_benchmark_")
+    rng = random.Random(semilla)
+    planificador = Planificador(datos_dir)
+    if temporal:
+        weakref.finalize(planificador, shutil.rmtree, datos_dir, True)
+    planificador.gestor_recursos = generar_recursos(recursos_por_tipo or RECURSOS_POR_TIPO, rng)
+    planificador.restricciones = generar_restricciones(planificador.gestor_recursos, rng)
+    planificador.gestor_eventos = generar_eventos(planificador.gestor_recursos, n_eventos, densidad, rng)
+    return planificador
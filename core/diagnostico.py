@@ -0,0 +1,145 @@
+"""
+Instrumentación ligera para diagnosticar el rendimiento del planificador
+Registra llamadas, tiempo de reloj y contadores de trabajo interno, y permite
+activar en caliente una captura con cProfile y/o tracemalloc
+"""
+import cProfile
+import functools
+import io
+import marshal
+import pstats
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+
+
+class Diagnostico:
+    """Registro de llamadas, tiempos y contadores (una sola instancia global: DIAGNOSTICO)"""
+
+    def __init__(self):
+        self.activo = True
+        self.llamadas: Dict[str, int] = {}
+        self.tiempo_total: Dict[str, float] = {}
+        self.tiempo_maximo: Dict[str, float] = {}
+        self.contadores: Dict[str, int] = {}
+        self._perfil: Optional[cProfile.Profile] = None
+        self._memoria = False
+
+    def registrar_llamada(self, nombre: str, duracion: float):
+        """Acumula una llamada de 'duracion' segundos"""
+        self.llamadas[nombre] = self.llamadas.get(nombre, 0) + 1
+        self.tiempo_total[nombre] = self.tiempo_total.get(nombre, 0.0) + duracion
+        if duracion > self.tiempo_maximo.get(nombre, 0.0):
+            self.tiempo_maximo[nombre] = duracion
+
+    def contar(self, nombre: str, cantidad: int = 1):
+        """Incrementa un contador de trabajo interno (huecos probados, eventos examinados...)"""
+        if self.activo:
+            self.contadores[nombre] = self.contadores.get(nombre, 0) + cantidad
+
+    def reiniciar(self):
+        """Borra todas las estadísticas acumuladas"""
+        self.llamadas.clear()
+        self.tiempo_total.clear()
+        self.tiempo_maximo.clear()
+        self.contadores.clear()
+
+    def estadisticas(self) -> List[Dict[str, Any]]:
+        """Resumen por función, ordenado por tiempo total descendente"""
+        filas = []
+        for nombre, llamadas in self.llamadas.items():
+            total = self.tiempo_total[nombre]
+            filas.append({
+                "funcion": nombre,
+                "llamadas": llamadas,
+                "total_ms": total * 1000,
+                "media_ms": total / llamadas * 1000,
+                "max_ms": self.tiempo_maximo[nombre] * 1000,
+            })
+        filas.sort(key=lambda f: f["total_ms"], reverse=True)
+        return filas
+
+    # Captura detallada (cProfile / tracemalloc)
+
+    @property
+    def capturando(self) -> bool:
+        return self._perfil is not None or self._memoria
+
+    def iniciar_captura(self, perfil: bool = True, memoria: bool = False):
+        """Comienza una captura detallada. El perfil se acumula con reanudar/pausar_perfil"""
+        if perfil and self._perfil is None:
+            self._perfil = cProfile.Profile()
+        if memoria and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._memoria = True
+
+    def reanudar_perfil(self):
+        """Activa el perfilador en el hilo actual (cProfile solo observa el hilo que lo activa)"""
+        if self._perfil is not None:
+            self._perfil.enable()
+
+    def pausar_perfil(self):
+        if self._perfil is not None:
+            self._perfil.disable()
+
+    def detener_captura(self, limite: int = 30) -> Dict[str, Any]:
+        """
+        Termina la captura y devuelve los resultados
+        Returns:
+            {'perfil': texto de pstats, 'perfil_binario': bytes para snakeviz/pstats,
+             'memoria': texto con las líneas que más memoria reservaron}
+        """
+        resultado: Dict[str, Any] = {"perfil": "", "perfil_binario": b"", "memoria": ""}
+
+        if self._perfil is not None:
+            self._perfil.disable()
+            salida = io.StringIO()
+            estadisticas = pstats.Stats(self._perfil, stream=salida)
+            estadisticas.sort_stats("cumulative").print_stats(limite)
+            resultado["perfil"] = salida.getvalue()
+            resultado["perfil_binario"] = _serializar_perfil(self._perfil)
+            self._perfil = None
+
+        if self._memoria:
+            instantanea = tracemalloc.take_snapshot()
+            actual, pico = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self._memoria = False
+            lineas = [f"Memoria actual: {actual / 1024:.1f} KB - pico: {pico / 1024:.1f} KB"]
+            for estadistica in instantanea.statistics("lineno")[:limite]:
+                lineas.append(str(estadistica))
+            resultado["memoria"] = "\n".join(lineas)
+
+        return resultado
+
+
+def _serializar_perfil(perfil: cProfile.Profile) -> bytes:
+    """Devuelve el perfil en el formato binario de pstats (el mismo que dump_stats)"""
+    perfil.create_stats()
+    return marshal.dumps(perfil.stats)
+
+
+DIAGNOSTICO = Diagnostico()
+
+
+def instrumentar(nombre: Optional[str] = None) -> Callable:
+    """Decorador que registra llamadas y tiempo de reloj de una función"""
+    def decorador(funcion: Callable) -> Callable:
+        etiqueta = nombre or funcion.__qualname__
+
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            if not DIAGNOSTICO.activo:
+                return funcion(*args, **kwargs)
+            inicio = time.perf_counter()
+            try:
+                return funcion(*args, **kwargs)
+            finally:
+                DIAGNOSTICO.registrar_llamada(etiqueta, time.perf_counter() - inicio)
+        return envoltura
+    return decorador
+
+
+def contar(nombre: str, cantidad: int = 1):
+    """Atajo para DIAGNOSTICO.contar"""
+    DIAGNOSTICO.contar(nombre, cantidad)
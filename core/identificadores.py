@@ -0,0 +1,69 @@
+"""
+Identificadores ordenables por tiempo (al estilo ULID)
+Cada id es un prefijo legible seguido de 26 caracteres en base32 de Crockford:
+48 bits con los milisegundos de creación y 80 bits aleatorios. Con 80 bits por
+milisegundo las colisiones no son un problema a ninguna escala, y como la marca de
+tiempo va delante, el orden alfabético de los ids es el orden de creación
+"""
+import random
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+
+# Base32 de Crockford en minúsculas (sin i, l, o, u para evitar confusiones)
+ALFABETO = "0123456789abcdefghjkmnpqrstvwxyz"
+
+LONGITUD = 26
+_BITS_ALEATORIOS = 80
+_MAXIMO_ALEATORIO = (1 << _BITS_ALEATORIOS) - 1
+_DESPLAZAMIENTOS = range(5 * (LONGITUD - 1), -1, -5)
+_VALORES = {caracter: valor for valor, caracter in enumerate(ALFABETO)}
+
+
+class _Generador:
+    """
+    Genera valores de 128 bits crecientes dentro del proceso: en el mismo milisegundo
+    (o si el reloj retrocede) se incrementa la parte aleatoria en lugar de sortearla
+    """
+
+    def __init__(self):
+        self._cerrojo = threading.Lock()
+        self._ultimo_ms = -1
+        self._ultimo_aleatorio = 0
+
+    def siguiente(self) -> int:
+        milisegundos = time.time_ns() // 1_000_000
+        with self._cerrojo:
+            if milisegundos <= self._ultimo_ms:
+                milisegundos = self._ultimo_ms
+                aleatorio = self._ultimo_aleatorio + 1
+                if aleatorio > _MAXIMO_ALEATORIO:
+                    milisegundos += 1
+                    aleatorio = random.getrandbits(_BITS_ALEATORIOS)
+            else:
+                # random se vuelve a sembrar en los procesos hijos tras un fork
+                aleatorio = random.getrandbits(_BITS_ALEATORIOS)
+            self._ultimo_ms = milisegundos
+            self._ultimo_aleatorio = aleatorio
+        return (milisegundos << _BITS_ALEATORIOS) | aleatorio
+
+
+_GENERADOR = _Generador()
+
+
+def generar_id(prefijo: str) -> str:
+    """Nuevo id '<prefijo>_<26 caracteres>' (p. ej. 'evento_01hx3k...')"""
+    valor = _GENERADOR.siguiente()
+    return f"{prefijo}_{''.join([ALFABETO[(valor >> desplazamiento) & 31] for desplazamiento in _DESPLAZAMIENTOS])}"
+
+
+def instante_de_id(identificador: str) -> Optional[datetime]:
+    """Momento de creación codificado en un id de generar_id (None si el id tiene otro formato)"""
+    codigo = identificador.rpartition("_")[2]
+    if len(codigo) != LONGITUD or any(caracter not in _VALORES for caracter in codigo):
+        return None
+    valor = 0
+    for caracter in codigo:
+        valor = (valor << 5) | _VALORES[caracter]
+    return datetime.fromtimestamp((valor >> _BITS_ALEATORIOS) / 1000)
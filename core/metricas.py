@@ -0,0 +1,323 @@
+"""
+Métricas de producción del planificador en formato de exposición de Prometheus
+Los contadores e histogramas se preasignan al importar el módulo. Pueden registrarse
+desde varios hilos del mismo proceso (la interfaz y el hilo de la API con main.py
+--con-api, los hilos de cada petición), así que cada hilo escribe en su propio
+fragmento de celdas preasignadas: registrar un valor solo suma sobre una lista ya
+creada, sin cerrojos, y al exponer se suman los fragmentos de todos los hilos
+"""
+import itertools
+import os
+import tempfile
+import threading
+import weakref
+from bisect import bisect_left
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+def _escapar(valor: str) -> str:
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _etiquetas(nombres: Sequence[str], valores: Sequence[str], extra: str = "") -> str:
+    partes = [f'{nombre}="{_escapar(valor)}"' for nombre, valor in zip(nombres, valores)]
+    if extra:
+        partes.append(extra)
+    return "{" + ",".join(partes) + "}" if partes else ""
+
+
+def _numero(valor: float) -> str:
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class _Testigo:
+    """Vive en el almacenamiento local de un hilo: cuando el hilo termina se libera"""
+
+    def __init__(self, celdas: List[float]):
+        self.celdas = celdas
+
+
+class _PorHilo:
+    """
+    Celdas de una métrica repartidas por hilos. Cada hilo escribe solo en las suyas
+    (creadas la primera vez que registra), así que nadie más las modifica y registrar
+    no necesita cerrojo. El cerrojo solo se usa al crear o retirar un fragmento y al
+    sumarlos; al terminar un hilo, sus celdas se acumulan en las retiradas
+    """
+
+    def __init__(self, tamano: int):
+        self.tamano = tamano
+        self._local = threading.local()
+        self._cerrojo = threading.Lock()
+        self._claves = itertools.count()
+        self._vivos: Dict[int, List[float]] = {}
+        self._retiradas: List[float] = [0] * tamano
+
+    def celdas(self) -> List[float]:
+        """Las celdas del hilo actual"""
+        try:
+            return self._local.testigo.celdas
+        except AttributeError:
+            return self._registrar()
+
+    def _registrar(self) -> List[float]:
+        clave = next(self._claves)
+        with self._cerrojo:
+            # Con el cerrojo, para no perderse una ampliación simultánea
+            celdas = self._vivos[clave] = [0] * self.tamano
+        testigo = _Testigo(celdas)
+        weakref.finalize(testigo, self._retirar, clave)
+        self._local.testigo = testigo
+        return celdas
+
+    def _retirar(self, clave: int):
+        with self._cerrojo:
+            celdas = self._vivos.pop(clave, None)
+            if celdas is not None:
+                self._retiradas = [a + b for a, b in zip(self._retiradas, celdas)]
+
+    def ampliar(self, tamano: int):
+        """Añade celdas al final (nuevas combinaciones de etiquetas); lo llama cualquier hilo"""
+        with self._cerrojo:
+            faltan = tamano - self.tamano
+            if faltan <= 0:
+                return
+            self.tamano = tamano
+            self._retiradas.extend([0] * faltan)
+            for celdas in self._vivos.values():
+                celdas.extend([0] * faltan)
+
+    def total(self) -> List[float]:
+        """Suma de las celdas de todos los hilos"""
+        with self._cerrojo:
+            total = list(self._retiradas)
+            for celdas in self._vivos.values():
+                for posicion, valor in enumerate(celdas[:len(total)]):
+                    total[posicion] += valor
+        return total
+
+    def reiniciar(self):
+        """Pone a cero todas las celdas (un registro simultáneo en otro hilo puede perderse)"""
+        with self._cerrojo:
+            self._retiradas = [0] * self.tamano
+            for celdas in self._vivos.values():
+                celdas[:] = [0] * len(celdas)
+
+
+class Contador:
+    """
+    Contador monótono, opcionalmente con etiquetas (p. ej. el motivo de un rechazo).
+    Las combinaciones de etiquetas conocidas se preasignan con 'valores'; una nueva
+    reserva su celda la primera vez que aparece
+    """
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = (),
+                 valores: Sequence[Tuple[str, ...]] = ()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        claves = [tuple(clave) for clave in valores] if self.etiquetas else [()]
+        self._posiciones: Dict[Tuple[str, ...], int] = {clave: i for i, clave in enumerate(claves)}
+        self._celdas = _PorHilo(len(self._posiciones))
+        self._nuevas = threading.Lock()
+
+    def _posicion(self, clave: Tuple[str, ...]) -> int:
+        posicion = self._posiciones.get(clave)
+        if posicion is None:
+            # Combinación no preasignada: fuera del camino habitual
+            with self._nuevas:
+                posicion = self._posiciones.get(clave)
+                if posicion is None:
+                    posicion = len(self._posiciones)
+                    self._celdas.ampliar(posicion + 1)
+                    self._posiciones = {**self._posiciones, clave: posicion}
+        return posicion
+
+    def incrementar(self, cantidad: float = 1, *valores_etiquetas: str):
+        self._celdas.celdas()[self._posicion(valores_etiquetas)] += cantidad
+
+    def _valores(self) -> Dict[Tuple[str, ...], float]:
+        total = self._celdas.total()
+        return {clave: total[posicion] for clave, posicion in self._posiciones.items() if posicion < len(total)}
+
+    def valor(self, *valores_etiquetas: str) -> float:
+        return self._valores().get(tuple(valores_etiquetas), 0)
+
+    def reiniciar(self):
+        self._celdas.reiniciar()
+
+    def exponer(self) -> List[str]:
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} counter"]
+        for clave, valor in sorted(self._valores().items()):
+            lineas.append(f"{self.nombre}{_etiquetas(self.etiquetas, clave)} {_numero(valor)}")
+        return lineas
+
+
+class Histograma:
+    """
+    Histograma con cubetas fijas: observar() es una búsqueda binaria y dos sumas. Las
+    celdas de cada hilo son las cubetas (la última, +Inf) y la suma de lo observado; la
+    cuenta se obtiene de las cubetas al exponer
+    """
+
+    def __init__(self, nombre: str, ayuda: str, limites: Sequence[float]):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.limites = sorted(limites)
+        self._celdas = _PorHilo(len(self.limites) + 2)
+
+    def observar(self, valor: float):
+        celdas = self._celdas.celdas()
+        # La última cubeta recoge los valores mayores que el límite más alto (+Inf)
+        celdas[bisect_left(self.limites, valor)] += 1
+        celdas[-1] += valor
+
+    @property
+    def cubetas(self) -> List[int]:
+        return self._celdas.total()[:-1]
+
+    @property
+    def suma(self) -> float:
+        return self._celdas.total()[-1]
+
+    @property
+    def cuenta(self) -> int:
+        return sum(self.cubetas)
+
+    def reiniciar(self):
+        self._celdas.reiniciar()
+
+    def exponer(self) -> List[str]:
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} histogram"]
+        total = self._celdas.total()
+        cubetas, suma = total[:-1], total[-1]
+        acumulado = 0
+        for limite, cantidad in zip(self.limites + [float("inf")], cubetas):
+            acumulado += cantidad
+            lineas.append(f'{self.nombre}_bucket{{le="{_numero(limite)}"}} {acumulado}')
+        lineas.append(f"{self.nombre}_sum {_numero(float(suma))}")
+        lineas.append(f"{self.nombre}_count {acumulado}")
+        return lineas
+
+
+class RegistroMetricas:
+    """Conjunto de métricas que se exponen juntas"""
+
+    def __init__(self):
+        self.metricas: Dict[str, object] = {}
+
+    def contador(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = (),
+                 valores: Sequence[Tuple[str, ...]] = ()) -> Contador:
+        self.metricas[nombre] = Contador(nombre, ayuda, etiquetas, valores)
+        return self.metricas[nombre]
+
+    def histograma(self, nombre: str, ayuda: str, limites: Sequence[float]) -> Histograma:
+        self.metricas[nombre] = Histograma(nombre, ayuda, limites)
+        return self.metricas[nombre]
+
+    def reiniciar(self):
+        for metrica in self.metricas.values():
+            metrica.reiniciar()
+
+    def exponer(self) -> str:
+        """Texto en el formato de exposición de Prometheus (versión 0.0.4)"""
+        lineas = []
+        # Copia de la lista por si otro hilo registra una métrica mientras tanto
+        for metrica in list(self.metricas.values()):
+            lineas.extend(metrica.exponer())
+        return "\n".join(lineas) + "\n"
+
+    def escribir_archivo(self, archivo: str):
+        """
+        Escribe la exposición de forma atómica (temporal + renombrado), apta para el
+        colector 'textfile' de node_exporter
+        """
+        directorio = os.path.dirname(archivo)
+        if directorio and not os.path.exists(directorio):
+            os.makedirs(directorio)
+        descriptor, temporal = tempfile.mkstemp(dir=directorio or ".", suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, 'w', encoding='utf-8') as f:
+                f.write(self.exponer())
+            os.replace(temporal, archivo)
+        finally:
+            if os.path.exists(temporal):
+                os.remove(temporal)
+
+
+class EscritorPeriodico:
+    """Hilo en segundo plano que vuelca las métricas a un archivo cada 'intervalo' segundos"""
+
+    def __init__(self, registro: RegistroMetricas, archivo: str, intervalo: float = 15.0):
+        self.registro = registro
+        self.archivo = archivo
+        self.intervalo = intervalo
+        self._detener = threading.Event()
+        self._hilo: Optional[threading.Thread] = None
+
+    def iniciar(self) -> 'EscritorPeriodico':
+        self._hilo = threading.Thread(target=self._ejecutar, name="escritor-metricas", daemon=True)
+        self._hilo.start()
+        return self
+
+    def detener(self):
+        self._detener.set()
+        if self._hilo is not None:
+            self._hilo.join()
+        # Último volcado para no perder lo registrado desde la última escritura
+        self.registro.escribir_archivo(self.archivo)
+
+    def _ejecutar(self):
+        while not self._detener.wait(self.intervalo):
+            try:
+                self.registro.escribir_archivo(self.archivo)
+            except OSError as e:
+                print(f"Error al escribir las métricas en {self.archivo}: {e}")
+
+
+METRICAS = RegistroMetricas()
+
+# Motivos de rechazo conocidos (los de planificar_evento y confirmar_retencion y las
+# clases de restricción predeterminadas); otros reservan su celda al aparecer
+MOTIVOS_RECHAZO = (
+    "validacion", "capacidad", "recurso_desconocido", "retencion_caducada", "error", "desconocido",
+    "RestriccionCoRequisito", "RestriccionExclusionMutua", "RestriccionCapacidad",
+    "RestriccionPotencia", "RestriccionCuota",
+)
+
+# Reservas
+RESERVAS_INTENTADAS = METRICAS.contador(
+    "planificador_reservas_intentadas_total", "Llamadas a planificar_evento")
+RESERVAS_ACEPTADAS = METRICAS.contador(
+    "planificador_reservas_aceptadas_total", "Reservas planificadas con éxito")
+RESERVAS_RECHAZADAS = METRICAS.contador(
+    "planificador_reservas_rechazadas_total",
+    "Reservas rechazadas por motivo (capacidad, clase de restricción violada, validación...)",
+    etiquetas=("motivo",), valores=[(motivo,) for motivo in MOTIVOS_RECHAZO])
+
+# Búsqueda de huecos
+ITERACIONES_HUECOS = METRICAS.histograma(
+    "planificador_busqueda_huecos_iteraciones",
+    "Candidatos probados en cada búsqueda de huecos",
+    [1, 5, 10, 50, 100, 500, 1000, 5000])
+
+# Persistencia
+DURACION_GUARDADO = METRICAS.histograma(
+    "persistencia_guardado_segundos", "Duración de Persistencia.guardar_sistema",
+    [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30])
+BYTES_ESCRITOS = METRICAS.contador(
+    "persistencia_bytes_escritos_total", "Bytes escritos en los archivos de datos")
+CONFLICTOS_REVISION = METRICAS.contador(
+    "persistencia_conflictos_revision_total", "Guardados que encontraron una revisión más reciente")
+
+
+def registrar_reserva(aceptada: bool, motivos: Sequence[str] = ()):
+    """Cuenta una llamada a planificar_evento y, si fue rechazada, cada uno de sus motivos"""
+    RESERVAS_INTENTADAS.incrementar()
+    if aceptada:
+        RESERVAS_ACEPTADAS.incrementar()
+    else:
+        for motivo in motivos or ("desconocido",):
+            RESERVAS_RECHAZADAS.incrementar(1, motivo)
@@ -0,0 +1,28 @@
+"""
+Importación perezosa de módulos pesados (pandas, plotly...)
+El módulo devuelto se registra en sys.modules, pero su código solo se ejecuta
+la primera vez que se accede a uno de sus atributos
+"""
+import importlib.util
+import sys
+from types import ModuleType
+
+
+def importar_perezoso(nombre: str) -> ModuleType:
+    """
+    Equivalente a 'import nombre' que aplaza la carga hasta el primer uso
+    Si el módulo ya estaba importado se devuelve tal cual
+    """
+    if nombre in sys.modules:
+        return sys.modules[nombre]
+
+    especificacion = importlib.util.find_spec(nombre)
+    if especificacion is None:
+        raise ModuleNotFoundError(f"No se encontró el módulo '{nombre}'", name=nombre)
+
+    cargador = importlib.util.LazyLoader(especificacion.loader)
+    especificacion.loader = cargador
+    modulo = importlib.util.module_from_spec(especificacion)
+    sys.modules[nombre] = modulo
+    cargador.exec_module(modulo)
+    return modulo
@@ -16,14 +16,35 @@ from .recursos import Recurso, GestorRecursos, crear_recursos_predeterminados
 # Exportar desde eventos.py  
 from .eventos import Evento, GestorEventos, crear_evento_ejemplo
 
+# Exportar desde series.py
+from .series import SerieRecurrente
+
+# Exportar desde bifurcacion.py
+from .bifurcacion import GestorEventosBifurcado, Diferencias
+
+# Exportar desde disponibilidad.py
+from .disponibilidad import MapaDisponibilidad
+
+# Exportar desde retenciones.py
+from .retenciones import Retenciones
+
+# Exportar desde potencia.py y cuotas.py
+from .potencia import PerfilPotencia
+from .cuotas import UsoRecurso
+
 # Exportar desde restricciones.py
 from .restricciones import (
     Restriccion,
     RestriccionCoRequisito,
     RestriccionExclusionMutua,
     RestriccionCapacidad,
+    RestriccionTemporal,
+    RestriccionPotencia,
+    RestriccionCuota,
     crear_restricciones_predeterminadas,
     validar_restricciones,
+    restricciones_violadas,
+    restricciones_de_agenda,
     obtener_restricciones_por_tipo
 )
 
@@ -38,12 +59,34 @@ __all__ = [
     'GestorEventos',
     'crear_evento_ejemplo',
     
+    # Series recurrentes
+    'SerieRecurrente',
+    
+    # Bifurcaciones
+    'GestorEventosBifurcado',
+    'Diferencias',
+    
+    # Disponibilidad
+    'MapaDisponibilidad',
+    
+    # Retenciones
+    'Retenciones',
+    
+    # Perfiles de la agenda
+    'PerfilPotencia',
+    'UsoRecurso',
+    
     # Restricciones
     'Restriccion',
     'RestriccionCoRequisito',
     'RestriccionExclusionMutua',
     'RestriccionCapacidad',
+    'RestriccionTemporal',
+    'RestriccionPotencia',
+    'RestriccionCuota',
     'crear_restricciones_predeterminadas',
     'validar_restricciones',
+    'restricciones_violadas',
+    'restricciones_de_agenda',
     'obtener_restricciones_por_tipo'
 ]
\ No newline at end of file
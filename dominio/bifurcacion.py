@@ -0,0 +1,275 @@
+"""
+Bifurcaciones del almacén de eventos para simulaciones "¿qué pasaría si...?"
+Un GestorEventosBifurcado no copia nada al crearse: guarda una referencia al gestor
+base y solo almacena sus propias altas, bajas y modificaciones. Las consultas combinan
+ambas capas, así que bifurcar cuesta O(1) y cada bifurcación ocupa lo que cambia
+"""
+from __future__ import annotations
+import copy
+import heapq
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from types import MappingProxyType
+from typing import Dict, Iterator, List, Mapping, Optional, Set, Tuple
+
+from .eventos import Evento, GestorEventos, ClaveOrden
+from .series import SerieRecurrente
+
+
+def copiar_evento(evento: Evento) -> Evento:
+    """Copia que se puede modificar sin afectar al original (metadata y recursos propios)"""
+    copia = copy.copy(evento)
+    copia.metadata = dict(evento.metadata)
+    copia.recursos = list(evento.recursos)
+    return copia
+
+
+def copiar_serie(serie: SerieRecurrente) -> SerieRecurrente:
+    """Copia de la serie con metadata, recursos, días y excepciones propios"""
+    copia = copy.copy(serie)
+    copia.metadata = dict(serie.metadata)
+    copia.recursos = list(serie.recursos)
+    copia.dias_semana = list(serie.dias_semana)
+    copia.excepciones = set(serie.excepciones)
+    return copia
+
+
+@dataclass
+class Diferencias:
+    """Cambios de una bifurcación respecto a su gestor base"""
+    eventos_agregados: List[Evento] = field(default_factory=list)
+    eventos_modificados: List[Tuple[Evento, Evento]] = field(default_factory=list)  # (base, bifurcación)
+    eventos_eliminados: List[Evento] = field(default_factory=list)
+    series_agregadas: List[SerieRecurrente] = field(default_factory=list)
+    series_modificadas: List[Tuple[SerieRecurrente, SerieRecurrente]] = field(default_factory=list)
+    series_eliminadas: List[SerieRecurrente] = field(default_factory=list)
+
+    @property
+    def vacia(self) -> bool:
+        return not (self.eventos_agregados or self.eventos_modificados or self.eventos_eliminados
+                    or self.series_agregadas or self.series_modificadas or self.series_eliminadas)
+
+    def resumen(self) -> str:
+        return (f"eventos: +{len(self.eventos_agregados)} ~{len(self.eventos_modificados)} "
+                f"-{len(self.eventos_eliminados)}; series: +{len(self.series_agregadas)} "
+                f"~{len(self.series_modificadas)} -{len(self.series_eliminadas)}")
+
+
+class _VistaEventos(Mapping):
+    """Eventos visibles de una bifurcación (base sin los ocultos + propios), sin copiarlos"""
+
+    def __init__(self, gestor: 'GestorEventosBifurcado'):
+        self._gestor = gestor
+
+    def __getitem__(self, id_evento: str) -> Evento:
+        evento = self._gestor.obtener_evento(id_evento)
+        if evento is None:
+            raise KeyError(id_evento)
+        return evento
+
+    def __iter__(self) -> Iterator[str]:
+        ocultos = self._gestor._ocultos
+        for id_evento in self._gestor.base.eventos:
+            if id_evento not in ocultos:
+                yield id_evento
+        yield from self._gestor._eventos
+
+    def __len__(self) -> int:
+        return len(self._gestor)
+
+
+class GestorEventosBifurcado(GestorEventos):
+    """
+    Vista copy-on-write de otro GestorEventos (que puede ser a su vez una bifurcación)
+    Los índices heredados solo contienen los eventos propios; las consultas por rango
+    mezclan en orden los de la base y los propios. Los eventos de la base no se
+    modifican nunca: editar_evento() y editar_serie() devuelven una copia propia.
+    Los cambios posteriores en la base son visibles mientras no se hayan sobrescrito aquí
+    """
+
+    def __init__(self, base: GestorEventos):
+        super().__init__()
+        self.base = base
+        # Versión de la base al bifurcar (para saber si cambió antes de fusionar)
+        self.version_base = base.version
+        # Ids de la base eliminados o sustituidos por una copia propia
+        self._ocultos: Set[str] = set()
+        self._series_ocultas: Set[str] = set()
+
+    # --- Eventos ---
+
+    @property
+    def eventos(self) -> Mapping[str, Evento]:
+        return _VistaEventos(self)
+
+    @eventos.setter
+    def eventos(self, eventos: Dict[str, Evento]):
+        """Sustituye todos los eventos: se ocultan los de la base y los nuevos pasan a ser propios"""
+        self._ocultos = set(self.base.eventos)
+        GestorEventos.eventos.fset(self, eventos)
+
+    def obtener_evento(self, id_evento: str) -> Optional[Evento]:
+        evento = self._eventos.get(id_evento)
+        if evento is None and id_evento not in self._ocultos:
+            evento = self.base.obtener_evento(id_evento)
+        return evento
+
+    def agregar_evento(self, evento: Evento) -> bool:
+        if self.obtener_evento(evento.id) is not None:
+            return False
+        return super().agregar_evento(evento)
+
+    def eliminar_evento(self, id_evento: str) -> bool:
+        if super().eliminar_evento(id_evento):
+            return True
+        evento = None if id_evento in self._ocultos else self.base.obtener_evento(id_evento)
+        if evento is None:
+            return False
+        self._ocultos.add(id_evento)
+        self.version += 1
+        self._notificar(evento, -1)
+        return True
+
+    def editar_evento(self, id_evento: str) -> Optional[Evento]:
+        """Copia propia del evento (la primera vez se copia desde la base)"""
+        evento = self._eventos.get(id_evento)
+        if evento is not None:
+            return evento
+        evento = self.obtener_evento(id_evento)
+        if evento is None:
+            return None
+        copia = copiar_evento(evento)
+        self._ocultos.add(id_evento)
+        self._notificar(evento, -1)
+        super().agregar_evento(copia)
+        return copia
+
+    def _recorrer(
+        self,
+        desde: Optional[datetime] = None,
+        hasta: Optional[datetime] = None,
+        tipo: Optional[str] = None,
+        descendente: bool = False,
+        cursor: Optional[ClaveOrden] = None,
+        incluir_hasta: bool = True,
+        recurso_id: Optional[str] = None
+    ) -> Iterator[Evento]:
+        ocultos = self._ocultos
+        de_base = (e for e in self.base._recorrer(desde, hasta, tipo, descendente, cursor, incluir_hasta, recurso_id)
+                   if e.id not in ocultos)
+        propios = super()._recorrer(desde, hasta, tipo, descendente, cursor, incluir_hasta, recurso_id)
+        return heapq.merge(de_base, propios, key=lambda e: (e.inicio, e.id), reverse=descendente)
+
+    def duracion_maxima_recurso(self, recurso_id: str) -> timedelta:
+        return max(self.base.duracion_maxima_recurso(recurso_id), super().duracion_maxima_recurso(recurso_id))
+
+    def contar_por_inicio(self, desde: Optional[datetime] = None, hasta: Optional[datetime] = None,
+                          tipo: Optional[str] = None) -> int:
+        total = self.base.contar_por_inicio(desde, hasta, tipo) + super().contar_por_inicio(desde, hasta, tipo)
+        for id_evento in self._ocultos:
+            evento = self.base.obtener_evento(id_evento)
+            if (evento is not None and (tipo is None or evento.tipo == tipo)
+                    and (desde is None or evento.inicio >= desde) and (hasta is None or evento.inicio <= hasta)):
+                total -= 1
+        return total
+
+    def to_list(self):
+        return [evento.to_dict() for evento in self]
+
+    def __len__(self):
+        ocultos_en_base = sum(1 for id_evento in self._ocultos if self.base.obtener_evento(id_evento) is not None)
+        return len(self.base) - ocultos_en_base + len(self._eventos)
+
+    def __iter__(self):
+        return iter(self.eventos.values())
+
+    # --- Series ---
+
+    @property
+    def series(self) -> Mapping[str, SerieRecurrente]:
+        visibles = {id_serie: serie for id_serie, serie in self.base.series.items()
+                    if id_serie not in self._series_ocultas}
+        visibles.update(self._series)
+        return MappingProxyType(visibles)
+
+    def obtener_serie(self, id_serie: str) -> Optional[SerieRecurrente]:
+        serie = self._series.get(id_serie)
+        if serie is None and id_serie not in self._series_ocultas:
+            serie = self.base.obtener_serie(id_serie)
+        return serie
+
+    def agregar_serie(self, serie: SerieRecurrente) -> bool:
+        if self.obtener_serie(serie.id) is not None:
+            return False
+        return super().agregar_serie(serie)
+
+    def eliminar_serie(self, id_serie: str) -> bool:
+        if super().eliminar_serie(id_serie):
+            return True
+        serie = None if id_serie in self._series_ocultas else self.base.obtener_serie(id_serie)
+        if serie is None:
+            return False
+        self._series_ocultas.add(id_serie)
+        self.version += 1
+        self._notificar(serie, -1)
+        return True
+
+    def editar_serie(self, id_serie: str) -> Optional[SerieRecurrente]:
+        """Copia propia de la serie (la primera vez se copia desde la base)"""
+        serie = self._series.get(id_serie)
+        if serie is not None:
+            return serie
+        serie = self.obtener_serie(id_serie)
+        if serie is None:
+            return None
+        copia = copiar_serie(serie)
+        self._series_ocultas.add(id_serie)
+        self._notificar(serie, -1)
+        super().agregar_serie(copia)
+        return copia
+
+    def ocurrencias_series(self, desde: datetime, hasta: datetime,
+                           recurso_id: Optional[str] = None) -> Iterator[Evento]:
+        for serie in self.series.values():
+            if recurso_id is None or serie.usa_recurso(recurso_id):
+                yield from serie.ocurrencias(desde, hasta)
+
+    def series_to_list(self):
+        return [serie.to_dict() for serie in self.series.values()]
+
+    # --- Comparación con la base ---
+
+    @property
+    def base_modificada(self) -> bool:
+        """La base cambió después de bifurcar"""
+        return self.base.version != self.version_base
+
+    def diferencias(self) -> Diferencias:
+        """Cambios propios respecto a la base, en O(cambios)"""
+        diferencias = Diferencias()
+        for evento in self._eventos.values():
+            original = self.base.obtener_evento(evento.id)
+            if original is None:
+                diferencias.eventos_agregados.append(evento)
+            elif original.to_dict() != evento.to_dict():
+                diferencias.eventos_modificados.append((original, evento))
+        for id_evento in self._ocultos:
+            original = self.base.obtener_evento(id_evento)
+            if original is not None and id_evento not in self._eventos:
+                diferencias.eventos_eliminados.append(original)
+
+        for serie in self._series.values():
+            original = self.base.obtener_serie(serie.id)
+            if original is None:
+                diferencias.series_agregadas.append(serie)
+            elif original.to_dict() != serie.to_dict():
+                diferencias.series_modificadas.append((original, serie))
+        for id_serie in self._series_ocultas:
+            original = self.base.obtener_serie(id_serie)
+            if original is not None and id_serie not in self._series:
+                diferencias.series_eliminadas.append(original)
+
+        diferencias.eventos_agregados.sort(key=lambda e: e.inicio)
+        diferencias.eventos_modificados.sort(key=lambda par: par[1].inicio)
+        diferencias.eventos_eliminados.sort(key=lambda e: e.inicio)
+        return diferencias
@@ -0,0 +1,141 @@
+"""
+Uso acumulado de un recurso para las cuotas por ventanas móviles
+Las horas reservadas de un recurso (opcionalmente solo en eventos de un tipo) se
+guardan como sumas prefijas por minutos en un árbol de Fenwick de suma por rangos:
+dar de alta o de baja un evento y saber cuántas horas hay reservadas en cualquier
+ventana cuestan O(log n), sin recorrer el historial. Se mantiene con los avisos del
+gestor (ver dominio.perfiles); las ocurrencias de series se suman al consultar.
+Desde la peor ventana se acota además cuánto hay que retrasar un evento que no cabe,
+para que la búsqueda de huecos no pruebe uno a uno los inicios que seguirían fallando
+"""
+from __future__ import annotations
+import math
+from typing import Dict, List, Optional, Tuple
+
+from .eventos import Evento, GestorEventos
+from .perfiles import MINUTO, ORIGEN, TOTAL_MINUTOS, Aporte, PerfilAgenda, minutos_evento
+
+
+class FenwickRangos:
+    """
+    Árbol de Fenwick disperso sobre [0, TOTAL_MINUTOS) con suma de un valor a cada
+    posición de un rango y suma de las posiciones anteriores a una dada. Se guardan dos
+    árboles de diferencias (d y d*posición), de modo que
+    suma(x) = x * Σ d[p] - Σ d[p] * p, con p < x
+    """
+
+    def __init__(self):
+        self._diferencias: Dict[int, int] = {}
+        self._ponderadas: Dict[int, int] = {}
+
+    def _actualizar(self, posicion: int, valor: int):
+        indice = posicion + 1
+        ponderado = valor * posicion
+        while indice <= TOTAL_MINUTOS:
+            self._diferencias[indice] = self._diferencias.get(indice, 0) + valor
+            self._ponderadas[indice] = self._ponderadas.get(indice, 0) + ponderado
+            indice += indice & -indice
+
+    def sumar(self, desde: int, hasta: int, valor: int):
+        """Suma 'valor' a cada posición de [desde, hasta)"""
+        if desde >= hasta or not valor:
+            return
+        self._actualizar(desde, valor)
+        if hasta < TOTAL_MINUTOS:
+            self._actualizar(hasta, -valor)
+
+    def suma_prefija(self, posicion: int) -> int:
+        """Suma de las posiciones de [0, posicion)"""
+        diferencias = ponderadas = 0
+        indice = posicion
+        while indice > 0:
+            diferencias += self._diferencias.get(indice, 0)
+            ponderadas += self._ponderadas.get(indice, 0)
+            indice -= indice & -indice
+        return posicion * diferencias - ponderadas
+
+    def suma(self, desde: int, hasta: int) -> int:
+        """Suma de las posiciones de [desde, hasta)"""
+        return self.suma_prefija(hasta) - self.suma_prefija(desde) if desde < hasta else 0
+
+
+class UsoRecurso(PerfilAgenda):
+    """Minutos-unidad reservados de un recurso (solo los eventos del tipo indicado, si lo hay)"""
+
+    def __init__(self, gestor_eventos: GestorEventos, recurso_id: str, tipo_evento: Optional[str] = None):
+        self.recurso_id = recurso_id
+        self.tipo_evento = tipo_evento
+        self._sumas = FenwickRangos()
+        super().__init__(gestor_eventos)
+
+    def cuenta(self, evento: Evento) -> int:
+        """Unidades del recurso que el evento cuenta para la cuota (0 si no cuenta)"""
+        if self.tipo_evento is not None and evento.tipo != self.tipo_evento:
+            return 0
+        return sum(1 for recurso in evento.recursos if recurso.id == self.recurso_id)
+
+    def _aporte(self, evento: Evento) -> Optional[Aporte]:
+        return (*minutos_evento(evento), self.cuenta(evento))
+
+    def _sumar(self, desde: int, hasta: int, valor: int):
+        self._sumas.sumar(desde, hasta, valor)
+
+    def _vaciar(self):
+        self._sumas = FenwickRangos()
+
+    def _contados(self, gestor_eventos: GestorEventos, desde: int, hasta: int,
+                  evento: Optional[Evento]) -> List[Evento]:
+        """
+        Eventos y ocurrencias que cuentan y están en curso en los minutos [desde, hasta)
+        (sin los cancelados ni las retenciones caducadas aunque aún no se hayan purgado)
+        """
+        return [e for e in gestor_eventos.eventos_con_recurso(self.recurso_id, ORIGEN + MINUTO * desde,
+                                                              ORIGEN + MINUTO * hasta)
+                if (evento is None or e.id != evento.id) and e.estado not in ("cancelado", "caducado")
+                and self.cuenta(e)]
+
+    def _pico(self, gestor_eventos: GestorEventos, evento: Evento, ventana: int) -> Tuple[int, int]:
+        """
+        (minutos-unidad, minuto de inicio) de la peor ventana de 'ventana' minutos que se
+        solape con el evento, contándolo con su versión nueva. El uso de la ventana
+        [t, t + ventana) es lineal a trozos en t y solo cambia de pendiente cuando t o
+        t + ventana pasan por el inicio o el fin de un evento, así que basta evaluarla ahí
+        (y en los extremos): se miran los límites de los eventos cercanos del recurso
+        (índice por recurso del gestor) y cada ventana cuesta una suma por rangos del árbol
+        """
+        desde, hasta = minutos_evento(evento)
+        primera, ultima = desde - ventana + 1, hasta - 1
+        cercanos = self._contados(gestor_eventos, primera, ultima + ventana, evento)
+        # Las ocurrencias de series no están en el árbol: se suman aparte
+        series = [(*minutos_evento(e), self.cuenta(e)) for e in cercanos if e.id not in self._aportes]
+        propio = (desde, hasta, self.cuenta(evento))
+        candidatos = {primera, ultima}
+        for limite in {m for e in (*cercanos, evento) for m in minutos_evento(e)}:
+            candidatos.update(t for t in (limite, limite - ventana) if primera <= t <= ultima)
+
+        pico = (0, primera)
+        with self._consultando(gestor_eventos, evento.id):
+            for inicio in candidatos:
+                fin = inicio + ventana
+                uso = self._sumas.suma(inicio, fin) + sum(
+                    unidades * max(0, min(b, fin) - max(a, inicio)) for a, b, unidades in (*series, propio))
+                pico = max(pico, (uso, inicio))
+        return pico
+
+    def pico(self, gestor_eventos: GestorEventos, evento: Evento, ventana: int) -> int:
+        """Máximo de minutos-unidad en una ventana de 'ventana' minutos que se solape con el evento (ver _pico)"""
+        return self._pico(gestor_eventos, evento, ventana)[0]
+
+    def retraso_minimo(self, gestor_eventos: GestorEventos, evento: Evento, ventana: int, limite: float) -> int:
+        """
+        Minutos que hay que retrasar el evento (con la misma duración) antes de que pueda
+        dejar de superar 'limite' (0 si no lo supera). Retrasarlo Δ minutos quita como
+        mucho Δ * unidades de la peor ventana, que sigue contando mientras se solape con él
+        """
+        uso, inicio = self._pico(gestor_eventos, evento, ventana)
+        if uso <= limite:
+            return 0
+        desde, _ = minutos_evento(evento)
+        por_exceso = math.ceil((uso - limite) / max(1, self.cuenta(evento)))
+        # Un minuto menos: el evento no tiene por qué empezar en un minuto exacto
+        return max(0, min(por_exceso, inicio + ventana - desde) - 1)
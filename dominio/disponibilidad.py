@@ -0,0 +1,277 @@
+"""
+Mapa de disponibilidad por recurso y día a granularidad fija
+Cada día de cada recurso se divide en franjas (5 minutos por defecto) con las unidades
+ocupadas en cada una. Los días se construyen al consultarlos y después se mantienen con
+las altas y bajas del gestor de eventos, sin volver a recorrerlo. Para varios recursos,
+"¿cuándo están libres todos?" se resuelve con máscaras de bits por día (una por recurso
+y cantidad pedida) combinadas con AND y recorridas por tramos.
+Solo considera la capacidad: las demás restricciones se validan aparte
+"""
+from __future__ import annotations
+import math
+from array import array
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .eventos import GestorEventos, Ocupacion
+from .recursos import GestorRecursos
+from .series import SerieRecurrente
+
+# Tamaño de franja por defecto (debe dividir exactamente un día)
+GRANULARIDAD = timedelta(minutes=5)
+
+UN_DIA = timedelta(days=1)
+
+
+def _tramos(mascara: int) -> Iterator[Tuple[int, int]]:
+    """(posición, longitud) de cada tramo de bits a 1, de menor a mayor"""
+    posicion = 0
+    while mascara:
+        salto = (mascara & -mascara).bit_length() - 1
+        mascara >>= salto
+        posicion += salto
+        # Cantidad de unos seguidos: posición del primer cero
+        longitud = (~mascara & (mascara + 1)).bit_length() - 1
+        yield posicion, longitud
+        mascara >>= longitud
+        posicion += longitud
+
+
+class VentanaOcupacion:
+    """
+    Franjas de una ventana en las que la demanda seguro que no cabe (eventos que cubren
+    la franja entera). Sirve para descartar candidatos de una búsqueda sin verificarlos
+    """
+
+    def __init__(self, origen: datetime, granularidad: timedelta, mascara: int):
+        self.origen = origen
+        self.granularidad = granularidad
+        self.mascara = mascara
+
+    def ocupado(self, inicio: datetime, fin: datetime) -> bool:
+        """True si [inicio, fin) contiene entera alguna franja sin capacidad suficiente"""
+        primera = math.ceil((inicio - self.origen) / self.granularidad)
+        ultima = (fin - self.origen) // self.granularidad
+        if ultima <= primera:
+            return False
+        return (self.mascara >> primera) & ((1 << (ultima - primera)) - 1) != 0
+
+
+class MapaDisponibilidad:
+    """Ocupación por franjas de los recursos de un gestor de eventos, mantenida con sus avisos"""
+
+    def __init__(self, gestor_eventos: GestorEventos, gestor_recursos: GestorRecursos,
+                 granularidad: timedelta = GRANULARIDAD):
+        if granularidad <= timedelta(0) or UN_DIA % granularidad:
+            raise ValueError("La granularidad debe dividir exactamente un día")
+        self.gestor_eventos = gestor_eventos
+        self.gestor_recursos = gestor_recursos
+        self.granularidad = granularidad
+        self.franjas_por_dia = UN_DIA // granularidad
+        # recurso_id -> día -> (unidades de los eventos que tocan cada franja,
+        #                       unidades de los que la cubren entera)
+        self._dias: Dict[str, Dict[date, Tuple[array, array]]] = {}
+        # (recurso_id, día) -> (unidades pedidas, seguro) -> máscara
+        self._mascaras: Dict[Tuple[str, date], Dict[Tuple[int, bool], int]] = {}
+        # Versiones de los gestores base (bifurcaciones): sus cambios no se avisan aquí
+        self._firma = self._firma_bases()
+        gestor_eventos.oyentes.append(self._al_cambiar)
+
+    def desconectar(self):
+        """Deja de recibir los avisos del gestor de eventos"""
+        if self._al_cambiar in self.gestor_eventos.oyentes:
+            self.gestor_eventos.oyentes.remove(self._al_cambiar)
+
+    def vaciar(self):
+        self._dias.clear()
+        self._mascaras.clear()
+
+    # --- Mantenimiento ---
+
+    def _firma_bases(self) -> tuple:
+        firma = []
+        base = getattr(self.gestor_eventos, "base", None)
+        while base is not None:
+            firma.append(base.version)
+            base = getattr(base, "base", None)
+        return tuple(firma)
+
+    def _comprobar_vigencia(self):
+        firma = self._firma_bases()
+        if firma != self._firma:
+            self.vaciar()
+            self._firma = firma
+
+    def _al_cambiar(self, ocupacion: Optional[Ocupacion], signo: int):
+        if ocupacion is None:
+            self.vaciar()
+        elif isinstance(ocupacion, SerieRecurrente):
+            if ocupacion.metadata.get("cancelado") is True:
+                return
+            # Solo se actualizan los días ya construidos de los recursos de la serie (una
+            # ocurrencia que cruza la medianoche aparece en dos días pero se suma una vez)
+            for recurso_id, unidades in self._demanda(ocupacion.recursos).items():
+                inicios = set()
+                for dia in self._dias.get(recurso_id, ()):
+                    origen = datetime.combine(dia, time.min)
+                    inicios.update(ocupacion.fechas(origen, origen + UN_DIA))
+                for inicio in inicios:
+                    self._sumar(recurso_id, inicio, inicio + ocupacion.duracion, signo * unidades)
+        elif ocupacion.metadata.get("cancelado") is not True:
+            for recurso_id, unidades in self._demanda(ocupacion.recursos).items():
+                self._sumar(recurso_id, ocupacion.inicio, ocupacion.fin, signo * unidades)
+
+    @staticmethod
+    def _demanda(recursos) -> Dict[str, int]:
+        demanda: Dict[str, int] = {}
+        for recurso in recursos:
+            demanda[recurso.id] = demanda.get(recurso.id, 0) + 1
+        return demanda
+
+    def _sumar(self, recurso_id: str, inicio: datetime, fin: datetime, unidades: int):
+        """Suma 'unidades' a las franjas de [inicio, fin) de los días ya construidos"""
+        dias = self._dias.get(recurso_id)
+        if not dias:
+            return
+        dia = inicio.date()
+        while datetime.combine(dia, time.min) < fin:
+            cuentas = dias.get(dia)
+            if cuentas is not None:
+                self._sumar_en_dia(cuentas, datetime.combine(dia, time.min), inicio, fin, unidades)
+                self._mascaras.pop((recurso_id, dia), None)
+            dia += UN_DIA
+
+    def _sumar_en_dia(self, cuentas: Tuple[array, array], origen: datetime,
+                      inicio: datetime, fin: datetime, unidades: int):
+        tocan, cubren = cuentas
+        desde = (inicio - origen) / self.granularidad
+        hasta = (fin - origen) / self.granularidad
+        for franja in range(max(0, math.floor(desde)), min(self.franjas_por_dia, math.ceil(hasta))):
+            tocan[franja] += unidades
+        for franja in range(max(0, math.ceil(desde)), min(self.franjas_por_dia, math.floor(hasta))):
+            cubren[franja] += unidades
+
+    def _construir(self, recurso_id: str, primer_dia: date, ultimo_dia: date):
+        """Construye los días de [primer_dia, ultimo_dia] que falten con un solo recorrido"""
+        dias = self._dias.setdefault(recurso_id, {})
+        faltan = [primer_dia + UN_DIA * n for n in range((ultimo_dia - primer_dia).days + 1)
+                  if primer_dia + UN_DIA * n not in dias]
+        if not faltan:
+            return
+        nuevos = {dia: (array('i', bytes(4 * self.franjas_por_dia)), array('i', bytes(4 * self.franjas_por_dia)))
+                  for dia in faltan}
+        desde = datetime.combine(faltan[0], time.min)
+        hasta = datetime.combine(faltan[-1], time.min) + UN_DIA
+        for evento in self.gestor_eventos.obtener_por_rango_fecha(desde, hasta):
+            if evento.metadata.get("cancelado") is True:
+                continue
+            unidades = sum(1 for recurso in evento.recursos if recurso.id == recurso_id)
+            if not unidades:
+                continue
+            dia = max(evento.inicio.date(), faltan[0])
+            while dia <= faltan[-1] and datetime.combine(dia, time.min) < evento.fin:
+                if dia in nuevos:
+                    self._sumar_en_dia(nuevos[dia], datetime.combine(dia, time.min),
+                                       evento.inicio, evento.fin, unidades)
+                dia += UN_DIA
+        dias.update(nuevos)
+
+    def _mascara_dia(self, recurso_id: str, dia: date, unidades: int, seguro: bool) -> int:
+        """
+        seguro=False: franjas en las que caben 'unidades' (contando todo evento que las toque)
+        seguro=True: franjas en las que no caben ni contando solo los que las cubren enteras
+        """
+        mascaras = self._mascaras.setdefault((recurso_id, dia), {})
+        mascara = mascaras.get((unidades, seguro))
+        if mascara is None:
+            recurso = self.gestor_recursos.obtener_recurso(recurso_id)
+            tocan, cubren = self._dias[recurso_id][dia]
+            mascara = 0
+            if recurso is None:
+                # Un recurso inexistente nunca está disponible
+                mascara = (1 << self.franjas_por_dia) - 1 if seguro else 0
+            elif seguro:
+                limite = recurso.capacidad - unidades
+                for franja, ocupadas in enumerate(cubren):
+                    if ocupadas > limite:
+                        mascara |= 1 << franja
+            else:
+                limite = recurso.capacidad - unidades
+                for franja, ocupadas in enumerate(tocan):
+                    if ocupadas <= limite:
+                        mascara |= 1 << franja
+            mascaras[(unidades, seguro)] = mascara
+        return mascara
+
+    def _mascara(self, recursos_con_cantidad: Dict[str, int], desde: datetime, hasta: datetime,
+                 seguro: bool) -> Tuple[datetime, int]:
+        """
+        Máscara de [desde, hasta] por días completos desde el día de 'desde': AND de las
+        franjas libres de todos los recursos, u OR de las seguro ocupadas
+        Returns: (inicio del primer día, máscara)
+        """
+        self._comprobar_vigencia()
+        primer_dia, ultimo_dia = desde.date(), hasta.date()
+        numero_dias = (ultimo_dia - primer_dia).days + 1
+        total = 0 if seguro else (1 << (numero_dias * self.franjas_por_dia)) - 1
+        for recurso_id, unidades in recursos_con_cantidad.items():
+            self._construir(recurso_id, primer_dia, ultimo_dia)
+            mascara = 0
+            for n in range(numero_dias):
+                mascara |= self._mascara_dia(recurso_id, primer_dia + UN_DIA * n, unidades, seguro) \
+                    << (n * self.franjas_por_dia)
+            total = total | mascara if seguro else total & mascara
+        return datetime.combine(primer_dia, time.min), total
+
+    # --- Consultas ---
+
+    def libres(self, recursos_con_cantidad: Dict[str, int], desde: datetime,
+               hasta: datetime) -> List[Tuple[datetime, datetime]]:
+        """Intervalos dentro de [desde, hasta] en los que todos los recursos tienen las unidades pedidas libres"""
+        if not recursos_con_cantidad or hasta <= desde:
+            return []
+        origen, mascara = self._mascara(recursos_con_cantidad, desde, hasta, seguro=False)
+        primera = math.ceil((desde - origen) / self.granularidad)
+        ultima = (hasta - origen) // self.granularidad
+        mascara &= ((1 << ultima) - 1) & ~((1 << primera) - 1)
+        return [(origen + self.granularidad * posicion, origen + self.granularidad * (posicion + longitud))
+                for posicion, longitud in _tramos(mascara)]
+
+    def huecos(self, recursos_con_cantidad: Dict[str, int], duracion: timedelta, desde: datetime,
+               hasta: datetime, max_resultados: Optional[int] = None) -> List[Tuple[datetime, datetime]]:
+        """Intervalos libres de al menos 'duracion' (p. ej. sugerencias mientras se escribe)"""
+        huecos = []
+        for inicio, fin in self.libres(recursos_con_cantidad, desde, hasta):
+            if fin - inicio >= duracion:
+                huecos.append((inicio, fin))
+                if max_resultados is not None and len(huecos) >= max_resultados:
+                    break
+        return huecos
+
+    def mapa_calor(self, recursos_con_cantidad: Dict[str, int], desde: date, dias: int,
+                   franja: timedelta = timedelta(hours=1)) -> List[List[float]]:
+        """
+        Fracción libre (0-1) de cada franja de 'franja' de cada día, para todos los recursos
+        a la vez. Una fila por día
+        """
+        if UN_DIA % franja or franja % self.granularidad:
+            raise ValueError("La franja debe dividir el día y ser múltiplo de la granularidad")
+        origen = datetime.combine(desde, time.min)
+        _, mascara = self._mascara(recursos_con_cantidad, origen, origen + UN_DIA * dias - self.granularidad,
+                                   seguro=False)
+        por_franja = franja // self.granularidad
+        bloque = (1 << por_franja) - 1
+        filas = []
+        for n in range(dias):
+            fila = []
+            for columna in range(UN_DIA // franja):
+                libres = (mascara >> (n * self.franjas_por_dia + columna * por_franja)) & bloque
+                fila.append(bin(libres).count("1") / por_franja)
+            filas.append(fila)
+        return filas
+
+    def ventana_ocupada(self, recursos_con_cantidad: Dict[str, int], desde: datetime,
+                        hasta: datetime) -> VentanaOcupacion:
+        """Franjas de [desde, hasta] en las que la demanda seguro que no cabe"""
+        origen, mascara = self._mascara(recursos_con_cantidad, desde, hasta, seguro=True)
+        return VentanaOcupacion(origen, self.granularidad, mascara)
@@ -2,13 +2,24 @@
 Gestión de eventos
 """
 from __future__ import annotations
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional 
-import uuid
+from types import MappingProxyType
+from typing import List, Dict, Any, Optional, Callable, Iterator, Mapping, Tuple, Union, TYPE_CHECKING
 from dataclasses import dataclass, field
 
 # Importación relativa - sin dependencia circular
 from .recursos import Recurso 
+from core.diagnostico import instrumentar, contar
+from core.identificadores import generar_id
+
+if TYPE_CHECKING:
+    from .series import SerieRecurrente
+
+# Margen que Evento.se_solapa_con deja por defecto entre dos eventos
+MARGEN_SOLAPAMIENTO = timedelta(minutes=15)
 
 @dataclass
 class Evento:
@@ -18,13 +29,14 @@ class Evento:
     fin: datetime 
     recursos: List[Recurso]
     tipo: str # entrenamiento, procesamiento, investigación, reunión, seminario, inferencia
-    id: str = field(default_factory=lambda: f"evento_{uuid.uuid4().hex[:8]}")
+    id: str = field(default_factory=lambda: generar_id("evento"))  # ordenable por fecha de creación
     descripcion: str = ""
     prioridad: int = 1  # 1-5, donde el número 5 es el máximo de prioridad
     metadata: Dict[str, Any] = field(default_factory=dict)
 
     def __post_init__(self):
         """Validaciones después de la inicialización"""
+        contar("eventos.construidos")
         self.validar_fechas()
         self.validar_recursos()
         self.validar_tipo()
@@ -54,6 +66,18 @@ class Evento:
         if self.tipo not in tipos_validos:
             raise ValueError(f"Tipo de evento inválido.Debe ser uno de: {','.join(tipos_validos)}")
     
+    @classmethod
+    def sin_validar(cls, id: str, nombre: str, inicio: datetime, fin: datetime, recursos: List[Recurso],
+                    tipo: str, descripcion: str, prioridad: int, metadata: Dict[str, Any]) -> 'Evento':
+        """
+        Construye el evento sin pasar por __post_init__. Solo para datos que ya se
+        validaron al crearse (archivos escritos y verificados por Persistencia)
+        """
+        evento = cls.__new__(cls)
+        evento.__dict__ = {'nombre': nombre, 'inicio': inicio, 'fin': fin, 'recursos': recursos, 'tipo': tipo,
+                           'id': id, 'descripcion': descripcion, 'prioridad': prioridad, 'metadata': metadata}
+        return evento
+
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'Evento':
         """Deserialización, a partir de un diccionario"""
@@ -117,6 +141,12 @@ class Evento:
         """Permite calcular la duración del evento en horas"""
         return self.duracion.total_seconds() / 3600
     
+    @property
+    def retencion(self) -> Optional[datetime]:
+        """Caducidad si el evento es una retención provisional (ver dominio.retenciones), si no None"""
+        caducidad = self.metadata.get("retencion")
+        return datetime.fromisoformat(caducidad) if caducidad else None
+
     @property
     def estado(self) -> str:
         ahora = datetime.now()
@@ -126,6 +156,11 @@ class Evento:
         
         if self.metadata.get("cancelado") is True:
             return "cancelado"
+
+        # Las retenciones provisionales dejan de ocupar recursos al caducar
+        retencion = self.retencion
+        if retencion is not None:
+            return "retenido" if ahora < retencion else "caducado"
             
         if ahora < self.inicio:
             return "planificado"
@@ -135,14 +170,17 @@ class Evento:
             return "completado"
     
     def cancelar(self):
-        """Marca el evento como cancelado de forma irreversible"""
+        """
+        Marca el evento como cancelado. Modifica el evento en sitio y no queda en el
+        historial: desde la aplicación se usa Planificador.cancelar_evento, que se puede deshacer
+        """
         self.metadata["cancelado"] = True
         self.metadata["fecha_cancelacion"] = datetime.now().isoformat()
     
     def se_solapa_con(self, otro_evento: 'Evento', margen: Optional[timedelta] = None) ->bool:
         """Verifica si un evento se solapa con otro"""
         if margen is None:
-            margen = timedelta(minutes = 15) # Margen por defecto de 15 minutos
+            margen = MARGEN_SOLAPAMIENTO # Margen por defecto de 15 minutos
 
         inicio_self = self.inicio - margen
         fin_self = self.fin + margen 
@@ -226,53 +264,350 @@ class Evento:
         return (f"Evento(id='{self.id}', nombre='{self.nombre}', "
                 f"inicio={self.inicio}, tipo= '{self.tipo}')")
     
+# Duración máxima de un evento (ver Evento.validar_fechas). Permite convertir
+# condiciones sobre el fin de un evento en rangos del índice ordenado por inicio
+DURACION_MAXIMA_EVENTO = timedelta(days=7)
+
+# Posición de un evento en el índice ordenado; también sirve de cursor de paginación
+ClaveOrden = Tuple[datetime, str]
+
+# Lo que ocupa recursos en el gestor: un evento suelto o una serie recurrente
+Ocupacion = Union[Evento, 'SerieRecurrente']
+
+
 class GestorEventos:
-    """Clase para gestionar múltiples eventos"""
+    """
+    Clase para gestionar múltiples eventos
+    Las altas y bajas de distintos hilos se hacen de una en una (cerrojo de escritura).
+    Las lecturas no usan el cerrojo: copian de una vez las claves del índice que van a
+    recorrer y repiten la copia si coincidió con una escritura, así que nunca esperan
+    a un escritor ni ven un índice a medio cambiar
+    """
     def __init__(self):
-        self.eventos: Dict[str, Evento] = {}
+        self._eventos: Dict[str, Evento] = {}
+        self._cerrojo = threading.RLock()
+        # Impar mientras se modifican los índices (lo comprueban las lecturas)
+        self._escrituras = 0
+        # Índices ordenados por (inicio, id): uno global y uno por tipo de evento
+        self._orden: List[ClaveOrden] = []
+        self._orden_por_tipo: Dict[str, List[ClaveOrden]] = {}
+        # Y uno por recurso, con la mayor duración de sus eventos (cota para buscar
+        # los que siguen en curso: no baja con las bajas, solo al sustituirlo todo)
+        self._orden_por_recurso: Dict[str, List[ClaveOrden]] = {}
+        self._duracion_por_recurso: Dict[str, timedelta] = {}
+        # Series recurrentes: un registro por serie, sus ocurrencias se generan al consultar
+        self._series: Dict[str, SerieRecurrente] = {}
+        # Se incrementa con cada alta o baja (sirve para invalidar cachés)
+        self.version = 0
+        # Reciben (evento o serie, +1 alta / -1 baja) en cada cambio de ocupación, y
+        # (None, 0) cuando se sustituye todo el contenido
+        self.oyentes: List[Callable[[Optional[Ocupacion], int], None]] = []
+
+    def _notificar(self, ocupacion: Optional[Ocupacion], signo: int):
+        for oyente in self.oyentes:
+            oyente(ocupacion, signo)
+
+    @property
+    def eventos(self) -> Mapping[str, Evento]:
+        """Eventos por id (solo lectura: las altas y bajas pasan por el gestor para mantener los índices)"""
+        return MappingProxyType(self._eventos)
+
+    @eventos.setter
+    def eventos(self, eventos: Dict[str, Evento]):
+        """Sustituye todos los eventos y reconstruye los índices"""
+        with self._cerrojo:
+            nuevos = dict(eventos)
+            orden = sorted((e.inicio, e.id) for e in nuevos.values())
+            orden_por_tipo: Dict[str, List[ClaveOrden]] = {}
+            orden_por_recurso: Dict[str, List[ClaveOrden]] = {}
+            duracion_por_recurso: Dict[str, timedelta] = {}
+            for clave in orden:
+                evento = nuevos[clave[1]]
+                orden_por_tipo.setdefault(evento.tipo, []).append(clave)
+                for recurso_id in {r.id for r in evento.recursos}:
+                    orden_por_recurso.setdefault(recurso_id, []).append(clave)
+                    duracion_por_recurso[recurso_id] = max(duracion_por_recurso.get(recurso_id, timedelta(0)),
+                                                           evento.duracion)
+            self._escrituras += 1
+            self._eventos, self._orden, self._orden_por_tipo = nuevos, orden, orden_por_tipo
+            self._orden_por_recurso, self._duracion_por_recurso = orden_por_recurso, duracion_por_recurso
+            self._escrituras += 1
+            self.version += 1
+            self._notificar(None, 0)
 
     def agregar_evento(self, evento: Evento) ->bool:
         """Agrega un evento al gestor de eventos"""
-        if evento.id in self.eventos:
-            return False
-        self.eventos[evento.id] = evento
-        return True
+        with self._cerrojo:
+            if evento.id in self._eventos:
+                return False
+            self._eventos[evento.id] = evento
+            clave = (evento.inicio, evento.id)
+            self._escrituras += 1
+            try:
+                insort(self._orden, clave)
+                insort(self._orden_por_tipo.setdefault(evento.tipo, []), clave)
+                for recurso_id in {r.id for r in evento.recursos}:
+                    insort(self._orden_por_recurso.setdefault(recurso_id, []), clave)
+                    if evento.duracion > self._duracion_por_recurso.get(recurso_id, timedelta(0)):
+                        self._duracion_por_recurso[recurso_id] = evento.duracion
+            finally:
+                self._escrituras += 1
+            self.version += 1
+            self._notificar(evento, 1)
+            return True
     
     def obtener_evento(self, id_evento:str) ->Optional[Evento]:
         """Obtiene un evento por id"""
-        return self.eventos.get(id_evento)
+        return self._eventos.get(id_evento)
     
+    @instrumentar()
     def obtener_fecha_inicio(self, fecha:datetime) ->List[Evento]:
         """Obtener todos los eventos que empiezan en una fecha específica(el mismo día)"""
-        return [e for e in self.eventos.values() 
-                if e.inicio.date()==fecha.date()]
+        dia = datetime.combine(fecha.date(), datetime.min.time())
+        return list(self._recorrer(desde=dia, hasta=dia + timedelta(days=1), incluir_hasta=False))
     
-    def obtener_por_rango_fecha(self, inicio:datetime, fin:datetime) ->List[Evento]:
-        """Obtiene todos los eventos que ocurren en un rango de fechas"""
-        return [e for e in self.eventos.values()
-                if e.inicio <= fin and e.fin >= inicio]
+    @instrumentar()
+    def obtener_por_rango_fecha(self, inicio:datetime, fin:datetime, incluir_series: bool = True) ->List[Evento]:
+        """
+        Obtiene todos los eventos que ocurren en un rango de fechas, incluidas las
+        ocurrencias de las series recurrentes dentro del rango
+        """
+        # Un evento que termina después de 'inicio' empezó como muy pronto DURACION_MAXIMA_EVENTO antes
+        eventos = [e for e in self._recorrer(desde=inicio - DURACION_MAXIMA_EVENTO, hasta=fin)
+                   if e.fin >= inicio]
+        if incluir_series:
+            eventos.extend(self.ocurrencias_series(inicio, fin))
+        return eventos
     
+    @instrumentar()
     def obtener_por_tipo(self, tipo:str) ->List[Evento]:
         """Obtiene todos los eventos que tengan un tipo específico"""
-        return [e for e in self.eventos.values()
-                if e.tipo == tipo]
+        return list(self._recorrer(tipo=tipo))
     
+    @instrumentar()
     def obtener_por_recurso(self, recurso:Recurso) ->List[Evento]:
         """Obtiene todos los eventos que posean un recurso específico"""
         return [e for e in self.eventos.values()
                 if e.contiene_recurso(recurso)]
     
+    def editar_evento(self, id_evento: str) -> Optional[Evento]:
+        """
+        Devuelve el evento para modificarlo en sitio (metadata, descripción...). En una
+        bifurcación es una copia propia; el inicio y el tipo no se cambian así porque
+        forman parte de los índices, igual que los recursos (hay que eliminarlo y volver a agregarlo)
+        """
+        return self._eventos.get(id_evento)
+
+    def actualizar_evento(self, id_evento: str, cambio: Callable[[Evento], Any]) -> Optional[Evento]:
+        """
+        Aplica 'cambio' al evento editable (ver editar_evento) avisando a los oyentes, para
+        cambios que afectan a la ocupación sin ser un alta o una baja (cancelar, reactivar)
+        """
+        with self._cerrojo:
+            evento = self.editar_evento(id_evento)
+            if evento is None:
+                return None
+            self._notificar(evento, -1)
+            cambio(evento)
+            self.version += 1
+            self._notificar(evento, 1)
+            return evento
+    
     def eliminar_evento(self, id_evento: str) ->bool:
         """Elimina el evento que se desee de la clase GestorEvento"""
-        if id_evento in self.eventos:
-            del self.eventos[id_evento]
+        with self._cerrojo:
+            if id_evento not in self._eventos:
+                return False
+            evento = self._eventos.pop(id_evento)
+            clave = (evento.inicio, evento.id)
+            self._escrituras += 1
+            try:
+                for orden in (self._orden, self._orden_por_tipo[evento.tipo]):
+                    del orden[bisect_left(orden, clave)]
+                for recurso_id in {r.id for r in evento.recursos}:
+                    orden = self._orden_por_recurso.get(recurso_id, [])
+                    posicion = bisect_left(orden, clave)
+                    if posicion < len(orden) and orden[posicion] == clave:
+                        del orden[posicion]
+            finally:
+                self._escrituras += 1
+            self.version += 1
+            self._notificar(evento, -1)
             return True
-        return False
+
+    def _recorrer(
+        self,
+        desde: Optional[datetime] = None,
+        hasta: Optional[datetime] = None,
+        tipo: Optional[str] = None,
+        descendente: bool = False,
+        cursor: Optional[ClaveOrden] = None,
+        incluir_hasta: bool = True,
+        recurso_id: Optional[str] = None
+    ) -> Iterator[Evento]:
+        """
+        Recorre en orden de inicio los eventos con inicio en [desde, hasta]
+        (o [desde, hasta) si incluir_hasta es False), empezando justo después del cursor.
+        Con recurso_id solo los que usan ese recurso (tiene prioridad sobre tipo)
+        """
+        while True:
+            escrituras = self._escrituras
+            if escrituras % 2 == 0:
+                if recurso_id is not None:
+                    orden = self._orden_por_recurso.get(recurso_id, [])
+                else:
+                    orden = self._orden if tipo is None else self._orden_por_tipo.get(tipo, [])
+                # Los ids son cadenas, así que (fecha, "") es anterior a cualquier clave de esa fecha
+                # y (fecha, "\uffff") posterior a cualquiera
+                bajo = 0 if desde is None else bisect_left(orden, (desde, ""))
+                if hasta is None:
+                    alto = len(orden)
+                elif incluir_hasta:
+                    alto = bisect_right(orden, (hasta, "\uffff"))
+                else:
+                    alto = bisect_left(orden, (hasta, ""))
+
+                if cursor is not None:
+                    if descendente:
+                        alto = min(alto, bisect_left(orden, cursor))
+                    else:
+                        bajo = max(bajo, bisect_right(orden, cursor))
+
+                claves = orden[bajo:alto]
+                if self._escrituras == escrituras:
+                    break
+            # Otro hilo estaba modificando el índice: se cede el turno y se vuelve a copiar
+            time.sleep(0)
+
+        # Un evento eliminado por otro hilo después de copiar las claves se salta
+        eventos = self._eventos
+        for _, id_evento in (reversed(claves) if descendente else claves):
+            evento = eventos.get(id_evento)
+            if evento is not None:
+                yield evento
+
+    def contar_por_inicio(self, desde: Optional[datetime] = None, hasta: Optional[datetime] = None,
+                          tipo: Optional[str] = None) -> int:
+        """Cantidad de eventos con inicio en [desde, hasta] sin recorrerlos (dos búsquedas binarias)"""
+        orden = self._orden if tipo is None else self._orden_por_tipo.get(tipo, [])
+        bajo = 0 if desde is None else bisect_left(orden, (desde, ""))
+        alto = len(orden) if hasta is None else bisect_right(orden, (hasta, "\uffff"))
+        return max(0, alto - bajo)
+
+    @instrumentar()
+    def paginar(
+        self,
+        limite: int = 20,
+        cursor: Optional[ClaveOrden] = None,
+        desde: Optional[datetime] = None,
+        hasta: Optional[datetime] = None,
+        tipo: Optional[str] = None,
+        filtro: Optional[Callable[[Evento], bool]] = None,
+        descendente: bool = True
+    ) -> Tuple[List[Evento], Optional[ClaveOrden]]:
+        """
+        Devuelve una página de eventos ordenados por inicio usando el índice ordenado
+        Args:
+            cursor: clave devuelta por la página anterior (None para la primera)
+            desde, hasta: límites sobre la fecha de inicio (se resuelven en el índice)
+            tipo: tipo de evento (usa el índice de ese tipo)
+            filtro: condición adicional; solo se evalúa sobre los eventos recorridos
+        Returns:
+            (eventos de la página, cursor de la página siguiente o None si no hay más)
+        """
+        pagina: List[Evento] = []
+        for evento in self._recorrer(desde, hasta, tipo, descendente, cursor):
+            if filtro is not None and not filtro(evento):
+                continue
+            if len(pagina) == limite:
+                # Hay al menos un evento más: la página siguiente empieza tras el último mostrado
+                ultimo = pagina[-1]
+                return pagina, (ultimo.inicio, ultimo.id)
+            pagina.append(evento)
+        return pagina, None
     
+    def duracion_maxima_recurso(self, recurso_id: str) -> timedelta:
+        """Cota de la duración de los eventos que usan el recurso"""
+        return self._duracion_por_recurso.get(recurso_id, timedelta(0))
+
+    @instrumentar()
+    def eventos_con_recurso(self, recurso_id: str, inicio: datetime, fin: datetime,
+                            incluir_series: bool = True) -> List[Evento]:
+        """
+        Eventos (y ocurrencias de series) que usan el recurso y están en curso en algún
+        momento de [inicio, fin). Usa el índice del recurso: los candidatos son los que
+        empiezan como muy pronto la duración máxima de sus eventos antes de 'inicio'
+        """
+        eventos = [e for e in self._recorrer(desde=inicio - self.duracion_maxima_recurso(recurso_id), hasta=fin,
+                                             incluir_hasta=False, recurso_id=recurso_id)
+                   if e.fin > inicio]
+        if incluir_series:
+            eventos.extend(o for o in self.ocurrencias_series(inicio, fin, recurso_id)
+                           if o.inicio < fin and o.fin > inicio)
+        return eventos
+
+    @instrumentar()
     def eventos_solapados(self, evento: Evento) ->List[Evento]:
         """Permite determinar todos los eventos que se solapan con el evento dado"""
-        return [e for e in self.eventos.values() 
-                if e.id != evento.id and e.se_solapa_con(evento)]
+        candidatos = self._recorrer(desde=evento.inicio - DURACION_MAXIMA_EVENTO - MARGEN_SOLAPAMIENTO,
+                                    hasta=evento.fin + MARGEN_SOLAPAMIENTO)
+        ocurrencias = self.ocurrencias_series(evento.inicio - MARGEN_SOLAPAMIENTO, evento.fin + MARGEN_SOLAPAMIENTO)
+        return [e for e in (*candidatos, *ocurrencias) if e.id != evento.id and e.se_solapa_con(evento)]
+
+    # --- Series recurrentes ---
+
+    @property
+    def series(self) -> Mapping[str, SerieRecurrente]:
+        """Series por id (solo lectura)"""
+        return MappingProxyType(self._series)
+
+    def agregar_serie(self, serie: SerieRecurrente) -> bool:
+        """Agrega una serie recurrente; sus ocurrencias no se materializan"""
+        with self._cerrojo:
+            if serie.id in self._series:
+                return False
+            self._series[serie.id] = serie
+            self.version += 1
+            self._notificar(serie, 1)
+            return True
+
+    def obtener_serie(self, id_serie: str) -> Optional[SerieRecurrente]:
+        return self._series.get(id_serie)
+
+    def editar_serie(self, id_serie: str) -> Optional[SerieRecurrente]:
+        """Devuelve la serie para modificarla en sitio (en una bifurcación, una copia propia)"""
+        return self._series.get(id_serie)
+
+    def actualizar_serie(self, id_serie: str, cambio: Callable[[SerieRecurrente], Any]) -> Optional[SerieRecurrente]:
+        """Aplica 'cambio' a la serie editable avisando a los oyentes (p. ej. anular una ocurrencia)"""
+        with self._cerrojo:
+            serie = self.editar_serie(id_serie)
+            if serie is None:
+                return None
+            self._notificar(serie, -1)
+            cambio(serie)
+            self.version += 1
+            self._notificar(serie, 1)
+            return serie
+
+    def eliminar_serie(self, id_serie: str) -> bool:
+        with self._cerrojo:
+            serie = self._series.pop(id_serie, None)
+            if serie is None:
+                return False
+            self.version += 1
+            self._notificar(serie, -1)
+            return True
+
+    def ocurrencias_series(self, desde: datetime, hasta: datetime,
+                           recurso_id: Optional[str] = None) -> Iterator[Evento]:
+        """
+        Ocurrencias de todas las series que intersecan [desde, hasta] (opcionalmente solo
+        las de las series que usan 'recurso_id'). Se generan al recorrerlas
+        """
+        for serie in list(self._series.values()):
+            if recurso_id is None or serie.usa_recurso(recurso_id):
+                yield from serie.ocurrencias(desde, hasta)
     
     def cargar_desde_lista(self, lista_eventos :List[Dict[str, Any]]):
         """Permite obtener el evento a partir de lista de diccionarios y agregarlo al gestor"""
@@ -337,15 +672,19 @@ class GestorEventos:
                 
     def to_list(self) -> List[Dict[str, Any]]:
         """Convierte todos los eventos a lista de diccionarios"""
-        return [ evento.to_dict() for evento in self.eventos.values()]
+        return [ evento.to_dict() for evento in self._eventos.values()]
+
+    def series_to_list(self) -> List[Dict[str, Any]]:
+        """Convierte todas las series recurrentes a lista de diccionarios"""
+        return [serie.to_dict() for serie in self._series.values()]
     
     def __len__(self):
         """Permite saber la cantidad de eventos gestionados"""
-        return len(self.eventos)
+        return len(self._eventos)
     
     def __iter__(self):
         """Permite iterar sobre todos los eventos"""
-        return iter(self.eventos.values())
+        return iter(self._eventos.values())
 
 # Funciones de utilidad para eventos
 def crear_evento_ejemplo() -> Evento:
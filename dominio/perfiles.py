@@ -0,0 +1,153 @@
+"""
+Perfiles acumulados de la agenda a lo largo del tiempo
+Un perfil suma a una estructura por minutos (árbol de segmentos, árbol de Fenwick...)
+el aporte de cada evento que le interesa, y la mantiene con los avisos del gestor de
+eventos, como el mapa de disponibilidad. Se construye la primera vez que se consulta y
+vuelve a construirse si se sustituye el contenido del gestor o cambia su base. Las
+retenciones provisionales dejan de contar en cuanto caducan, aunque aún no se hayan
+purgado del gestor (su aporte se retira en la siguiente consulta)
+"""
+from __future__ import annotations
+import heapq
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .eventos import Evento, GestorEventos, Ocupacion
+from .series import SerieRecurrente
+
+# Las estructuras cubren 2^25 minutos (unos 63 años) desde ORIGEN
+ORIGEN = datetime(2000, 1, 1)
+MINUTO = timedelta(minutes=1)
+TOTAL_MINUTOS = 1 << 25
+
+# (minuto inicial, minuto final, valor por minuto)
+Aporte = Tuple[int, int, int]
+
+
+def minutos(momento: datetime, redondear_arriba: bool = False) -> int:
+    """Minuto de 'momento' desde ORIGEN (redondeado hacia fuera si se indica), dentro del rango"""
+    cantidad, resto = divmod(momento - ORIGEN, MINUTO)
+    if redondear_arriba and resto:
+        cantidad += 1
+    return min(max(cantidad, 0), TOTAL_MINUTOS)
+
+
+def minutos_evento(evento: Evento) -> Tuple[int, int]:
+    """Minutos que ocupa el evento (hacia fuera, para no quedarse corto)"""
+    return minutos(evento.inicio), minutos(evento.fin, True)
+
+
+class PerfilAgenda(ABC):
+    """
+    Base de los perfiles. No guarda el gestor (lo recibe en cada consulta) para no
+    mantenerlo vivo: se cuelga de sus oyentes y desaparece con él. Las ocurrencias de
+    series no tienen fin y no se suman: cada perfil las añade al consultar
+    """
+
+    def __init__(self, gestor_eventos: GestorEventos):
+        self._cerrojo = threading.Lock()
+        self._construido = False
+        # id del evento -> lo que se le sumó a la estructura
+        self._aportes: Dict[str, Aporte] = {}
+        # Caducidad de las retenciones sumadas, y montículo (caducidad, id) para retirarlas al caducar
+        self._retenidas: Dict[str, datetime] = {}
+        self._caducidades: List[Tuple[datetime, str]] = []
+        self._firma = self._firma_bases(gestor_eventos)
+        gestor_eventos.oyentes.append(self._al_cambiar)
+
+    @abstractmethod
+    def _aporte(self, evento: Evento) -> Optional[Aporte]:
+        """Lo que el evento suma a la estructura (None si no le interesa)"""
+        pass
+
+    @abstractmethod
+    def _sumar(self, desde: int, hasta: int, valor: int):
+        """Suma 'valor' a cada minuto de [desde, hasta)"""
+        pass
+
+    @abstractmethod
+    def _vaciar(self):
+        pass
+
+    @staticmethod
+    def _firma_bases(gestor_eventos: GestorEventos) -> tuple:
+        """Versiones de los gestores base (bifurcaciones): sus cambios no se avisan aquí"""
+        firma = []
+        base = getattr(gestor_eventos, "base", None)
+        while base is not None:
+            firma.append(base.version)
+            base = getattr(base, "base", None)
+        return tuple(firma)
+
+    # --- Mantenimiento ---
+
+    def _quitar(self, id_evento: str):
+        self._retenidas.pop(id_evento, None)
+        aporte = self._aportes.pop(id_evento, None)
+        if aporte is not None:
+            desde, hasta, valor = aporte
+            self._sumar(desde, hasta, -valor)
+
+    def _poner(self, evento: Evento):
+        self._quitar(evento.id)
+        if evento.estado in ("cancelado", "caducado"):
+            return
+        aporte = self._aporte(evento)
+        if aporte is not None and aporte[2]:
+            self._sumar(*aporte)
+            self._aportes[evento.id] = aporte
+            caducidad = evento.retencion
+            if caducidad is not None:
+                self._retenidas[evento.id] = caducidad
+                heapq.heappush(self._caducidades, (caducidad, evento.id))
+
+    def _retirar_caducadas(self, ahora: datetime):
+        """Quita el aporte de las retenciones que han caducado (las confirmadas o prorrogadas se saltan)"""
+        while self._caducidades and self._caducidades[0][0] <= ahora:
+            caducidad, id_evento = heapq.heappop(self._caducidades)
+            if self._retenidas.get(id_evento) == caducidad:
+                self._quitar(id_evento)
+
+    def _al_cambiar(self, ocupacion: Optional[Ocupacion], signo: int):
+        with self._cerrojo:
+            if ocupacion is None:
+                self._construido = False
+            elif not self._construido or isinstance(ocupacion, SerieRecurrente):
+                # Sin construir todavía, o una serie (se consultan aparte)
+                return
+            elif signo > 0:
+                self._poner(ocupacion)
+            else:
+                self._quitar(ocupacion.id)
+
+    def _construir(self, gestor_eventos: GestorEventos):
+        self._vaciar()
+        self._aportes = {}
+        self._retenidas = {}
+        self._caducidades = []
+        for evento in list(gestor_eventos.eventos.values()):
+            self._poner(evento)
+        self._firma = self._firma_bases(gestor_eventos)
+        self._construido = True
+
+    @contextmanager
+    def _consultando(self, gestor_eventos: GestorEventos, id_evento: Optional[str] = None) -> Iterator[None]:
+        """
+        Consulta con el perfil al día y sin el aporte guardado del evento indicado (el que
+        se está comprobando, que se cuenta con su versión nueva)
+        """
+        with self._cerrojo:
+            if not self._construido or self._firma != self._firma_bases(gestor_eventos):
+                self._construir(gestor_eventos)
+            self._retirar_caducadas(datetime.now())
+            previo = self._aportes.get(id_evento) if id_evento is not None else None
+            if previo is not None:
+                self._sumar(previo[0], previo[1], -previo[2])
+            try:
+                yield
+            finally:
+                if previo is not None:
+                    self._sumar(*previo)
@@ -0,0 +1,126 @@
+"""
+Perfil de potencia simultánea de un gestor de eventos
+La potencia de un evento es la suma del consumo_energia de sus recursos (por unidad).
+La suma de todos los eventos a lo largo del tiempo se guarda en un árbol de segmentos
+por minutos con suma por rangos y máximo por rangos: dar de alta o de baja un evento
+y consultar el pico de una ventana cuestan O(log n), sin recorrer los eventos que se
+solapan con ella. El árbol se mantiene con los avisos del gestor, como el mapa de
+disponibilidad (ver dominio.perfiles). Las ocurrencias de series (que no tienen fin)
+se suman al consultar
+"""
+from __future__ import annotations
+import re
+from typing import Dict, Iterable, Optional
+
+from .eventos import Evento, GestorEventos
+from .perfiles import TOTAL_MINUTOS, Aporte, PerfilAgenda, minutos_evento
+from .recursos import Recurso
+
+_CONSUMO = re.compile(r"^\s*([0-9]+(?:[.,][0-9]+)?)\s*(kw|w)?\s*$", re.IGNORECASE)
+
+
+def consumo_vatios(recurso: Recurso) -> int:
+    """
+    Consumo de una unidad del recurso en vatios, a partir de atributos['consumo_energia']
+    ('6.5kW', '800W' o un número en kW). 0 si no lo indica o no se entiende
+    """
+    valor = recurso.atributos.get("consumo_energia") if recurso.atributos else None
+    if isinstance(valor, (int, float)):
+        return max(0, round(valor * 1000))
+    coincidencia = _CONSUMO.match(str(valor)) if valor is not None else None
+    if not coincidencia:
+        return 0
+    cantidad = float(coincidencia.group(1).replace(",", "."))
+    unidad = (coincidencia.group(2) or "kw").lower()
+    return round(cantidad * 1000) if unidad == "kw" else round(cantidad)
+
+
+def potencia_vatios(recursos: Iterable[Recurso]) -> int:
+    """Potencia de un evento con estos recursos (cada unidad consume lo suyo)"""
+    return sum(consumo_vatios(recurso) for recurso in recursos)
+
+
+class ArbolPotencia:
+    """
+    Árbol de segmentos disperso sobre [0, TOTAL_MINUTOS): suma un valor a un rango y
+    devuelve el máximo de un rango. Cada nodo guarda lo sumado a su rango entero y el
+    máximo de su subárbol (sin propagar hacia abajo), y solo existen los nodos tocados
+    """
+
+    def __init__(self):
+        self._sumado: Dict[int, int] = {}
+        self._maximo: Dict[int, int] = {}
+
+    def sumar(self, desde: int, hasta: int, valor: int, nodo: int = 1,
+              izquierda: int = 0, derecha: int = TOTAL_MINUTOS):
+        if hasta <= izquierda or derecha <= desde or not valor:
+            return
+        if desde <= izquierda and derecha <= hasta:
+            self._sumado[nodo] = self._sumado.get(nodo, 0) + valor
+            self._maximo[nodo] = self._maximo.get(nodo, 0) + valor
+            return
+        medio = (izquierda + derecha) // 2
+        self.sumar(desde, hasta, valor, 2 * nodo, izquierda, medio)
+        self.sumar(desde, hasta, valor, 2 * nodo + 1, medio, derecha)
+        self._maximo[nodo] = self._sumado.get(nodo, 0) + max(
+            self._maximo.get(2 * nodo, 0), self._maximo.get(2 * nodo + 1, 0))
+
+    def maximo(self, desde: int, hasta: int, nodo: int = 1,
+               izquierda: int = 0, derecha: int = TOTAL_MINUTOS) -> int:
+        if hasta <= izquierda or derecha <= desde:
+            return 0
+        if desde <= izquierda and derecha <= hasta:
+            return self._maximo.get(nodo, 0)
+        if nodo not in self._maximo:
+            # Subárbol nunca tocado: todo a cero
+            return 0
+        medio = (izquierda + derecha) // 2
+        return self._sumado.get(nodo, 0) + max(
+            self.maximo(desde, hasta, 2 * nodo, izquierda, medio),
+            self.maximo(desde, hasta, 2 * nodo + 1, medio, derecha))
+
+
+class PerfilPotencia(PerfilAgenda):
+    """Potencia simultánea (vatios) de los eventos de un gestor"""
+
+    def __init__(self, gestor_eventos: GestorEventos):
+        self._arbol = ArbolPotencia()
+        super().__init__(gestor_eventos)
+
+    def _aporte(self, evento: Evento) -> Optional[Aporte]:
+        return (*minutos_evento(evento), potencia_vatios(evento.recursos))
+
+    def _sumar(self, desde: int, hasta: int, valor: int):
+        self._arbol.sumar(desde, hasta, valor)
+
+    def _vaciar(self):
+        self._arbol = ArbolPotencia()
+
+    def pico(self, gestor_eventos: GestorEventos, evento: Evento) -> int:
+        """
+        Máxima potencia simultánea (vatios) durante el evento si se añade a la agenda,
+        contando una sola vez el evento (si ya está en el gestor, con su versión nueva)
+        """
+        propia = potencia_vatios(evento.recursos)
+        desde, hasta = minutos_evento(evento)
+        ocurrencias = [
+            (*minutos_evento(ocurrencia), potencia_vatios(ocurrencia.recursos))
+            for ocurrencia in gestor_eventos.ocurrencias_series(evento.inicio, evento.fin)
+            if ocurrencia.id != evento.id and ocurrencia.estado not in ("cancelado", "caducado")
+            and ocurrencia.inicio < evento.fin and evento.inicio < ocurrencia.fin
+        ]
+        ocurrencias = [ocurrencia for ocurrencia in ocurrencias if ocurrencia[2]]
+
+        with self._consultando(gestor_eventos, evento.id):
+            if not ocurrencias:
+                return propia + self._arbol.maximo(desde, hasta)
+            # Tramos en los que las ocurrencias que se solapan no cambian
+            cortes = sorted({desde, hasta} | {
+                min(max(momento, desde), hasta) for inicio, fin, _ in ocurrencias for momento in (inicio, fin)
+            })
+            pico = 0
+            for inicio_tramo, fin_tramo in zip(cortes, cortes[1:]):
+                series = sum(vatios for inicio, fin, vatios in ocurrencias
+                             if inicio < fin_tramo and inicio_tramo < fin)
+                pico = max(pico, series + self._arbol.maximo(inicio_tramo, fin_tramo))
+            return propia + pico
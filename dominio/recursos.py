@@ -1,7 +1,7 @@
 from datetime import datetime 
 from dataclasses import dataclass, field
 from typing import Dict, List, Any, Optional
-import uuid 
+from core.identificadores import generar_id
 
 @dataclass
 class Recurso:
@@ -15,7 +15,7 @@ class Recurso:
     def __post_init__(self): # Función que es un método de instancia, opera sobre instancias
         """Validaciones después de la inicialización"""
         if not self.id:
-            self.id = f"recurso_{uuid.uuid4().hex[:8]}"
+            self.id = generar_id("recurso")
         
         if not self.nombre:        # Validar que nombre no esté vacío
             raise ValueError("El nombre del recurso es obligatorio")
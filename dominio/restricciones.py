@@ -2,14 +2,19 @@
 Sistema de restricciones para el planificador de eventos
 """
 from __future__ import annotations
+import weakref
 from abc import ABC, abstractmethod
-from typing import List, TYPE_CHECKING
+from datetime import timedelta
+from typing import Any, Dict, List, Optional, TYPE_CHECKING
+
+from .cuotas import UsoRecurso
+from .potencia import PerfilPotencia, consumo_vatios, potencia_vatios
 
 # Evita dependencias circulares
 if TYPE_CHECKING:
     # Solo para type checking durante desarrollo
-    from .recursos import Recurso
-    from .eventos import Evento
+    from .recursos import Recurso, GestorRecursos
+    from .eventos import Evento, GestorEventos
     from ..core.interfaces import IRecursoProtocol, IEventoProtocol
 
 class Restriccion(ABC):
@@ -25,6 +30,30 @@ class Restriccion(ABC):
         """Devuelve el mensaje de error si la restricción no se cumple"""
         pass
 
+    def recursos_implicados(self, gestor_recursos: Optional['GestorRecursos'] = None) -> List[str]:
+        """
+        Ids de los recursos concretos que relaciona la restricción. Los recursos que
+        comparten una restricción quedan en el mismo fragmento (ver aplicacion.fragmentacion);
+        las que solo miran el tipo de recurso no relacionan ninguno
+        """
+        return []
+
+class RestriccionTemporal(Restriccion):
+    """
+    Restricción que además depende de los demás eventos de la agenda en el horario del
+    evento. es_valida solo mira el evento aislado; es_valida_en, la parte que depende de
+    la agenda (el Planificador la comprueba con los conflictos de ocupación)
+    """
+    @abstractmethod
+    def es_valida_en(self, recursos: List['Recurso'], evento: 'Evento', gestor_eventos: 'GestorEventos') -> bool:
+        """Valida el evento junto a los eventos del gestor (sin contar la versión guardada del propio evento)"""
+        pass
+
+    @property
+    def depende_de_agenda(self) -> bool:
+        """False si, tal como está configurada, es_valida_en no tiene nada que comprobar"""
+        return True
+
 class RestriccionCoRequisito(Restriccion):
     """
     Al utilizar el recurso A es estrictamente necesario utilizar el recurso B
@@ -50,26 +79,52 @@ class RestriccionCoRequisito(Restriccion):
     def mensaje_error(self) ->str:
         return (f"Para la utilización del recurso: {self.principal}, "
                 f"es necesario emplear también el recurso: {self.requerido}")
+
+    def recursos_implicados(self, gestor_recursos: Optional['GestorRecursos'] = None) -> List[str]:
+        return [self.principal, self.requerido]
      
-class RestriccionExclusionMutua(Restriccion):
+class RestriccionExclusionMutua(RestriccionTemporal):
     """Si el recurso A es utilizado entonces el recurso B no debe utilizarse
     Ejemplo: lab de datos sensibles no debe usarse con servidores externos
+    Con temporal=True tampoco a la vez en eventos distintos
+    Ejemplo: sala de servidores y laboratorio de prototipado (interferencias)
     """
     
-    def __init__(self, id_recurso_a: str, id_recurso_b: str):
+    def __init__(self, id_recurso_a: str, id_recurso_b: str, temporal: bool = False):
         if id_recurso_a == id_recurso_b:
             raise ValueError(f"Un recurso no puede excluirse a sí mismo")
         self.recurso_a = id_recurso_a
         self.recurso_b = id_recurso_b
+        self.temporal = temporal
         
     def es_valida(self, recursos:List['Recurso'], evento:'Evento') ->bool:
         tiene_recurso_a = any(r.id == self.recurso_a for r in recursos)
         tiene_recurso_b = any(r.id == self.recurso_b for r in recursos)
 
         return not (tiene_recurso_a and tiene_recurso_b)
+
+    def es_valida_en(self, recursos: List['Recurso'], evento: 'Evento', gestor_eventos: 'GestorEventos') -> bool:
+        if not self.temporal:
+            return True
+        # Solo se buscan, en el índice del otro recurso, los eventos en curso durante este
+        for propio, otro in ((self.recurso_a, self.recurso_b), (self.recurso_b, self.recurso_a)):
+            if any(r.id == propio for r in recursos) and any(
+                    ajeno.id != evento.id and ajeno.estado not in ('cancelado', 'caducado')
+                    for ajeno in gestor_eventos.eventos_con_recurso(otro, evento.inicio, evento.fin)):
+                return False
+        return True
+
+    @property
+    def depende_de_agenda(self) -> bool:
+        return self.temporal
     
     def mensaje_error(self) ->str:
+        if self.temporal:
+            return f"El recurso {self.recurso_a} y {self.recurso_b} no se pueden utilizar a la vez (ni en eventos distintos)"
         return f"El recurso {self.recurso_a} y {self.recurso_b} no se pueden utilizar juntos"
+
+    def recursos_implicados(self, gestor_recursos: Optional['GestorRecursos'] = None) -> List[str]:
+        return [self.recurso_a, self.recurso_b]
     
 class RestriccionCapacidad(Restriccion):
     """Limita la cantidad de recursos que se pueden utilizar para un evento de un tipo específico
@@ -92,6 +147,116 @@ class RestriccionCapacidad(Restriccion):
     def mensaje_error(self) ->str:
         return f"Máximo {self.capacidad_maxima} recursos de tipo '{self.tipo_recurso}' permitidos por evento"
     
+class RestriccionPotencia(RestriccionTemporal):
+    """La potencia simultánea de todos los eventos (atributos['consumo_energia'] de sus
+    recursos) no puede superar el límite en ningún momento
+    Ejemplo: los clusters GPU comparten una acometida de 8 kW
+    """
+    def __init__(self, limite_kw: float):
+        if limite_kw <= 0:
+            raise ValueError("El límite de potencia debe ser mayor a 0")
+        self.limite_kw = limite_kw
+        # Perfil de potencia de cada gestor de eventos en el que se ha comprobado
+        self._perfiles: 'weakref.WeakKeyDictionary[GestorEventos, PerfilPotencia]' = weakref.WeakKeyDictionary()
+
+    @property
+    def limite_vatios(self) -> int:
+        return round(self.limite_kw * 1000)
+
+    def es_valida(self, recursos: List['Recurso'], evento: 'Evento') -> bool:
+        return potencia_vatios(recursos) <= self.limite_vatios
+
+    def es_valida_en(self, recursos: List['Recurso'], evento: 'Evento', gestor_eventos: 'GestorEventos') -> bool:
+        if not potencia_vatios(recursos):
+            # No consume: no puede subir el pico (aunque otros ya lo superen)
+            return True
+        perfil = self._perfiles.get(gestor_eventos)
+        if perfil is None:
+            perfil = self._perfiles[gestor_eventos] = PerfilPotencia(gestor_eventos)
+        return perfil.pico(gestor_eventos, evento) <= self.limite_vatios
+
+    def mensaje_error(self) -> str:
+        return f"La potencia simultánea de los eventos superaría el límite de {self.limite_kw:g} kW"
+
+    def recursos_implicados(self, gestor_recursos: Optional['GestorRecursos'] = None) -> List[str]:
+        # Todos los recursos que consumen comparten el mismo presupuesto
+        if gestor_recursos is None:
+            return []
+        return [recurso.id for recurso in gestor_recursos if consumo_vatios(recurso)]
+
+class RestriccionCuota(RestriccionTemporal):
+    """Máximo de horas de uso de un recurso (por unidad) en cualquier ventana móvil de
+    'ventana_dias' días, opcionalmente solo en eventos de un tipo
+    Ejemplo: máximo 40 horas de cluster_gpu_a100 en entrenamiento cada 7 días
+    Se comprueban todas las ventanas que se solapan con la reserva (también las que
+    incluyen reservas posteriores ya hechas)
+    """
+    def __init__(self, id_recurso: str, horas_maximas: float, ventana_dias: float = 7,
+                 tipo_evento: Optional[str] = None):
+        if horas_maximas <= 0:
+            raise ValueError("Las horas máximas deben ser mayores a 0")
+        if ventana_dias <= 0:
+            raise ValueError("La ventana debe ser de más de 0 días")
+        self.recurso = id_recurso
+        self.horas_maximas = horas_maximas
+        self.ventana_dias = ventana_dias
+        self.tipo_evento = tipo_evento
+        # Sumas prefijas de uso del recurso en cada gestor de eventos en el que se ha comprobado
+        self._usos: 'weakref.WeakKeyDictionary[GestorEventos, UsoRecurso]' = weakref.WeakKeyDictionary()
+
+    def _unidades(self, recursos: List['Recurso'], evento: 'Evento') -> int:
+        if self.tipo_evento is not None and evento.tipo != self.tipo_evento:
+            return 0
+        return sum(1 for r in recursos if r.id == self.recurso)
+
+    def aplica_a(self, evento: 'Evento') -> bool:
+        return self._unidades(evento.recursos, evento) > 0
+
+    def _uso(self, gestor_eventos: 'GestorEventos') -> UsoRecurso:
+        uso = self._usos.get(gestor_eventos)
+        if uso is None:
+            uso = self._usos[gestor_eventos] = UsoRecurso(gestor_eventos, self.recurso, self.tipo_evento)
+        return uso
+
+    def horas_usadas(self, gestor_eventos: 'GestorEventos', evento: 'Evento') -> float:
+        """Horas de uso contando el evento, en la peor ventana que se solapa con él"""
+        return self._uso(gestor_eventos).pico(gestor_eventos, evento, round(self.ventana_dias * 24 * 60)) / 60
+
+    def retraso_minimo(self, gestor_eventos: 'GestorEventos', evento: 'Evento') -> timedelta:
+        """Cuánto hay que retrasar como mínimo el evento para que pueda cumplir la cuota (0 si ya la cumple)"""
+        if not self._unidades(evento.recursos, evento):
+            return timedelta(0)
+        return timedelta(minutes=self._uso(gestor_eventos).retraso_minimo(
+            gestor_eventos, evento, round(self.ventana_dias * 24 * 60), self.horas_maximas * 60))
+
+    def estado(self, gestor_eventos: 'GestorEventos', evento: 'Evento') -> Dict[str, Any]:
+        """Uso y presupuesto restante de la cuota si se añade el evento"""
+        usadas = self.horas_usadas(gestor_eventos, evento)
+        return {
+            'recurso': self.recurso,
+            'tipo_evento': self.tipo_evento,
+            'ventana_dias': self.ventana_dias,
+            'horas_maximas': self.horas_maximas,
+            'horas_usadas': round(usadas, 2),
+            'horas_restantes': round(self.horas_maximas - usadas, 2)
+        }
+
+    def es_valida(self, recursos: List['Recurso'], evento: 'Evento') -> bool:
+        # Aislado, el evento solo no puede gastar más que la cuota
+        return self._unidades(recursos, evento) * evento.duracion_horas <= self.horas_maximas
+
+    def es_valida_en(self, recursos: List['Recurso'], evento: 'Evento', gestor_eventos: 'GestorEventos') -> bool:
+        if not self._unidades(recursos, evento):
+            return True
+        return self.horas_usadas(gestor_eventos, evento) <= self.horas_maximas
+
+    def mensaje_error(self) -> str:
+        tipo = f" en eventos de tipo '{self.tipo_evento}'" if self.tipo_evento else ""
+        return f"Cuota superada: máximo {self.horas_maximas:g} h de {self.recurso}{tipo} cada {self.ventana_dias:g} días"
+
+    def recursos_implicados(self, gestor_recursos: Optional['GestorRecursos'] = None) -> List[str]:
+        return [self.recurso]
+    
 def crear_restricciones_predeterminadas() -> List[Restriccion]:
     """
     Crea las restricciones predeterminadas para un centro de investigación de IA
@@ -127,18 +292,12 @@ def crear_restricciones_predeterminadas() -> List[Restriccion]:
             id_recurso_b="servidor_externo"
         ),
         
-        # NO USAR JUNTOS: Dos clusters GPU grandes
-        # (Por limitaciones de consumo energético y refrigeración)
-        RestriccionExclusionMutua(
-            id_recurso_a="cluster_gpu_a100",
-            id_recurso_b="cluster_gpu_v100"
-        ),
-        
-        # NO USAR JUNTOS: Sala de servidores y laboratorio de prototipado
-        # (Por interferencia electromagnética con equipos sensibles)
+        # NO USAR A LA VEZ: Sala de servidores y laboratorio de prototipado
+        # (Por interferencia electromagnética con equipos sensibles, también entre eventos distintos)
         RestriccionExclusionMutua(
             id_recurso_a="sala_servidores",
-            id_recurso_b="lab_prototipado"
+            id_recurso_b="lab_prototipado",
+            temporal=True
         ),
         
         # NO USAR JUNTOS: Robot de aprendizaje con sala de reuniones principal
@@ -165,20 +324,53 @@ def crear_restricciones_predeterminadas() -> List[Restriccion]:
         RestriccionCapacidad(
             tipo_recurso="espacio",
             capacidad_maxima=1
+        ),
+        
+        # POTENCIA
+        # Máximo 8 kW simultáneos entre todos los eventos (acometida y refrigeración de los
+        # clusters GPU): el A100 y el V100 no pueden funcionar a la vez
+        RestriccionPotencia(limite_kw=8.0),
+        
+        # CUOTAS (ventanas móviles)
+        # Reparto justo del cluster A100: máximo 40 horas de entrenamiento cada 7 días
+        RestriccionCuota(
+            id_recurso="cluster_gpu_a100",
+            horas_maximas=40,
+            ventana_dias=7,
+            tipo_evento="entrenamiento"
+        ),
+        
+        # Carga de trabajo del científico de datos: máximo 30 horas por semana
+        RestriccionCuota(
+            id_recurso="cientifico_datos",
+            horas_maximas=30,
+            ventana_dias=7
         )
     ]
     return restricciones
 
-def validar_restricciones(recursos: List['Recurso'], evento: 'Evento', restricciones:List['Restriccion']) ->tuple:
+def restricciones_violadas(recursos: List['Recurso'], evento: 'Evento', restricciones:List['Restriccion'],
+                           gestor_eventos: Optional['GestorEventos'] = None) ->List['Restriccion']:
+    """
+    Devuelve las restricciones que el evento no cumple (para saber de qué tipo es cada fallo)
+    Con gestor_eventos, las restricciones temporales se comprueban también junto a su agenda
+    """
+    return [r for r in restricciones
+            if not r.es_valida(recursos, evento)
+            or (gestor_eventos is not None and isinstance(r, RestriccionTemporal) and r.depende_de_agenda
+                and not r.es_valida_en(recursos, evento, gestor_eventos))]
+
+def validar_restricciones(recursos: List['Recurso'], evento: 'Evento', restricciones:List['Restriccion'],
+                          gestor_eventos: Optional['GestorEventos'] = None) ->tuple:
     """Valida todas las restricciones para un evento"""
-    errores = []
-    
-    for restriccion in restricciones:
-        if not restriccion.es_valida(recursos, evento):
-            errores.append(restriccion.mensaje_error())
+    errores = [r.mensaje_error() for r in restricciones_violadas(recursos, evento, restricciones, gestor_eventos)]
 
     return len(errores) == 0, errores
 
+def restricciones_de_agenda(restricciones: List[Restriccion]) -> List['RestriccionTemporal']:
+    """Las restricciones temporales que, tal como están configuradas, dependen de la agenda"""
+    return [r for r in restricciones if isinstance(r, RestriccionTemporal) and r.depende_de_agenda]
+
 def obtener_restricciones_por_tipo(restricciones: List[Restriccion], tipo_restriccion: type) ->List[Restriccion]:
     """Permite obtener las restricciones de un tipo específico"""
     return [r for r in restricciones if isinstance(r, tipo_restriccion)]
@@ -0,0 +1,52 @@
+"""
+Retenciones provisionales de recursos
+Una retención es un evento normal del gestor marcado con su caducidad en
+metadata["retencion"], así que las comprobaciones de conflictos y el mapa de
+disponibilidad la cuentan como cualquier otra reserva (y se guarda con el resto de
+datos, de modo que otros usuarios también la ven). Al caducar deja de contar
+(Evento.estado pasa a 'caducado') y se retira en la siguiente purga
+"""
+from __future__ import annotations
+import heapq
+from datetime import datetime
+from typing import List, Tuple
+
+from .eventos import Evento, GestorEventos
+
+
+class Retenciones:
+    """
+    Caducidades de las retenciones de un gestor en un montículo (caducidad, id): saber
+    cuál es la próxima en caducar es O(1) y retirarla O(log n), sin recorrer los eventos
+    """
+
+    def __init__(self, gestor_eventos: GestorEventos):
+        self.gestor_eventos = gestor_eventos
+        # Las retenciones confirmadas o liberadas se quedan en el montículo y se descartan al salir
+        self._monticulo: List[Tuple[datetime, str]] = [
+            (evento.retencion, evento.id) for evento in gestor_eventos.eventos.values()
+            if evento.retencion is not None
+        ]
+        heapq.heapify(self._monticulo)
+
+    def agregar(self, evento: Evento):
+        heapq.heappush(self._monticulo, (evento.retencion, evento.id))
+
+    def proxima(self) -> datetime:
+        """Caducidad más próxima (puede ser de una retención ya confirmada o liberada)"""
+        return self._monticulo[0][0] if self._monticulo else datetime.max
+
+    def purgar(self, ahora: datetime) -> List[str]:
+        """Elimina del gestor las retenciones caducadas. Returns: sus ids"""
+        purgadas = []
+        while self._monticulo and self._monticulo[0][0] <= ahora:
+            caducidad, id_evento = heapq.heappop(self._monticulo)
+            evento = self.gestor_eventos.obtener_evento(id_evento)
+            # Solo si sigue siendo esa misma retención (no se confirmó ni se prorrogó)
+            if evento is not None and evento.retencion == caducidad:
+                self.gestor_eventos.eliminar_evento(id_evento)
+                purgadas.append(id_evento)
+        return purgadas
+
+    def __len__(self) -> int:
+        return len(self._monticulo)
@@ -0,0 +1,255 @@
+"""
+Series de eventos recurrentes (reuniones semanales, lotes nocturnos de inferencia...)
+Una serie se guarda como un único registro con su regla de repetición, al estilo de
+RRULE: frecuencia, intervalo, días de la semana, fin por fecha o por número de
+repeticiones y excepciones. Las ocurrencias se generan bajo demanda y solo dentro de
+la ventana consultada, así que una serie sin fin no se expande nunca entera
+"""
+from __future__ import annotations
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+from .recursos import Recurso
+from .eventos import Evento, DURACION_MAXIMA_EVENTO
+from core.identificadores import generar_id
+
+# Frecuencias admitidas: diaria y semanal avanzan un número fijo de días por periodo
+FRECUENCIAS = ("diaria", "semanal", "mensual")
+
+DIAS_SEMANA = ("lunes", "martes", "miércoles", "jueves", "viernes", "sábado", "domingo")
+
+
+def _sumar_meses(fecha: datetime, meses: int) -> Optional[datetime]:
+    """Misma fecha y hora 'meses' después; None si ese mes no tiene ese día (p. ej. 31)"""
+    total = fecha.month - 1 + meses
+    try:
+        return fecha.replace(year=fecha.year + total // 12, month=total % 12 + 1)
+    except ValueError:
+        return None
+
+
+@dataclass
+class SerieRecurrente:
+    """
+    Evento que se repite según una regla
+    Args:
+        inicio: comienzo de la primera ocurrencia (fija también la hora de todas)
+        duracion: duración de cada ocurrencia
+        frecuencia: 'diaria', 'semanal' o 'mensual'
+        intervalo: cada cuántos periodos se repite (2 con 'semanal' = cada dos semanas)
+        dias_semana: con 'semanal', días en que se repite (0 = lunes); por defecto el de 'inicio'
+        repetir_hasta: no hay ocurrencias que empiecen después de esta fecha
+        repeticiones: número total de ocurrencias (las excepciones también cuentan)
+        excepciones: inicios de las ocurrencias anuladas
+    """
+    nombre: str
+    inicio: datetime
+    duracion: timedelta
+    recursos: List[Recurso]
+    tipo: str
+    frecuencia: str = "semanal"
+    intervalo: int = 1
+    dias_semana: List[int] = field(default_factory=list)
+    repetir_hasta: Optional[datetime] = None
+    repeticiones: Optional[int] = None
+    excepciones: Set[datetime] = field(default_factory=set)
+    id: str = field(default_factory=lambda: generar_id("serie"))
+    descripcion: str = ""
+    prioridad: int = 1
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+    def __post_init__(self):
+        """Valida la regla; los datos de cada ocurrencia se validan construyendo la primera"""
+        if self.frecuencia not in FRECUENCIAS:
+            raise ValueError(f"Frecuencia inválida. Debe ser una de: {','.join(FRECUENCIAS)}")
+        if self.intervalo < 1:
+            raise ValueError("El intervalo debe ser al menos 1")
+        if self.duracion <= timedelta(0) or self.duracion > DURACION_MAXIMA_EVENTO:
+            raise ValueError("La duración de cada ocurrencia debe estar entre 0 y 7 días")
+        if self.repetir_hasta is not None and self.repeticiones is not None:
+            raise ValueError("Indique la fecha final o el número de repeticiones, no ambos")
+        if self.repeticiones is not None and self.repeticiones < 1:
+            raise ValueError("El número de repeticiones debe ser al menos 1")
+
+        if self.frecuencia == "semanal":
+            if any(not 0 <= dia <= 6 for dia in self.dias_semana):
+                raise ValueError("Los días de la semana van de 0 (lunes) a 6 (domingo)")
+            self.dias_semana = sorted(set(self.dias_semana)) or [self.inicio.weekday()]
+        elif self.dias_semana:
+            raise ValueError("Los días de la semana solo se indican con frecuencia semanal")
+
+        self.excepciones = set(self.excepciones)
+        self._crear_ocurrencia(self.inicio)
+
+    # --- Expansión perezosa ---
+
+    def _candidatas(self, desde: Optional[datetime]) -> Iterator[tuple]:
+        """
+        Genera (índice, inicio) de las ocurrencias de la regla en orden, sin aplicar
+        límites ni excepciones. Salta directamente al periodo que contiene 'desde'
+        """
+        if self.frecuencia == "diaria":
+            paso = timedelta(days=self.intervalo)
+            periodo = 0 if desde is None else max(0, (desde - self.inicio) // paso)
+            while True:
+                yield periodo, self.inicio + periodo * paso
+                periodo += 1
+
+        elif self.frecuencia == "semanal":
+            paso = timedelta(weeks=self.intervalo)
+            lunes = self.inicio - timedelta(days=self.inicio.weekday())
+            # En la primera semana solo cuentan los días desde el inicio de la serie
+            primeros = sum(1 for dia in self.dias_semana if dia >= self.inicio.weekday())
+            periodo = 0 if desde is None else max(0, (desde - lunes) // paso)
+            while True:
+                base = lunes + periodo * paso
+                indice = 0 if periodo == 0 else primeros + (periodo - 1) * len(self.dias_semana)
+                for dia in self.dias_semana:
+                    if periodo == 0 and dia < self.inicio.weekday():
+                        continue
+                    yield indice, base + timedelta(days=dia)
+                    indice += 1
+                periodo += 1
+
+        else:
+            # Los meses sin ese día (31 de abril...) se omiten y no cuentan; solo se puede
+            # saltar sin recorrer desde el principio si todos los meses tienen el día
+            periodo = 0
+            if desde is not None and (self.inicio.day <= 28 or self.repeticiones is None):
+                meses = (desde.year - self.inicio.year) * 12 + desde.month - self.inicio.month - 1
+                periodo = max(0, meses // self.intervalo)
+            indice = periodo
+            while True:
+                fecha = _sumar_meses(self.inicio, periodo * self.intervalo)
+                if fecha is not None:
+                    yield indice, fecha
+                    indice += 1
+                periodo += 1
+
+    def fechas(self, desde: Optional[datetime] = None, hasta: Optional[datetime] = None) -> Iterator[datetime]:
+        """
+        Inicios de las ocurrencias que intersecan [desde, hasta], en orden
+        Sin 'hasta' el generador es infinito si la serie no tiene fin
+        """
+        for indice, inicio in self._candidatas(None if desde is None else desde - self.duracion):
+            if self.repeticiones is not None and indice >= self.repeticiones:
+                return
+            if self.repetir_hasta is not None and inicio > self.repetir_hasta:
+                return
+            if hasta is not None and inicio > hasta:
+                return
+            if desde is not None and inicio + self.duracion < desde:
+                continue
+            if inicio in self.excepciones:
+                continue
+            yield inicio
+
+    def ocurrencias(self, desde: Optional[datetime] = None, hasta: Optional[datetime] = None) -> Iterator[Evento]:
+        """Ocurrencias que intersecan [desde, hasta] como eventos (se crean al recorrerlas)"""
+        for inicio in self.fechas(desde, hasta):
+            yield self._crear_ocurrencia(inicio)
+
+    def _crear_ocurrencia(self, inicio: datetime) -> Evento:
+        metadata = {"serie": self.id}
+        if self.metadata.get("cancelado") is True:
+            metadata["cancelado"] = True
+        return Evento(
+            id=self.id_ocurrencia(inicio),
+            nombre=self.nombre,
+            inicio=inicio,
+            fin=inicio + self.duracion,
+            recursos=self.recursos,
+            tipo=self.tipo,
+            descripcion=self.descripcion,
+            prioridad=self.prioridad,
+            metadata=metadata
+        )
+
+    def id_ocurrencia(self, inicio: datetime) -> str:
+        """Id estable de la ocurrencia que empieza en 'inicio'"""
+        return f"{self.id}@{inicio.strftime('%Y%m%dT%H%M')}"
+
+    def agregar_excepcion(self, inicio: datetime) -> bool:
+        """Anula la ocurrencia que empieza en 'inicio'; False si no es una ocurrencia de la serie"""
+        if inicio not in self.fechas(inicio, inicio):
+            return False
+        self.excepciones.add(inicio)
+        return True
+
+    # --- Consultas ---
+
+    @property
+    def es_infinita(self) -> bool:
+        return self.repetir_hasta is None and self.repeticiones is None
+
+    @property
+    def estado(self) -> str:
+        return "cancelado" if self.metadata.get("cancelado") is True else "activa"
+
+    def usa_recurso(self, recurso_id: str) -> bool:
+        return any(r.id == recurso_id for r in self.recursos)
+
+    def cancelar(self):
+        """Cancela todas las ocurrencias de la serie"""
+        self.metadata["cancelado"] = True
+        self.metadata["fecha_cancelacion"] = datetime.now().isoformat()
+
+    def describir_regla(self) -> str:
+        """Descripción legible de la regla, p. ej. 'cada 2 semanas (lunes, jueves) hasta 30/06/2025'"""
+        unidad = {"diaria": ("día", "días"), "semanal": ("semana", "semanas"),
+                  "mensual": ("mes", "meses")}[self.frecuencia]
+        texto = f"cada {unidad[0]}" if self.intervalo == 1 else f"cada {self.intervalo} {unidad[1]}"
+        if self.frecuencia == "semanal":
+            texto += f" ({', '.join(DIAS_SEMANA[d] for d in self.dias_semana)})"
+        if self.repetir_hasta is not None:
+            texto += f" hasta {self.repetir_hasta.strftime('%d/%m/%Y')}"
+        elif self.repeticiones is not None:
+            texto += f", {self.repeticiones} veces"
+        return texto
+
+    # --- Serialización ---
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'id': self.id,
+            'nombre': self.nombre,
+            'inicio': self.inicio.isoformat(),
+            'duracion_minutos': self.duracion.total_seconds() / 60,
+            'recursos': [recurso.to_dict() for recurso in self.recursos],
+            'tipo': self.tipo,
+            'frecuencia': self.frecuencia,
+            'intervalo': self.intervalo,
+            'dias_semana': self.dias_semana if self.frecuencia == "semanal" else [],
+            'repetir_hasta': self.repetir_hasta.isoformat() if self.repetir_hasta else None,
+            'repeticiones': self.repeticiones,
+            'excepciones': sorted(e.isoformat() for e in self.excepciones),
+            'descripcion': self.descripcion,
+            'prioridad': self.prioridad,
+            'metadata': self.metadata
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'SerieRecurrente':
+        """Deserialización; 'recursos' puede contener diccionarios u objetos Recurso"""
+        recursos = [Recurso.from_dict(r) if isinstance(r, dict) else r for r in data.get('recursos', [])]
+        return cls(
+            id=data.get('id', ''),
+            nombre=data['nombre'],
+            inicio=datetime.fromisoformat(data['inicio']),
+            duracion=timedelta(minutes=data['duracion_minutos']),
+            recursos=recursos,
+            tipo=data['tipo'],
+            frecuencia=data.get('frecuencia', 'semanal'),
+            intervalo=data.get('intervalo', 1),
+            dias_semana=data.get('dias_semana', []),
+            repetir_hasta=datetime.fromisoformat(data['repetir_hasta']) if data.get('repetir_hasta') else None,
+            repeticiones=data.get('repeticiones'),
+            excepciones={datetime.fromisoformat(e) for e in data.get('excepciones', [])},
+            descripcion=data.get('descripcion', ''),
+            prioridad=data.get('prioridad', 1),
+            metadata=data.get('metadata', {})
+        )
+
+    def __str__(self):
+        return f"🔁 {self.nombre} ({self.inicio.strftime('%H:%M')}, {self.describir_regla()})"
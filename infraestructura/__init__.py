@@ -2,6 +2,6 @@
 Módulo infraestructura - Persistencia y servicios externos
 """
 
-from .persistencia import Persistencia
+from .persistencia import Persistencia, ConflictoRevision
 
-__all__ = ['Persistencia']
\ No newline at end of file
+__all__ = ['Persistencia', 'ConflictoRevision']
\ No newline at end of file
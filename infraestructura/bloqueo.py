@@ -0,0 +1,56 @@
+"""
+Cerrojo entre procesos para las escrituras versionadas del sistema
+"""
+import os
+
+try:
+    import fcntl
+except ImportError:  # Windows no dispone de fcntl
+    fcntl = None
+    import msvcrt
+
+# La revisión se guarda con ancho fijo para poder sobrescribirla sin truncar el archivo
+ANCHO_REVISION = 20
+
+
+class BloqueoArchivo:
+    """
+    Cerrojo exclusivo asociado a un archivo de datos.
+    Usa un archivo auxiliar "<archivo>.lock" que además almacena la revisión vigente,
+    de modo que comprobar e incrementar la revisión solo cuesta un par de llamadas al sistema
+    """
+
+    def __init__(self, archivo: str):
+        self.ruta = f"{archivo}.lock"
+        self._fd = None
+
+    def __enter__(self) -> "BloqueoArchivo":
+        self._fd = os.open(self.ruta, os.O_RDWR | os.O_CREAT, 0o644)
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        else:
+            os.lseek(self._fd, 0, os.SEEK_SET)
+            msvcrt.locking(self._fd, msvcrt.LK_LOCK, 1)
+        return self
+
+    def __exit__(self, tipo_excepcion, excepcion, traza):
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+
+    def leer_revision(self) -> int:
+        """Devuelve la revisión registrada (0 si el archivo aún no se ha guardado nunca)"""
+        os.lseek(self._fd, 0, os.SEEK_SET)
+        contenido = os.read(self._fd, ANCHO_REVISION).strip()
+        return int(contenido) if contenido else 0
+
+    def escribir_revision(self, revision: int):
+        """Registra la nueva revisión (debe llamarse con el cerrojo adquirido)"""
+        os.lseek(self._fd, 0, os.SEEK_SET)
+        os.write(self._fd, str(revision).zfill(ANCHO_REVISION).encode("ascii"))
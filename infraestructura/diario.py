@@ -0,0 +1,135 @@
+"""
+Diario de cambios entre guardados completos
+Cada comando aplicado o deshecho se añade como una línea JSON a "<archivo>.diario".
+Escribir una línea cuesta lo que ocupa el cambio, no todo el estado, y al cargar se
+vuelven a aplicar las entradas de la misma revisión que el archivo, de modo que los
+cambios hechos después del último guardado completo sobreviven a un cierre inesperado.
+Varios planificadores (sesiones de la interfaz web, la API, otros procesos) pueden
+compartir el archivo: cada entrada lleva la sesión y el proceso que la escribió, solo
+se recuperan las de procesos que ya no existen (las demás son cambios sin guardar de
+otra sesión viva) y cada sesión descarta únicamente las suyas al guardar. Todas las
+operaciones se hacen con el cerrojo del archivo de datos
+"""
+import json
+import os
+from typing import Any, Dict, List
+
+from core.identificadores import generar_id
+from infraestructura.bloqueo import BloqueoArchivo
+
+
+def proceso_vivo(pid: int) -> bool:
+    """Si existe un proceso con ese identificador"""
+    if pid == os.getpid():
+        return True
+    if os.name == "nt":
+        # En Windows os.kill terminaría el proceso: se consulta con OpenProcess
+        import ctypes
+        manejador = ctypes.windll.kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not manejador:
+            return False
+        ctypes.windll.kernel32.CloseHandle(manejador)
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Existe, pero es de otro usuario
+        return True
+    return True
+
+
+class Diario:
+    """Registro de solo-añadir asociado a un archivo de datos, con las entradas de una sesión"""
+
+    def __init__(self, archivo: str, sincronizar: bool = False):
+        self.archivo = archivo
+        self.ruta = f"{archivo}.diario"
+        self.sesion = generar_id("sesion")
+        self.pid = os.getpid()
+        # Con sincronizar cada entrada se fuerza a disco (sobrevive también a un corte de
+        # corriente, a cambio de una espera del disco por cambio)
+        self.sincronizar = sincronizar
+
+    def _propia(self, entrada: Dict[str, Any]) -> bool:
+        return entrada.get("sesion") == self.sesion
+
+    @staticmethod
+    def _huerfana(entrada: Dict[str, Any]) -> bool:
+        """Entrada de un proceso que ya no existe (o anterior a las sesiones)"""
+        pid = entrada.get("pid")
+        return not isinstance(pid, int) or not proceso_vivo(pid)
+
+    def _leer_todas(self) -> List[Dict[str, Any]]:
+        if not os.path.exists(self.ruta):
+            return []
+        entradas = []
+        with open(self.ruta, 'r', encoding='utf-8') as f:
+            for linea in f:
+                try:
+                    entrada = json.loads(linea)
+                except json.JSONDecodeError:
+                    # Última línea a medio escribir por un cierre inesperado
+                    break
+                if isinstance(entrada, dict):
+                    entradas.append(entrada)
+        return entradas
+
+    def _reescribir(self, entradas: List[Dict[str, Any]]):
+        """Sustituye el contenido del diario (con el cerrojo adquirido)"""
+        if not entradas:
+            if os.path.exists(self.ruta):
+                os.remove(self.ruta)
+            return
+        temporal = f"{self.ruta}.tmp"
+        with open(temporal, 'w', encoding='utf-8') as f:
+            for entrada in entradas:
+                f.write(json.dumps(entrada, ensure_ascii=False, default=str) + "\n")
+        os.replace(temporal, self.ruta)
+
+    def registrar(self, revision: int, entrada: Dict[str, Any]):
+        """Añade una entrada de esta sesión hecha sobre la revisión 'revision' del archivo de datos"""
+        linea = json.dumps({"revision": revision, "sesion": self.sesion, "pid": self.pid, **entrada},
+                           ensure_ascii=False, default=str)
+        with BloqueoArchivo(self.archivo):
+            with open(self.ruta, 'a', encoding='utf-8') as f:
+                f.write(linea + "\n")
+                if self.sincronizar:
+                    f.flush()
+                    os.fsync(f.fileno())
+
+    def recuperar(self, revision: int, adoptar: bool = True) -> List[Dict[str, Any]]:
+        """
+        Entradas de sesiones terminadas sin guardar hechas sobre 'revision'. Las de otras
+        revisiones ya están incluidas en un guardado posterior o se hicieron sobre datos
+        que ya no existen. Con adoptar, las recuperadas pasan a ser de esta sesión (se
+        descartan al guardarla) y las obsoletas se eliminan del archivo
+        """
+        with BloqueoArchivo(self.archivo):
+            entradas = self._leer_todas()
+            recuperadas = []
+            conservadas = []
+            for entrada in entradas:
+                if not self._huerfana(entrada):
+                    conservadas.append(entrada)
+                elif entrada.get("revision") == revision:
+                    recuperadas.append(entrada)
+                    if adoptar:
+                        conservadas.append({**entrada, "sesion": self.sesion, "pid": self.pid})
+            if adoptar and (recuperadas or len(conservadas) != len(entradas)):
+                self._reescribir(conservadas)
+        return recuperadas
+
+    def vaciar(self):
+        """Descarta las entradas de esta sesión (tras un guardado completo, que ya las incluye)"""
+        with BloqueoArchivo(self.archivo):
+            entradas = self._leer_todas()
+            restantes = [entrada for entrada in entradas if not self._propia(entrada)]
+            if len(restantes) != len(entradas) or not restantes:
+                self._reescribir(restantes)
+
+    def __len__(self):
+        """Entradas de esta sesión pendientes de guardar"""
+        with BloqueoArchivo(self.archivo):
+            return sum(1 for entrada in self._leer_todas() if self._propia(entrada))
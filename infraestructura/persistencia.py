@@ -2,62 +2,200 @@
 
 """Encargado de cargar y guardar el estado del sistema"""
 
+import hashlib
 import json
 from datetime import datetime
-from typing import List, Any, Dict
+from typing import List, Any, Dict, Optional
 import os
+import sys
+import tempfile
+import time
 
 # Usando importaciones absolutas 
 from dominio.recursos import Recurso, GestorRecursos 
 from dominio.eventos import Evento, GestorEventos
+from dominio.series import SerieRecurrente
 from dominio.restricciones import (
     Restriccion, RestriccionExclusionMutua, 
-    RestriccionCoRequisito, RestriccionCapacidad,
-    crear_restricciones_predeterminadas
+    RestriccionCoRequisito, RestriccionCapacidad, RestriccionPotencia, RestriccionCuota
 )
+from infraestructura.bloqueo import BloqueoArchivo
+from core.diagnostico import instrumentar
+from core.metricas import DURACION_GUARDADO, BYTES_ESCRITOS, CONFLICTOS_REVISION
+
+# Versión del formato de archivo. Desde la 1.1 la metadata ocupa la primera línea tras
+# la llave de apertura e incluye la suma de comprobación del resto del texto, que
+# permite cargar los eventos sin volver a validarlos
+VERSION_FORMATO = "1.1"
+
+# Comienzo de la línea de metadata en el formato 1.1
+_CABECERA = '{\n  "metadata": '
+
+
+class ConflictoRevision(Exception):
+    """Otro proceso guardó el archivo después de la revisión con la que se trabajaba"""
+    def __init__(self, archivo: str, revision_esperada: int, revision_actual: int):
+        super().__init__(
+            f"El archivo {archivo} está en la revisión {revision_actual}, "
+            f"se esperaba la revisión {revision_esperada}"
+        )
+        self.archivo = archivo
+        self.revision_esperada = revision_esperada
+        self.revision_actual = revision_actual
 
 
 class Persistencia:
     """Responsable de cargar y guardar los datos del sistema"""
      
     @staticmethod #La siguiente función no recibe parámetro(clase, instancia)
+    @instrumentar("Persistencia.guardar_sistema")
     def guardar_sistema( gestor_eventos: GestorEventos, gestor_recursos: GestorRecursos,
-                        restricciones: List[Restriccion], archivo: str = "datos.json"):
+                        restricciones: List[Restriccion], archivo: str = "datos.json",
+                        revision_esperada: Optional[int] = None) -> int:
     # archivo:es la ruta completa donde se encuentran los datos del sistema
-        datos ={
+        """
+        Guarda el estado completo como una nueva revisión del archivo
+        Args:
+            revision_esperada: revisión sobre la que se hicieron los cambios. Si otro proceso
+                guardó entretanto se lanza ConflictoRevision. Con None se sobrescribe sin comprobar
+        Returns: la revisión con la que quedó guardado el archivo
+        """
+        inicio_guardado = time.perf_counter()
+        while True:
+            revision_base = (revision_esperada if revision_esperada is not None
+                             else Persistencia.leer_revision(archivo))
+            datos = Persistencia.a_diccionario(gestor_eventos, gestor_recursos, restricciones,
+                                               revision_base + 1)
+
+            #Crear el directorio si no existe 
+            directorio = os.path.dirname(archivo)
+            if directorio and not os.path.exists(directorio):
+                os.makedirs(directorio)
+
+            # Se serializa fuera del cerrojo en un archivo temporal del mismo directorio,
+            # así el cerrojo solo se mantiene para comprobar la revisión y renombrar
+            descriptor, archivo_temporal = tempfile.mkstemp(
+                dir = directorio or ".", prefix = f".{os.path.basename(archivo)}.", suffix = ".tmp")
+            try:
+                with os.fdopen(descriptor, 'w', encoding = 'utf-8') as f:
+                    f.write(Persistencia.serializar(datos))
+                    bytes_escritos = f.tell()
+
+                with BloqueoArchivo(archivo) as bloqueo:
+                    revision_actual = bloqueo.leer_revision()
+                    if revision_actual == revision_base:
+                        os.replace(archivo_temporal, archivo)
+                        bloqueo.escribir_revision(revision_base + 1)
+                        BYTES_ESCRITOS.incrementar(bytes_escritos)
+                        DURACION_GUARDADO.observar(time.perf_counter() - inicio_guardado)
+                        return revision_base + 1
+            finally:
+                if os.path.exists(archivo_temporal):
+                    os.remove(archivo_temporal)
+
+            CONFLICTOS_REVISION.incrementar()
+            if revision_esperada is not None:
+                raise ConflictoRevision(archivo, revision_esperada, revision_actual)
+            # Sin revisión esperada se reintenta sobre la revisión más reciente
+
+    @staticmethod
+    def leer_revision(archivo: str = "datos.json") -> int:
+        """Devuelve la revisión vigente del archivo (0 si nunca se guardó con revisiones)"""
+        if not os.path.exists(f"{archivo}.lock"):
+            return 0
+        with BloqueoArchivo(archivo) as bloqueo:
+            return bloqueo.leer_revision()
+    
+    @staticmethod
+    @instrumentar("Persistencia.cargar_sistema")
+    def cargar_sistema(archivo: str = "datos.json") -> tuple:
+        """Permite cargar los datos del sistema"""
+        """
+        Returns: tuple: (gestor_eventos, gestor_recursos, restricciones, advertencias)
+        Raises:
+        FileNotFoundError: "El archivo no fue encontrado"
+        json.JSONDecodeError: "Si el archivo no es JSON válido"
+
+        """
+        with open(archivo, 'r',encoding ='utf-8') as f:
+            texto = f.read()
+        return Persistencia._interpretar(texto)
+
+    @staticmethod
+    def cargar_con_revision(archivo: str = "datos.json") -> tuple:
+        """
+        Como cargar_sistema, pero leyendo la revisión y el contenido con el cerrojo, de
+        modo que nadie puede guardar entre una lectura y otra
+        Returns: tuple: (revision, gestor_eventos, gestor_recursos, restricciones, advertencias)
+        """
+        with BloqueoArchivo(archivo) as bloqueo:
+            revision = bloqueo.leer_revision()
+            with open(archivo, 'r', encoding = 'utf-8') as f:
+                texto = f.read()
+        return (revision, *Persistencia._interpretar(texto))
+
+    @staticmethod
+    def _interpretar(texto: str) -> tuple:
+        """Estado a partir del texto de un archivo de datos (ver cargar_sistema)"""
+        datos = json.loads(texto)
+        return Persistencia.desde_diccionario(datos, confiable = Persistencia.es_confiable(texto, datos))
+
+    @staticmethod
+    def a_diccionario(gestor_eventos: GestorEventos, gestor_recursos: GestorRecursos,
+                      restricciones: List[Restriccion], revision: int = 0) -> Dict[str, Any]:
+        """Estado completo como diccionario serializable (el contenido del archivo de datos)"""
+        return {
             "metadata": { 
                 "fecha_guardado": datetime.now().isoformat(),
-                "version": "1.0",#Por si se modifica la estructura de datos posteriormente
+                "version": VERSION_FORMATO,#Por si se modifica la estructura de datos posteriormente
+                "revision": revision,
                 "total_eventos": len(gestor_eventos),
+                "total_series": len(gestor_eventos.series),
                 "total_recursos": len(gestor_recursos),
                 "total_restricciones": len(restricciones)
             },
             "eventos": [ evento.to_dict() for evento in gestor_eventos.eventos.values()],
+            "series": gestor_eventos.series_to_list(),
             "recursos": [recurso.to_dict() for recurso in gestor_recursos.recursos.values()],
             "restricciones": Persistencia.serializar_restricciones(restricciones)
             }
 
-        #Crear el directorio si no existe 
-        directorio = os.path.dirname(archivo)
-        if directorio and not os.path.exists(directorio):
-            os.makedirs(directorio)
-
-        with open(archivo, 'w', encoding = 'utf-8') as f:
-            json.dump(datos, f, indent = 2, ensure_ascii = False, default = str)
-    
     @staticmethod
-    def cargar_sistema(archivo: str = "datos.json") -> tuple:
-        """Permite cargar los datos del sistema"""
+    def serializar(datos: Dict[str, Any]) -> str:
         """
-        Returns: tuple: (gestor_eventos, gestor_recursos, restricciones, advertencias)
-        Raises:
-        FileNotFoundError: "El archivo no fue encontrado"
-        json.JSONDecodeError: "Si el archivo no es JSON válido"
+        Texto del archivo de datos: la metadata en una sola línea, con la suma de
+        comprobación de todo lo que va detrás, y el resto con sangría
+        """
+        resto = json.dumps({clave: valor for clave, valor in datos.items() if clave != "metadata"},
+                           indent = 2, ensure_ascii = False, default = str)[2:]
+        metadata = {**datos.get("metadata", {}), "suma": Persistencia._suma(resto)}
+        return f"{_CABECERA}{json.dumps(metadata, ensure_ascii = False, default = str)},\n{resto}"
 
+    @staticmethod
+    def _suma(texto: str) -> str:
+        return hashlib.blake2b(texto.encode('utf-8'), digest_size = 16).hexdigest()
+
+    @staticmethod
+    def es_confiable(texto: str, datos: Dict[str, Any]) -> bool:
         """
-        with open(archivo, 'r',encoding ='utf-8') as f:
-            datos = json.load(f)
+        El archivo lo escribió Persistencia con el formato actual y no se modificó después
+        (coinciden la versión y la suma de comprobación del texto tras la metadata)
+        """
+        metadata = datos.get("metadata", {})
+        if metadata.get("version") != VERSION_FORMATO or not texto.startswith(_CABECERA):
+            return False
+        fin_metadata = texto.find("\n", len(_CABECERA))
+        return fin_metadata != -1 and metadata.get("suma") == Persistencia._suma(texto[fin_metadata + 1:])
 
+    @staticmethod
+    def desde_diccionario(datos: Dict[str, Any], confiable: bool = False) -> tuple:
+        """
+        Reconstruye el estado a partir de un diccionario con el formato del archivo de datos
+        Args:
+            confiable: los eventos los generó el propio sistema (archivo verificado con
+                es_confiable o instantánea en memoria) y se cargan sin volver a validarlos
+        Returns: tuple: (gestor_eventos, gestor_recursos, restricciones, advertencias)
+        """
         #cargar recursos
         gestor_recursos = GestorRecursos()
         advertencias = []
@@ -77,42 +215,110 @@ class Persistencia:
             
         #cargar eventos (depende de recursos)
         gestor_eventos = GestorEventos()
-        for evento_data in datos.get("eventos", []):
-            recursos_evento = [] 
-            for recurso_data in evento_data.get("recursos", []):
-                if isinstance(recurso_data, dict):
-                    # Vamos a deserializar los recursos a partir de ID
-                    # Ya que si utilizamos la función Recurso.from_dict(), se crearían múltiples instancias del mismo recurso 
-                    # y nos interesa que el mismo recurso físico tenga una única instancia en memoria
-                    recurso_id = recurso_data.get('id')
-                    recurso = gestor_recursos.obtener_recurso(recurso_id)
-                    if not recurso:
-                        print(
-                            f"El recurso con ID '{recurso_id}' referenciado en evento '{evento_data.get('id', 'sin id')}', "
-                            "no es encontrado en el gestor de recursos.Omitiendo recurso"
-                        )
-                        advertencias.append(
-                            f"El recurso con ID '{recurso_id}' referenciado en evento '{evento_data.get('id', 'sin id')}', "
-                            "no es encontrado en el gestor de recursos.Omitiendo recurso")   
-                        continue
-                    recursos_evento.append(recurso)
+        if confiable:
+            Persistencia._cargar_eventos_confiables(datos["eventos"], gestor_recursos, gestor_eventos, advertencias)
+        else:
+            # Archivos antiguos o modificados fuera del sistema: cada evento se valida
+            for evento_data in datos.get("eventos", []):
+                gestor_eventos.agregar_evento(
+                    Persistencia._evento_validado(evento_data, gestor_recursos, advertencias))
+        
+        #cargar series recurrentes (también dependen de recursos)
+        for serie_data in datos.get("series", []):
+            recursos_serie = []
+            for recurso_data in serie_data.get("recursos", []):
+                recurso_id = recurso_data.get('id') if isinstance(recurso_data, dict) else recurso_data
+                recurso = gestor_recursos.obtener_recurso(recurso_id)
+                if recurso:
+                    recursos_serie.append(recurso)
                 else:
-                    #En caso de que el recurso sea una instancia de la clase Recurso
-                    #(Que no debería pasar en cadena JSON)
-                    recursos_evento.append(recurso_data)
-
-            # Vamos a actualizar los recursos(como objeto Recurso) que pertenecen al evento
-            evento_data["recursos"] = recursos_evento
-
-            #Para crear el objeto evento 
-            evento = Evento.from_dict(evento_data)
-            gestor_eventos.agregar_evento(evento)
+                    advertencias.append(
+                        f"El recurso con ID '{recurso_id}' referenciado en la serie '{serie_data.get('id', 'sin id')}', "
+                        "no es encontrado en el gestor de recursos.Omitiendo recurso")
+            try:
+                gestor_eventos.agregar_serie(SerieRecurrente.from_dict({**serie_data, "recursos": recursos_serie}))
+            except (KeyError, TypeError, ValueError) as e:
+                print(f" Error al cargar la serie {serie_data.get('id', 'sin id')}: {e}")
+                advertencias.append(f"No se pudo cargar la serie '{serie_data.get('id', 'sin id')}': {e}")
         
         #cargar restricciones
         restricciones = Persistencia.deserializar_restricciones(datos.get("restricciones", []))
         
         return gestor_eventos, gestor_recursos, restricciones, advertencias
     
+    @staticmethod
+    def _evento_validado(evento_data: Dict[str, Any], gestor_recursos: GestorRecursos,
+                         advertencias: List[str]) -> Evento:
+        """Construye un evento del archivo pasando por todas las validaciones de Evento"""
+        recursos_evento = [] 
+        for recurso_data in evento_data.get("recursos", []):
+            if isinstance(recurso_data, dict):
+                # Vamos a deserializar los recursos a partir de ID
+                # Ya que si utilizamos la función Recurso.from_dict(), se crearían múltiples instancias del mismo recurso 
+                # y nos interesa que el mismo recurso físico tenga una única instancia en memoria
+                recurso_id = recurso_data.get('id')
+                recurso = gestor_recursos.obtener_recurso(recurso_id)
+                if not recurso:
+                    print(
+                        f"El recurso con ID '{recurso_id}' referenciado en evento '{evento_data.get('id', 'sin id')}', "
+                        "no es encontrado en el gestor de recursos.Omitiendo recurso"
+                    )
+                    advertencias.append(
+                        f"El recurso con ID '{recurso_id}' referenciado en evento '{evento_data.get('id', 'sin id')}', "
+                        "no es encontrado en el gestor de recursos.Omitiendo recurso")   
+                    continue
+                recursos_evento.append(recurso)
+            else:
+                #En caso de que el recurso sea una instancia de la clase Recurso
+                #(Que no debería pasar en cadena JSON)
+                recursos_evento.append(recurso_data)
+
+        #Para crear el objeto evento con los recursos (como objeto Recurso) que le pertenecen,
+        #sin modificar el diccionario de entrada
+        return Evento.from_dict({**evento_data, "recursos": recursos_evento})
+
+    @staticmethod
+    def _cargar_eventos_confiables(eventos_data: List[Dict[str, Any]], gestor_recursos: GestorRecursos,
+                                   gestor_eventos: GestorEventos, advertencias: List[str]):
+        """
+        Carga rápida de eventos ya validados al crearse: se construyen sin __post_init__,
+        las cadenas repetidas (tipo) se internan, cada fecha distinta se interpreta una
+        sola vez y los índices del gestor se ordenan una vez al final
+        """
+        recursos = gestor_recursos.recursos
+        fechas: Dict[str, datetime] = {}
+        eventos: Dict[str, Evento] = {}
+        for evento_data in eventos_data:
+            try:
+                recursos_evento = [recursos[recurso_data['id']] for recurso_data in evento_data['recursos']]
+            except (KeyError, TypeError):
+                # Referencia a un recurso que ya no existe: este evento se valida (y se avisa)
+                evento = Persistencia._evento_validado(evento_data, gestor_recursos, advertencias)
+            else:
+                inicio = fechas.get(evento_data['inicio'])
+                if inicio is None:
+                    inicio = fechas[evento_data['inicio']] = datetime.fromisoformat(evento_data['inicio'])
+                fin = fechas.get(evento_data['fin'])
+                if fin is None:
+                    fin = fechas[evento_data['fin']] = datetime.fromisoformat(evento_data['fin'])
+                metadata = evento_data.get('metadata', {})
+                if evento_data.get('estado') == 'cancelado':
+                    metadata["cancelado"] = True
+                evento = Evento.sin_validar(
+                    id = evento_data['id'],
+                    nombre = evento_data['nombre'],
+                    inicio = inicio,
+                    fin = fin,
+                    recursos = recursos_evento,
+                    tipo = sys.intern(evento_data['tipo']),
+                    descripcion = evento_data.get('descripcion', ''),
+                    prioridad = evento_data.get('prioridad', 1),
+                    metadata = metadata
+                )
+            # Como agregar_evento: si un id se repite se conserva el primero
+            eventos.setdefault(evento.id, evento)
+        gestor_eventos.eventos = eventos
+    
     @staticmethod
     def serializar_restricciones(restricciones: List[Restriccion]) -> List[Dict[str, Any]]:
         """Convierte una lista de restricciones a diccionarios serializables"""
@@ -128,7 +334,8 @@ class Persistencia:
                 tipo = "exclusion_mutua"
                 parametros = {
                     "recurso_a":restriccion.recurso_a,
-                    "recurso_b":restriccion.recurso_b
+                    "recurso_b":restriccion.recurso_b,
+                    "temporal": restriccion.temporal
                 }
             elif isinstance(restriccion, RestriccionCapacidad):
                 tipo = "capacidad"
@@ -136,6 +343,19 @@ class Persistencia:
                     "tipo_recurso": restriccion.tipo_recurso,
                     "capacidad_maxima": restriccion.capacidad_maxima
                 }
+            elif isinstance(restriccion, RestriccionPotencia):
+                tipo = "potencia"
+                parametros = {
+                    "limite_kw": restriccion.limite_kw
+                }
+            elif isinstance(restriccion, RestriccionCuota):
+                tipo = "cuota"
+                parametros = {
+                    "recurso": restriccion.recurso,
+                    "horas_maximas": restriccion.horas_maximas,
+                    "ventana_dias": restriccion.ventana_dias,
+                    "tipo_evento": restriccion.tipo_evento
+                }
             else:
                 continue  #Restriccion desconocida, se omite
             
@@ -162,13 +382,25 @@ class Persistencia:
             elif tipo == "exclusion_mutua":
                 restriccion = RestriccionExclusionMutua(
                     id_recurso_a = parametros.get("recurso_a"),
-                    id_recurso_b = parametros.get("recurso_b")
+                    id_recurso_b = parametros.get("recurso_b"),
+                    temporal = parametros.get("temporal", False)
                 )
             elif tipo == "capacidad":
                 restriccion = RestriccionCapacidad(
                     tipo_recurso = parametros.get("tipo_recurso"),
                     capacidad_maxima = parametros.get("capacidad_maxima")
                 )
+            elif tipo == "potencia":
+                restriccion = RestriccionPotencia(
+                    limite_kw = parametros.get("limite_kw")
+                )
+            elif tipo == "cuota":
+                restriccion = RestriccionCuota(
+                    id_recurso = parametros.get("recurso"),
+                    horas_maximas = parametros.get("horas_maximas"),
+                    ventana_dias = parametros.get("ventana_dias", 7),
+                    tipo_evento = parametros.get("tipo_evento")
+                )
             else:
                 continue #tipo desconocido, se omite
             
@@ -182,8 +414,7 @@ class Persistencia:
         return Persistencia.cargar_sistema(archivo_backup)
     
     @staticmethod 
-            
-
+    @instrumentar("Persistencia.crear_backup")
     def crear_backup(gestor_recursos: GestorRecursos, gestor_eventos: GestorEventos,
                      restricciones: List[Restriccion], directorio_backup: str = "backups"):
         """Crea un backup del sistema con timestamp"""
@@ -194,9 +425,15 @@ class Persistencia:
         # Para crear el directorio si no existe 
         if not os.path.exists(directorio_backup):
             os.makedirs(directorio_backup)
-            
-        Persistencia.guardar_sistema(gestor_eventos, gestor_recursos, 
-                                            restricciones, archivo_backup)
+
+        # Una copia no tiene revisiones ni la escriben varios procesos: se escribe sin
+        # cerrojo (no deja un .lock junto a cada backup), a través de un temporal para que
+        # nunca quede a medias
+        datos = Persistencia.a_diccionario(gestor_eventos, gestor_recursos, restricciones)
+        archivo_temporal = f"{archivo_backup}.tmp"
+        with open(archivo_temporal, 'w', encoding = 'utf-8') as f:
+            f.write(Persistencia.serializar(datos))
+        os.replace(archivo_temporal, archivo_backup)
         
         return archivo_backup
     
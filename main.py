@@ -1,15 +1,61 @@
 """
  Punto de entrada oficial para la evaluación del proyecto
  Este script actúa como un adaptador para cumplir con el requisito del sistema
- automatizado de MatCom, el cual busca un archivo "main.py". Como la interfaz 
+ automatizado de MatCom, el cual busca un archivo "main.py". Como la interfaz
  gráfica está desarrollada en Streamlit (que requiere un comando especial),
- este archivo redirige la ejecución hacia "app.py".
+ este archivo arranca el servidor de Streamlit con "app.py" dentro del mismo
+ proceso, sin lanzar una shell ni otro intérprete.
+
+ Opciones:
+    python main.py              Interfaz web (Streamlit)
+    python main.py --api        Solo la API HTTP/JSON (ver api.py)
+    python main.py --con-api    Interfaz web y API a la vez
 
 """
+import argparse
 import os
+import threading
+
+# Ruta absoluta de la interfaz, para poder lanzar main.py desde cualquier directorio
+RUTA_APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+
+
+def iniciar_interfaz(puerto: int = None, sin_navegador: bool = False):
+    """Arranca Streamlit en este proceso (equivale a 'streamlit run app.py')"""
+    from streamlit.web import bootstrap
+
+    opciones = {}
+    if puerto is not None:
+        opciones["server_port"] = puerto
+    if sin_navegador:
+        opciones["server_headless"] = True
+    bootstrap.load_config_options(flag_options=opciones)
+    bootstrap.run(RUTA_APP, f"streamlit run {RUTA_APP}", [], flag_options=opciones)
+
+
 if __name__ == "__main__":
-    # Mensaje en la terminal para confirmar que el script arrancó 
+    parser = argparse.ArgumentParser(description="Planificador Inteligente de Eventos")
+    modo = parser.add_mutually_exclusive_group()
+    modo.add_argument("--api", action="store_true", help="Iniciar solo la API HTTP/JSON")
+    modo.add_argument("--con-api", action="store_true", help="Iniciar la API junto a la interfaz web")
+    parser.add_argument("--puerto-api", type=int, default=8000, help="Puerto de la API")
+    parser.add_argument("--puerto", type=int, help="Puerto de la interfaz web (por defecto 8501)")
+    parser.add_argument("--sin-navegador", action="store_true",
+                        help="No abrir el navegador al iniciar la interfaz web")
+    argumentos = parser.parse_args()
+
+    # Mensaje en la terminal para confirmar que el script arrancó
     print("Iniciando el Planificador Inteligente de Eventos...")
-    
-    # Invoca al sistema operativo para levantar el servidor de Streamlit
-    os.system("streamlit run app.py")
\ No newline at end of file
+
+    if argumentos.api or argumentos.con_api:
+        import api
+        if argumentos.api:
+            api.ejecutar(puerto=argumentos.puerto_api)
+            raise SystemExit(0)
+        # La API corre en un hilo propio; ambas interfaces comparten el directorio de datos
+        # y las escrituras versionadas evitan que se sobrescriban mutuamente
+        threading.Thread(
+            target=api.ejecutar, kwargs={"puerto": argumentos.puerto_api}, daemon=True
+        ).start()
+
+    iniciar_interfaz(argumentos.puerto, argumentos.sin_navegador)